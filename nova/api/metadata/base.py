@@ -477,6 +477,121 @@ class InstanceMetadata(object):
             yield ('%s/%s/%s' % ("openstack", CONTENT_DIR, cid), content)
 
 
+class PrerenderedMetadata(InstanceMetadata):
+    """Instance metadata served from a pre-rendered form.
+
+    render() serializes every path of the EC2 and OpenStack metadata trees
+    of an InstanceMetadata into a dict of primitives, which can be stored
+    in a cache shared by all the metadata API workers. Building this class
+    from it costs no database or network API call.
+    """
+
+    # Version of the pre-rendered form, bumped when its layout changes so
+    # that workers ignore the forms cached by workers of another version.
+    RENDER_VERSION = 2
+
+    def __init__(self, rendered):
+        self.set_mimetype(MIME_TYPE_TEXT_PLAIN)
+        self.uuid = rendered['uuid']
+        self.instance = objects.Instance(uuid=rendered['uuid'],
+                                         project_id=rendered['project_id'])
+        self.password = rendered['password']
+        self.userdata_raw = rendered['user_data']
+        self.content = rendered['content']
+        self._ec2 = rendered['ec2']
+        self._openstack = rendered['openstack']
+
+    @classmethod
+    def render(cls, meta_data):
+        """Return the pre-rendered form of an InstanceMetadata.
+
+        The user data is stored once rather than in every version, and
+        the random seed is left out of meta_data.json to be generated for
+        each request.
+        """
+        ec2 = {}
+        for version in VERSIONS:
+            ec2[version] = meta_data.get_ec2_metadata(version)
+            ec2[version].pop('user-data', None)
+
+        openstack = {}
+        for version in OPENSTACK_VERSIONS:
+            items = {}
+            for path in (VERSION, MD_JSON_NAME, UD_NAME, PASS_NAME,
+                         VD_JSON_NAME, NW_JSON_NAME):
+                meta_data.set_mimetype(MIME_TYPE_TEXT_PLAIN)
+                try:
+                    data = meta_data.get_openstack_item([version, path])
+                except KeyError:
+                    continue
+                if callable(data) or path == UD_NAME:
+                    # The password is handled by a function of the request,
+                    # which can't be rendered, and the user data is served
+                    # from its single copy.
+                    data = None
+                elif path == MD_JSON_NAME:
+                    data = jsonutils.loads(data)
+                    data.pop('random_seed', None)
+                items[path] = (meta_data.get_mimetype(), data)
+            openstack[version] = items
+
+        return {'render_version': cls.RENDER_VERSION,
+                'uuid': meta_data.uuid,
+                'project_id': meta_data.instance.project_id,
+                'password': meta_data.password,
+                'user_data': meta_data.userdata_raw,
+                'content': dict(meta_data.content),
+                'ec2': ec2,
+                'openstack': openstack}
+
+    @classmethod
+    def from_rendered(cls, rendered):
+        """Return the metadata of a pre-rendered form, or None if it has
+        another version.
+        """
+        if (not isinstance(rendered, dict) or
+                rendered.get('render_version') != cls.RENDER_VERSION):
+            return None
+        return cls(rendered)
+
+    def get_ec2_metadata(self, version):
+        if version == "latest":
+            version = VERSIONS[-1]
+
+        if version not in VERSIONS:
+            raise InvalidMetadataVersion(version)
+
+        data = dict(self._ec2[version])
+        if self.userdata_raw is not None:
+            data['user-data'] = self.userdata_raw
+        return data
+
+    def get_openstack_item(self, path_tokens):
+        if path_tokens[0] == CONTENT_DIR:
+            return self._handle_content(path_tokens)
+
+        version = path_tokens[0]
+        if version == "latest":
+            version = OPENSTACK_VERSIONS[-1]
+
+        if version not in OPENSTACK_VERSIONS:
+            raise InvalidMetadataVersion(version)
+
+        path = '/'.join(path_tokens[1:]) or VERSION
+        mimetype, data = self._openstack[version][path]
+        if path == PASS_NAME:
+            return password.handle_password
+        if path == UD_NAME:
+            data = self.userdata_raw
+        elif path == MD_JSON_NAME:
+            data = dict(data)
+            if self._check_os_version(GRIZZLY, version):
+                data['random_seed'] = base64.b64encode(os.urandom(512))
+            data = jsonutils.dumps(data)
+        self.set_mimetype(mimetype)
+        return data
+
+
 class RouteConfiguration(object):
     """Routes metadata paths to request handlers."""
 
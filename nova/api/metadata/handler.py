@@ -59,7 +59,14 @@ metadata_opts = [
                     'this should improve response times of the metadata API '
                     'when under heavy load. Higher values may increase memory'
                     'usage and result in longer times for host metadata '
-                    'changes to take effect.')
+                    'changes to take effect.'),
+    cfg.BoolOpt('metadata_prerender',
+                default=False,
+                help='Cache the metadata of instances rendered for every '
+                     'path it serves, instead of the objects it is rendered '
+                     'from. The rendered metadata can be shared by all the '
+                     'metadata API workers through memcached_servers, and '
+                     'is served without rebuilding it.'),
 ]
 
 CONF.register_opts(metadata_proxy_opts, 'neutron')
@@ -74,12 +81,29 @@ class MetadataRequestHandler(wsgi.Application):
     def __init__(self):
         self._cache = memorycache.get_client()
 
+    def _cache_key(self, key):
+        if CONF.metadata_prerender:
+            return 'metadata-prerendered-%s' % key
+        return 'metadata-%s' % key
+
+    def _get_cached(self, cache_key):
+        data = self._cache.get(cache_key)
+        if data and CONF.metadata_prerender:
+            data = base.PrerenderedMetadata.from_rendered(data)
+        return data
+
+    def _set_cached(self, cache_key, data):
+        if CONF.metadata_cache_expiration > 0:
+            if CONF.metadata_prerender:
+                data = base.PrerenderedMetadata.render(data)
+            self._cache.set(cache_key, data, CONF.metadata_cache_expiration)
+
     def get_metadata_by_remote_address(self, address):
         if not address:
             raise exception.FixedIpNotFoundForAddress(address=address)
 
-        cache_key = 'metadata-%s' % address
-        data = self._cache.get(cache_key)
+        cache_key = self._cache_key(address)
+        data = self._get_cached(cache_key)
         if data:
             LOG.debug("Using cached metadata for %s", address)
             return data
@@ -89,14 +113,13 @@ class MetadataRequestHandler(wsgi.Application):
         except exception.NotFound:
             return None
 
-        if CONF.metadata_cache_expiration > 0:
-            self._cache.set(cache_key, data, CONF.metadata_cache_expiration)
+        self._set_cached(cache_key, data)
 
         return data
 
     def get_metadata_by_instance_id(self, instance_id, address):
-        cache_key = 'metadata-%s' % instance_id
-        data = self._cache.get(cache_key)
+        cache_key = self._cache_key(instance_id)
+        data = self._get_cached(cache_key)
         if data:
             LOG.debug("Using cached metadata for instance %s", instance_id)
             return data
@@ -106,8 +129,7 @@ class MetadataRequestHandler(wsgi.Application):
         except exception.NotFound:
             return None
 
-        if CONF.metadata_cache_expiration > 0:
-            self._cache.set(cache_key, data, CONF.metadata_cache_expiration)
+        self._set_cached(cache_key, data)
 
         return data
 
@@ -38,7 +38,7 @@ class HypervisorsController(object):
         self.ext_mgr = ext_mgr
 
     def _view_hypervisor(self, hypervisor, service, detail, servers=None,
-                         **kwargs):
+                         alive=None, **kwargs):
         hyp_dict = {
             'id': hypervisor.id,
             'hypervisor_hostname': hypervisor.hypervisor_hostname,
@@ -46,7 +46,8 @@ class HypervisorsController(object):
 
         ext_status_loaded = self.ext_mgr.is_loaded('os-hypervisor-status')
         if ext_status_loaded:
-            alive = self.servicegroup_api.service_is_up(service)
+            if alive is None:
+                alive = self.servicegroup_api.service_is_up(service)
             hyp_dict['state'] = 'up' if alive else "down"
             hyp_dict['status'] = (
                 'disabled' if service.disabled else 'enabled')
@@ -81,6 +82,26 @@ class HypervisorsController(object):
 
         return hyp_dict
 
+    def _view_hypervisors(self, context, compute_nodes, detail,
+                          servers=None):
+        """Return the views of the hypervisors, checking at once whether
+        their services are up.
+
+        :param servers: list of the servers of each hypervisor, if any
+        """
+        services = [self.host_api.service_get_by_compute_host(context,
+                                                              hyp.host)
+                    for hyp in compute_nodes]
+        if self.ext_mgr.is_loaded('os-hypervisor-status'):
+            alive = self.servicegroup_api.is_up_many(services)
+        else:
+            alive = [None] * len(services)
+        servers = servers or [None] * len(services)
+        return [self._view_hypervisor(hyp, service, detail, hyp_servers,
+                                      alive=is_up)
+                for hyp, service, hyp_servers, is_up
+                in zip(compute_nodes, services, servers, alive)]
+
     def index(self, req):
         context = req.environ['nova.context']
         authorize(context)
@@ -93,12 +114,8 @@ class HypervisorsController(object):
 
         compute_nodes = self.host_api.compute_node_get_all(context)
         req.cache_db_compute_nodes(compute_nodes)
-        return dict(hypervisors=[self._view_hypervisor(
-                                 hyp,
-                                 self.host_api.service_get_by_compute_host(
-                                     context, hyp.host),
-                                 False)
-                                 for hyp in compute_nodes])
+        return dict(hypervisors=self._view_hypervisors(
+            context, compute_nodes, False))
 
     def detail(self, req):
         context = req.environ['nova.context']
@@ -112,12 +129,8 @@ class HypervisorsController(object):
 
         compute_nodes = self.host_api.compute_node_get_all(context)
         req.cache_db_compute_nodes(compute_nodes)
-        return dict(hypervisors=[self._view_hypervisor(
-                                 hyp,
-                                 self.host_api.service_get_by_compute_host(
-                                     context, hyp.host),
-                                 True)
-                                 for hyp in compute_nodes])
+        return dict(hypervisors=self._view_hypervisors(
+            context, compute_nodes, True))
 
     def show(self, req, id):
         context = req.environ['nova.context']
@@ -167,12 +180,8 @@ class HypervisorsController(object):
         hypervisors = self.host_api.compute_node_search_by_hypervisor(
                 context, id)
         if hypervisors:
-            return dict(hypervisors=[self._view_hypervisor(
-                                     hyp,
-                                     self.host_api.service_get_by_compute_host(
-                                         context, hyp.host),
-                                     False)
-                                     for hyp in hypervisors])
+            return dict(hypervisors=self._view_hypervisors(
+                context, hypervisors, False))
         else:
             msg = _("No hypervisor matching '%s' could be found.") % id
             raise webob.exc.HTTPNotFound(explanation=msg)
@@ -192,16 +201,11 @@ class HypervisorsController(object):
         if not compute_nodes:
             msg = _("No hypervisor matching '%s' could be found.") % id
             raise webob.exc.HTTPNotFound(explanation=msg)
-        hypervisors = []
-        for compute_node in compute_nodes:
-            instances = self.host_api.instance_get_all_by_host(context,
-                    compute_node.host)
-            service = self.host_api.service_get_by_compute_host(
-                context, compute_node.host)
-            hyp = self._view_hypervisor(compute_node, service, False,
-                                        instances)
-            hypervisors.append(hyp)
-        return dict(hypervisors=hypervisors)
+        servers = [self.host_api.instance_get_all_by_host(context,
+                                                          compute_node.host)
+                   for compute_node in compute_nodes]
+        return dict(hypervisors=self._view_hypervisors(
+            context, compute_nodes, False, servers))
 
     def statistics(self, req):
         context = req.environ['nova.context']
@@ -108,6 +108,7 @@ class QuotaClassSetsController(wsgi.Controller):
                 db.quota_class_update(context, quota_class, key, value)
             except exception.QuotaClassNotFound:
                 db.quota_class_create(context, quota_class, key, value)
+        QUOTAS.flush_limits(quota_class=quota_class)
 
         values = QUOTAS.get_class_quotas(context, quota_class)
         return self._format_quota_set(None, values)
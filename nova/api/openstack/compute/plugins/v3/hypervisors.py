@@ -39,8 +39,9 @@ class HypervisorsController(wsgi.Controller):
         super(HypervisorsController, self).__init__()
 
     def _view_hypervisor(self, hypervisor, service, detail, servers=None,
-                         **kwargs):
-        alive = self.servicegroup_api.service_is_up(service)
+                         alive=None, **kwargs):
+        if alive is None:
+            alive = self.servicegroup_api.service_is_up(service)
         hyp_dict = {
             'id': hypervisor.id,
             'hypervisor_hostname': hypervisor.hypervisor_hostname,
@@ -74,18 +75,31 @@ class HypervisorsController(wsgi.Controller):
 
         return hyp_dict
 
+    def _view_hypervisors(self, context, compute_nodes, detail,
+                          servers=None):
+        """Return the views of the hypervisors, checking at once whether
+        their services are up.
+
+        :param servers: list of the servers of each hypervisor, if any
+        """
+        services = [self.host_api.service_get_by_compute_host(context,
+                                                              hyp.host)
+                    for hyp in compute_nodes]
+        alive = self.servicegroup_api.is_up_many(services)
+        servers = servers or [None] * len(services)
+        return [self._view_hypervisor(hyp, service, detail, hyp_servers,
+                                      alive=is_up)
+                for hyp, service, hyp_servers, is_up
+                in zip(compute_nodes, services, servers, alive)]
+
     @extensions.expected_errors(())
     def index(self, req):
         context = req.environ['nova.context']
         authorize(context)
         compute_nodes = self.host_api.compute_node_get_all(context)
         req.cache_db_compute_nodes(compute_nodes)
-        return dict(hypervisors=[self._view_hypervisor(
-                                 hyp,
-                                 self.host_api.service_get_by_compute_host(
-                                     context, hyp.host),
-                                 False)
-                                 for hyp in compute_nodes])
+        return dict(hypervisors=self._view_hypervisors(
+            context, compute_nodes, False))
 
     @extensions.expected_errors(())
     def detail(self, req):
@@ -93,12 +107,8 @@ class HypervisorsController(wsgi.Controller):
         authorize(context)
         compute_nodes = self.host_api.compute_node_get_all(context)
         req.cache_db_compute_nodes(compute_nodes)
-        return dict(hypervisors=[self._view_hypervisor(
-                                 hyp,
-                                 self.host_api.service_get_by_compute_host(
-                                     context, hyp.host),
-                                 True)
-                                 for hyp in compute_nodes])
+        return dict(hypervisors=self._view_hypervisors(
+            context, compute_nodes, True))
 
     @extensions.expected_errors(404)
     def show(self, req, id):
@@ -143,12 +153,8 @@ class HypervisorsController(wsgi.Controller):
         hypervisors = self.host_api.compute_node_search_by_hypervisor(
                 context, id)
         if hypervisors:
-            return dict(hypervisors=[self._view_hypervisor(
-                                     hyp,
-                                     self.host_api.service_get_by_compute_host(
-                                         context, hyp.host),
-                                     False)
-                                     for hyp in hypervisors])
+            return dict(hypervisors=self._view_hypervisors(
+                context, hypervisors, False))
         else:
             msg = _("No hypervisor matching '%s' could be found.") % id
             raise webob.exc.HTTPNotFound(explanation=msg)
@@ -162,16 +168,11 @@ class HypervisorsController(wsgi.Controller):
         if not compute_nodes:
             msg = _("No hypervisor matching '%s' could be found.") % id
             raise webob.exc.HTTPNotFound(explanation=msg)
-        hypervisors = []
-        for compute_node in compute_nodes:
-            instances = self.host_api.instance_get_all_by_host(context,
-                    compute_node.host)
-            service = self.host_api.service_get_by_compute_host(
-                context, compute_node.host)
-            hyp = self._view_hypervisor(compute_node, service, False,
-                                        instances)
-            hypervisors.append(hyp)
-        return dict(hypervisors=hypervisors)
+        servers = [self.host_api.instance_get_all_by_host(context,
+                                                          compute_node.host)
+                   for compute_node in compute_nodes]
+        return dict(hypervisors=self._view_hypervisors(
+            context, compute_nodes, False, servers))
 
     @extensions.expected_errors(())
     def statistics(self, req):
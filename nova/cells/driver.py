@@ -39,3 +39,10 @@ class BaseCellsDriver(object):
     def send_message_to_cell(self, cell_state, message):
         """Send a message to a cell."""
         raise NotImplementedError()
+
+    def send_messages_to_cell(self, cell_state, messages):
+        """Send a batch of messages to a cell.  Drivers which can't send
+        them at once send them one by one.
+        """
+        for message in messages:
+            self.send_message_to_cell(cell_state, message)
@@ -30,6 +30,7 @@ The interface into this module is the MessageRunner class.
 import sys
 import traceback
 
+from eventlet import greenthread
 from eventlet import queue
 from oslo_config import cfg
 from oslo_log import log as logging
@@ -65,7 +66,14 @@ cell_messaging_opts = [
             help='Maximum number of hops for cells routing.'),
     cfg.StrOpt('scheduler',
             default='nova.cells.scheduler.CellsScheduler',
-            help='Cells scheduler to use')]
+            help='Cells scheduler to use'),
+    cfg.FloatOpt('message_batch_window',
+            default=0,
+            help='Number of seconds during which the instance, bandwidth '
+                 'usage, capability and capacity updates sent to a '
+                 'neighbor cell are held and sent together.  Repeated '
+                 'updates of the same instance or cell within the window '
+                 'are only sent once.  0 disables the batching')]
 
 CONF = cfg.CONF
 CONF.import_opt('name', 'nova.cells.opts', group='cells')
@@ -74,6 +82,12 @@ CONF.register_opts(cell_messaging_opts, group='cells')
 
 LOG = logging.getLogger(__name__)
 
+# Methods of the messages not needing a response which may be batched
+# when message_batch_window is set.
+_BATCHED_METHODS = ('instance_update_at_top', 'instance_destroy_at_top',
+                    'instance_fault_create_at_top', 'bw_usage_update_at_top',
+                    'update_capabilities', 'update_capacities')
+
 # Separator used between cell names for the 'full cell name' and routing
 # path.
 _PATH_CELL_SEP = cells_utils.PATH_CELL_SEP
@@ -96,6 +110,37 @@ def _response_cell_name_from_path(routing_path, neighbor_only=False):
     return _PATH_CELL_SEP.join(path.split(_PATH_CELL_SEP)[:2])
 
 
+def _batch_key(message):
+    """Return the key of a batched message.  A message replaces the
+    message with the same key already waiting in a batch, or None if it
+    can't replace any message.
+    """
+    method_kwargs = message.method_kwargs
+    if message.method_name == 'instance_update_at_top':
+        return (message.method_name, message.direction,
+                method_kwargs['instance']['uuid'])
+    if message.method_name in ('update_capabilities', 'update_capacities'):
+        return (message.method_name, message.direction,
+                method_kwargs['cell_name'])
+    return None
+
+
+def _instance_updated_at(message):
+    """Return the updated_at of the instance of an instance_update_at_top
+    message as a naive UTC datetime, or None if it isn't known.
+    """
+    instance = message.method_kwargs['instance']
+    if isinstance(instance, objects_base.NovaObject):
+        if not instance.obj_attr_is_set('updated_at'):
+            return None
+        updated_at = instance.updated_at
+    else:
+        updated_at = instance.get('updated_at')
+    if isinstance(updated_at, six.string_types):
+        updated_at = timeutils.parse_isotime(updated_at)
+    return updated_at and timeutils.normalize_time(updated_at)
+
+
 #
 # Message classes.
 #
@@ -434,7 +479,7 @@ class _TargetedMessage(_BaseMessage):
             if self.hop_count >= self.max_hop_count:
                 raise exception.CellMaxHopCountReached(
                         hop_count=self.hop_count)
-            next_hop.send_message(self)
+            self.msg_runner._send_message(next_hop, self)
         except Exception:
             exc_info = sys.exc_info()
             err_str = _LE("Failed to send message to cell: %(next_hop)s")
@@ -477,7 +522,7 @@ class _BroadcastMessage(_BaseMessage):
     def _send_to_cells(self, target_cells):
         """Send a message to multiple cells."""
         for cell in target_cells:
-            cell.send_message(self)
+            self.msg_runner._send_message(cell, self)
 
     def _send_json_responses(self, json_responses):
         """Responses to broadcast messages always need to go to the
@@ -597,7 +642,7 @@ class _ResponseMessage(_TargetedMessage):
                 # Next hop is the target.. so we must fanout.  See
                 # DocString above.
                 self.fanout = True
-        next_hop.send_message(self)
+        self.msg_runner._send_message(next_hop, self)
 
 
 #
@@ -1243,6 +1288,76 @@ class MessageRunner(object):
         for msg_type, cls in six.iteritems(_CELL_MESSAGE_TYPE_TO_METHODS_CLS):
             self.methods_by_type[msg_type] = cls(self)
         self.serializer = objects_base.NovaObjectSerializer()
+        # Messages waiting to be sent to each neighbor cell, as lists
+        # of (key, message) keyed by cell name.
+        self._batches = {}
+
+    def _send_message(self, cell_state, message):
+        """Send a message to a neighbor cell.  Updates not needing a
+        response are added to the batch of messages sent to the cell at
+        the end of the batching window instead.
+        """
+        window = CONF.cells.message_batch_window
+        batch = self._batches.get(cell_state.name)
+        if (window <= 0 or message.need_response or
+                message.method_name not in _BATCHED_METHODS):
+            if batch:
+                # Keep the order of the messages sent to the cell.
+                self._flush_batch(cell_state)
+            cell_state.send_message(message)
+            return
+        if batch is None:
+            batch = self._batches[cell_state.name] = []
+            greenthread.spawn_after(window, self._flush_batch, cell_state)
+        self._add_to_batch(batch, message)
+
+    @staticmethod
+    def _add_to_batch(batch, message):
+        """Add a message to a batch, replacing the older message with the
+        same key.  The last update of an instance wins according to the
+        updated_at of the instance.
+        """
+        key = _batch_key(message)
+        if key is not None:
+            for i, (batched_key, batched) in enumerate(batch):
+                if batched_key != key:
+                    continue
+                if message.method_name == 'instance_update_at_top':
+                    updated_at = _instance_updated_at(message)
+                    batched_updated_at = _instance_updated_at(batched)
+                    if (updated_at is not None and
+                            batched_updated_at is not None and
+                            updated_at < batched_updated_at):
+                        return
+                del batch[i]
+                break
+        batch.append((key, message))
+
+    def _flush_batch(self, cell_state):
+        """Send the batch of messages waiting for a neighbor cell."""
+        batch = self._batches.pop(cell_state.name, None)
+        if not batch:
+            return
+        messages = [message for _key, message in batch]
+        try:
+            cell_state.send_messages(messages)
+        except Exception:
+            LOG.exception(_LE("Failed to send %(count)d messages to cell: "
+                              "%(cell)s"),
+                          {'count': len(messages), 'cell': cell_state})
+
+    def process_messages(self, messages):
+        """Process in order a batch of messages received from a neighbor
+        cell.  An error processing a message doesn't prevent processing
+        the following ones.
+        """
+        for message in messages:
+            try:
+                message.process()
+            except Exception:
+                LOG.exception(_LE("Error processing message %(method)s "
+                                  "from cell batch"),
+                              {'method': message.method_name})
 
     def _process_message_locally(self, message):
         """Message processing will call this when its determined that
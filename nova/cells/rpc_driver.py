@@ -17,8 +17,14 @@
 """
 Cells RPC Communication Driver
 """
+import base64
+import itertools
+import zlib
+
 from oslo_config import cfg
 import oslo_messaging as messaging
+from oslo_serialization import jsonutils
+from oslo_utils import encodeutils
 
 from nova.cells import driver
 from nova import rpc
@@ -28,7 +34,12 @@ cell_rpc_driver_opts = [
                    default='cells.intercell',
                    help="Base queue name to use when communicating between "
                         "cells.  Various topics by message type will be "
-                        "appended to this.")]
+                        "appended to this."),
+        cfg.IntOpt('message_compression_threshold',
+                   default=0,
+                   help="Size in bytes from which the batches of messages "
+                        "sent to other cells are compressed with zlib.  0 "
+                        "disables the compression.")]
 
 CONF = cfg.CONF
 CONF.register_opts(cell_rpc_driver_opts, group='cells')
@@ -91,6 +102,12 @@ class CellsRPCDriver(driver.BaseCellsDriver):
         """Use the IntercellRPCAPI to send a message to a cell."""
         self.intercell_rpcapi.send_message_to_cell(cell_state, message)
 
+    def send_messages_to_cell(self, cell_state, messages):
+        """Use the IntercellRPCAPI to send a batch of messages to a
+        cell.
+        """
+        self.intercell_rpcapi.send_messages_to_cell(cell_state, messages)
+
 
 class InterCellRPCAPI(object):
     """Client side of the Cell<->Cell RPC API.
@@ -99,6 +116,7 @@ class InterCellRPCAPI(object):
 
     API version history:
         1.0 - Initial version.
+        1.1 - Added process_messages()
 
         ... Grizzly supports message version 1.0.  So, any changes to existing
         methods in 2.x after that point should be done such that they can
@@ -155,6 +173,36 @@ class InterCellRPCAPI(object):
         return cctxt.cast(message.ctxt, 'process_message',
                           message=message.to_json())
 
+    def send_messages_to_cell(self, cell_state, messages):
+        """Send a batch of messages to another cell.  Consecutive messages
+        of the same type and fanout are JSON-ified together and sent with
+        a single RPC cast to 'process_messages', compressed if they are
+        larger than CONF.cells.message_compression_threshold.  The messages
+        are sent one by one if the other cell doesn't support it.
+        """
+        topic_base = CONF.cells.rpc_driver_queue_base
+        for (message_type, fanout), group in itertools.groupby(
+                messages, lambda message: (message.message_type,
+                                           message.fanout)):
+            group = list(group)
+            topic = '%s.%s' % (topic_base, message_type)
+            cctxt = self._get_client(cell_state, topic)
+            if len(group) == 1 or not cctxt.can_send_version('1.1'):
+                for message in group:
+                    self.send_message_to_cell(cell_state, message)
+                continue
+            cctxt = cctxt.prepare(fanout=fanout, version='1.1')
+            payload = jsonutils.dumps([message.to_json()
+                                       for message in group])
+            threshold = CONF.cells.message_compression_threshold
+            compressed = 0 < threshold <= len(payload)
+            if compressed:
+                payload = base64.b64encode(zlib.compress(
+                    encodeutils.safe_encode(payload)))
+                payload = encodeutils.safe_decode(payload)
+            cctxt.cast(group[0].ctxt, 'process_messages', messages=payload,
+                       compressed=compressed)
+
 
 class InterCellRPCDispatcher(object):
     """RPC Dispatcher to handle messages received from other cells.
@@ -165,7 +213,7 @@ class InterCellRPCDispatcher(object):
     logic is defined by the message class in the nova.cells.messaging module.
     """
 
-    target = messaging.Target(version='1.0')
+    target = messaging.Target(version='1.1')
 
     def __init__(self, msg_runner):
         """Init the Intercell RPC Dispatcher."""
@@ -178,3 +226,14 @@ class InterCellRPCDispatcher(object):
         """
         message = self.msg_runner.message_from_json(message)
         message.process()
+
+    def process_messages(self, _ctxt, messages, compressed=False):
+        """We received a batch of messages from another cell.  Turn each
+        of them from JSON back into a Message and process them in order.
+        """
+        if compressed:
+            messages = encodeutils.safe_decode(
+                zlib.decompress(base64.b64decode(messages)))
+        messages = [self.msg_runner.message_from_json(message)
+                    for message in jsonutils.loads(messages)]
+        self.msg_runner.process_messages(messages)
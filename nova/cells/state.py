@@ -114,6 +114,12 @@ class CellState(object):
         """
         self.driver.send_message_to_cell(self, message)
 
+    def send_messages(self, messages):
+        """Send a batch of messages to a cell.  Just forward this to the
+        driver, passing ourselves and the messages as arguments.
+        """
+        self.driver.send_messages_to_cell(self, messages)
+
     def __repr__(self):
         me = "me" if self.is_me else "not_me"
         return "Cell '%s' (%s)" % (self.name, me)
@@ -145,6 +151,18 @@ def sync_after(f):
 _unset = object()
 
 
+def _free_units(total, free, per_inst, reserve_level):
+    """Return the number of instances needing per_inst MB which fit in the
+    free MB of a host, keeping reserve_level of its total MB free.
+    """
+    if per_inst:
+        min_free = total * reserve_level
+        free = max(0, free - min_free)
+        return int(free / per_inst)
+    else:
+        return 0
+
+
 class CellStateManager(base.Base):
     def __new__(cls, cell_state_cls=None, cells_config=_unset):
         if cls is not CellStateManager:
@@ -167,6 +185,7 @@ class CellStateManager(base.Base):
         self.parent_cells = {}
         self.child_cells = {}
         self.last_cell_db_check = datetime.datetime.min
+        self._reset_capacity()
 
         attempts = 0
         while True:
@@ -252,6 +271,10 @@ class CellStateManager(base.Base):
 
         Units are in MB, so 122880 = (10 + 100) * 1024.
 
+        The units are maintained incrementally: only the compute nodes
+        whose capacity changed since the last update are counted again,
+        unless the instance types or the reserve percentage changed.
+
         NOTE(comstud): Perhaps we should only report a single number
         available per instance_type.
         """
@@ -259,8 +282,6 @@ class CellStateManager(base.Base):
         if not ctxt:
             ctxt = context.get_admin_context()
 
-        reserve_level = CONF.cells.reserve_percent / 100.0
-
         def _defaultdict_int():
             return collections.defaultdict(int)
         compute_hosts = collections.defaultdict(_defaultdict_int)
@@ -287,49 +308,74 @@ class CellStateManager(base.Base):
 
         _get_compute_hosts()
         if not compute_hosts:
+            self._reset_capacity()
             self.my_cell_state.update_capacities({})
             return
 
-        ram_mb_free_units = {}
-        disk_mb_free_units = {}
-        total_ram_mb_free = 0
-        total_disk_mb_free = 0
-
-        def _free_units(total, free, per_inst):
-            if per_inst:
-                min_free = total * reserve_level
-                free = max(0, free - min_free)
-                return int(free / per_inst)
-            else:
-                return 0
-
         instance_types = self.db.flavor_get_all(ctxt)
         memory_mb_slots = frozenset(
                 [inst_type['memory_mb'] for inst_type in instance_types])
         disk_mb_slots = frozenset(
                 [(inst_type['root_gb'] + inst_type['ephemeral_gb']) * units.Ki
                     for inst_type in instance_types])
-
-        for compute_values in compute_hosts.values():
-            total_ram_mb_free += compute_values['free_ram_mb']
-            total_disk_mb_free += compute_values['free_disk_mb']
-            for memory_mb_slot in memory_mb_slots:
-                ram_mb_free_units.setdefault(str(memory_mb_slot), 0)
-                free_units = _free_units(compute_values['total_ram_mb'],
-                        compute_values['free_ram_mb'], memory_mb_slot)
-                ram_mb_free_units[str(memory_mb_slot)] += free_units
-            for disk_mb_slot in disk_mb_slots:
-                disk_mb_free_units.setdefault(str(disk_mb_slot), 0)
-                free_units = _free_units(compute_values['total_disk_mb'],
-                        compute_values['free_disk_mb'], disk_mb_slot)
-                disk_mb_free_units[str(disk_mb_slot)] += free_units
-
-        capacities = {'ram_free': {'total_mb': total_ram_mb_free,
-                                   'units_by_mb': ram_mb_free_units},
-                      'disk_free': {'total_mb': total_disk_mb_free,
-                                    'units_by_mb': disk_mb_free_units}}
+        slots = (CONF.cells.reserve_percent / 100.0,
+                 memory_mb_slots, disk_mb_slots)
+        if slots != self._capacity_slots:
+            # The units of every host need to be computed again.
+            self._reset_capacity(slots)
+
+        # Only the hosts whose capacity changed since the last update
+        # change the units of the cell.
+        for host in set(self._host_capacities) - set(compute_hosts):
+            self._add_host_capacity(self._host_capacities.pop(host), -1)
+        for host, compute_values in six.iteritems(compute_hosts):
+            old_values = self._host_capacities.get(host)
+            if old_values == compute_values:
+                continue
+            if old_values is not None:
+                self._add_host_capacity(old_values, -1)
+            self._add_host_capacity(compute_values, 1)
+            self._host_capacities[host] = compute_values
+
+        capacities = {'ram_free': {'total_mb': self._free_mb['ram'],
+                                   'units_by_mb': dict(
+                                       self._free_units['ram'])},
+                      'disk_free': {'total_mb': self._free_mb['disk'],
+                                    'units_by_mb': dict(
+                                        self._free_units['disk'])}}
         self.my_cell_state.update_capacities(capacities)
 
+    def _reset_capacity(self, slots=None):
+        """Forget the capacity of the hosts of our cell.
+
+        :param slots: tuple of the reserve level and of the memory and disk
+                      requirements, in MB, of the instance types for which
+                      the units are counted
+        """
+        self._capacity_slots = slots
+        self._host_capacities = {}
+        self._free_mb = {'ram': 0, 'disk': 0}
+        self._free_units = {'ram': {}, 'disk': {}}
+        if slots:
+            for resource, resource_slots in zip(('ram', 'disk'), slots[1:]):
+                self._free_units[resource] = dict.fromkeys(
+                    [str(slot) for slot in resource_slots], 0)
+
+    def _add_host_capacity(self, compute_values, sign):
+        """Add (sign=1) or remove (sign=-1) the capacity of a host to or
+        from the capacity of our cell.
+        """
+        reserve_level = self._capacity_slots[0]
+        for resource, resource_slots in zip(('ram', 'disk'),
+                                            self._capacity_slots[1:]):
+            total = compute_values['total_%s_mb' % resource]
+            free = compute_values['free_%s_mb' % resource]
+            self._free_mb[resource] += sign * free
+            free_units = self._free_units[resource]
+            for slot in resource_slots:
+                free_units[str(slot)] += sign * _free_units(
+                    total, free, slot, reserve_level)
+
     @sync_before
     def get_cell_info_for_neighbors(self):
         """Return cell information for all neighbor cells."""
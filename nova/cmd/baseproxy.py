@@ -20,10 +20,13 @@ for Openstack Nova."""
 import os
 import sys
 
+from oslo_concurrency import processutils
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_reports import guru_meditation_report as gmr
+from oslo_service import service
 
+from nova.console import eventletproxy
 from nova.console import websocketproxy
 from nova import version
 
@@ -36,6 +39,10 @@ CONF.import_opt('source_is_ipv6', 'nova.cmd.novnc')
 CONF.import_opt('cert', 'nova.cmd.novnc')
 CONF.import_opt('key', 'nova.cmd.novnc')
 CONF.import_opt('web', 'nova.cmd.novnc')
+CONF.import_opt('proxy_mode', 'nova.cmd.novnc')
+CONF.import_opt('proxy_workers', 'nova.cmd.novnc')
+CONF.import_opt('proxy_handshake_timeout', 'nova.cmd.novnc')
+CONF.import_opt('proxy_idle_timeout', 'nova.cmd.novnc')
 
 
 def exit_with_error(msg, errno=-1):
@@ -55,6 +62,20 @@ def proxy(host, port):
 
     gmr.TextGuruMeditation.setup_autorun(version)
 
+    if CONF.proxy_mode == 'eventlet':
+        server = eventletproxy.WebSocketProxyServer(
+            host=host,
+            port=port,
+            web=CONF.web,
+            cert=CONF.cert,
+            key=CONF.key,
+            ssl_only=CONF.ssl_only,
+            handshake_timeout=CONF.proxy_handshake_timeout,
+            idle_timeout=CONF.proxy_idle_timeout)
+        workers = CONF.proxy_workers or processutils.get_worker_count()
+        service.launch(CONF, server, workers=workers).wait()
+        return
+
     # Create and start the NovaWebSockets proxy
     websocketproxy.NovaWebSocketProxy(
         listen_host=host,
@@ -36,6 +36,27 @@ opts = [
     cfg.StrOpt('web',
                default='/usr/share/spice-html5',
                help='Run webserver on same port. Serve files from DIR.'),
+    cfg.StrOpt('proxy_mode',
+               default='websockify',
+               choices=('websockify', 'eventlet'),
+               help='How the proxy serves the console sessions: websockify '
+                    'forks a process for each session, eventlet serves all '
+                    'the sessions of a process from greenthreads, in '
+                    'proxy_workers processes.  The daemon and record '
+                    'options are ignored in the eventlet mode.'),
+    cfg.IntOpt('proxy_workers',
+               help='Number of processes of the proxy in the eventlet '
+                    'mode.  Defaults to the number of CPUs.'),
+    cfg.IntOpt('proxy_handshake_timeout',
+               default=10,
+               help='Number of seconds the proxy waits for the TLS '
+                    'handshake and the request of a client in the eventlet '
+                    'mode.'),
+    cfg.IntOpt('proxy_idle_timeout',
+               default=0,
+               help='Number of seconds after which a console session which '
+                    'received nothing from its client is closed in the '
+                    'eventlet mode.  0 means never.'),
     ]
 
 cfg.CONF.register_cli_opts(opts)
@@ -130,7 +130,16 @@ compute_opts = [
     cfg.IntOpt('block_device_allocate_retries',
                default=60,
                help='Number of times to retry block device'
-                    ' allocation on failures')
+                    ' allocation on failures'),
+    cfg.BoolOpt('heal_instance_info_cache_batch',
+                default=False,
+                help='Whether each pass healing the instance network '
+                     'information caches looks up the ports bound to the '
+                     'host at once, and refreshes the caches of all the '
+                     'instances whose ports differ from them, rather than '
+                     'the cache of one instance. Only supported with '
+                     'neutron, and the changes of floating IPs made outside '
+                     'of nova are not detected')
     ]
 
 interval_opts = [
@@ -5304,11 +5313,24 @@ class ComputeManager(manager.Manager):
         list, pull the DB record, and try the call to the network API.
         If anything errors don't fail, as it's possible the instance
         has been deleted, etc.
+
+        With heal_instance_info_cache_batch, the caches of all the
+        instances whose network resources changed are refreshed instead,
+        when the network API supports it.
         """
         heal_interval = CONF.heal_instance_info_cache_interval
         if not heal_interval:
             return
 
+        if CONF.heal_instance_info_cache_batch:
+            try:
+                self._heal_stale_instance_info_caches(context)
+                return
+            except NotImplementedError:
+                LOG.debug('The network API cannot look up the network '
+                          'resources of all the instances at once, healing '
+                          'the info cache of one instance')
+
         instance_uuids = getattr(self, '_instance_uuids_to_heal', [])
         instance = None
 
@@ -5317,8 +5339,10 @@ class ComputeManager(manager.Manager):
         if not instance_uuids:
             # The list of instances to heal is empty so rebuild it
             LOG.debug('Rebuilding the list of instances to heal')
-            db_instances = objects.InstanceList.get_by_host(
-                context, self.host, expected_attrs=[], use_slave=True)
+            db_instances = objects.InstanceList.iter_by_filters(
+                context, {'host': self.host, 'deleted': False},
+                sort_keys=['id'], sort_dirs=['asc'], expected_attrs=[],
+                use_slave=True)
             for inst in db_instances:
                 # We don't want to refresh the cache for instances
                 # which are building or deleting so don't put them
@@ -5386,6 +5410,46 @@ class ComputeManager(manager.Manager):
             LOG.debug("Didn't find any instances for network info cache "
                       "update.")
 
+    def _heal_stale_instance_info_caches(self, context):
+        """Refresh the network info caches of all the instances on the host
+        which differ from their network resources, looked up at once.
+        """
+        start = time.time()
+        db_instances = objects.InstanceList.get_by_host(
+            context, self.host, expected_attrs=['info_cache'], use_slave=True)
+        # As in _heal_instance_info_cache, the instances which are building
+        # or deleting are skipped.
+        instances = [inst for inst in db_instances
+                     if inst.vm_state != vm_states.BUILDING and
+                     inst.task_state != task_states.DELETING]
+        stale_instances = self.network_api.get_instances_with_stale_nw_info(
+            context, instances, self.host)
+
+        healed = 0
+        with self.network_api.shared_lookups(context):
+            for instance in stale_instances:
+                try:
+                    self.network_api.get_instance_nw_info(context, instance)
+                    healed += 1
+                except exception.InstanceNotFound:
+                    LOG.debug('Instance no longer exists. Unable to refresh',
+                              instance=instance)
+                except Exception:
+                    LOG.error(_LE('An error occurred while refreshing the '
+                                  'network cache.'), instance=instance,
+                              exc_info=True)
+
+        msg_args = {'healed': healed, 'instances': len(instances),
+                    'elapsed': time.time() - start}
+        if healed:
+            LOG.info(_LI('Healed the network info cache of %(healed)d of '
+                         '%(instances)d instances in %(elapsed).2f seconds'),
+                     msg_args)
+        else:
+            LOG.debug('Healed the network info cache of %(healed)d of '
+                      '%(instances)d instances in %(elapsed).2f seconds',
+                      msg_args)
+
     @periodic_task.periodic_task
     def _poll_rebooting_instances(self, context):
         if CONF.reboot_timeout > 0:
@@ -5736,30 +5800,37 @@ class ComputeManager(manager.Manager):
         virtual machines known by the hypervisor and if the number matches the
         number of virtual machines known by the database, we proceed in a lazy
         loop, one database record at a time, checking if the hypervisor has the
-        same power state as is in the database.
+        same power state as is in the database. Drivers able to list the power
+        states of all their instances at once are only queried again for the
+        instances whose power state differs from the database. The database
+        records are read page by page.
         """
-        db_instances = objects.InstanceList.get_by_host(context, self.host,
-                                                        expected_attrs=[],
-                                                        use_slave=True)
-
-        num_vm_instances = self.driver.get_num_instances()
-        num_db_instances = len(db_instances)
+        db_instances = objects.InstanceList.iter_by_filters(
+            context, {'host': self.host, 'deleted': False},
+            sort_keys=['id'], sort_dirs=['asc'], expected_attrs=[],
+            use_slave=True)
 
-        if num_vm_instances != num_db_instances:
-            LOG.warning(_LW("While synchronizing instance power states, found "
-                            "%(num_db_instances)s instances in the database "
-                            "and %(num_vm_instances)s instances on the "
-                            "hypervisor."),
-                        {'num_db_instances': num_db_instances,
-                         'num_vm_instances': num_vm_instances})
+        try:
+            vm_power_states = self.driver.get_power_states()
+            num_vm_instances = len(vm_power_states)
+        except NotImplementedError:
+            vm_power_states = {}
+            num_vm_instances = self.driver.get_num_instances()
 
         def _sync(db_instance):
+            # The power state listed by the driver is only used if the
+            # database agreed with it, which is checked again under the lock.
+            vm_power_state = vm_power_states.get(db_instance.uuid)
+            if vm_power_state != db_instance.power_state:
+                vm_power_state = None
+
             # NOTE(melwitt): This must be synchronized as we query state from
             #                two separate sources, the driver and the database.
             #                They are set (in stop_instance) and read, in sync.
             @utils.synchronized(db_instance.uuid)
             def query_driver_power_state_and_sync():
-                self._query_driver_power_state_and_sync(context, db_instance)
+                self._query_driver_power_state_and_sync(
+                    context, db_instance, vm_power_state=vm_power_state)
 
             try:
                 query_driver_power_state_and_sync()
@@ -5770,7 +5841,9 @@ class ComputeManager(manager.Manager):
 
             self._syncs_in_progress.pop(db_instance.uuid)
 
+        num_db_instances = 0
         for db_instance in db_instances:
+            num_db_instances += 1
             # process syncs asynchronously - don't want instance locking to
             # block entire periodic task thread
             uuid = db_instance.uuid
@@ -5781,36 +5854,60 @@ class ComputeManager(manager.Manager):
                 self._syncs_in_progress[uuid] = True
                 self._sync_power_pool.spawn_n(_sync, db_instance)
 
-    def _query_driver_power_state_and_sync(self, context, db_instance):
+        if num_vm_instances != num_db_instances:
+            LOG.warning(_LW("While synchronizing instance power states, found "
+                            "%(num_db_instances)s instances in the database "
+                            "and %(num_vm_instances)s instances on the "
+                            "hypervisor."),
+                        {'num_db_instances': num_db_instances,
+                         'num_vm_instances': num_vm_instances})
+
+    def _query_driver_power_state_and_sync(self, context, db_instance,
+                                           vm_power_state=None):
+        """Sync the power state of an instance with the hypervisor.
+
+        :param vm_power_state: the power state of the instance listed by
+                               the driver with the others, used instead of
+                               querying the driver if the database still
+                               agrees with it
+        """
         if db_instance.task_state is not None:
             LOG.info(_LI("During sync_power_state the instance has a "
                          "pending task (%(task)s). Skip."),
                      {'task': db_instance.task_state}, instance=db_instance)
             return
+        listed = vm_power_state is not None
         # No pending tasks. Now try to figure out the real vm_power_state.
-        try:
-            vm_instance = self.driver.get_info(db_instance)
-            vm_power_state = vm_instance.state
-        except exception.InstanceNotFound:
-            vm_power_state = power_state.NOSTATE
+        if not listed:
+            try:
+                vm_instance = self.driver.get_info(db_instance)
+                vm_power_state = vm_instance.state
+            except exception.InstanceNotFound:
+                vm_power_state = power_state.NOSTATE
         # Note(maoy): the above get_info call might take a long time,
         # for example, because of a broken libvirt driver.
         try:
             self._sync_instance_power_state(context,
                                             db_instance,
                                             vm_power_state,
-                                            use_slave=True)
+                                            use_slave=True,
+                                            listed=listed)
         except exception.InstanceNotFound:
             # NOTE(hanlind): If the instance gets deleted during sync,
             # silently ignore.
             pass
 
     def _sync_instance_power_state(self, context, db_instance, vm_power_state,
-                                   use_slave=False):
+                                   use_slave=False, listed=False):
         """Align instance power state between the database and hypervisor.
 
         If the instance is not found on the hypervisor, but is in the database,
         then a stop() API will be called on the instance.
+
+        :param listed: whether vm_power_state was listed by the driver with
+                       the power states of the other instances, in which
+                       case the driver is queried again if the database no
+                       longer agrees with it
         """
 
         # We re-query the DB to get the latest instance info to minimize
@@ -5819,6 +5916,11 @@ class ComputeManager(manager.Manager):
         db_power_state = db_instance.power_state
         vm_state = db_instance.vm_state
 
+        if listed and vm_power_state != db_power_state:
+            # The instance changed since the power states were listed,
+            # e.g. it was stopped while waiting for the lock.
+            vm_power_state = self._get_power_state(context, db_instance)
+
         if self.host != db_instance.host:
             # on the sending end of nova-compute _sync_power_state
             # may have yielded to the greenthread performing a live
@@ -19,6 +19,7 @@ scheduler with useful information about availability through the ComputeNode
 model.
 """
 import copy
+import time
 
 from oslo_config import cfg
 from oslo_log import log as logging
@@ -52,6 +53,13 @@ resource_tracker_opts = [
     cfg.ListOpt('compute_resources',
                 default=['vcpu'],
                 help='The names of the extra resources to track.'),
+    cfg.IntOpt('resource_audit_interval',
+               default=0,
+               help='Interval in seconds between two audits of the usage of '
+                    'a compute node against its instances, migrations and '
+                    'hypervisor. In between, the usage kept up to date by '
+                    'resource claims is reported as is. 0 means to audit '
+                    'every time compute resources are updated.'),
 ]
 
 CONF = cfg.CONF
@@ -83,6 +91,7 @@ class ResourceTracker(object):
         self.ext_resources_handler = \
             ext_resources.ResourceHandler(CONF.compute_resources)
         self.old_resources = objects.ComputeNode()
+        self._last_audit = 0
         self.scheduler_client = scheduler_client.SchedulerClient()
 
     @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE)
@@ -376,6 +385,15 @@ class ResourceTracker(object):
         declared a need for resources, but not necessarily retrieved them from
         the hypervisor layer yet.
         """
+        curr_time = time.time()
+        if (not self.disabled and
+                curr_time - self._last_audit < CONF.resource_audit_interval):
+            # Claims keep the usage up to date and report it as it changes,
+            # so there is nothing to do until the next audit.
+            LOG.debug("Skipping the audit of compute resources for node "
+                      "%(node)s", {'node': self.nodename})
+            return
+
         LOG.info(_LI("Auditing locally available compute resources for "
                      "node %(node)s"),
                  {'node': self.nodename})
@@ -406,6 +424,7 @@ class ResourceTracker(object):
         self._report_hypervisor_resource_view(resources)
 
         self._update_available_resource(context, resources)
+        self._last_audit = curr_time
 
     @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE)
     def _update_available_resource(self, context, resources):
@@ -582,11 +601,21 @@ class ResourceTracker(object):
                   'pci_stats': pci_stats})
 
     def _resource_change(self):
-        """Check to see if any resources have changed."""
-        if not obj_base.obj_equal_prims(self.compute_node, self.old_resources):
-            self.old_resources = copy.deepcopy(self.compute_node)
-            return True
-        return False
+        """Check to see if any resources have changed.
+
+        Fields set to the same value as the last time resources were
+        reported are not flagged as changed anymore, so that only the
+        fields which actually changed are saved to the compute node record.
+        """
+        new_prims = obj_base.obj_to_primitive(self.compute_node)
+        old_prims = obj_base.obj_to_primitive(self.old_resources)
+        unchanged = set(
+            field for field in self.compute_node.obj_what_changed()
+            if field in old_prims and
+            new_prims.get(field) == old_prims[field])
+        if unchanged:
+            self.compute_node.obj_reset_changes(unchanged, recursive=True)
+        return bool(self.compute_node.obj_what_changed())
 
     def _update(self, context):
         """Update partial stats locally and populate them to Scheduler."""
@@ -595,6 +624,7 @@ class ResourceTracker(object):
             return
         # Persist the stats to the Scheduler
         self.scheduler_client.update_resource_stats(self.compute_node)
+        self.old_resources = copy.deepcopy(self.compute_node)
         if self.pci_tracker:
             self.pci_tracker.save(context)
 
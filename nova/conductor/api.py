@@ -36,7 +36,16 @@ conductor_opts = [
                help='Full class name for the Manager for conductor'),
     cfg.IntOpt('workers',
                help='Number of workers for OpenStack Conductor service. '
-                    'The default will be the number of CPUs available.')
+                    'The default will be the number of CPUs available.'),
+    cfg.IntOpt('heartbeat_flush_interval',
+               default=0,
+               help='Interval in seconds at which the conductor writes the '
+                    'state reports of the services using the db servicegroup '
+                    'driver, all at once. Services send their state reports '
+                    'to the conductor instead of saving them when this is '
+                    'set. Their state can then lag behind by up to this '
+                    'interval, so report_interval plus this interval must '
+                    'stay below service_down_time. 0 disables it.'),
 ]
 conductor_group = cfg.OptGroup(name='conductor',
                                title='Conductor Options')
@@ -85,6 +94,11 @@ class LocalAPI(object):
         return self._manager.security_groups_trigger_members_refresh(context,
                                                                      group_ids)
 
+    def service_heartbeat(self, context, service):
+        """Record a state report of a service."""
+        service.report_count += 1
+        service.save()
+
     def object_backport(self, context, objinst, target_version):
         return self._manager.object_backport(context, objinst, target_version)
 
@@ -202,6 +216,14 @@ class API(LocalAPI):
         return self._manager.instance_update(context, instance_uuid,
                                              updates, 'conductor')
 
+    def service_heartbeat(self, context, service):
+        """Send a state report of a service to the conductor, which writes
+        it along with the reports of the other services.
+        """
+        if not self._manager.can_send_service_heartbeat():
+            return super(API, self).service_heartbeat(context, service)
+        self._manager.service_heartbeat(context, service.id)
+
 
 class ComputeTaskAPI(object):
     """ComputeTask API that queues up compute tasks for nova-conductor."""
@@ -16,10 +16,12 @@
 
 import copy
 import itertools
+import time
 
 from oslo_config import cfg
 from oslo_log import log as logging
 import oslo_messaging as messaging
+from oslo_service import periodic_task
 from oslo_serialization import jsonutils
 from oslo_utils import excutils
 from oslo_utils import timeutils
@@ -83,7 +85,7 @@ class ConductorManager(manager.Manager):
     namespace.  See the ComputeTaskManager class for details.
     """
 
-    target = messaging.Target(version='2.1')
+    target = messaging.Target(version='2.2')
 
     def __init__(self, *args, **kwargs):
         super(ConductorManager, self).__init__(service_name='conductor',
@@ -95,6 +97,10 @@ class ConductorManager(manager.Manager):
         self.compute_task_mgr = ComputeTaskManager()
         self.cells_rpcapi = cells_rpcapi.CellsAPI()
         self.additional_endpoints.append(self.compute_task_mgr)
+        # Dict of (number of reports, time of the last report) keyed by
+        # service ID
+        self._heartbeats = {}
+        self._last_heartbeats_flush = time.time()
 
     @property
     def network_api(self):
@@ -385,6 +391,26 @@ class ConductorManager(manager.Manager):
     def security_groups_trigger_handler(self, context, event, args):
         self.security_group_api.trigger_handler(event, context, *args)
 
+    def service_heartbeat(self, context, service_id):
+        count = self._heartbeats.get(service_id, (0, None))[0]
+        self._heartbeats[service_id] = (count + 1, timeutils.utcnow())
+        if (time.time() - self._last_heartbeats_flush >=
+                CONF.conductor.heartbeat_flush_interval):
+            self._flush_heartbeats(context)
+
+    @periodic_task.periodic_task
+    def _flush_heartbeats(self, context):
+        """Write the buffered state reports of the services at once."""
+        heartbeats, self._heartbeats = self._heartbeats, {}
+        self._last_heartbeats_flush = time.time()
+        if not heartbeats:
+            return
+        try:
+            self.db.service_update_heartbeats(context.elevated(), heartbeats)
+        except Exception:
+            LOG.exception(_LE('Failed to record the state reports of '
+                              '%d services'), len(heartbeats))
+
     def security_groups_trigger_members_refresh(self, context, group_ids):
         self.security_group_api.trigger_members_refresh(context, group_ids)
 
@@ -181,6 +181,8 @@ class ConductorAPI(object):
     * Remove task_log_begin_task()
     * Remove task_log_end_task()
 
+    * 2.2  - Added service_heartbeat()
+
     """
 
     VERSION_ALIASES = {
@@ -235,6 +237,13 @@ class ConductorAPI(object):
         return cctxt.call(context, 'security_groups_trigger_members_refresh',
                           group_ids=group_ids)
 
+    def can_send_service_heartbeat(self):
+        return self.client.can_send_version('2.2')
+
+    def service_heartbeat(self, context, service_id):
+        cctxt = self.client.prepare(version='2.2')
+        cctxt.cast(context, 'service_heartbeat', service_id=service_id)
+
     def object_class_action(self, context, objname, objmethod, objver,
                             args, kwargs):
         cctxt = self.client.prepare()
@@ -0,0 +1,576 @@
+# Copyright (c) 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+'''
+Event loop based websocket proxy that is compatible with OpenStack Nova.
+
+Unlike websockify, which forks a process for every console session, this
+proxy serves all the sessions of a process from greenthreads, so that a
+process per CPU can serve thousands of sessions.
+'''
+
+import base64
+import hashlib
+import mimetypes
+import os
+import posixpath
+import socket
+import struct
+import time
+
+import eventlet
+from eventlet import semaphore
+import greenlet
+from oslo_log import log as logging
+from oslo_service import service
+import six
+import six.moves.urllib.parse as urlparse
+
+from nova.console import websocketproxy
+from nova import exception
+from nova.i18n import _LE, _LI
+
+LOG = logging.getLogger(__name__)
+
+_WEBSOCKET_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+# Frame opcodes
+OPCODE_CONTINUATION = 0x0
+OPCODE_TEXT = 0x1
+OPCODE_BINARY = 0x2
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xa
+
+# Close status codes
+CLOSE_NORMAL = 1000
+CLOSE_PROTOCOL_ERROR = 1002
+CLOSE_POLICY_VIOLATION = 1008
+CLOSE_TOO_BIG = 1009
+CLOSE_INTERNAL_ERROR = 1011
+
+_MAX_REQUEST_SIZE = 65536
+_MAX_FRAME_SIZE = 16 * 1024 * 1024
+_BUFFER_SIZE = 65536
+# Frames whose payload is smaller than this are sent with their header in
+# one send() call, larger payloads aren't copied.
+_COALESCE_SIZE = 4096
+# Tables XORing every byte with each of the 256 values of a mask byte
+_XOR_TABLES = [bytes(bytearray(value ^ key for value in range(256)))
+               for key in range(256)]
+
+
+class WebSocketProtocolError(Exception):
+    def __init__(self, message, code=CLOSE_POLICY_VIOLATION):
+        super(WebSocketProtocolError, self).__init__(message)
+        self.code = code
+
+
+def unmask(data, mask):
+    """XOR the payload of a frame with its 4 bytes mask.
+
+    The payload is copied once into a bytearray, and each of its 4
+    interleaved slices is translated in place with the table of its mask
+    byte, which is done in C instead of byte by byte in Python.
+
+    :param data: payload, as a memoryview of the receive buffer
+    :param mask: 4 bytes mask of the frame
+    :returns: the unmasked payload, as a bytearray
+    """
+    unmasked = bytearray(data)
+    for i, key in enumerate(bytearray(mask)):
+        unmasked[i::4] = unmasked[i::4].translate(_XOR_TABLES[key])
+    return unmasked
+
+
+def encode_frame_header(opcode, length, mask=None):
+    """Return the header of a final frame."""
+    mask_bit = 0x80 if mask else 0
+    if length < 126:
+        header = struct.pack('!BB', 0x80 | opcode, mask_bit | length)
+    elif length < 65536:
+        header = struct.pack('!BBH', 0x80 | opcode, mask_bit | 126, length)
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, mask_bit | 127, length)
+    if mask:
+        header += mask
+    return header
+
+
+class FrameDecoder(object):
+    """Incrementally decodes the frames received on a websocket.
+
+    The received data is appended to a single buffer and the payloads are
+    sliced out of it with a memoryview, so that they are only copied when
+    they are unmasked.  The frames of a fragmented message are reassembled
+    into a single payload, the control frames sent between them are
+    returned as they come.
+
+    The frames sent by a client must be masked, the ones sent by a server
+    must not, so clients decode the frames of the server with require_mask
+    set to False.
+    """
+
+    def __init__(self, data=b'', require_mask=True):
+        self.buf = bytearray(data)
+        self.require_mask = require_mask
+        # Opcode and payload of the fragmented message being received
+        self._message_opcode = None
+        self._message = None
+
+    def feed(self, data):
+        """Add received data and return the list of the (opcode, payload)
+        of the messages and control frames completed.
+        """
+        self.buf += data
+        frames = []
+        offset = 0
+        view = memoryview(self.buf)
+        try:
+            while True:
+                frame = self._decode(view, offset)
+                if frame is None:
+                    break
+                opcode, fin, payload, offset = frame
+                message = self._reassemble(opcode, fin, payload)
+                if message is not None:
+                    frames.append(message)
+        finally:
+            # The buffer can't be resized while a view of it exists.
+            del view
+        del self.buf[:offset]
+        return frames
+
+    def _decode(self, view, offset):
+        buf = self.buf
+        if len(buf) - offset < 2:
+            return None
+        b1, b2 = struct.unpack_from('!BB', buf, offset)
+        fin = bool(b1 & 0x80)
+        opcode = b1 & 0x0f
+        length = b2 & 0x7f
+        pos = offset + 2
+        if length == 126:
+            if len(buf) < pos + 2:
+                return None
+            length, = struct.unpack_from('!H', buf, pos)
+            pos += 2
+        elif length == 127:
+            if len(buf) < pos + 8:
+                return None
+            length, = struct.unpack_from('!Q', buf, pos)
+            pos += 8
+        if length > _MAX_FRAME_SIZE:
+            raise WebSocketProtocolError('Frame too big', CLOSE_TOO_BIG)
+        mask = None
+        if b2 & 0x80:
+            if len(buf) < pos + 4:
+                return None
+            mask = buf[pos:pos + 4]
+            pos += 4
+        elif self.require_mask:
+            raise WebSocketProtocolError('Unmasked client frame',
+                                         CLOSE_PROTOCOL_ERROR)
+        if len(buf) < pos + length:
+            return None
+        payload = view[pos:pos + length]
+        if mask:
+            payload = unmask(payload, mask)
+        else:
+            payload = payload.tobytes()
+        return opcode, fin, payload, pos + length
+
+    def _reassemble(self, opcode, fin, payload):
+        """Return the (opcode, payload) of the message completed by a
+        frame, or None if more fragments are expected.
+        """
+        if opcode >= OPCODE_CLOSE:
+            # Control frames aren't fragmented.
+            return opcode, payload
+        if opcode == OPCODE_CONTINUATION:
+            if self._message_opcode is None:
+                raise WebSocketProtocolError('Unexpected continuation frame')
+            self._message += payload
+            if len(self._message) > _MAX_FRAME_SIZE:
+                raise WebSocketProtocolError('Message too big',
+                                             CLOSE_TOO_BIG)
+        elif self._message_opcode is not None:
+            raise WebSocketProtocolError('Fragmented message not finished')
+        elif fin:
+            return opcode, payload
+        else:
+            self._message_opcode = opcode
+            self._message = bytearray(payload)
+        if not fin:
+            return None
+        message = (self._message_opcode, self._message)
+        self._message_opcode = None
+        self._message = None
+        return message
+
+
+class ProxySession(object):
+    """Counters of a console session."""
+
+    def __init__(self, client_address):
+        self.client_address = client_address
+        self.started_at = time.time()
+        # Bytes and frames received from the client and sent to it
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.frames_in = 0
+        self.frames_out = 0
+        # Time spent forwarding the frames received from the client
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def record_frame_in(self, length, latency):
+        self.bytes_in += length
+        self.frames_in += 1
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+
+    def record_frame_out(self, length):
+        self.bytes_out += length
+        self.frames_out += 1
+
+    def stats(self):
+        return {'client': self.client_address[0],
+                'duration': time.time() - self.started_at,
+                'bytes_in': self.bytes_in,
+                'bytes_out': self.bytes_out,
+                'frames_in': self.frames_in,
+                'frames_out': self.frames_out,
+                'latency_avg': (self.latency_total / self.frames_in
+                                if self.frames_in else 0.0),
+                'latency_max': self.latency_max}
+
+
+class _Headers(dict):
+    """Headers of a request, keyed by lower case name, with the
+    getheader() method used by NovaProxyRequestHandlerBase.
+    """
+
+    def getheader(self, name, default=None):
+        return self.get(name.lower(), default)
+
+
+class EventletProxyRequestHandler(
+        websocketproxy.NovaProxyRequestHandlerBase):
+    """Handles a connection to the proxy in a greenthread: serves a file
+    of the web directory, or upgrades the connection to a websocket and
+    proxies it to the console of the instance.
+    """
+
+    # All the sessions share the eventlet hub of the process.
+    reset_hub = False
+
+    def __init__(self, server, sock, client_address):
+        self.server = server
+        self.request = sock
+        self.client_address = client_address
+        self.path = None
+        self.headers = _Headers()
+        self.base64 = False
+        self.session = ProxySession(client_address)
+        self._decoder = None
+        self._send_lock = semaphore.Semaphore()
+
+    def msg(self, msg, *args):
+        LOG.info(msg, *args)
+
+    def vmsg(self, msg, *args):
+        LOG.debug(msg, *args)
+
+    def socket(self, host, port, connect=False):
+        return eventlet.connect((host, port))
+
+    def handle(self):
+        if not self._read_request():
+            return
+        # The request was read within the handshake timeout, the session may
+        # then wait for the client up to the idle timeout.
+        self.request.settimeout(self.server.idle_timeout or None)
+        if self.headers.getheader('upgrade', '').lower() != 'websocket':
+            self._serve_file()
+            return
+        self._accept_websocket()
+        try:
+            self.new_websocket_client()
+        except WebSocketProtocolError as e:
+            self._send_close(e.code, six.text_type(e))
+        except (exception.InvalidToken, exception.ValidationError) as e:
+            LOG.info(_LI("Console session from %(client)s refused: "
+                         "%(error)s"),
+                     {'client': self.client_address[0], 'error': e})
+            self._send_close(CLOSE_POLICY_VIOLATION, six.text_type(e))
+        except socket.timeout:
+            LOG.info(_LI("Console session from %s timed out"),
+                     self.client_address[0])
+            self._send_close(CLOSE_NORMAL, 'Idle timeout')
+        except socket.error:
+            # The client or the console went away.
+            pass
+        except Exception as e:
+            LOG.exception(_LE("Console session from %s failed"),
+                          self.client_address[0])
+            self._send_close(CLOSE_INTERNAL_ERROR, six.text_type(e))
+        else:
+            self._send_close(CLOSE_NORMAL, '')
+        LOG.info(_LI("Console session from %(client)s closed: "
+                     "%(bytes_in)d bytes in %(frames_in)d frames in, "
+                     "%(bytes_out)d bytes in %(frames_out)d frames out, "
+                     "%(latency_avg).6fs average and %(latency_max).6fs "
+                     "maximum forwarding latency, %(duration).1fs"),
+                 self.session.stats())
+
+    def _read_request(self):
+        data = b''
+        while b'\r\n\r\n' not in data:
+            if len(data) > _MAX_REQUEST_SIZE:
+                self._send_response(431, 'Request Header Fields Too Large')
+                return False
+            chunk = self.request.recv(_BUFFER_SIZE)
+            if not chunk:
+                return False
+            data += chunk
+        head, rest = data.split(b'\r\n\r\n', 1)
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, self.path, _version = lines[0].split(' ', 2)
+        except ValueError:
+            self._send_response(400, 'Bad Request')
+            return False
+        if method != 'GET':
+            self._send_response(405, 'Method Not Allowed')
+            return False
+        for line in lines[1:]:
+            name, _sep, value = line.partition(':')
+            self.headers[name.strip().lower()] = value.strip()
+        # A client may send its first frames along with the handshake.
+        self._decoder = FrameDecoder(rest)
+        return True
+
+    def _send_response(self, status, reason, headers=(), body=b''):
+        response = ['HTTP/1.1 %d %s' % (status, reason)]
+        response.extend('%s: %s' % header for header in headers)
+        if status != 101:
+            response.append('Content-Length: %d' % len(body))
+            response.append('Connection: close')
+        response = ('\r\n'.join(response) + '\r\n\r\n').encode('latin-1')
+        self.request.sendall(response + body)
+
+    def _accept_websocket(self):
+        key = self.headers.getheader('sec-websocket-key', '')
+        accept = base64.b64encode(hashlib.sha1(
+            key.encode('latin-1') + _WEBSOCKET_GUID).digest())
+        headers = [('Upgrade', 'websocket'),
+                   ('Connection', 'Upgrade'),
+                   ('Sec-WebSocket-Accept', accept.decode('ascii'))]
+        protocols = [protocol.strip() for protocol in self.headers.getheader(
+            'sec-websocket-protocol', '').split(',') if protocol.strip()]
+        # Like websockify, prefer binary frames to base64 encoded ones.
+        if 'binary' in protocols:
+            headers.append(('Sec-WebSocket-Protocol', 'binary'))
+        elif 'base64' in protocols:
+            self.base64 = True
+            headers.append(('Sec-WebSocket-Protocol', 'base64'))
+        self._send_response(101, 'Switching Protocols', headers)
+
+    def _serve_file(self):
+        web = self.server.web
+        path = posixpath.normpath(urlparse.unquote(
+            urlparse.urlparse(self.path).path))
+        filename = os.path.realpath(os.path.join(web or '',
+                                                 path.lstrip('/')))
+        if (not web or
+                not filename.startswith(os.path.realpath(web) + os.sep) or
+                not os.path.isfile(filename)):
+            self._send_response(404, 'Not Found')
+            return
+        content_type = mimetypes.guess_type(filename)[0]
+        with open(filename, 'rb') as f:
+            body = f.read()
+        self._send_response(200, 'OK', [('Content-Type', content_type or
+                                         'application/octet-stream')],
+                            body)
+
+    def _send_frame(self, opcode, payload):
+        header = encode_frame_header(opcode, len(payload))
+        with self._send_lock:
+            if len(payload) < _COALESCE_SIZE:
+                self.request.sendall(header + payload)
+            else:
+                self.request.sendall(header)
+                self.request.sendall(payload)
+
+    def _send_close(self, code, reason):
+        payload = struct.pack('!H', code) + reason.encode('utf-8')[:123]
+        try:
+            self._send_frame(OPCODE_CLOSE, payload)
+        except socket.error:
+            pass
+
+    def do_proxy(self, target):
+        """Proxy the websocket to the console until either side closes the
+        connection.
+        """
+        target_reader = eventlet.spawn(self._target_to_client, target)
+        try:
+            self._client_to_target(target)
+        finally:
+            target_reader.kill()
+        target.close()
+
+    def _client_to_target(self, target):
+        frames = self._decoder.feed(b'')
+        while True:
+            started = time.time()
+            for opcode, payload in frames:
+                if opcode == OPCODE_CLOSE:
+                    return
+                elif opcode == OPCODE_PING:
+                    self._send_frame(OPCODE_PONG, payload)
+                elif opcode in (OPCODE_BINARY, OPCODE_TEXT):
+                    # Fragmented messages are reassembled by the decoder,
+                    # so that base64 is decoded over the whole message.
+                    if self.base64:
+                        payload = base64.b64decode(payload)
+                    target.sendall(payload)
+                    self.session.record_frame_in(len(payload),
+                                                 time.time() - started)
+            data = self.request.recv(_BUFFER_SIZE)
+            if not data:
+                return
+            frames = self._decoder.feed(data)
+
+    def _target_to_client(self, target):
+        opcode = OPCODE_TEXT if self.base64 else OPCODE_BINARY
+        try:
+            while True:
+                data = target.recv(_BUFFER_SIZE)
+                if not data:
+                    break
+                if self.base64:
+                    data = base64.b64encode(data)
+                self._send_frame(opcode, data)
+                self.session.record_frame_out(len(data))
+        except socket.error:
+            pass
+        # The console closed the connection, stop reading the client too.
+        try:
+            self.request.shutdown(socket.SHUT_RD)
+        except socket.error:
+            pass
+
+
+class WebSocketProxyServer(service.ServiceBase):
+    """Server accepting the connections to the proxy and handling each of
+    them in a greenthread.  It may be run in several processes sharing the
+    listening socket with an oslo.service launcher.
+    """
+
+    def __init__(self, host='0.0.0.0', port=0, web=None, cert=None,
+                 key=None, ssl_only=False, pool_size=10000, backlog=1024,
+                 handshake_timeout=10, idle_timeout=None,
+                 handler_class=EventletProxyRequestHandler):
+        self.web = web
+        self.cert = cert
+        self.key = key
+        self.ssl_only = ssl_only
+        # Seconds to wait for the TLS handshake and the request of a client,
+        # and for data from the client once its session started.
+        self.handshake_timeout = handshake_timeout
+        self.idle_timeout = idle_timeout
+        self.pool_size = pool_size
+        self.handler_class = handler_class
+        self._pool = eventlet.GreenPool(pool_size)
+        self._server = None
+        self.sessions = set()
+
+        try:
+            info = socket.getaddrinfo(host, port, socket.AF_UNSPEC,
+                                      socket.SOCK_STREAM)[0]
+            family = info[0]
+            bind_addr = info[-1]
+        except Exception:
+            family = socket.AF_INET
+            bind_addr = (host, port)
+        self._socket = eventlet.listen(bind_addr, family, backlog=backlog)
+        (self.host, self.port) = self._socket.getsockname()[0:2]
+        LOG.info(_LI("Websocket proxy listening on %(host)s:%(port)s"),
+                 {'host': self.host, 'port': self.port})
+
+    def start(self):
+        self._server = eventlet.spawn(self._serve)
+
+    def _serve(self):
+        while True:
+            sock, address = self._socket.accept()
+            self._pool.spawn_n(self._handle, sock, address)
+
+    def _wrap_ssl(self, sock):
+        """Return the socket to use for a connection, wrapped in SSL if the
+        client starts a TLS handshake, or None to refuse it.
+        """
+        if self.cert and os.path.exists(self.cert):
+            first = sock.recv(1, socket.MSG_PEEK)
+            if first in (b'\x16', b'\x80'):
+                return eventlet.wrap_ssl(sock, certfile=self.cert,
+                                         keyfile=self.key, server_side=True)
+        if self.ssl_only:
+            return None
+        return sock
+
+    def _handle(self, sock, address):
+        handler = None
+        try:
+            # A client connecting without sending its request must not hold
+            # a greenthread of the pool.
+            sock.settimeout(self.handshake_timeout)
+            client = self._wrap_ssl(sock)
+            if client is None:
+                return
+            handler = self.handler_class(self, client, address)
+            self.sessions.add(handler.session)
+            handler.handle()
+        except Exception:
+            LOG.debug("Error handling console proxy connection from %s",
+                      address[0], exc_info=True)
+        finally:
+            if handler is not None:
+                self.sessions.discard(handler.session)
+            sock.close()
+
+    def stats(self):
+        """Return the counters of the active sessions."""
+        return [session.stats() for session in self.sessions]
+
+    def reset(self):
+        self._pool.resize(self.pool_size)
+
+    def stop(self):
+        LOG.info(_LI("Stopping websocket proxy."))
+        if self._server is not None:
+            self._pool.resize(0)
+            self._server.kill()
+
+    def wait(self):
+        try:
+            if self._server is not None:
+                self._pool.waitall()
+                self._server.wait()
+        except greenlet.GreenletExit:
+            LOG.info(_LI("Websocket proxy has stopped."))
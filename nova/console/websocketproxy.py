@@ -35,6 +35,10 @@ LOG = logging.getLogger(__name__)
 
 
 class NovaProxyRequestHandlerBase(object):
+    # Whether the eventlet hub must be reopened for each session, which
+    # runs in its own process with websockify.
+    reset_hub = True
+
     def address_string(self):
         # NOTE(rpodolyaka): override the superclass implementation here and
         # explicitly disable the reverse DNS lookup, which might fail on some
@@ -62,8 +66,9 @@ class NovaProxyRequestHandlerBase(object):
         """Called after a new WebSocket connection has been established."""
         # Reopen the eventlet hub to make sure we don't share an epoll
         # fd with parent and/or siblings, which would be bad
-        from eventlet import hubs
-        hubs.use_hub()
+        if self.reset_hub:
+            from eventlet import hubs
+            hubs.use_hub()
 
         # The nova expected behavior is to have token
         # passed to the method GET of the request
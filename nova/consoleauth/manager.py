@@ -21,14 +21,15 @@ import time
 from oslo_config import cfg
 from oslo_log import log as logging
 import oslo_messaging as messaging
-from oslo_serialization import jsonutils
+from oslo_service import periodic_task
+from oslo_utils import importutils
+import six
 
 from nova.cells import rpcapi as cells_rpcapi
 from nova.compute import rpcapi as compute_rpcapi
-from nova.i18n import _LI, _LW
+from nova.i18n import _LI
 from nova import manager
 from nova import objects
-from nova.openstack.common import memorycache
 
 
 LOG = logging.getLogger(__name__)
@@ -36,7 +37,22 @@ LOG = logging.getLogger(__name__)
 consoleauth_opts = [
     cfg.IntOpt('console_token_ttl',
                default=600,
-               help='How many seconds before deleting tokens')
+               help='How many seconds before deleting tokens'),
+    cfg.StrOpt('console_token_store',
+               default='nova.consoleauth.token_store.MemcacheTokenStore',
+               help='Class of the store of the console tokens.  '
+                    'nova.consoleauth.token_store.SQLiteTokenStore keeps '
+                    'them in a local SQLite database, across restarts'),
+    cfg.IntOpt('console_token_sweep_interval',
+               default=60,
+               help='Interval in seconds between two deletions of the '
+                    'expired tokens from the store of the console tokens'),
+    cfg.IntOpt('console_token_validation_cache_time',
+               default=0,
+               help='Number of seconds during which a console token whose '
+                    'port was validated by the compute service is accepted '
+                    'again without validating it, as long as it is in the '
+                    'store.  0 validates the port of every checked token'),
     ]
 
 CONF = cfg.CONF
@@ -52,17 +68,13 @@ class ConsoleAuthManager(manager.Manager):
     def __init__(self, scheduler_driver=None, *args, **kwargs):
         super(ConsoleAuthManager, self).__init__(service_name='consoleauth',
                                                  *args, **kwargs)
-        self.mc = memorycache.get_client()
+        self.token_store = importutils.import_object(
+            CONF.console_token_store)
         self.compute_rpcapi = compute_rpcapi.ComputeAPI()
         self.cells_rpcapi = cells_rpcapi.CellsAPI()
-
-    def _get_tokens_for_instance(self, instance_uuid):
-        tokens_str = self.mc.get(instance_uuid.encode('UTF-8'))
-        if not tokens_str:
-            tokens = []
-        else:
-            tokens = jsonutils.loads(tokens_str)
-        return tokens
+        # Times at which the port of the tokens was last validated, and
+        # instances of the tokens, keyed by token.
+        self._validated_tokens = {}
 
     def authorize_console(self, context, token, console_type, host, port,
                           internal_access_path, instance_uuid,
@@ -76,26 +88,7 @@ class ConsoleAuthManager(manager.Manager):
                       'internal_access_path': internal_access_path,
                       'access_url': access_url,
                       'last_activity_at': time.time()}
-        data = jsonutils.dumps(token_dict)
-
-        # We need to log the warning message if the token is not cached
-        # successfully, because the failure will cause the console for
-        # instance to not be usable.
-        if not self.mc.set(token.encode('UTF-8'),
-                           data, CONF.console_token_ttl):
-            LOG.warning(_LW("Token: %(token)s failed to save into memcached."),
-                        {'token': token})
-        tokens = self._get_tokens_for_instance(instance_uuid)
-
-        # Remove the expired tokens from cache.
-        tokens = [tok for tok in tokens if self.mc.get(tok.encode('UTF-8'))]
-        tokens.append(token)
-
-        if not self.mc.set(instance_uuid.encode('UTF-8'),
-                           jsonutils.dumps(tokens)):
-            LOG.warning(_LW("Instance: %(instance_uuid)s failed to save "
-                            "into memcached"),
-                        {'instance_uuid': instance_uuid})
+        self.token_store.add(token, token_dict, CONF.console_token_ttl)
 
         LOG.info(_LI("Received Token: %(token)s, %(token_dict)s"),
                   {'token': token, 'token_dict': token_dict})
@@ -119,18 +112,44 @@ class ConsoleAuthManager(manager.Manager):
                                             token['port'],
                                             token['console_type'])
 
+    def _recently_validated(self, token):
+        validated = self._validated_tokens.get(token['token'])
+        return (validated is not None and
+                time.time() - validated[0] <
+                CONF.console_token_validation_cache_time)
+
     def check_token(self, context, token):
-        token_str = self.mc.get(token.encode('UTF-8'))
-        token_valid = (token_str is not None)
+        token_dict = self.token_store.get(token)
+        token_valid = (token_dict is not None)
         LOG.info(_LI("Checking Token: %(token)s, %(token_valid)s"),
                   {'token': token, 'token_valid': token_valid})
         if token_valid:
-            token = jsonutils.loads(token_str)
-            if self._validate_token(context, token):
-                return token
+            # NOTE: the token is looked up in the store first, so that the
+            # tokens revoked by another consoleauth service sharing the
+            # store aren't accepted.
+            if self._recently_validated(token_dict):
+                return token_dict
+            if self._validate_token(context, token_dict):
+                if CONF.console_token_validation_cache_time > 0:
+                    self._validated_tokens[token] = (
+                        time.time(), token_dict['instance_uuid'])
+                return token_dict
 
     def delete_tokens_for_instance(self, context, instance_uuid):
-        tokens = self._get_tokens_for_instance(instance_uuid)
-        for token in tokens:
-            self.mc.delete(token.encode('UTF-8'))
-        self.mc.delete(instance_uuid.encode('UTF-8'))
+        self.token_store.delete_tokens_for_instance(instance_uuid)
+        self._validated_tokens = {
+            token: validated
+            for token, validated in six.iteritems(self._validated_tokens)
+            if validated[1] != instance_uuid}
+
+    @periodic_task.periodic_task(spacing=CONF.console_token_sweep_interval)
+    def _sweep_expired_tokens(self, context):
+        """Delete the expired tokens from the store."""
+        deleted = self.token_store.sweep()
+        if deleted:
+            LOG.debug("Deleted %d expired console tokens", deleted)
+        now = time.time()
+        self._validated_tokens = {
+            token: validated
+            for token, validated in six.iteritems(self._validated_tokens)
+            if now - validated[0] < CONF.console_token_validation_cache_time}
@@ -0,0 +1,239 @@
+# Copyright (c) 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+"""Stores of the console authentication tokens."""
+
+import os
+import sqlite3
+
+import eventlet.semaphore
+from eventlet import tpool
+from oslo_config import cfg
+from oslo_log import log as logging
+from oslo_serialization import jsonutils
+from oslo_utils import timeutils
+
+from nova.i18n import _LW
+from nova.openstack.common import memorycache
+
+
+LOG = logging.getLogger(__name__)
+
+token_store_opts = [
+    cfg.StrOpt('console_token_store_path',
+               default='$state_path/console_tokens.sqlite',
+               help='Path of the SQLite database in which the '
+                    'SQLiteTokenStore keeps the console tokens.  The '
+                    'consoleauth services using the same file share their '
+                    'tokens.'),
+    cfg.IntOpt('console_token_store_timeout',
+               default=10,
+               help='Number of seconds to wait for the SQLite database of '
+                    'the console tokens when it is locked by another '
+                    'consoleauth service.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(token_store_opts)
+CONF.import_opt('state_path', 'nova.paths')
+
+
+class TokenStore(object):
+    """Base class of the stores of console tokens."""
+
+    def add(self, token, token_dict, ttl):
+        """Store the dict of a token, expiring after ttl seconds.  Return
+        False if the token couldn't be stored.
+        """
+        raise NotImplementedError()
+
+    def get(self, token):
+        """Return the dict of a token, or None if it doesn't exist or
+        expired.
+        """
+        raise NotImplementedError()
+
+    def get_tokens_for_instance(self, instance_uuid):
+        """Return the tokens of an instance."""
+        raise NotImplementedError()
+
+    def delete_tokens_for_instance(self, instance_uuid):
+        """Delete all the tokens of an instance."""
+        raise NotImplementedError()
+
+    def sweep(self):
+        """Delete the expired tokens and return how many were deleted.
+        Stores expiring the tokens themselves have nothing to do.
+        """
+        return 0
+
+
+class MemcacheTokenStore(TokenStore):
+    """Keeps the tokens in memcached, or in memory when no memcached
+    servers are configured.  The tokens of each instance are kept as a JSON
+    list stored under the uuid of the instance.
+    """
+
+    def __init__(self):
+        self.mc = memorycache.get_client()
+
+    def add(self, token, token_dict, ttl):
+        # We need to log the warning message if the token is not cached
+        # successfully, because the failure will cause the console for
+        # instance to not be usable.
+        stored = self.mc.set(token.encode('UTF-8'),
+                             jsonutils.dumps(token_dict), ttl)
+        if not stored:
+            LOG.warning(_LW("Token: %(token)s failed to save into memcached."),
+                        {'token': token})
+
+        instance_uuid = token_dict['instance_uuid']
+        tokens = self.get_tokens_for_instance(instance_uuid)
+
+        # Remove the expired tokens from cache.
+        tokens = [tok for tok in tokens if self.mc.get(tok.encode('UTF-8'))]
+        tokens.append(token)
+
+        if not self.mc.set(instance_uuid.encode('UTF-8'),
+                           jsonutils.dumps(tokens)):
+            LOG.warning(_LW("Instance: %(instance_uuid)s failed to save "
+                            "into memcached"),
+                        {'instance_uuid': instance_uuid})
+        return stored
+
+    def get(self, token):
+        token_str = self.mc.get(token.encode('UTF-8'))
+        if token_str is None:
+            return None
+        return jsonutils.loads(token_str)
+
+    def get_tokens_for_instance(self, instance_uuid):
+        tokens_str = self.mc.get(instance_uuid.encode('UTF-8'))
+        if not tokens_str:
+            tokens = []
+        else:
+            tokens = jsonutils.loads(tokens_str)
+        return tokens
+
+    def delete_tokens_for_instance(self, instance_uuid):
+        tokens = self.get_tokens_for_instance(instance_uuid)
+        for token in tokens:
+            self.mc.delete(token.encode('UTF-8'))
+        self.mc.delete(instance_uuid.encode('UTF-8'))
+
+
+class SQLiteTokenStore(TokenStore):
+    """Keeps the tokens in a local SQLite database, which survives the
+    restarts of the service and may be shared by the consoleauth services
+    of a host.
+
+    The tokens are indexed by instance and expiry time, so that a token is
+    checked with a single lookup, the tokens of an instance are revoked
+    with a single DELETE and the expired tokens are deleted by sweep().
+
+    The statements are run in native threads, so that waiting for the
+    database locked by another service doesn't block the green threads.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or CONF.console_token_store_path
+        self._conn = None
+        self._lock = eventlet.semaphore.Semaphore()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path,
+                               timeout=CONF.console_token_store_timeout,
+                               isolation_level=None,
+                               check_same_thread=False)
+        # Readers don't block the writer of another service.
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    @property
+    def _connection(self):
+        if self._conn is None:
+            if self.path == ':memory:':
+                conn = self._connect()
+            else:
+                # The tokens give access to the consoles: only the services
+                # may read the database, its WAL and shared memory files.
+                old_umask = os.umask(0o077)
+                try:
+                    os.close(os.open(self.path, os.O_CREAT | os.O_RDWR,
+                                     0o600))
+                    conn = self._connect()
+                finally:
+                    os.umask(old_umask)
+            conn.execute('CREATE TABLE IF NOT EXISTS console_tokens ('
+                         'token TEXT PRIMARY KEY, '
+                         'instance_uuid TEXT, '
+                         'expires_at REAL, '
+                         'data TEXT NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS '
+                         'console_tokens_instance_uuid_idx '
+                         'ON console_tokens (instance_uuid)')
+            conn.execute('CREATE INDEX IF NOT EXISTS '
+                         'console_tokens_expires_at_idx '
+                         'ON console_tokens (expires_at)')
+            self._conn = conn
+        return self._conn
+
+    def _execute_sync(self, sql, params):
+        cursor = self._connection.execute(sql, params)
+        return cursor.fetchall(), cursor.rowcount
+
+    def _execute(self, sql, params):
+        """Run a statement in a native thread and return its rows and the
+        number of rows it changed.
+        """
+        # The connection is used by one native thread at a time.
+        with self._lock:
+            return tpool.execute(self._execute_sync, sql, params)
+
+    def add(self, token, token_dict, ttl):
+        expires_at = timeutils.utcnow_ts() + ttl if ttl else None
+        self._execute(
+            'INSERT OR REPLACE INTO console_tokens '
+            '(token, instance_uuid, expires_at, data) VALUES (?, ?, ?, ?)',
+            (token, token_dict['instance_uuid'], expires_at,
+             jsonutils.dumps(token_dict)))
+        return True
+
+    def get(self, token):
+        rows, _count = self._execute(
+            'SELECT data FROM console_tokens WHERE token = ? AND '
+            '(expires_at IS NULL OR expires_at > ?)',
+            (token, timeutils.utcnow_ts()))
+        if not rows:
+            return None
+        return jsonutils.loads(rows[0][0])
+
+    def get_tokens_for_instance(self, instance_uuid):
+        rows, _count = self._execute(
+            'SELECT token FROM console_tokens WHERE instance_uuid = ? AND '
+            '(expires_at IS NULL OR expires_at > ?) ORDER BY rowid',
+            (instance_uuid, timeutils.utcnow_ts()))
+        return [row[0] for row in rows]
+
+    def delete_tokens_for_instance(self, instance_uuid):
+        self._execute(
+            'DELETE FROM console_tokens WHERE instance_uuid = ?',
+            (instance_uuid,))
+
+    def sweep(self):
+        _rows, count = self._execute(
+            'DELETE FROM console_tokens WHERE expires_at <= ?',
+            (timeutils.utcnow_ts(),))
+        return count
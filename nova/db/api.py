@@ -153,6 +153,15 @@ def service_update(context, service_id, values):
     return IMPL.service_update(context, service_id, values)
 
 
+def service_update_heartbeats(context, heartbeats):
+    """Record the state reports of several services at once.
+
+    :param heartbeats: dict of (number of reports, time of the last report)
+                       tuples, keyed by service ID
+    """
+    return IMPL.service_update_heartbeats(context, heartbeats)
+
+
 ###################
 
 
@@ -1105,6 +1114,19 @@ def quota_reserve(context, resources, quotas, user_quotas, deltas, expire,
                               project_id=project_id, user_id=user_id)
 
 
+def quota_reserve_optimistic(context, resources, quotas, user_quotas, deltas,
+                             expire, until_refresh, max_age, project_id=None,
+                             user_id=None):
+    """Check quotas and create appropriate reservations, without locking
+    the quota usages.
+    """
+    return IMPL.quota_reserve_optimistic(context, resources, quotas,
+                                         user_quotas, deltas, expire,
+                                         until_refresh, max_age,
+                                         project_id=project_id,
+                                         user_id=user_id)
+
+
 def reservation_commit(context, reservations, project_id=None, user_id=None):
     """Commit quota reservations."""
     return IMPL.reservation_commit(context, reservations,
@@ -1119,6 +1141,22 @@ def reservation_rollback(context, reservations, project_id=None, user_id=None):
                                      user_id=user_id)
 
 
+def reservation_commit_optimistic(context, reservations, project_id=None,
+                                  user_id=None):
+    """Commit quota reservations, without locking the quota usages."""
+    return IMPL.reservation_commit_optimistic(context, reservations,
+                                              project_id=project_id,
+                                              user_id=user_id)
+
+
+def reservation_rollback_optimistic(context, reservations, project_id=None,
+                                    user_id=None):
+    """Roll back quota reservations, without locking the quota usages."""
+    return IMPL.reservation_rollback_optimistic(context, reservations,
+                                                project_id=project_id,
+                                                user_id=user_id)
+
+
 def quota_destroy_all_by_project_and_user(context, project_id, user_id):
     """Destroy all quotas associated with a given project and user."""
     return IMPL.quota_destroy_all_by_project_and_user(context,
@@ -1135,6 +1173,13 @@ def reservation_expire(context):
     return IMPL.reservation_expire(context)
 
 
+def reservation_expire_optimistic(context):
+    """Roll back any expired reservations, without locking the quota
+    usages.
+    """
+    return IMPL.reservation_expire_optimistic(context)
+
+
 ###################
 
 
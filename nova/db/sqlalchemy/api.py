@@ -547,6 +547,23 @@ def service_update(context, service_id, values):
     return service_ref
 
 
+def service_update_heartbeats(context, heartbeats):
+    if not heartbeats:
+        return
+    report_counts = {}
+    last_seen_ups = {}
+    for service_id, (count, last_seen_up) in six.iteritems(heartbeats):
+        report_counts[service_id] = models.Service.report_count + count
+        last_seen_ups[service_id] = last_seen_up
+    model_query(context, models.Service, read_deleted="no").\
+            filter(models.Service.id.in_(list(heartbeats))).\
+            update({'report_count': sql.case(report_counts,
+                                             value=models.Service.id),
+                    'last_seen_up': sql.case(last_seen_ups,
+                                             value=models.Service.id)},
+                   synchronize_session=False)
+
+
 ###################
 
 def compute_node_get(context, compute_id):
@@ -2057,16 +2074,12 @@ def instance_get_all_by_filters_sort(context, filters, limit=None, marker=None,
 
     # paginate query
     if marker is not None:
-        try:
-            if deleted:
-                marker = _instance_get_by_uuid(
-                    context.elevated(read_deleted='yes'), marker,
-                    session=session)
-            else:
-                marker = _instance_get_by_uuid(context,
-                                               marker, session=session)
-        except exception.InstanceNotFound:
-            raise exception.MarkerNotFound(marker)
+        if deleted:
+            marker_context = context.elevated(read_deleted='yes')
+        else:
+            marker_context = context
+        marker = _instance_get_sort_key_values(marker_context, marker,
+                                               sort_keys, session=session)
     try:
         query_prefix = sqlalchemyutils.paginate_query(query_prefix,
                                models.Instance, limit,
@@ -2079,6 +2092,29 @@ def instance_get_all_by_filters_sort(context, filters, limit=None, marker=None,
     return _instances_fill_metadata(context, query_prefix.all(), manual_joins)
 
 
+def _instance_get_sort_key_values(context, uuid, sort_keys, session=None):
+    """Return the values of the sort keys of an instance, as a marker.
+
+    paginate_query() only needs the sort key values of the marker to seek
+    past it, so only those columns are read, without the joins needed to
+    build a whole instance. A marker deleted since its page was listed
+    still has its values, so listings walked page by page don't break.
+    """
+    columns = []
+    for sort_key in sort_keys:
+        if sort_key not in models.Instance.__table__.columns:
+            raise exception.InvalidSortKey()
+        columns.append(getattr(models.Instance, sort_key))
+    result = model_query(context, models.Instance, args=columns,
+                         session=session, read_deleted="yes",
+                         project_only=True).\
+                filter_by(uuid=uuid).\
+                first()
+    if not result:
+        raise exception.MarkerNotFound(uuid)
+    return result
+
+
 def _tag_instance_filter(context, query, filters):
     """Applies tag filtering to an Instance query.
 
@@ -3305,13 +3341,14 @@ def _reservation_create(uuid, usage, project_id, user_id, resource,
 # on reservations.
 
 def _get_project_user_quota_usages(context, session, project_id,
-                                   user_id):
-    rows = model_query(context, models.QuotaUsage,
-                       read_deleted="no",
-                       session=session).\
-                   filter_by(project_id=project_id).\
-                   with_lockmode('update').\
-                   all()
+                                   user_id, lock=True):
+    query = model_query(context, models.QuotaUsage,
+                        read_deleted="no",
+                        session=session).\
+                   filter_by(project_id=project_id)
+    if lock:
+        query = query.with_lockmode('update')
+    rows = query.all()
     proj_result = dict()
     user_result = dict()
     # Get the total count of in_use,reserved
@@ -3448,6 +3485,109 @@ def _calculate_overquota(project_quotas, user_quotas, deltas,
     return overs
 
 
+def _sync_quota_usages(elevated, session, resources, deltas, user_usages,
+                       until_refresh, max_age, project_id, user_id):
+    """Creates the missing QuotaUsage records of the deltas and refreshes
+    the ones which need it.
+
+    :param user_usages:   dict of resource keys to QuotaUsage records,
+                          updated in place.
+    """
+    work = set(deltas.keys())
+    while work:
+        resource = work.pop()
+
+        # Do we need to refresh the usage?
+        created = _create_quota_usage_if_missing(user_usages, resource,
+                                                 until_refresh, project_id,
+                                                 user_id, session)
+        refresh = created or _is_quota_refresh_needed(
+                                    user_usages[resource], max_age)
+
+        # OK, refresh the usage
+        if refresh:
+            # Grab the sync routine
+            sync = QUOTA_SYNC_FUNCTIONS[resources[resource].sync]
+
+            updates = sync(elevated, project_id, user_id, session)
+            for res, in_use in updates.items():
+                # Make sure we have a destination for the usage!
+                _create_quota_usage_if_missing(user_usages, res,
+                                               until_refresh, project_id,
+                                               user_id, session)
+                _refresh_quota_usages(user_usages[res], until_refresh,
+                                      in_use)
+
+                # Because more than one resource may be refreshed
+                # by the call to the sync routine, and we don't
+                # want to double-sync, we make sure all refreshed
+                # resources are dropped from the work set.
+                work.discard(res)
+
+                # NOTE(Vek): We make the assumption that the sync
+                #            routine actually refreshes the
+                #            resources that it is the sync routine
+                #            for.  We don't check, because this is
+                #            a best-effort mechanism.
+
+
+def _check_quota_usages(project_quotas, user_quotas, deltas,
+                        project_usages, user_usages):
+    """Returns the lists of resources which would go under 0 and over
+    quota with the deltas.
+    """
+    # Check for deltas that would go negative
+    unders = [res for res, delta in deltas.items()
+              if delta < 0 and
+              delta + user_usages[res].in_use < 0]
+
+    # Now, let's check the quotas
+    # NOTE(Vek): We're only concerned about positive increments.
+    #            If a project has gone over quota, we want them to
+    #            be able to reduce their usage without any
+    #            problems.
+    for key, value in user_usages.items():
+        if key not in project_usages:
+            LOG.debug('Copying QuotaUsage for resource "%(key)s" from '
+                      'user_usages into project_usages: %(value)s',
+                      {'key': key, 'value': dict(value)})
+            project_usages[key] = value
+
+    overs = _calculate_overquota(project_quotas, user_quotas, deltas,
+                                 project_usages, user_usages)
+    return unders, overs
+
+
+def _raise_overquota(project_quotas, user_quotas, deltas, overs,
+                     project_usages, user_usages):
+    if project_quotas == user_quotas:
+        usages = project_usages
+    else:
+        # NOTE(mriedem): user_usages is a dict of resource keys to
+        # QuotaUsage sqlalchemy dict-like objects and doen't log well
+        # so convert the user_usages values to something useful for
+        # logging. Remove this if we ever change how
+        # _get_project_user_quota_usages returns the user_usages values.
+        user_usages = {k: dict(in_use=v['in_use'], reserved=v['reserved'],
+                               total=v['total'])
+                  for k, v in user_usages.items()}
+        usages = user_usages
+    usages = {k: dict(in_use=v['in_use'], reserved=v['reserved'])
+              for k, v in usages.items()}
+    LOG.debug('Raise OverQuota exception because: '
+              'project_quotas: %(project_quotas)s, '
+              'user_quotas: %(user_quotas)s, deltas: %(deltas)s, '
+              'overs: %(overs)s, project_usages: %(project_usages)s, '
+              'user_usages: %(user_usages)s',
+              {'project_quotas': project_quotas,
+               'user_quotas': user_quotas,
+               'overs': overs, 'deltas': deltas,
+               'project_usages': project_usages,
+               'user_usages': user_usages})
+    raise exception.OverQuota(overs=sorted(overs), quotas=user_quotas,
+                              usages=usages)
+
+
 @require_context
 @oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
 def quota_reserve(context, resources, project_quotas, user_quotas, deltas,
@@ -3467,62 +3607,12 @@ def quota_reserve(context, resources, project_quotas, user_quotas, deltas,
                 context, session, project_id, user_id)
 
         # Handle usage refresh
-        work = set(deltas.keys())
-        while work:
-            resource = work.pop()
-
-            # Do we need to refresh the usage?
-            created = _create_quota_usage_if_missing(user_usages, resource,
-                                                     until_refresh, project_id,
-                                                     user_id, session)
-            refresh = created or _is_quota_refresh_needed(
-                                        user_usages[resource], max_age)
-
-            # OK, refresh the usage
-            if refresh:
-                # Grab the sync routine
-                sync = QUOTA_SYNC_FUNCTIONS[resources[resource].sync]
-
-                updates = sync(elevated, project_id, user_id, session)
-                for res, in_use in updates.items():
-                    # Make sure we have a destination for the usage!
-                    _create_quota_usage_if_missing(user_usages, res,
-                                                   until_refresh, project_id,
-                                                   user_id, session)
-                    _refresh_quota_usages(user_usages[res], until_refresh,
-                                          in_use)
-
-                    # Because more than one resource may be refreshed
-                    # by the call to the sync routine, and we don't
-                    # want to double-sync, we make sure all refreshed
-                    # resources are dropped from the work set.
-                    work.discard(res)
-
-                    # NOTE(Vek): We make the assumption that the sync
-                    #            routine actually refreshes the
-                    #            resources that it is the sync routine
-                    #            for.  We don't check, because this is
-                    #            a best-effort mechanism.
-
-        # Check for deltas that would go negative
-        unders = [res for res, delta in deltas.items()
-                  if delta < 0 and
-                  delta + user_usages[res].in_use < 0]
-
-        # Now, let's check the quotas
-        # NOTE(Vek): We're only concerned about positive increments.
-        #            If a project has gone over quota, we want them to
-        #            be able to reduce their usage without any
-        #            problems.
-        for key, value in user_usages.items():
-            if key not in project_usages:
-                LOG.debug('Copying QuotaUsage for resource "%(key)s" from '
-                          'user_usages into project_usages: %(value)s',
-                          {'key': key, 'value': dict(value)})
-                project_usages[key] = value
-
-        overs = _calculate_overquota(project_quotas, user_quotas, deltas,
-                                     project_usages, user_usages)
+        _sync_quota_usages(elevated, session, resources, deltas, user_usages,
+                           until_refresh, max_age, project_id, user_id)
+
+        unders, overs = _check_quota_usages(project_quotas, user_quotas,
+                                            deltas, project_usages,
+                                            user_usages)
 
         # NOTE(Vek): The quota check needs to be in the transaction,
         #            but the transaction doesn't fail just because
@@ -3568,32 +3658,136 @@ def quota_reserve(context, resources, project_quotas, user_quotas, deltas,
                         "resources: %s"), unders)
 
     if overs:
-        if project_quotas == user_quotas:
-            usages = project_usages
-        else:
-            # NOTE(mriedem): user_usages is a dict of resource keys to
-            # QuotaUsage sqlalchemy dict-like objects and doen't log well
-            # so convert the user_usages values to something useful for
-            # logging. Remove this if we ever change how
-            # _get_project_user_quota_usages returns the user_usages values.
-            user_usages = {k: dict(in_use=v['in_use'], reserved=v['reserved'],
-                                   total=v['total'])
-                      for k, v in user_usages.items()}
-            usages = user_usages
-        usages = {k: dict(in_use=v['in_use'], reserved=v['reserved'])
-                  for k, v in usages.items()}
-        LOG.debug('Raise OverQuota exception because: '
-                  'project_quotas: %(project_quotas)s, '
-                  'user_quotas: %(user_quotas)s, deltas: %(deltas)s, '
-                  'overs: %(overs)s, project_usages: %(project_usages)s, '
-                  'user_usages: %(user_usages)s',
-                  {'project_quotas': project_quotas,
-                   'user_quotas': user_quotas,
-                   'overs': overs, 'deltas': deltas,
-                   'project_usages': project_usages,
-                   'user_usages': user_usages})
-        raise exception.OverQuota(overs=sorted(overs), quotas=user_quotas,
-                                  usages=usages)
+        _raise_overquota(project_quotas, user_quotas, deltas, overs,
+                         project_usages, user_usages)
+
+    return reservations
+
+
+def _quota_usage_update_if_unchanged(context, session, usage, original):
+    """Writes the usage of a detached QuotaUsage record if its row still
+    has the in_use and reserved values it was read with.
+
+    :return: True if the row was updated, False if it was changed by a
+             concurrent request in the meantime.
+    """
+    in_use, reserved = original
+    return bool(model_query(context, models.QuotaUsage, session=session,
+                            read_deleted="no").
+                filter_by(id=usage.id).
+                filter_by(in_use=in_use).
+                filter_by(reserved=reserved).
+                update({'in_use': usage.in_use,
+                        'reserved': usage.reserved,
+                        'until_refresh': usage.until_refresh},
+                       synchronize_session=False))
+
+
+@require_context
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True,
+                           retry_on_request=True)
+def quota_reserve_optimistic(context, resources, project_quotas, user_quotas,
+                             deltas, expire, until_refresh, max_age,
+                             project_id=None, user_id=None):
+    elevated = context.elevated()
+    if project_id is None:
+        project_id = context.project_id
+    if user_id is None:
+        user_id = context.user_id
+
+    reservations = []
+    session = get_session()
+    with session.begin():
+        # Get the current usages, without locking them
+        project_usages, user_usages = _get_project_user_quota_usages(
+                context, session, project_id, user_id, lock=False)
+
+        # NOTE(iuliat): The existing usages are changed on detached
+        # copies, which are only written below if their rows were not
+        # changed since they were read. The usages created here are
+        # inserted with the session as usual.
+        session.expunge_all()
+        originals = {res: (usage.in_use, usage.reserved, usage.until_refresh)
+                     for res, usage in user_usages.items()}
+
+        # Handle usage refresh
+        _sync_quota_usages(elevated, session, resources, deltas, user_usages,
+                           until_refresh, max_age, project_id, user_id)
+
+        # Resources limited per project for which other users of the
+        # project can reserve concurrently, without conflicting with the
+        # usages of this user.
+        shared = [res for res, delta in deltas.items()
+                  if delta > 0 and project_quotas[res] >= 0 and
+                  user_usages[res].user_id is not None]
+
+        unders, overs = _check_quota_usages(project_quotas, user_quotas,
+                                            deltas, project_usages,
+                                            user_usages)
+
+        # NOTE(Vek): See quota_reserve() about positive increments.
+        if not overs:
+            for res, delta in deltas.items():
+                if delta > 0:
+                    user_usages[res].reserved += delta
+
+        for res, original in originals.items():
+            usage = user_usages[res]
+            if (usage.in_use, usage.reserved, usage.until_refresh) == original:
+                continue
+            if not _quota_usage_update_if_unchanged(context, session, usage,
+                                                    original[:2]):
+                LOG.debug('Quota usage of resource %(res)s of project '
+                          '%(project_id)s was updated concurrently, '
+                          'retrying the reservation',
+                          {'res': res, 'project_id': project_id})
+                raise db_exc.RetryRequest(
+                    exception.QuotaUsageUpdateConflict(project_id=project_id))
+
+        # Create the reservations, with a single statement
+        if not overs:
+            values = []
+            for res, delta in deltas.items():
+                values.append({'uuid': str(uuid.uuid4()),
+                               'usage_id': user_usages[res].id,
+                               'project_id': project_id,
+                               'user_id': user_id,
+                               'resource': res,
+                               'delta': delta,
+                               'expire': expire})
+            session.execute(models.Reservation.__table__.insert(), values)
+            reservations = [value['uuid'] for value in values]
+
+    if unders:
+        LOG.warning(_LW("Change will make usage less than 0 for the following "
+                        "resources: %s"), unders)
+
+    if overs:
+        _raise_overquota(project_quotas, user_quotas, deltas, overs,
+                         project_usages, user_usages)
+
+    # NOTE(iuliat): Without locks, other users of the project may have
+    # reserved the shared resources concurrently. Check the project
+    # usages again now that the reservations are committed: of several
+    # concurrent requests, at least the last one to check sees the
+    # reservations of all the others, so the project can't stay over
+    # quota. The reservations are rolled back when it is.
+    if shared:
+        usages = _quota_usage_get_all(context, project_id)
+        overs = [res for res in shared
+                 if project_quotas[res] < (usages[res]['in_use'] +
+                                           usages[res]['reserved'])]
+        if overs:
+            reservation_rollback_optimistic(context, reservations,
+                                            project_id=project_id,
+                                            user_id=user_id)
+            project_usages = {
+                res: dict(usages[res],
+                          total=usages[res]['in_use'] +
+                          usages[res]['reserved'] - deltas[res])
+                for res in shared}
+            _raise_overquota(project_quotas, project_quotas, deltas, overs,
+                             project_usages, project_usages)
 
     return reservations
 
@@ -3642,6 +3836,75 @@ def reservation_rollback(context, reservations, project_id=None, user_id=None):
         reservation_query.soft_delete(synchronize_session=False)
 
 
+def _reservations_apply_optimistic(context, criterion, commit):
+    """Apply the reservations matching the criterion to their usages with
+    atomic increments, and delete them.
+    """
+    session = get_session()
+    with session.begin():
+        reservation_query = model_query(context, models.Reservation,
+                                        read_deleted="no",
+                                        session=session).\
+                   filter(criterion)
+        rows = reservation_query.all()
+        if not rows:
+            return
+
+        # NOTE(iuliat): Only the request which deletes the reservations
+        # applies them to the usages, so that concurrent commits,
+        # rollbacks or expirations of the same reservations don't
+        # apply them twice.
+        deleted = model_query(context, models.Reservation, read_deleted="no",
+                              session=session).\
+                filter(models.Reservation.id.in_(
+                    [reservation.id for reservation in rows])).\
+                soft_delete(synchronize_session=False)
+        if deleted != len(rows):
+            raise db_exc.RetryRequest(exception.QuotaUsageUpdateConflict(
+                project_id=rows[0].project_id))
+
+        reserved = collections.defaultdict(int)
+        in_use = collections.defaultdict(int)
+        for reservation in rows:
+            if reservation.delta >= 0:
+                reserved[reservation.usage_id] -= reservation.delta
+            if commit:
+                in_use[reservation.usage_id] += reservation.delta
+
+        values = {}
+        for column, changes in (('reserved', reserved), ('in_use', in_use)):
+            changes = {usage_id: change for usage_id, change
+                       in six.iteritems(changes) if change}
+            if changes:
+                column = getattr(models.QuotaUsage, column)
+                values[column] = column + sql.case(
+                    changes, value=models.QuotaUsage.id, else_=0)
+        if values:
+            model_query(context, models.QuotaUsage, read_deleted="no",
+                        session=session).\
+                    filter(models.QuotaUsage.id.in_(
+                        set(reservation.usage_id for reservation in rows))).\
+                    update(values, synchronize_session=False)
+
+
+@require_context
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True,
+                           retry_on_request=True)
+def reservation_commit_optimistic(context, reservations, project_id=None,
+                                  user_id=None):
+    _reservations_apply_optimistic(
+        context, models.Reservation.uuid.in_(reservations), commit=True)
+
+
+@require_context
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True,
+                           retry_on_request=True)
+def reservation_rollback_optimistic(context, reservations, project_id=None,
+                                    user_id=None):
+    _reservations_apply_optimistic(
+        context, models.Reservation.uuid.in_(reservations), commit=False)
+
+
 def quota_destroy_all_by_project_and_user(context, project_id, user_id):
     session = get_session()
     with session.begin():
@@ -3705,6 +3968,14 @@ def reservation_expire(context):
         reservation_query.soft_delete(synchronize_session=False)
 
 
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True,
+                           retry_on_request=True)
+def reservation_expire_optimistic(context):
+    _reservations_apply_optimistic(
+        context, models.Reservation.expire < timeutils.utcnow(),
+        commit=False)
+
+
 ###################
 
 
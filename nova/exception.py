@@ -981,6 +981,11 @@ class OverQuota(NovaException):
     msg_fmt = _("Quota exceeded for resources: %(overs)s")
 
 
+class QuotaUsageUpdateConflict(NovaException):
+    msg_fmt = _("Quota usages of project %(project_id)s were updated "
+                "concurrently.")
+
+
 class SecurityGroupNotFound(NotFound):
     msg_fmt = _("Security group %(security_group_id)s not found.")
 
@@ -17,6 +17,8 @@
 Filter support
 """
 
+import time
+
 from oslo_log import log as logging
 
 from nova.i18n import _LI
@@ -44,10 +46,26 @@ class BaseFilter(object):
             if self._filter_one(obj, filter_properties):
                 yield obj
 
+    def filter_mask(self, columns, filter_properties):
+        """Return a sequence of booleans telling which objects pass the filter.
+
+        Override this in a subclass which can evaluate its condition at once
+        over the columnar view of all the objects given by the filter
+        handler. Returning None means the filter has no batch form, and
+        filter_all() is used instead.
+        """
+        return None
+
     # Set to true in a subclass if a filter only needs to be run once
     # for each request rather than for each instance
     run_filter_once_per_request = False
 
+    # Set to true in a subclass if the result of a filter for an object can
+    # change when an instance of the same request is placed on another
+    # object, for example because the filter looks at the hosts already
+    # chosen for the request.
+    depends_on_placements = False
+
     def run_filter_for_index(self, index):
         """Return True if the filter needs to be run for the "index-th"
         instance in a request.  Only need to override this if a filter
@@ -65,21 +83,56 @@ class BaseFilterHandler(loadables.BaseLoader):
     This class should be subclassed where one needs to use filters.
     """
 
+    # Set to a nova.plugin_stats.StatsCollector in a subclass to collect
+    # run statistics of the filters
+    stats = None
+
+    def get_columns(self, objs):
+        """Return a columnar view of the objects for the filter masks.
+
+        Override this in a subclass to enable the batch form of the filters.
+        Returning None means that every filter runs object by object.
+        """
+        return None
+
     def get_filtered_objects(self, filters, objs, filter_properties, index=0):
         list_objs = list(objs)
         LOG.debug("Starting with %d host(s)", len(list_objs))
+        columns = None
         for filter_ in filters:
+            cls_name = filter_.__class__.__name__
             if filter_.run_filter_for_index(index):
-                cls_name = filter_.__class__.__name__
-                objs = filter_.filter_all(list_objs, filter_properties)
-                if objs is None:
-                    LOG.debug("Filter %s says to stop filtering", cls_name)
-                    return
-                list_objs = list(objs)
+                start = time.time()
+                num_objs = len(list_objs)
+                if columns is None:
+                    columns = self.get_columns(list_objs)
+                mask = None
+                if columns is not None:
+                    mask = filter_.filter_mask(columns, filter_properties)
+                if mask is not None:
+                    columns = columns.compress(mask)
+                    list_objs = columns.objs
+                else:
+                    # The filter may have changed the objects, so the
+                    # columns need to be built again for the next filter.
+                    columns = None
+                    objs = filter_.filter_all(list_objs, filter_properties)
+                    if objs is None:
+                        LOG.debug("Filter %s says to stop filtering",
+                                  cls_name)
+                        return
+                    list_objs = list(objs)
+                if self.stats is not None:
+                    self.stats[cls_name].record_run(time.time() - start,
+                                                    num_objs, len(list_objs))
                 if not list_objs:
                     LOG.info(_LI("Filter %s returned 0 hosts"), cls_name)
                     break
                 LOG.debug("Filter %(cls_name)s returned "
                           "%(obj_len)d host(s)",
                           {'cls_name': cls_name, 'obj_len': len(list_objs)})
+            elif self.stats is not None:
+                # The hosts kept by the first run of the filter for the
+                # request are reused
+                self.stats[cls_name].record_skip()
         return list_objs
@@ -0,0 +1,344 @@
+# Copyright (c) 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Transfer module downloading the images from their http and https
+locations in concurrent byte ranges.
+
+The image is preallocated at its destination and each range is written
+at its offset as it arrives, so that the ranges don't wait for each
+other.  The MD5 checksum of the image is computed while it is written:
+the data extending the checksummed start of the image is hashed in
+memory, the ranges received ahead of it are read back from the page
+cache once the ranges before them are complete.
+
+A failed range is retried from where it stopped.  When the download
+fails anyway, the progress of the ranges is saved next to the image, so
+that downloading it again to the same path only fetches what is missing.
+"""
+
+import errno
+import hashlib
+import os
+
+from oslo_config import cfg
+from oslo_log import log as logging
+from oslo_serialization import jsonutils
+from oslo_utils import fileutils
+import requests
+from requests import adapters
+
+from nova import exception
+from nova.i18n import _, _LI, _LW
+import nova.image.download.base as xfer_base
+from nova import utils
+
+
+LOG = logging.getLogger(__name__)
+
+ranged_opts = [
+    cfg.IntOpt('ranges',
+               default=4,
+               help='Maximum number of byte ranges of an image downloaded '
+                    'concurrently'),
+    cfg.IntOpt('min_range_size',
+               default=64 * 1024 * 1024,
+               help='Minimum size in bytes of the byte ranges, smaller '
+                    'images are downloaded in fewer ranges'),
+    cfg.IntOpt('chunk_size',
+               default=64 * 1024,
+               help='Size in bytes of the chunks in which the ranges are '
+                    'read and written'),
+    cfg.IntOpt('range_retries',
+               default=3,
+               help='Number of times a failed byte range is requested again '
+                    'from where it stopped before the download fails'),
+    cfg.IntOpt('timeout',
+               default=60,
+               help='Number of seconds to wait for the server of the images '
+                    'before retrying a byte range'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(ranged_opts, group='image_http_url')
+
+# Suffix of the file saving the progress of an interrupted download
+STATE_SUFFIX = '.ranges'
+
+
+def _pwrite(fd, data, offset):
+    """Write data at an offset of a file descriptor owned by the caller."""
+    data = memoryview(data)
+    while data:
+        if hasattr(os, 'pwrite'):
+            written = os.pwrite(fd, data, offset)
+        else:
+            # The offset of the descriptor isn't shared with other writers
+            os.lseek(fd, offset, os.SEEK_SET)
+            written = os.write(fd, data)
+        data = data[written:]
+        offset += written
+
+
+def _preallocate(fd, size):
+    os.ftruncate(fd, size)
+    if hasattr(os, 'posix_fallocate') and size:
+        try:
+            os.posix_fallocate(fd, 0, size)
+        except OSError as e:
+            # Not supported by every file system, the file is sparse then
+            if e.errno not in (errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+
+
+class ByteRange(object):
+    """The bytes [start, end) of an image, of which done are written."""
+
+    def __init__(self, start, end, done=0):
+        self.start = start
+        self.end = end
+        self.done = done
+
+    @property
+    def offset(self):
+        return self.start + self.done
+
+    @property
+    def complete(self):
+        return self.offset >= self.end
+
+    def to_list(self):
+        return [self.start, self.end, self.done]
+
+
+def split_ranges(size, count, min_size):
+    """Split size bytes in at most count ranges of at least min_size bytes,
+    except for an empty image which has a single empty range.
+    """
+    count = max(1, min(count, size // max(min_size, 1)))
+    step, extra = divmod(size, count)
+    ranges = []
+    start = 0
+    for i in range(count):
+        end = start + step + (1 if i < extra else 0)
+        ranges.append(ByteRange(start, end))
+        start = end
+    return ranges
+
+
+class IncrementalChecksum(object):
+    """Computes the MD5 of a file whose byte ranges are written
+    concurrently, in memory for the data which extends the hashed start of
+    the file and by reading the written ranges back once the ranges before
+    them are complete.
+    """
+
+    def __init__(self, path, ranges, chunk_size):
+        self.path = path
+        self.ranges = ranges
+        self.chunk_size = chunk_size
+        self.md5 = hashlib.md5()
+        self.offset = 0
+        self._index = 0
+
+    def update(self, offset, data):
+        """Account for data written at offset, once its range counts it as
+        done.
+        """
+        if offset == self.offset:
+            self.md5.update(data)
+            self.offset += len(data)
+        self.catch_up()
+
+    def catch_up(self):
+        """Hash the data written after the hashed start of the file."""
+        object_file = None
+        try:
+            while self._index < len(self.ranges):
+                byte_range = self.ranges[self._index]
+                while self.offset < byte_range.offset:
+                    if object_file is None:
+                        object_file = open(self.path, 'rb')
+                    object_file.seek(self.offset)
+                    data = object_file.read(
+                        min(self.chunk_size, byte_range.offset - self.offset))
+                    if not data:
+                        raise IOError(_('%s is shorter than its written '
+                                        'ranges') % self.path)
+                    self.md5.update(data)
+                    self.offset += len(data)
+                if not byte_range.complete:
+                    break
+                self._index += 1
+        finally:
+            if object_file is not None:
+                object_file.close()
+
+    def hexdigest(self):
+        return self.md5.hexdigest()
+
+
+class RangedTransfer(xfer_base.TransferBase):
+
+    def _load_state(self, dst_path, url, size, checksum):
+        """Return the ranges of an interrupted download of the same image
+        to dst_path, or None.
+        """
+        state_path = dst_path + STATE_SUFFIX
+        try:
+            with open(state_path) as state_file:
+                state = jsonutils.loads(state_file.read())
+            if (state['url'] != url or state['size'] != size or
+                    state['checksum'] != checksum or
+                    os.path.getsize(dst_path) != size):
+                return None
+            return [ByteRange(*r) for r in state['ranges']]
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _save_state(self, dst_path, url, size, checksum, ranges):
+        state = {'url': url, 'size': size, 'checksum': checksum,
+                 'ranges': [r.to_list() for r in ranges]}
+        try:
+            with open(dst_path + STATE_SUFFIX, 'w') as state_file:
+                state_file.write(jsonutils.dumps(state))
+        except (IOError, OSError) as e:
+            LOG.warning(_LW('Failed to save the progress of the download '
+                            'to %(path)s: %(error)s'),
+                        {'path': dst_path, 'error': e})
+
+    def _get_size(self, session, url):
+        response = session.head(url, allow_redirects=True,
+                                timeout=CONF.image_http_url.timeout)
+        response.raise_for_status()
+        return int(response.headers['Content-Length'])
+
+    def _fetch_range(self, session, url, dst_path, byte_range, size,
+                     checksum):
+        conf = CONF.image_http_url
+        attempts = 0
+        fd = os.open(dst_path, os.O_WRONLY)
+        try:
+            while not byte_range.complete:
+                try:
+                    response = session.get(
+                        url, stream=True, timeout=conf.timeout,
+                        headers={'Range': 'bytes=%d-%d' % (
+                            byte_range.offset, byte_range.end - 1)})
+                    try:
+                        # A server ignoring the Range header sends the
+                        # whole image, which only fits a range spanning it.
+                        if not (response.status_code == 206 or
+                                response.status_code == 200 and
+                                byte_range.offset == 0 and
+                                byte_range.end == size):
+                            raise exception.ImageDownloadModuleError(
+                                module=str(self),
+                                reason=_('Unexpected status %(status)d for '
+                                         'a byte range of %(url)s') %
+                                {'status': response.status_code,
+                                 'url': url})
+                        for data in response.iter_content(conf.chunk_size):
+                            data = data[:byte_range.end - byte_range.offset]
+                            offset = byte_range.offset
+                            _pwrite(fd, data, offset)
+                            byte_range.done += len(data)
+                            if checksum is not None:
+                                checksum.update(offset, data)
+                            if byte_range.complete:
+                                break
+                    finally:
+                        response.close()
+                    if not byte_range.complete:
+                        raise IOError(_('Byte range ended early'))
+                except (requests.RequestException, IOError) as e:
+                    attempts += 1
+                    if attempts > conf.range_retries:
+                        raise
+                    LOG.warning(_LW('Retrying the byte range %(start)d-'
+                                    '%(end)d of %(url)s from %(offset)d: '
+                                    '%(error)s'),
+                                {'start': byte_range.start,
+                                 'end': byte_range.end - 1, 'url': url,
+                                 'offset': byte_range.offset, 'error': e})
+        finally:
+            os.close(fd)
+
+    def download(self, context, url_parts, dst_path, metadata, **kwargs):
+        conf = CONF.image_http_url
+        url = url_parts.geturl()
+        image_meta = kwargs.get('image_meta') or {}
+        expected_checksum = image_meta.get('checksum')
+
+        session = requests.Session()
+        adapter = adapters.HTTPAdapter(pool_maxsize=max(conf.ranges, 1))
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        size = image_meta.get('size')
+        if size is None:
+            size = self._get_size(session, url)
+
+        ranges = self._load_state(dst_path, url, size, expected_checksum)
+        if ranges is None:
+            ranges = split_ranges(size, conf.ranges, conf.min_range_size)
+            fd = os.open(dst_path, os.O_WRONLY | os.O_CREAT, 0o644)
+            try:
+                _preallocate(fd, size)
+            finally:
+                os.close(fd)
+        else:
+            LOG.info(_LI('Resuming the download of %(url)s to %(path)s, '
+                         '%(missing)d of %(size)d bytes missing'),
+                     {'url': url, 'path': dst_path, 'size': size,
+                      'missing': sum(r.end - r.offset for r in ranges)})
+
+        checksum = None
+        if expected_checksum:
+            checksum = IncrementalChecksum(dst_path, ranges, conf.chunk_size)
+
+        threads = [utils.spawn(self._fetch_range, session, url, dst_path,
+                               byte_range, size, checksum)
+                   for byte_range in ranges if not byte_range.complete]
+        error = None
+        for thread in threads:
+            try:
+                thread.wait()
+            except Exception as e:
+                error = error or e
+        session.close()
+        if error is not None:
+            self._save_state(dst_path, url, size, expected_checksum, ranges)
+            raise error
+
+        fileutils.delete_if_exists(dst_path + STATE_SUFFIX)
+        if checksum is not None:
+            # Hash the ranges resumed from a previous download
+            checksum.catch_up()
+            if checksum.hexdigest() != expected_checksum:
+                raise exception.ImageDownloadModuleError(
+                    module=str(self),
+                    reason=_('Checksum %(checksum)s of %(url)s does not '
+                             'match the checksum %(expected)s of the image')
+                    % {'checksum': checksum.hexdigest(), 'url': url,
+                       'expected': expected_checksum})
+        LOG.info(_LI('Downloaded %(url)s in %(ranges)d byte ranges'),
+                 {'url': url, 'ranges': len(ranges)})
+
+
+def get_download_handler(**kwargs):
+    return RangedTransfer()
+
+
+def get_schemes():
+    return ['http', 'https']
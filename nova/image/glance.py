@@ -347,7 +347,8 @@ class GlanceImageService(object):
                 xfer_mod = self._get_transfer_module(o.scheme)
                 if xfer_mod:
                     try:
-                        xfer_mod.download(context, o, dst_path, loc_meta)
+                        xfer_mod.download(context, o, dst_path, loc_meta,
+                                          image_meta=image)
                         LOG.info(_LI("Successfully transferred "
                                      "using %s"), o.scheme)
                         return
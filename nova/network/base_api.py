@@ -13,6 +13,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import functools
 import inspect
 
@@ -358,3 +359,26 @@ class NetworkAPI(base.Base):
         :param index: The index on the instance for the VIF.
         """
         pass
+
+    def get_instances_with_stale_nw_info(self, context, instances, host):
+        """Return the instances on a host whose network info cache differs
+        from their network resources, looked up at once for all of them.
+
+        :param context: The request context.
+        :param instances: nova.objects.instance.Instance objects on the
+                          host, with their info_cache.
+        :param host: The host the instances are on.
+        """
+        raise NotImplementedError()
+
+    @contextlib.contextmanager
+    def shared_lookups(self, context):
+        """Share the lookups made to build the network info of instances
+        within the block, e.g. of their networks and subnets.
+
+        Outside of the block the details are looked up again for each
+        instance.  Nothing is shared by default.
+
+        :param context: The request context the network info is built with.
+        """
+        yield
@@ -18,6 +18,7 @@
 """Implements vlans, bridges, and iptables rules using linux utilities."""
 
 import calendar
+import hashlib
 import inspect
 import os
 import re
@@ -121,6 +122,17 @@ linux_net_opts = [
                default='DROP',
                help='The table that iptables to jump to when a packet is '
                     'to be dropped.'),
+    cfg.BoolOpt('iptables_incremental_apply',
+                default=False,
+                help='Whether to only apply the chains of nova which changed '
+                     'since the rules were last applied, with '
+                     'iptables-restore --noflush, rather than saving and '
+                     'restoring the whole tables. The tables are still '
+                     'rewritten when the rules nova adds to the shared and '
+                     'built-in chains change, or when iptables_top_regex or '
+                     'iptables_bottom_regex is set. The rules of nova '
+                     'removed outside of nova are only restored when the '
+                     'tables are rewritten.'),
     cfg.IntOpt('ovs_vsctl_timeout',
                default=120,
                help='Amount of time, in seconds, that ovs_vsctl should wait '
@@ -332,6 +344,10 @@ class IptablesTable(object):
             self.rules.remove(rule)
 
 
+def _digest(lines):
+    return hashlib.sha1('\n'.join(lines).encode('utf-8')).hexdigest()
+
+
 class IptablesManager(object):
     """Wrapper for iptables.
 
@@ -368,6 +384,10 @@ class IptablesManager(object):
 
         self.iptables_apply_deferred = False
 
+        # The digests of the unwrapped rules and of each wrapped chain last
+        # applied, by command and table name, see _apply_changed_chains
+        self._applied_chains = {}
+
         # Add a nova-filter-top chain. It's intended to be shared
         # among the various nova components. It sits at the very top
         # of FORWARD and OUTPUT.
@@ -457,6 +477,8 @@ class IptablesManager(object):
             s += [('ip6tables', self.ipv6)]
 
         for cmd, tables in s:
+            if self._apply_changed_chains(cmd, tables):
+                continue
             all_tables, _err = self.execute('%s-save' % (cmd,), '-c',
                                                 run_as_root=True,
                                                 attempts=5)
@@ -469,8 +491,113 @@ class IptablesManager(object):
             self.execute('%s-restore' % (cmd,), '-c', run_as_root=True,
                          process_input='\n'.join(all_lines),
                          attempts=5)
+            if CONF.iptables_incremental_apply:
+                self._applied_chains[cmd] = dict(
+                    (table_name, self._table_digests(table))
+                    for table_name, table in six.iteritems(tables))
         LOG.debug("IPTablesManager.apply completed with success")
 
+    def _apply_changed_chains(self, cmd, tables):
+        """Apply the wrapped chains changed since the tables were last
+        applied, without saving and restoring the whole tables.
+
+        The wrapped chains are only written by this component of Nova, so
+        their rules last applied are known.  Each changed chain is declared
+        again, which flushes it with --noflush, and filled, and the removed
+        chains are deleted.
+
+        Returns False when the tables are to be rewritten instead: when
+        they weren't applied yet, when the unwrapped rules changed, as
+        they live in chains shared with other components, or when the top
+        and bottom regexes reorder the rules of other components.
+        """
+        applied = self._applied_chains.get(cmd)
+        if (not CONF.iptables_incremental_apply or applied is None or
+                CONF.iptables_top_regex or CONF.iptables_bottom_regex):
+            return False
+
+        changes = {}
+        for table_name, table in six.iteritems(tables):
+            if not table.dirty:
+                continue
+            if table.remove_rules or table.remove_chains:
+                return False
+            chain_rules = self._wrapped_chain_rules(table)
+            digests = self._table_digests(table, chain_rules)
+            if digests[0] != applied[table_name][0]:
+                return False
+            changes[table_name] = (digests, chain_rules)
+
+        lines = []
+        for table_name, (digests, chain_rules) in sorted(
+                six.iteritems(changes)):
+            applied_chains = applied[table_name][1]
+            changed = sorted(name for name, digest in six.iteritems(digests[1])
+                             if applied_chains.get(name) != digest)
+            removed = sorted(set(applied_chains) - set(digests[1]))
+            if not changed and not removed:
+                continue
+            lines.append('*%s' % table_name)
+            lines.extend(':%s-%s - [0:0]' % (binary_name, name)
+                         for name in changed + removed)
+            for name in changed:
+                lines.extend(chain_rules[name])
+            lines.extend('-X %s-%s' % (binary_name, name) for name in removed)
+            lines.append('COMMIT')
+
+        if lines:
+            try:
+                self.execute('%s-restore' % (cmd,), '-c', '--noflush',
+                             run_as_root=True,
+                             process_input='\n'.join(lines) + '\n',
+                             attempts=5)
+            except processutils.ProcessExecutionError as e:
+                LOG.warning(_LW('Failed to apply the changed %(cmd)s chains, '
+                                'rewriting the tables: %(error)s'),
+                            {'cmd': cmd, 'error': e})
+                del self._applied_chains[cmd]
+                return False
+        for table_name, (digests, chain_rules) in six.iteritems(changes):
+            applied[table_name] = digests
+            tables[table_name].dirty = False
+        return True
+
+    def _table_digests(self, table, chain_rules=None):
+        """Return the digests of the unwrapped rules of a table, and of
+        each of its wrapped chains by name.
+        """
+        if chain_rules is None:
+            chain_rules = self._wrapped_chain_rules(table)
+        return (self._unwrapped_digest(table),
+                dict((name, _digest(rules))
+                     for name, rules in six.iteritems(chain_rules)))
+
+    @staticmethod
+    def _unwrapped_digest(table):
+        return _digest(sorted(table.unwrapped_chains) +
+                       ['%s %s %s' % (rule.chain, rule.top, rule.rule)
+                        for rule in table.rules if not rule.wrap])
+
+    @staticmethod
+    def _wrapped_chain_rules(table):
+        """Return the rules of the wrapped chains of a table by chain name,
+        as _modify_rules writes them.
+        """
+        chain_rules = dict((name, []) for name in table.chains)
+        rules = ([rule for rule in table.rules if rule.top] +
+                 [rule for rule in table.rules if not rule.top])
+        for rule in rules:
+            if rule.wrap and rule.chain in chain_rules:
+                chain_rules[rule.chain].append(str(rule))
+        # As in _modify_rules, the last duplicate takes precedence
+        unique_rules = {}
+        for name, rules in six.iteritems(chain_rules):
+            unique_rules[name] = []
+            for rule in reversed(rules):
+                if rule not in unique_rules[name]:
+                    unique_rules[name].insert(0, rule)
+        return unique_rules
+
     def _find_table(self, lines, table_name):
         if len(lines) < 3:
             # length only <2 when fake iptables
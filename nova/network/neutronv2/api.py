@@ -15,8 +15,11 @@
 #    under the License.
 #
 
+import collections
+import contextlib
 import time
 import uuid
+import weakref
 
 from keystoneclient import auth
 from keystoneclient.auth.identity import v2 as v2_auth
@@ -129,6 +132,9 @@ soft_external_network_attach_authorize = extensions.soft_core_authorizer(
 _SESSION = None
 _ADMIN_AUTH = None
 
+# The networks and subnets looked up within API.shared_lookups, by context
+_SHARED_LOOKUPS = weakref.WeakKeyDictionary()
+
 
 def reset_state():
     global _ADMIN_AUTH
@@ -890,9 +896,9 @@ class API(base_api.NetworkAPI):
             net_ids = [iface['network']['id'] for iface in ifaces]
 
         if networks is None:
-            networks = self._get_available_networks(context,
-                                                    instance.project_id,
-                                                    net_ids)
+            networks = self._get_networks_by_ids(context,
+                                                 instance.project_id,
+                                                 net_ids)
         # an interface was added/removed from instance.
         else:
             # Since networks does not contain the existing networks on the
@@ -908,6 +914,87 @@ class API(base_api.NetworkAPI):
 
         return networks, port_ids
 
+    def _get_networks_by_ids(self, context, project_id, net_ids):
+        """Return the networks available for the tenant with the given ids,
+        or all of them if there are no ids.
+
+        Within shared_lookups each network is only looked up once.
+        """
+        lookups = _SHARED_LOOKUPS.get(context)
+        if lookups is None or not net_ids:
+            return self._get_available_networks(context, project_id, net_ids)
+        cached = lookups['networks']
+        net_ids = _unique(net_ids)
+        missing = [net_id for net_id in net_ids if net_id not in cached]
+        if missing:
+            for net in self._get_available_networks(context, project_id,
+                                                    missing):
+                cached[net['id']] = net
+        return [cached[net_id] for net_id in net_ids if net_id in cached]
+
+    @contextlib.contextmanager
+    def shared_lookups(self, context):
+        """Share the networks and subnets looked up to build the network
+        info of instances within the block, with the DHCP servers of the
+        subnets.
+        """
+        if context in _SHARED_LOOKUPS:
+            # Nested in a block already sharing the lookups
+            yield
+            return
+        _SHARED_LOOKUPS[context] = {'networks': {}, 'subnets': {}}
+        try:
+            yield
+        finally:
+            _SHARED_LOOKUPS.pop(context, None)
+
+    def get_instances_with_stale_nw_info(self, context, instances, host):
+        """Return the instances on a host whose network info cache differs
+        from the ports bound to the host, listed at once.
+        """
+        client = get_client(context, admin=True)
+        # Neutron ignores the filters on unknown attributes, the ports of
+        # every host would be listed without the port binding extension.
+        if not self._has_port_binding_extension(context, refresh_cache=True,
+                                                neutron=client):
+            raise NotImplementedError()
+        data = client.list_ports(**{'binding:host_id': host})
+        host_ports = collections.defaultdict(list)
+        for port in data.get('ports', []):
+            host_ports[port['device_id']].append(port)
+        return [instance for instance in instances
+                if not self._nw_info_matches_ports(
+                    compute_utils.get_nw_info_for_instance(instance),
+                    host_ports.get(instance.uuid, []))]
+
+    @staticmethod
+    def _nw_info_matches_ports(nw_info, ports):
+        """Whether the VIFs of a network info match the ports, as far as
+        the ports describe them.
+        """
+        ports = {port['id']: port for port in ports}
+        if set(vif['id'] for vif in nw_info) != set(ports):
+            return False
+        for vif in nw_info:
+            port = ports[vif['id']]
+            active = (port['admin_state_up'] is False or
+                      port['status'] == 'ACTIVE')
+            vnic_type = port.get('binding:vnic_type',
+                                 network_model.VNIC_TYPE_NORMAL)
+            details = port.get('binding:vif_details') or {}
+            fixed_ips = sorted(ip['ip_address'] for ip in port['fixed_ips'])
+            if (vif['address'] != port['mac_address'] or
+                    vif['network']['id'] != port['network_id'] or
+                    vif['type'] != port.get('binding:vif_type') or
+                    vif['vnic_type'] != vnic_type or
+                    vif['details'] != details or
+                    vif['profile'] != port.get('binding:profile') or
+                    vif['active'] != active or
+                    sorted(ip['address'] for ip in vif.fixed_ips()) !=
+                    fixed_ips):
+                return False
+        return True
+
     @base_api.refresh_cache
     def add_fixed_ip_to_instance(self, context, instance, network_id):
         """Add a fixed ip to the instance from specified network."""
@@ -1410,20 +1497,20 @@ class API(base_api.NetworkAPI):
             raise exception.FloatingIpMultipleFoundForAddress(address=address)
         return fips[0]
 
-    def _get_floating_ips_by_fixed_and_port(self, client, fixed_ip, port):
-        """Get floatingips from fixed ip and port."""
+    def _get_floating_ips_by_ports(self, client, port_ids):
+        """Get the floatingips associated with any of the ports."""
+        if not port_ids:
+            return []
         try:
-            data = client.list_floatingips(fixed_ip_address=fixed_ip,
-                                           port_id=port)
+            data = client.list_floatingips(port_id=port_ids)
         # If a neutron plugin does not implement the L3 API a 404 from
         # list_floatingips will be raised.
         except neutron_client_exc.NeutronClientException as e:
             if e.status_code == 404:
                 return []
             with excutils.save_and_reraise_exception():
-                LOG.exception(_LE('Unable to access floating IP %(fixed_ip)s '
-                                  'for port %(port_id)s'),
-                              {'fixed_ip': fixed_ip, 'port_id': port})
+                LOG.exception(_LE('Unable to access floating IPs for ports '
+                                  '%s'), port_ids)
         return data['floatingips']
 
     def release_floating_ip(self, context, address,
@@ -1488,21 +1575,23 @@ class API(base_api.NetworkAPI):
         """Force add a network to the project."""
         raise NotImplementedError()
 
-    def _nw_info_get_ips(self, client, port):
+    def _nw_info_get_ips(self, port, floating_ips):
         network_IPs = []
         for fixed_ip in port['fixed_ips']:
             fixed = network_model.FixedIP(address=fixed_ip['ip_address'])
-            floats = self._get_floating_ips_by_fixed_and_port(
-                client, fixed_ip['ip_address'], port['id'])
-            for ip in floats:
+            for ip in floating_ips:
+                if (ip['port_id'] != port['id'] or
+                        ip['fixed_ip_address'] != fixed_ip['ip_address']):
+                    continue
                 fip = network_model.IP(address=ip['floating_ip_address'],
                                        type='floating')
                 fixed.add_floating_ip(fip)
             network_IPs.append(fixed)
         return network_IPs
 
-    def _nw_info_get_subnets(self, context, port, network_IPs):
-        subnets = self._get_subnets_from_port(context, port)
+    def _nw_info_get_subnets(self, context, port, network_IPs,
+                             port_subnets=None):
+        subnets = self._get_subnets_from_port(context, port, port_subnets)
         for subnet in subnets:
             subnet['ips'] = [fixed_ip for fixed_ip in network_IPs
                              if fixed_ip.is_in_subnet(subnet)]
@@ -1632,84 +1721,129 @@ class API(base_api.NetworkAPI):
         if not port_ids:
             port_ids = current_neutron_port_map.keys()
 
+        ports = []
         for port_id in port_ids:
             current_neutron_port = current_neutron_port_map.get(port_id)
             if current_neutron_port:
-                vif_active = False
-                if (current_neutron_port['admin_state_up'] is False
-                    or current_neutron_port['status'] == 'ACTIVE'):
-                    vif_active = True
-
-                network_IPs = self._nw_info_get_ips(client,
-                                                    current_neutron_port)
-                subnets = self._nw_info_get_subnets(context,
-                                                    current_neutron_port,
-                                                    network_IPs)
-
-                devname = "tap" + current_neutron_port['id']
-                devname = devname[:network_model.NIC_NAME_LEN]
-
-                network, ovs_interfaceid = (
-                    self._nw_info_build_network(current_neutron_port,
-                                                networks, subnets))
-                preserve_on_delete = (current_neutron_port['id'] in
-                                      preexisting_port_ids)
-
-                nw_info.append(network_model.VIF(
-                    id=current_neutron_port['id'],
-                    address=current_neutron_port['mac_address'],
-                    network=network,
-                    vnic_type=current_neutron_port.get('binding:vnic_type',
-                        network_model.VNIC_TYPE_NORMAL),
-                    type=current_neutron_port.get('binding:vif_type'),
-                    profile=current_neutron_port.get('binding:profile'),
-                    details=current_neutron_port.get('binding:vif_details'),
-                    ovs_interfaceid=ovs_interfaceid,
-                    devname=devname,
-                    active=vif_active,
-                    preserve_on_delete=preserve_on_delete))
-
+                ports.append(current_neutron_port)
             elif nw_info_refresh:
                 LOG.info(_LI('Port %s from network info_cache is no '
                              'longer associated with instance in Neutron. '
                              'Removing from network info_cache.'), port_id,
                          instance=instance)
 
+        # Look the floating IPs and the subnets of all the ports up at once
+        # rather than port by port.
+        floating_ips = self._get_floating_ips_by_ports(
+            client, [port['id'] for port in ports if port['fixed_ips']])
+        port_subnets = self._get_subnets_and_dhcp_servers(
+            context, [fixed_ip['subnet_id'] for port in ports
+                      for fixed_ip in port['fixed_ips']])
+
+        for current_neutron_port in ports:
+            vif_active = False
+            if (current_neutron_port['admin_state_up'] is False
+                or current_neutron_port['status'] == 'ACTIVE'):
+                vif_active = True
+
+            network_IPs = self._nw_info_get_ips(current_neutron_port,
+                                                floating_ips)
+            subnets = self._nw_info_get_subnets(context,
+                                                current_neutron_port,
+                                                network_IPs, port_subnets)
+
+            devname = "tap" + current_neutron_port['id']
+            devname = devname[:network_model.NIC_NAME_LEN]
+
+            network, ovs_interfaceid = (
+                self._nw_info_build_network(current_neutron_port,
+                                            networks, subnets))
+            preserve_on_delete = (current_neutron_port['id'] in
+                                  preexisting_port_ids)
+
+            nw_info.append(network_model.VIF(
+                id=current_neutron_port['id'],
+                address=current_neutron_port['mac_address'],
+                network=network,
+                vnic_type=current_neutron_port.get('binding:vnic_type',
+                    network_model.VNIC_TYPE_NORMAL),
+                type=current_neutron_port.get('binding:vif_type'),
+                profile=current_neutron_port.get('binding:profile'),
+                details=current_neutron_port.get('binding:vif_details'),
+                ovs_interfaceid=ovs_interfaceid,
+                devname=devname,
+                active=vif_active,
+                preserve_on_delete=preserve_on_delete))
+
         return nw_info
 
-    def _get_subnets_from_port(self, context, port):
-        """Return the subnets for a given port."""
+    def _get_subnets_and_dhcp_servers(self, context, subnet_ids):
+        """Return the subnets with the given ids and the addresses of their
+        DHCP servers, or None, by subnet id.
+
+        The subnets are looked up together, and the DHCP ports of their
+        networks too.  Within shared_lookups each subnet is only looked up
+        once.
+        """
+        lookups = _SHARED_LOOKUPS.get(context)
+        subnets = lookups['subnets'] if lookups is not None else {}
+        missing = [subnet_id for subnet_id in _unique(subnet_ids)
+                   if subnet_id not in subnets]
+        # Since list_subnets(id=[]) returns all subnets visible for the
+        # current tenant, nothing is looked up without subnet ids.
+        if not missing:
+            return subnets
+        client = get_client(context)
+        data = client.list_subnets(id=missing)
+        ipam_subnets = data.get('subnets', [])
+        network_ids = _unique(subnet['network_id'] for subnet in ipam_subnets)
+        dhcp_servers = {}
+        if network_ids:
+            # attempt to populate DHCP server field
+            data = client.list_ports(network_id=network_ids,
+                                     device_owner='network:dhcp')
+            for p in data.get('ports', []):
+                port_subnet_ids = set()
+                for ip_pair in p['fixed_ips']:
+                    if ip_pair['subnet_id'] not in port_subnet_ids:
+                        port_subnet_ids.add(ip_pair['subnet_id'])
+                        dhcp_servers[ip_pair['subnet_id']] = (
+                            ip_pair['ip_address'])
+        for subnet in ipam_subnets:
+            subnets[subnet['id']] = (subnet, dhcp_servers.get(subnet['id']))
+        return subnets
+
+    def _get_subnets_from_port(self, context, port, port_subnets=None):
+        """Return the subnets for a given port.
+
+        :param port_subnets: the subnets of the port and their DHCP servers
+                             by subnet id, as returned by
+                             _get_subnets_and_dhcp_servers, or None to look
+                             them up.
+        """
 
         fixed_ips = port['fixed_ips']
         # No fixed_ips for the port means there is no subnet associated
         # with the network the port is created on.
-        # Since list_subnets(id=[]) returns all subnets visible for the
-        # current tenant, returned subnets may contain subnets which is not
-        # related to the port. To avoid this, the method returns here.
         if not fixed_ips:
             return []
-        search_opts = {'id': [ip['subnet_id'] for ip in fixed_ips]}
-        data = get_client(context).list_subnets(**search_opts)
-        ipam_subnets = data.get('subnets', [])
+        subnet_ids = _unique(ip['subnet_id'] for ip in fixed_ips)
+        if port_subnets is None:
+            port_subnets = self._get_subnets_and_dhcp_servers(context,
+                                                              subnet_ids)
         subnets = []
 
-        for subnet in ipam_subnets:
+        for subnet_id in subnet_ids:
+            if subnet_id not in port_subnets:
+                continue
+            subnet, dhcp_server = port_subnets[subnet_id]
             subnet_dict = {'cidr': subnet['cidr'],
                            'gateway': network_model.IP(
                                 address=subnet['gateway_ip'],
                                 type='gateway'),
             }
-
-            # attempt to populate DHCP server field
-            search_opts = {'network_id': subnet['network_id'],
-                           'device_owner': 'network:dhcp'}
-            data = get_client(context).list_ports(**search_opts)
-            dhcp_ports = data.get('ports', [])
-            for p in dhcp_ports:
-                for ip_pair in p['fixed_ips']:
-                    if ip_pair['subnet_id'] == subnet['id']:
-                        subnet_dict['dhcp_server'] = ip_pair['ip_address']
-                        break
+            if dhcp_server is not None:
+                subnet_dict['dhcp_server'] = dhcp_server
 
             subnet_object = network_model.Subnet(**subnet_dict)
             for dns in subnet.get('dns_nameservers', []):
@@ -1816,3 +1950,12 @@ def _ensure_requested_network_ordering(accessor, unordered, preferred):
     """Sort a list with respect to the preferred network ordering."""
     if preferred:
         unordered.sort(key=lambda i: preferred.index(accessor(i)))
+
+
+def _unique(items):
+    """Return the items without their duplicates, in order."""
+    unique = []
+    for item in items:
+        if item not in unique:
+            unique.append(item)
+    return unique
@@ -1069,6 +1069,31 @@ class InstanceList(base.ObjectListBase, base.NovaObject):
         return _make_instance_list(context, cls(), db_inst_list,
                                    expected_attrs)
 
+    @classmethod
+    def iter_by_filters(cls, context, filters, sort_keys=None,
+                        sort_dirs=None, expected_attrs=None, use_slave=False,
+                        batch_size=1000):
+        """Yield the instances matching the filters, one batch at a time.
+
+        Each batch is a page of get_by_filters() starting after the last
+        instance of the previous one, so the whole list of instances is
+        never held in memory at once.
+        """
+        marker = None
+        while True:
+            # _make_instance_list() modifies expected_attrs
+            attrs = list(expected_attrs) if expected_attrs else expected_attrs
+            batch = cls.get_by_filters(context, filters, limit=batch_size,
+                                       marker=marker, expected_attrs=attrs,
+                                       use_slave=use_slave,
+                                       sort_keys=sort_keys,
+                                       sort_dirs=sort_dirs)
+            for instance in batch:
+                yield instance
+            if len(batch) < batch_size:
+                break
+            marker = batch[-1].uuid
+
     @base.remotable_classmethod
     def get_by_host(cls, context, host, expected_attrs=None, use_slave=False):
         db_inst_list = db.instance_get_all_by_host(
@@ -34,13 +34,16 @@ S3 client with this module::
 
 import bisect
 import datetime
+import hashlib
 import os
 import os.path
+import time
 import urllib
 
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_log import versionutils
+from oslo_utils import excutils
 from oslo_utils import fileutils
 import routes
 import six
@@ -65,6 +68,20 @@ s3_opts = [
     cfg.IntOpt('s3_listen_port',
                default=3333,
                help='Port for S3 API to listen'),
+    cfg.IntOpt('s3_chunk_size',
+               default=65536,
+               help='Size in bytes of the chunks in which the objects are '
+                    'read from and written to disk, so that large objects '
+                    'are streamed rather than held in memory'),
+    cfg.IntOpt('s3_bucket_index_cache_time',
+               default=30,
+               help='Number of seconds the sorted index of the objects of '
+                    'a bucket is cached for listing it, rather than walking '
+                    'the bucket directory on every request.  The index is '
+                    'updated by the objects created and deleted through '
+                    'this server, the objects added to the buckets by other '
+                    'means are listed after this time.  0 disables the '
+                    'cache.'),
 ]
 
 CONF = cfg.CONF
@@ -78,6 +95,36 @@ def get_wsgi_server():
                        host=CONF.s3_listen)
 
 
+class FileIterator(object):
+    """Iterates over the chunks of length bytes of a file, from its
+    current position, so that the file is streamed to the client rather
+    than read into memory.  The file is closed by the WSGI server once the
+    response is sent.
+    """
+
+    def __init__(self, object_file, length, chunk_size):
+        self.object_file = object_file
+        self.length = length
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        if self.length <= 0:
+            raise StopIteration()
+        chunk = self.object_file.read(min(self.chunk_size, self.length))
+        if not chunk:
+            raise StopIteration()
+        self.length -= len(chunk)
+        return chunk
+
+    __next__ = next
+
+    def close(self):
+        self.object_file.close()
+
+
 class S3Application(wsgi.Router):
     """Implementation of an S3-like storage server based on local files.
 
@@ -107,8 +154,55 @@ class S3Application(wsgi.Router):
         self.directory = os.path.abspath(root_directory)
         fileutils.ensure_tree(self.directory)
         self.bucket_depth = bucket_depth
+        # Sorted object names of the buckets and when they were listed,
+        # by bucket name
+        self._bucket_indexes = {}
         super(S3Application, self).__init__(mapper)
 
+    def get_object_names(self, bucket_name, path):
+        """Return the sorted names of the objects of a bucket, from the
+        index of the bucket when it is recent enough.
+        """
+        cache_time = CONF.s3_bucket_index_cache_time
+        index = self._bucket_indexes.get(bucket_name)
+        if index and time.time() - index[0] < cache_time:
+            return index[1]
+
+        listed_at = time.time()
+        object_names = []
+        for root, dirs, files in os.walk(path):
+            for file_name in files:
+                object_names.append(os.path.join(root, file_name))
+        skip = len(path) + 1
+        for i in range(self.bucket_depth):
+            skip += 2 * (i + 1) + 1
+        object_names = [n[skip:] for n in object_names]
+        object_names.sort()
+        if cache_time > 0:
+            self._bucket_indexes[bucket_name] = (listed_at, object_names)
+        return object_names
+
+    def add_to_index(self, bucket_name, object_name):
+        index = self._bucket_indexes.get(bucket_name)
+        if index:
+            object_names = index[1]
+            pos = bisect.bisect_left(object_names, object_name)
+            if (pos == len(object_names) or
+                    object_names[pos] != object_name):
+                object_names.insert(pos, object_name)
+
+    def remove_from_index(self, bucket_name, object_name):
+        index = self._bucket_indexes.get(bucket_name)
+        if index:
+            object_names = index[1]
+            pos = bisect.bisect_left(object_names, object_name)
+            if (pos < len(object_names) and
+                    object_names[pos] == object_name):
+                del object_names[pos]
+
+    def drop_index(self, bucket_name):
+        self._bucket_indexes.pop(bucket_name, None)
+
 
 class BaseRequestHandler(object):
     """Base class emulating Tornado's web framework pattern in WSGI.
@@ -253,15 +347,7 @@ class BucketHandler(BaseRequestHandler):
                 not os.path.isdir(path)):
             self.set_404()
             return
-        object_names = []
-        for root, dirs, files in os.walk(path):
-            for file_name in files:
-                object_names.append(os.path.join(root, file_name))
-        skip = len(path) + 1
-        for i in range(self.application.bucket_depth):
-            skip += 2 * (i + 1) + 1
-        object_names = [n[skip:] for n in object_names]
-        object_names.sort()
+        object_names = self.application.get_object_names(bucket_name, path)
         contents = []
 
         start_pos = 0
@@ -271,7 +357,9 @@ class BucketHandler(BaseRequestHandler):
             start_pos = bisect.bisect_left(object_names, prefix, start_pos)
 
         truncated = False
-        for object_name in object_names[start_pos:]:
+        # Only the requested page of the index is walked
+        for pos in six.moves.range(start_pos, len(object_names)):
+            object_name = object_names[pos]
             if not object_name.startswith(prefix):
                 break
             if len(contents) >= max_keys:
@@ -280,7 +368,11 @@ class BucketHandler(BaseRequestHandler):
             object_path = self._object_path(bucket_name, object_name)
             c = {"Key": object_name}
             if not terse:
-                info = os.stat(object_path)
+                try:
+                    info = os.stat(object_path)
+                except OSError:
+                    # Deleted since the bucket was indexed
+                    continue
                 c.update({
                     "LastModified": datetime.datetime.utcfromtimestamp(
                         info.st_mtime),
@@ -305,6 +397,7 @@ class BucketHandler(BaseRequestHandler):
             self.set_status(403)
             return
         fileutils.ensure_tree(path)
+        self.application.drop_index(bucket_name)
         self.finish()
 
     def delete(self, bucket_name):
@@ -318,6 +411,7 @@ class BucketHandler(BaseRequestHandler):
             self.set_status(403)
             return
         os.rmdir(path)
+        self.application.drop_index(bucket_name)
         self.set_status(204)
         self.finish()
 
@@ -344,11 +438,33 @@ class ObjectHandler(BaseRequestHandler):
         self.set_header("Content-Type", "application/unknown")
         self.set_header("Last-Modified", datetime.datetime.utcfromtimestamp(
             info.st_mtime))
-        object_file = open(path, "r")
-        try:
-            self.finish(object_file.read())
-        finally:
-            object_file.close()
+        self.set_header("Accept-Ranges", "bytes")
+        size = info.st_size
+        offset, length = 0, size
+        byte_range = self.request.range
+        if byte_range is not None:
+            limits = byte_range.range_for_length(size)
+            if limits is None:
+                self.set_header("Content-Range", "bytes */%d" % size)
+                self.set_status(416)
+                return
+            offset, end = limits
+            length = end - offset
+            self.set_header("Content-Range",
+                            str(byte_range.content_range(size)))
+            self.set_status(206)
+
+        object_file = open(path, "rb")
+        # Let the WSGI server send whole files with sendfile() when it can
+        file_wrapper = self.request.environ.get('wsgi.file_wrapper')
+        if file_wrapper is not None and length == size:
+            self.response.app_iter = file_wrapper(object_file,
+                                                  CONF.s3_chunk_size)
+        else:
+            object_file.seek(offset)
+            self.response.app_iter = FileIterator(object_file, length,
+                                                  CONF.s3_chunk_size)
+        self.response.content_length = length
 
     def put(self, bucket, object_name):
         object_name = urllib.unquote(object_name)
@@ -364,11 +480,21 @@ class ObjectHandler(BaseRequestHandler):
             return
         directory = os.path.dirname(path)
         fileutils.ensure_tree(directory)
-        object_file = open(path, "w")
-        object_file.write(self.request.body)
-        object_file.close()
-        self.set_header('ETag',
-                        '"%s"' % utils.get_hash_str(self.request.body))
+        md5 = hashlib.md5()
+        body_file = self.request.body_file
+        try:
+            with open(path, "wb") as object_file:
+                while True:
+                    chunk = body_file.read(CONF.s3_chunk_size)
+                    if not chunk:
+                        break
+                    md5.update(chunk)
+                    object_file.write(chunk)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                fileutils.delete_if_exists(path)
+        self.application.add_to_index(bucket, object_name)
+        self.set_header('ETag', '"%s"' % md5.hexdigest())
         self.finish()
 
     def delete(self, bucket, object_name):
@@ -379,5 +505,6 @@ class ObjectHandler(BaseRequestHandler):
             self.set_404()
             return
         os.unlink(path)
+        self.application.remove_from_index(bucket, object_name)
         self.set_status(204)
         self.finish()
@@ -30,12 +30,14 @@ import nova.console.xvp
 import nova.consoleauth
 import nova.consoleauth.manager
 import nova.consoleauth.rpcapi
+import nova.consoleauth.token_store
 import nova.crypto
 import nova.db.api
 import nova.db.base
 import nova.db.sqlalchemy.api
 import nova.exception
 import nova.image.download.file
+import nova.image.download.ranged
 import nova.image.glance
 import nova.image.s3
 import nova.ipv6.api
@@ -71,7 +73,8 @@ def list_opts():
              [nova.consoleauth.consoleauth_topic_opt],
              [nova.db.base.db_driver_opt],
              [nova.ipv6.api.ipv6_backend_opt],
-             [nova.servicegroup.api.servicegroup_driver_opt],
+             [nova.servicegroup.api.servicegroup_driver_opt,
+              nova.servicegroup.api.servicegroup_cache_time_opt],
              nova.availability_zones.availability_zone_opts,
              nova.cert.rpcapi.rpcapi_opts,
              nova.cloudpipe.pipelib.cloudpipe_opts,
@@ -83,6 +86,7 @@ def list_opts():
              nova.console.rpcapi.rpcapi_opts,
              nova.console.xvp.xvp_opts,
              nova.consoleauth.manager.consoleauth_opts,
+             nova.consoleauth.token_store.token_store_opts,
              nova.crypto.crypto_opts,
              nova.db.api.db_opts,
              nova.db.sqlalchemy.api.db_opts,
@@ -111,6 +115,7 @@ def list_opts():
         ('database', nova.db.sqlalchemy.api.oslo_db_options.database_opts),
         ('glance', nova.image.glance.glance_opts),
         ('image_file_url', [nova.image.download.file.opt_group]),
+        ('image_http_url', nova.image.download.ranged.ranged_opts),
         ('keymgr',
          itertools.chain(
              nova.keymgr.conf_key_mgr.key_mgr_opts,
@@ -0,0 +1,92 @@
+# Copyright (c) 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Lightweight run statistics for filter and weigher plugins.
+"""
+
+import bisect
+
+# Upper bounds, in seconds, of the wall time histogram buckets. The last
+# bucket counts the runs slower than the last bound.
+TIME_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+
+class PluginStats(object):
+    """Counters and wall time histogram of the runs of a single plugin."""
+
+    def __init__(self):
+        self.runs = 0
+        self.skipped = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.objs_in = 0
+        self.objs_out = 0
+        self.emptied = 0
+        self.histogram = [0] * (len(TIME_BUCKETS) + 1)
+
+    def record_run(self, elapsed, objs_in, objs_out=None):
+        """Record a run of the plugin.
+
+        :param elapsed: wall time of the run, in seconds
+        :param objs_in: number of objects given to the plugin
+        :param objs_out: number of objects kept by the plugin, if it filters
+        """
+        self.runs += 1
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+        self.histogram[bisect.bisect_left(TIME_BUCKETS, elapsed)] += 1
+        self.objs_in += objs_in
+        if objs_out is not None:
+            self.objs_out += objs_out
+            if not objs_out:
+                self.emptied += 1
+
+    def record_skip(self):
+        """Record a run avoided by reusing the result of a previous one."""
+        self.skipped += 1
+
+    def to_dict(self):
+        return {'runs': self.runs,
+                'skipped': self.skipped,
+                'total_time': self.total_time,
+                'max_time': self.max_time,
+                'objs_in': self.objs_in,
+                'objs_out': self.objs_out,
+                'emptied': self.emptied,
+                'histogram': list(self.histogram)}
+
+
+class StatsCollector(object):
+    """Run statistics of a set of plugins, keyed by plugin name."""
+
+    def __init__(self):
+        self._stats = {}
+
+    def __getitem__(self, name):
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = PluginStats()
+        return stats
+
+    def to_dict(self):
+        return {name: stats.to_dict()
+                for name, stats in self._stats.items()}
+
+    def reset(self):
+        """Return the statistics as a dict and start collecting anew."""
+        stats = self.to_dict()
+        self._stats = {}
+        return stats
@@ -17,6 +17,7 @@
 """Quotas for instances, and floating ips."""
 
 import datetime
+import time
 
 from oslo_config import cfg
 from oslo_log import log as logging
@@ -93,15 +94,92 @@ quota_opts = [
                     'Note that quotas are not updated on a periodic task, '
                     'they will update on a new reservation if max_age has '
                     'passed since the last reservation'),
+    cfg.IntOpt('quota_limits_cache_time',
+               default=0,
+               help='Number of seconds the quota limits read from the '
+                    'database are cached for. They are flushed when they '
+                    'are updated through this service, but the updates '
+                    'made through other services may only be seen after '
+                    'this time. 0 disables the cache'),
     cfg.StrOpt('quota_driver',
                default='nova.quota.DbQuotaDriver',
-               help='Default driver to use for quota checks'),
+               help='Default driver to use for quota checks. '
+                    'nova.quota.OptimisticQuotaDriver reserves quotas '
+                    'without locking the quota usages, which scales better '
+                    'with concurrent requests of the same project'),
     ]
 
 CONF = cfg.CONF
 CONF.register_opts(quota_opts)
 
 
+class QuotaLimitsCache(object):
+    """Cache of the quota limits of the projects, users and quota classes
+    read from the database.
+
+    The limits are kept for quota_limits_cache_time seconds, or until
+    they are flushed, and the usages are never cached. The hits and
+    misses attributes count the lookups served from the cache and from
+    the database.
+    """
+
+    def __init__(self):
+        # Tuples of (expiration time, limits) keyed by (kind, key...)
+        self._cache = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key, load):
+        cache_time = CONF.quota_limits_cache_time
+        if cache_time <= 0:
+            return load()
+        now = time.time()
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] > now:
+            self.hits += 1
+        else:
+            self.misses += 1
+            cached = (now + cache_time, load())
+            self._cache[key] = cached
+        # The callers may update the returned dictionary
+        return dict(cached[1])
+
+    def get_defaults(self, context):
+        return self._get(('defaults',),
+                         lambda: db.quota_class_get_default(context))
+
+    def get_class_quotas(self, context, quota_class):
+        return self._get(('class', quota_class),
+                         lambda: db.quota_class_get_all_by_name(context,
+                                                                quota_class))
+
+    def get_project_quotas(self, context, project_id):
+        return self._get(('project', project_id),
+                         lambda: db.quota_get_all_by_project(context,
+                                                             project_id))
+
+    def get_user_quotas(self, context, project_id, user_id):
+        return self._get(('user', project_id, user_id),
+                         lambda: db.quota_get_all_by_project_and_user(
+                             context, project_id, user_id))
+
+    def flush(self, project_id=None, quota_class=None):
+        """Flush the limits of a project and its users, and/or of a quota
+        class, or all of them if neither is given.
+        """
+        if project_id is None and quota_class is None:
+            self._cache.clear()
+            return
+        for key in list(self._cache):
+            # NOTE(iuliat): The defaults are the limits of a quota class
+            # too, which may be the one updated.
+            if (key[0] in ('project', 'user') and key[1] == project_id or
+                    quota_class is not None and
+                    (key[0] == 'defaults' or
+                     key[0] == 'class' and key[1] == quota_class)):
+                del self._cache[key]
+
+
 class DbQuotaDriver(object):
     """Driver to perform necessary checks to enforce quotas and obtain
     quota information.  The default driver utilizes the local
@@ -109,6 +187,9 @@ class DbQuotaDriver(object):
     """
     UNLIMITED_VALUE = -1
 
+    def __init__(self):
+        self.limits_cache = QuotaLimitsCache()
+
     def get_by_project_and_user(self, context, project_id, user_id, resource):
         """Get a specific quota by project and user."""
 
@@ -134,7 +215,7 @@ class DbQuotaDriver(object):
         """
 
         quotas = {}
-        default_quotas = db.quota_class_get_default(context)
+        default_quotas = self.limits_cache.get_defaults(context)
         for resource in resources.values():
             quotas[resource.name] = default_quotas.get(resource.name,
                                                        resource.default)
@@ -156,7 +237,8 @@ class DbQuotaDriver(object):
         """
 
         quotas = {}
-        class_quotas = db.quota_class_get_all_by_name(context, quota_class)
+        class_quotas = self.limits_cache.get_class_quotas(context,
+                                                          quota_class)
         for resource in resources.values():
             if defaults or resource.name in class_quotas:
                 quotas[resource.name] = class_quotas.get(resource.name,
@@ -175,7 +257,8 @@ class DbQuotaDriver(object):
         if project_id == context.project_id:
             quota_class = context.quota_class
         if quota_class:
-            class_quotas = db.quota_class_get_all_by_name(context, quota_class)
+            class_quotas = self.limits_cache.get_class_quotas(context,
+                                                              quota_class)
         else:
             class_quotas = {}
 
@@ -241,11 +324,11 @@ class DbQuotaDriver(object):
         if user_quotas:
             user_quotas = user_quotas.copy()
         else:
-            user_quotas = db.quota_get_all_by_project_and_user(context,
-                                                               project_id,
-                                                               user_id)
+            user_quotas = self.limits_cache.get_user_quotas(context,
+                                                            project_id,
+                                                            user_id)
         # Use the project quota for default user quota.
-        proj_quotas = project_quotas or db.quota_get_all_by_project(
+        proj_quotas = project_quotas or self.limits_cache.get_project_quotas(
             context, project_id)
         for key, value in six.iteritems(proj_quotas):
             if key not in user_quotas.keys():
@@ -283,8 +366,9 @@ class DbQuotaDriver(object):
                         will be returned.
         :param project_quotas: Quotas dictionary for the specified project.
         """
-        project_quotas = project_quotas or db.quota_get_all_by_project(
-            context, project_id)
+        project_quotas = (project_quotas or
+                          self.limits_cache.get_project_quotas(context,
+                                                               project_id))
         project_usages = None
         if usages:
             LOG.debug('Getting all quota usages for project: %s', project_id)
@@ -459,7 +543,8 @@ class DbQuotaDriver(object):
             user_id = context.user_id
 
         # Get the applicable quotas
-        project_quotas = db.quota_get_all_by_project(context, project_id)
+        project_quotas = self.limits_cache.get_project_quotas(context,
+                                                              project_id)
         quotas = self._get_quotas(context, resources, values.keys(),
                                   has_sync=False, project_id=project_id,
                                   project_quotas=project_quotas)
@@ -553,7 +638,8 @@ class DbQuotaDriver(object):
         # NOTE(Vek): We're not worried about races at this point.
         #            Yes, the admin may be in the process of reducing
         #            quotas, but that's a pretty rare thing.
-        project_quotas = db.quota_get_all_by_project(context, project_id)
+        project_quotas = self.limits_cache.get_project_quotas(context,
+                                                              project_id)
         LOG.debug('Quota limits for project %(project_id)s: '
                   '%(project_quotas)s', {'project_id': project_id,
                                          'project_quotas': project_quotas})
@@ -577,10 +663,13 @@ class DbQuotaDriver(object):
         #            which means access to the session.  Since the
         #            session isn't available outside the DBAPI, we
         #            have to do the work there.
-        return db.quota_reserve(context, resources, quotas, user_quotas,
-                                deltas, expire,
-                                CONF.until_refresh, CONF.max_age,
-                                project_id=project_id, user_id=user_id)
+        return self._quota_reserve(context, resources, quotas, user_quotas,
+                                   deltas, expire,
+                                   CONF.until_refresh, CONF.max_age,
+                                   project_id=project_id, user_id=user_id)
+
+    def _quota_reserve(self, context, *args, **kwargs):
+        return db.quota_reserve(context, *args, **kwargs)
 
     def commit(self, context, reservations, project_id=None, user_id=None):
         """Commit reservations.
@@ -667,6 +756,7 @@ class DbQuotaDriver(object):
         """
 
         db.quota_destroy_all_by_project_and_user(context, project_id, user_id)
+        self.limits_cache.flush(project_id=project_id)
 
     def destroy_all_by_project(self, context, project_id):
         """Destroy all quotas, usages, and reservations associated with a
@@ -677,6 +767,18 @@ class DbQuotaDriver(object):
         """
 
         db.quota_destroy_all_by_project(context, project_id)
+        self.limits_cache.flush(project_id=project_id)
+
+    def flush_limits(self, project_id=None, quota_class=None):
+        """Flush the cached quota limits of a project and its users, and/or
+        of a quota class, or all of them if neither is given.
+
+        :param project_id: The ID of the project whose limits were updated.
+        :param quota_class: The name of the quota class whose limits were
+                            updated.
+        """
+        self.limits_cache.flush(project_id=project_id,
+                                quota_class=quota_class)
 
     def expire(self, context):
         """Expire reservations.
@@ -690,6 +792,67 @@ class DbQuotaDriver(object):
         db.reservation_expire(context)
 
 
+class OptimisticQuotaDriver(DbQuotaDriver):
+    """Driver to enforce quotas with the local database, like
+    DbQuotaDriver, without locking the quota usages.
+
+    The reservations read the quota usages without SELECT ... FOR UPDATE
+    and write them only if they were not changed in the meantime,
+    retrying otherwise, and the commits and rollbacks update them with
+    atomic increments. This avoids serializing the concurrent
+    reservations of a project on the locks of its usages, at the cost
+    of a second read of the project usages once a reservation is made.
+    """
+
+    def _quota_reserve(self, context, *args, **kwargs):
+        return db.quota_reserve_optimistic(context, *args, **kwargs)
+
+    def commit(self, context, reservations, project_id=None, user_id=None):
+        """Commit reservations.
+
+        :param context: The request context, for access checks.
+        :param reservations: A list of the reservation UUIDs, as
+                             returned by the reserve() method.
+        :param project_id: Specify the project_id if current context
+                           is admin and admin wants to impact on
+                           common user's tenant.
+        :param user_id: Specify the user_id if current context
+                        is admin and admin wants to impact on
+                        common user.
+        """
+        db.reservation_commit_optimistic(context, reservations,
+                                         project_id=project_id,
+                                         user_id=user_id)
+
+    def rollback(self, context, reservations, project_id=None, user_id=None):
+        """Roll back reservations.
+
+        :param context: The request context, for access checks.
+        :param reservations: A list of the reservation UUIDs, as
+                             returned by the reserve() method.
+        :param project_id: Specify the project_id if current context
+                           is admin and admin wants to impact on
+                           common user's tenant.
+        :param user_id: Specify the user_id if current context
+                        is admin and admin wants to impact on
+                        common user.
+        """
+        db.reservation_rollback_optimistic(context, reservations,
+                                           project_id=project_id,
+                                           user_id=user_id)
+
+    def expire(self, context):
+        """Expire reservations.
+
+        Explores all currently existing reservations and rolls back
+        any that have expired.
+
+        :param context: The request context, for access checks.
+        """
+
+        db.reservation_expire_optimistic(context)
+
+
 class NoopQuotaDriver(object):
     """Driver that turns quotas calls into no-ops and pretends that quotas
     for all resources are unlimited.  This can be used if you do not
@@ -962,6 +1125,16 @@ class NoopQuotaDriver(object):
         """
         pass
 
+    def flush_limits(self, project_id=None, quota_class=None):
+        """Flush the cached quota limits of a project and its users, and/or
+        of a quota class, or all of them if neither is given.
+
+        :param project_id: The ID of the project whose limits were updated.
+        :param quota_class: The name of the quota class whose limits were
+                            updated.
+        """
+        pass
+
 
 class BaseResource(object):
     """Describe a single resource for quota checking."""
@@ -1443,6 +1616,21 @@ class QuotaEngine(object):
 
         self._driver.expire(context)
 
+    def flush_limits(self, project_id=None, quota_class=None):
+        """Flush the cached quota limits of a project and its users, and/or
+        of a quota class, or all of them if neither is given.
+
+        :param project_id: The ID of the project whose limits were updated.
+        :param quota_class: The name of the quota class whose limits were
+                            updated.
+        """
+
+        # quota_driver is pluggable, and the drivers which don't cache the
+        # limits don't need to provide flush_limits().
+        flush_limits = getattr(self._driver, 'flush_limits', None)
+        if flush_limits is not None:
+            flush_limits(project_id=project_id, quota_class=quota_class)
+
     @property
     def resources(self):
         return sorted(self._resources.keys())
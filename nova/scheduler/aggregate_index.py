@@ -0,0 +1,130 @@
+# Copyright (c) 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Inverted index of the aggregate metadata, by key and value, to hosts.
+
+The aggregate filters use it to look up which hosts have a given metadata
+key or value, instead of merging the metadata of the aggregates of every
+host for each request. Values are split on commas, like
+nova.scheduler.filters.utils.aggregate_metadata_get_by_host() does.
+"""
+
+import six
+
+
+def _get_field(aggregate, name):
+    if aggregate.obj_attr_is_set(name):
+        return getattr(aggregate, name)
+    return None
+
+
+def _split_values(value):
+    return set(x.strip() for x in value.split(','))
+
+
+class AggregateMetadataIndex(object):
+    """Hosts having each aggregate metadata key and key/value pair.
+
+    A host can get the same key or value from several aggregates, so the
+    index counts the contributing aggregates of each host.
+    """
+
+    def __init__(self):
+        # Dict of {host: count} keyed by metadata key
+        self._hosts_by_key = {}
+        # Dict of {host: count} keyed by (metadata key, value)
+        self._hosts_by_value = {}
+        # Dict of {value: count} keyed by metadata key
+        self._values_by_key = {}
+        # Dict of the indexed (hosts, metadata) keyed by aggregate ID
+        self._aggregates = {}
+
+    @staticmethod
+    def _add(mapping, key, items):
+        counts = mapping.setdefault(key, {})
+        for item in items:
+            counts[item] = counts.get(item, 0) + 1
+
+    @staticmethod
+    def _remove(mapping, key, items):
+        counts = mapping.get(key)
+        if counts is None:
+            return
+        for item in items:
+            count = counts.get(item, 0) - 1
+            if count > 0:
+                counts[item] = count
+            else:
+                counts.pop(item, None)
+        if not counts:
+            del mapping[key]
+
+    def _index(self, hosts, metadata, remove=False):
+        change = self._remove if remove else self._add
+        for key, values in six.iteritems(metadata):
+            change(self._hosts_by_key, key, hosts)
+            change(self._values_by_key, key, values)
+            for value in values:
+                change(self._hosts_by_value, (key, value), hosts)
+
+    def update(self, aggregate):
+        """Index an aggregate, replacing its previously indexed version."""
+        self.delete(aggregate)
+        hosts = tuple(_get_field(aggregate, 'hosts') or ())
+        metadata = {key: _split_values(value) for key, value
+                    in six.iteritems(_get_field(aggregate, 'metadata') or {})}
+        self._aggregates[aggregate.id] = (hosts, metadata)
+        self._index(hosts, metadata)
+
+    def delete(self, aggregate):
+        """Remove an aggregate from the index."""
+        indexed = self._aggregates.pop(aggregate.id, None)
+        if indexed is not None:
+            self._index(*indexed, remove=True)
+
+    def hosts_with_key(self, key):
+        """Return a container of the hosts having the metadata key."""
+        return self._hosts_by_key.get(key, {})
+
+    def hosts_with_value(self, key, value):
+        """Return a container of the hosts having the metadata key/value."""
+        try:
+            return self._hosts_by_value.get((key, value), {})
+        except TypeError:
+            # Unhashable values can't be in the metadata
+            return {}
+
+    def values(self, key):
+        """Return the values of the metadata key over all aggregates."""
+        return list(self._values_by_key.get(key, ()))
+
+    def hosts_matching(self, key, predicate, hosts=None):
+        """Return the set of hosts having a value of the metadata key for
+        which the predicate is true.
+
+        :param hosts: if given, only the values of these hosts are checked
+                      and only these hosts are returned
+        """
+        matching = set()
+        for value in self.values(key):
+            value_hosts = self._hosts_by_value[(key, value)]
+            if hosts is not None:
+                value_hosts = hosts.intersection(value_hosts)
+                if not value_hosts:
+                    continue
+            if predicate(value):
+                matching.update(value_hosts)
+        return matching
@@ -44,6 +44,9 @@ class CachingScheduler(filter_scheduler.FilterScheduler):
     copy of the cache. So if you run multiple schedulers, you will get
     more retries, because the data stored on any additional scheduler will
     be more out of date, than if it was fetched from the database.
+    Setting scheduler_use_host_state_cache (with memcached_servers) makes
+    the periodic task only refresh the hosts whose compute node changed
+    since the last run, from a cache shared by all the schedulers.
 
     In a similar way, if you have a high number of server deletes, the
     extra capacity from those deletes will not show up until the cache is
@@ -13,13 +13,20 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from nova.scheduler import host_state_cache
+
 
 class SchedulerReportClient(object):
     """Client class for updating the scheduler."""
 
+    def __init__(self):
+        self.host_state_cache = host_state_cache.get_host_state_cache()
+
     def update_resource_stats(self, compute_node):
         """Creates or updates stats for the supplied compute node.
 
         :param compute_node: updated nova.objects.ComputeNode to report
         """
         compute_node.save()
+        if self.host_state_cache:
+            self.host_state_cache.update_compute_node(compute_node)
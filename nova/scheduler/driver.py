@@ -53,8 +53,7 @@ class Scheduler(object):
 
         services = db.service_get_all_by_topic(context, topic)
         return [service['host']
-                for service in services
-                if self.servicegroup_api.service_is_up(service)]
+                for service in self.servicegroup_api.get_up_services(services)]
 
     def select_destinations(self, context, request_spec, filter_properties):
         """Must override select_destinations method.
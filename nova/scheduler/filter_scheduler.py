@@ -19,6 +19,7 @@ You can customize this scheduler by specifying your own Host Filters and
 Weighing Functions.
 """
 
+import heapq
 import random
 
 from oslo_config import cfg
@@ -45,7 +46,15 @@ filter_scheduler_opts = [
                     'chosen from. A value of 1 chooses the '
                     'first host returned by the weighing functions. '
                     'This value must be at least 1. Any value less than 1 '
-                    'will be ignored, and 1 will be used instead')
+                    'will be ignored, and 1 will be used instead'),
+    cfg.BoolOpt('scheduler_bulk_placement',
+                default=False,
+                help='When a request is for several instances, filter and '
+                     'weigh all the hosts only once. After each placement, '
+                     'only the chosen host is filtered and weighed again, '
+                     'plus all the candidate hosts for the filters whose '
+                     'result depends on the previous placements, like the '
+                     'server group affinity filters.'),
 ]
 
 CONF.register_opts(filter_scheduler_opts)
@@ -128,6 +137,10 @@ class FilterScheduler(driver.Scheduler):
 
         selected_hosts = []
         num_instances = request_spec.get('num_instances', 1)
+        if CONF.scheduler_bulk_placement and num_instances > 1:
+            return self._schedule_bulk(hosts, num_instances,
+                                       instance_properties,
+                                       filter_properties)
         for num in range(num_instances):
             # Filter local hosts based on requirements ...
             hosts = self.host_manager.get_filtered_hosts(hosts,
@@ -143,11 +156,8 @@ class FilterScheduler(driver.Scheduler):
 
             LOG.debug("Weighed %(hosts)s", {'hosts': weighed_hosts})
 
-            scheduler_host_subset_size = CONF.scheduler_host_subset_size
-            if scheduler_host_subset_size > len(weighed_hosts):
-                scheduler_host_subset_size = len(weighed_hosts)
-            if scheduler_host_subset_size < 1:
-                scheduler_host_subset_size = 1
+            scheduler_host_subset_size = self._get_subset_size(
+                len(weighed_hosts))
 
             chosen_host = random.choice(
                 weighed_hosts[0:scheduler_host_subset_size])
@@ -167,6 +177,107 @@ class FilterScheduler(driver.Scheduler):
                 filter_properties['group_hosts'].add(chosen_host.obj.host)
         return selected_hosts
 
+    @staticmethod
+    def _get_subset_size(num_hosts):
+        scheduler_host_subset_size = CONF.scheduler_host_subset_size
+        if scheduler_host_subset_size > num_hosts:
+            scheduler_host_subset_size = num_hosts
+        if scheduler_host_subset_size < 1:
+            scheduler_host_subset_size = 1
+        return scheduler_host_subset_size
+
+    def _schedule_bulk(self, hosts, num_instances, instance_properties,
+                       filter_properties):
+        """Returns a list of hosts for all the instances of a request,
+        filtering and weighing all the hosts only once.
+
+        The hosts are taken in order from the weighed hosts, so that only
+        the best ones are looked at, merged with a heap of the hosts which
+        were weighed again. Once a host is chosen and its resources
+        consumed, only that host is filtered and weighed again before going
+        into the heap.
+        """
+        update_group_hosts = filter_properties.get('group_updated', False)
+        placement_filters = [
+            filter_.__class__.__name__
+            for filter_ in self.host_manager.default_filters
+            if filter_.depends_on_placements]
+
+        hosts = self.host_manager.get_filtered_hosts(hosts,
+                filter_properties, index=0)
+        if not hosts:
+            return []
+        weighed_hosts = self.host_manager.get_weighed_hosts(hosts,
+                filter_properties)
+        # NOTE(iuliat): The heap entries are (-weight, sequence, host). The
+        # sequence number keeps the weighing order between hosts having the
+        # same weight, and avoids comparing the hosts.
+        num_weighed = len(weighed_hosts)
+        position = 0
+        counter = num_weighed
+        heap = []
+
+        selected_hosts = []
+        for num in range(num_instances):
+            subset_size = self._get_subset_size(
+                len(heap) + num_weighed - position)
+            candidates = []
+            while len(candidates) < subset_size:
+                entry = None
+                if position < num_weighed:
+                    weighed_host = weighed_hosts[position]
+                    entry = (-weighed_host.weight, position, weighed_host)
+                if heap and (entry is None or heap[0][:2] < entry[:2]):
+                    entry = heapq.heappop(heap)
+                elif entry is not None:
+                    position += 1
+                else:
+                    break
+                # The hosts placed on by the previous instances of the
+                # request can make the others fail the placement filters.
+                if (num and placement_filters and
+                        not self.host_manager.get_filtered_hosts(
+                            [entry[2].obj], filter_properties,
+                            filter_class_names=placement_filters,
+                            index=num)):
+                    continue
+                candidates.append(entry)
+            if not candidates:
+                # Can't get any more locally.
+                break
+
+            chosen = random.choice(candidates)
+            for candidate in candidates:
+                if candidate is not chosen:
+                    heapq.heappush(heap, candidate)
+            chosen_host = chosen[2]
+            LOG.debug("Selected host: %(host)s", {'host': chosen_host})
+            selected_hosts.append(chosen_host)
+
+            # Now consume the resources so the filter/weights
+            # will change for the next instance.
+            chosen_host.obj.consume_from_instance(instance_properties)
+            if update_group_hosts is True:
+                # NOTE(sbauza): Group details are serialized into a list now
+                # that they are populated by the conductor, we need to
+                # deserialize them
+                if isinstance(filter_properties['group_hosts'], list):
+                    filter_properties['group_hosts'] = set(
+                        filter_properties['group_hosts'])
+                filter_properties['group_hosts'].add(chosen_host.obj.host)
+
+            if num + 1 == num_instances:
+                break
+
+            if self.host_manager.get_filtered_hosts([chosen_host.obj],
+                    filter_properties, index=num + 1):
+                weighed_host = self.host_manager.get_weighed_host(
+                    chosen_host.obj, filter_properties)
+                counter += 1
+                heapq.heappush(heap, (-weighed_host.weight, counter,
+                                      weighed_host))
+        return selected_hosts
+
     def _get_all_host_states(self, context):
         """Template method, so a subclass can implement caching."""
         return self.host_manager.get_all_host_states(context)
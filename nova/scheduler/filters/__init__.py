@@ -17,11 +17,56 @@
 Scheduler host filters
 """
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from nova import filters
+from nova import plugin_stats
+
+
+class HostStateColumns(object):
+    """Columnar view of HostState attributes used by the filter masks.
+
+    The columns are NumPy arrays of float64 built lazily, the first time an
+    attribute is requested, and shared by all the filters of a request until
+    a filter without a batch form changes the list of hosts.
+    """
+
+    def __init__(self, host_states, columns=None):
+        self.objs = host_states
+        self._columns = columns or {}
+
+    def __len__(self):
+        return len(self.objs)
+
+    def __getitem__(self, attr):
+        column = self._columns.get(attr)
+        if column is None:
+            column = numpy.array([getattr(host_state, attr)
+                                  for host_state in self.objs],
+                                 dtype=numpy.float64)
+            self._columns[attr] = column
+        return column
+
+    def compress(self, mask):
+        """Return the columns of the hosts selected by the mask."""
+        mask = numpy.asarray(mask, dtype=bool)
+        objs = [host_state for host_state, selected
+                in zip(self.objs, mask) if selected]
+        columns = {attr: column[mask]
+                   for attr, column in self._columns.items()}
+        return HostStateColumns(objs, columns)
 
 
 class BaseHostFilter(filters.BaseFilter):
     """Base class for host filters."""
+
+    # Inverted index of the aggregate metadata, set by the HostManager which
+    # loads the filter
+    aggregate_index = None
+
     def _filter_one(self, obj, filter_properties):
         """Return True if the object passes the filter, otherwise False."""
         return self.host_passes(obj, filter_properties)
@@ -34,8 +79,15 @@ class BaseHostFilter(filters.BaseFilter):
 
 
 class HostFilterHandler(filters.BaseFilterHandler):
-    def __init__(self):
+    def __init__(self, use_batch_filters=False):
         super(HostFilterHandler, self).__init__(BaseHostFilter)
+        self.use_batch_filters = use_batch_filters and numpy is not None
+        self.stats = plugin_stats.StatsCollector()
+
+    def get_columns(self, objs):
+        if not self.use_batch_filters:
+            return None
+        return HostStateColumns(objs)
 
 
 def all_filters():
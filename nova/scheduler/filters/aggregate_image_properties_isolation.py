@@ -49,6 +49,25 @@ class AggregateImagePropertiesIsolation(filters.BaseHostFilter):
 
         spec = filter_properties.get('request_spec', {})
         image_props = spec.get('image', {}).get('properties', {})
+
+        index = self.aggregate_index
+        if index is not None:
+            host = host_state.host
+            for key, prop in six.iteritems(image_props):
+                if not prop or (cfg_namespace and not key.startswith(
+                        cfg_namespace + cfg_separator)):
+                    continue
+                if (host in index.hosts_with_key(key) and
+                        host not in index.hosts_with_value(key, prop)):
+                    LOG.debug("%(host_state)s fails image aggregate "
+                              "properties requirements. Property %(prop)s "
+                              "does not match %(key)s of its aggregates.",
+                              {'host_state': host_state,
+                               'prop': prop,
+                               'key': key})
+                    return False
+            return True
+
         metadata = utils.aggregate_metadata_get_by_host(host_state)
 
         for key, options in six.iteritems(metadata):
@@ -33,6 +33,46 @@ class AggregateInstanceExtraSpecsFilter(filters.BaseHostFilter):
     # Aggregate data and instance type does not change within a request
     run_filter_once_per_request = True
 
+    @staticmethod
+    def _get_specs(instance_type):
+        """Yield the (aggregate metadata key, requirement) pairs of the extra
+        specs which are either not scoped or in our scope.
+        """
+        for key, req in six.iteritems(instance_type['extra_specs']):
+            # Either not scope format, or aggregate_instance_extra_specs scope
+            scope = key.split(':', 1)
+            if len(scope) > 1:
+                if scope[0] != _SCOPE:
+                    continue
+                else:
+                    del scope[0]
+            yield scope[0], req
+
+    def filter_all(self, filter_obj_list, filter_properties):
+        """Look up the hosts matching each extra spec once per request in the
+        aggregate metadata index, when the host manager provides one.
+
+        Only the metadata values of the hosts still passing are matched, so
+        that, as with host_passes(), a value which can't be compared to the
+        requirement only raises if it is on one of these hosts.
+        """
+        index = self.aggregate_index
+        instance_type = filter_properties.get('instance_type')
+        if index is None or 'extra_specs' not in instance_type:
+            return super(AggregateInstanceExtraSpecsFilter, self).filter_all(
+                filter_obj_list, filter_properties)
+
+        filter_obj_list = list(filter_obj_list)
+        hosts = set(obj.host for obj in filter_obj_list)
+        for key, req in self._get_specs(instance_type):
+            hosts = index.hosts_matching(
+                key, lambda value: extra_specs_ops.match(value, req),
+                hosts=hosts)
+            LOG.debug("%(num_hosts)d host(s) match instance_type extra_spec "
+                      "%(key)s '%(req)s'",
+                      {'num_hosts': len(hosts), 'key': key, 'req': req})
+        return (obj for obj in filter_obj_list if obj.host in hosts)
+
     def host_passes(self, host_state, filter_properties):
         """Return a list of hosts that can create instance_type
 
@@ -45,15 +85,7 @@ class AggregateInstanceExtraSpecsFilter(filters.BaseHostFilter):
 
         metadata = utils.aggregate_metadata_get_by_host(host_state)
 
-        for key, req in six.iteritems(instance_type['extra_specs']):
-            # Either not scope format, or aggregate_instance_extra_specs scope
-            scope = key.split(':', 1)
-            if len(scope) > 1:
-                if scope[0] != _SCOPE:
-                    continue
-                else:
-                    del scope[0]
-            key = scope[0]
+        for key, req in self._get_specs(instance_type):
             aggregate_vals = metadata.get(key, None)
             if not aggregate_vals:
                 LOG.debug("%(host_state)s fails instance_type extra_specs "
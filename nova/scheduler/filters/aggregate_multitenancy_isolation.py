@@ -40,6 +40,16 @@ class AggregateMultiTenancyIsolation(filters.BaseHostFilter):
         props = spec.get('instance_properties', {})
         tenant_id = props.get('project_id')
 
+        index = self.aggregate_index
+        if index is not None:
+            host = host_state.host
+            if (host in index.hosts_with_key('filter_tenant_id') and
+                    host not in index.hosts_with_value('filter_tenant_id',
+                                                       tenant_id)):
+                LOG.debug("%s fails tenant id on aggregate", host_state)
+                return False
+            return True
+
         metadata = utils.aggregate_metadata_get_by_host(host_state,
                                                         key="filter_tenant_id")
 
@@ -44,6 +44,11 @@ class AvailabilityZoneFilter(filters.BaseHostFilter):
         if not availability_zone:
             return True
 
+        index = self.aggregate_index
+        if index is not None:
+            return self._host_passes_indexed(index, host_state,
+                                             availability_zone)
+
         metadata = utils.aggregate_metadata_get_by_host(
                 host_state, key='availability_zone')
 
@@ -62,3 +67,17 @@ class AvailabilityZoneFilter(filters.BaseHostFilter):
                        'host_az': host_az})
 
         return hosts_passes
+
+    @staticmethod
+    def _host_passes_indexed(index, host_state, availability_zone):
+        host = host_state.host
+        if host in index.hosts_with_value('availability_zone',
+                                          availability_zone):
+            return True
+        if (availability_zone == CONF.default_availability_zone and
+                host not in index.hosts_with_key('availability_zone')):
+            return True
+        LOG.debug("Availability Zone '%(az)s' requested. "
+                  "%(host_state)s is not in it.",
+                  {'host_state': host_state, 'az': availability_zone})
+        return False
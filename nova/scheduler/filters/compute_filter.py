@@ -34,17 +34,38 @@ class ComputeFilter(filters.BaseHostFilter):
     # Host state does not change within a request
     run_filter_once_per_request = True
 
-    def host_passes(self, host_state, filter_properties):
-        """Returns True for only active compute nodes."""
+    @staticmethod
+    def _is_disabled(host_state):
         service = host_state.service
         if service['disabled']:
             LOG.debug("%(host_state)s is disabled, reason: %(reason)s",
                       {'host_state': host_state,
                        'reason': service.get('disabled_reason')})
+            return True
+        return False
+
+    @staticmethod
+    def _check_up(host_state, is_up):
+        if not is_up:
+            LOG.warning(_LW("%(host_state)s has not been heard from in a "
+                            "while"), {'host_state': host_state})
+        return is_up
+
+    def host_passes(self, host_state, filter_properties):
+        """Returns True for only active compute nodes."""
+        if self._is_disabled(host_state):
             return False
-        else:
-            if not self.servicegroup_api.service_is_up(service):
-                LOG.warning(_LW("%(host_state)s has not been heard from in a "
-                                "while"), {'host_state': host_state})
-                return False
-        return True
+        is_up = self.servicegroup_api.service_is_up(host_state.service)
+        return self._check_up(host_state, is_up)
+
+    def filter_all(self, filter_obj_list, filter_properties):
+        """Yield the active compute nodes, checking whether the services of
+        all of them are up at once.
+        """
+        host_states = [host_state for host_state in filter_obj_list
+                       if not self._is_disabled(host_state)]
+        is_up = self.servicegroup_api.is_up_many(
+            [host_state.service for host_state in host_states])
+        for host_state, host_is_up in zip(host_states, is_up):
+            if self._check_up(host_state, host_is_up):
+                yield host_state
@@ -80,6 +80,36 @@ class CoreFilter(BaseCoreFilter):
     def _get_cpu_allocation_ratio(self, host_state, filter_properties):
         return CONF.cpu_allocation_ratio
 
+    def filter_mask(self, columns, filter_properties):
+        """Keep the hosts which have sufficient CPU cores, all at once."""
+        instance_type = filter_properties.get('instance_type')
+        if not instance_type:
+            return [True] * len(columns)
+
+        instance_vcpus = instance_type['vcpus']
+        cpu_allocation_ratio = CONF.cpu_allocation_ratio
+        vcpus_total = columns['vcpus_total'] * cpu_allocation_ratio
+        free_vcpus = vcpus_total - columns['vcpus_used']
+        mask = free_vcpus >= instance_vcpus
+
+        broken_hosts = 0
+        for i, host_state in enumerate(columns.objs):
+            if not host_state.vcpus_total:
+                # Fail safe
+                broken_hosts += 1
+                mask[i] = True
+                continue
+            # Only provide a VCPU limit to compute if the virt driver is
+            # reporting an accurate count of installed VCPUs. (XenServer
+            # driver does not)
+            host_vcpus_total = host_state.vcpus_total * cpu_allocation_ratio
+            if host_vcpus_total > 0:
+                host_state.limits['vcpu'] = host_vcpus_total
+        if broken_hosts:
+            LOG.warning(_LW("VCPUs not set on %d host(s); assuming CPU "
+                            "collection broken"), broken_hosts)
+        return mask
+
 
 class AggregateCoreFilter(BaseCoreFilter):
     """AggregateCoreFilter with per-aggregate CPU subscription flag.
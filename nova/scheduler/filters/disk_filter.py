@@ -64,6 +64,27 @@ class DiskFilter(filters.BaseHostFilter):
         host_state.limits['disk_gb'] = disk_gb_limit
         return True
 
+    def filter_mask(self, columns, filter_properties):
+        """Filter all the hosts at once based on disk usage."""
+        instance_type = filter_properties.get('instance_type')
+        if not instance_type:
+            return None
+        requested_disk = (1024 * (instance_type['root_gb'] +
+                                 instance_type['ephemeral_gb']) +
+                         instance_type['swap'])
+        disk_allocation_ratio = CONF.disk_allocation_ratio
+        total_usable_disk_mb = columns['total_usable_disk_gb'] * 1024
+        disk_mb_limit = total_usable_disk_mb * disk_allocation_ratio
+        used_disk_mb = total_usable_disk_mb - columns['free_disk_mb']
+        mask = disk_mb_limit - used_disk_mb >= requested_disk
+
+        for host_state, passes in zip(columns.objs, mask):
+            if passes:
+                host_disk_mb_limit = (host_state.total_usable_disk_gb *
+                                      1024 * disk_allocation_ratio)
+                host_state.limits['disk_gb'] = host_disk_mb_limit / 1024
+        return mask
+
 
 class AggregateDiskFilter(DiskFilter):
     """AggregateDiskFilter with per-aggregate disk allocation ratio flag.
@@ -84,3 +105,8 @@ class AggregateDiskFilter(DiskFilter):
             ratio = CONF.disk_allocation_ratio
 
         return ratio
+
+    def filter_mask(self, columns, filter_properties):
+        # NOTE(iuliat): The allocation ratio depends on the aggregates of each
+        # host, so there is no batch form for this filter.
+        return None
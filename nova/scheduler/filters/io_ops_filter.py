@@ -54,6 +54,9 @@ class IoOpsFilter(filters.BaseHostFilter):
                          'max_io_ops': max_io_ops})
         return passes
 
+    def filter_mask(self, columns, filter_properties):
+        return columns['num_io_ops'] < CONF.max_io_ops_per_host
+
 
 class AggregateIoOpsFilter(IoOpsFilter):
     """AggregateIoOpsFilter with per-aggregate the max io operations.
@@ -73,3 +76,8 @@ class AggregateIoOpsFilter(IoOpsFilter):
             value = CONF.max_io_ops_per_host
 
         return value
+
+    def filter_mask(self, columns, filter_properties):
+        # NOTE(iuliat): The maximum depends on the aggregates of each host, so
+        # there is no batch form for this filter.
+        return None
@@ -48,6 +48,9 @@ class NumInstancesFilter(filters.BaseHostFilter):
                          'max_instances': max_instances})
         return passes
 
+    def filter_mask(self, columns, filter_properties):
+        return columns['num_instances'] < CONF.max_instances_per_host
+
 
 class AggregateNumInstancesFilter(NumInstancesFilter):
     """AggregateNumInstancesFilter with per-aggregate the max num instances.
@@ -69,3 +72,8 @@ class AggregateNumInstancesFilter(NumInstancesFilter):
             value = CONF.max_instances_per_host
 
         return value
+
+    def filter_mask(self, columns, filter_properties):
+        # NOTE(iuliat): The maximum depends on the aggregates of each host, so
+        # there is no batch form for this filter.
+        return None
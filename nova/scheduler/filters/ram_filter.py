@@ -71,6 +71,28 @@ class RamFilter(BaseRamFilter):
     def _get_ram_allocation_ratio(self, host_state, filter_properties):
         return CONF.ram_allocation_ratio
 
+    def filter_mask(self, columns, filter_properties):
+        """Only keep the hosts with sufficient available RAM, all at once."""
+        instance_type = filter_properties.get('instance_type')
+        if not instance_type:
+            return None
+        requested_ram = instance_type['memory_mb']
+        ram_allocation_ratio = CONF.ram_allocation_ratio
+        total_usable_ram_mb = columns['total_usable_ram_mb']
+        memory_mb_limit = total_usable_ram_mb * ram_allocation_ratio
+        used_ram_mb = total_usable_ram_mb - columns['free_ram_mb']
+        mask = memory_mb_limit - used_ram_mb >= requested_ram
+
+        # save oversubscription limit for compute node to test against:
+        for host_state, passes in zip(columns.objs, mask):
+            if passes:
+                host_state.limits['memory_mb'] = (
+                    host_state.total_usable_ram_mb * ram_allocation_ratio)
+        LOG.debug("%(failed)d host(s) do not have %(requested_ram)s MB "
+                  "usable ram", {'failed': len(mask) - mask.sum(),
+                                 'requested_ram': requested_ram})
+        return mask
+
 
 class AggregateRamFilter(BaseRamFilter):
     """AggregateRamFilter with per-aggregate ram subscription flag.
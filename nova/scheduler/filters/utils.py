@@ -75,10 +75,9 @@ def instance_uuids_overlap(host_state, uuids):
     """
     if isinstance(uuids, six.string_types):
         uuids = [uuids]
-    set_uuids = set(uuids)
-    # host_state.instances is a dict whose keys are the instance uuids
-    host_uuids = set(host_state.instances.keys())
-    return bool(host_uuids.intersection(set_uuids))
+    # host_state.instances is a dict whose keys are the instance uuids, so
+    # each uuid is looked up instead of building a set of the instances
+    return any(uuid in host_state.instances for uuid in uuids)
 
 
 def other_types_on_host(host_state, instance_type_id):
@@ -88,7 +87,5 @@ def other_types_on_host(host_state, instance_type_id):
     Returns True if there are any instances in the host_state whose
     instance_type_id is different than the supplied instance_type_id value.
     """
-    host_instances = host_state.instances.values()
-    host_types = set([inst.instance_type_id for inst in host_instances])
-    inst_set = set([instance_type_id])
-    return bool(host_types - inst_set)
+    return any(inst.instance_type_id != instance_type_id
+               for inst in six.itervalues(host_state.instances))
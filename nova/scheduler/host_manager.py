@@ -39,7 +39,10 @@ from nova import exception
 from nova.i18n import _, _LI, _LW
 from nova import objects
 from nova.pci import stats as pci_stats
+from nova import plugin_stats
+from nova.scheduler import aggregate_index
 from nova.scheduler import filters
+from nova.scheduler import host_state_cache
 from nova.scheduler import weights
 from nova import utils
 from nova.virt import hardware
@@ -71,6 +74,17 @@ host_manager_opts = [
                default=True,
                help='Determines if the Scheduler tracks changes to instances '
                     'to help with its filtering decisions.'),
+    cfg.BoolOpt('scheduler_use_batch_filters',
+                default=False,
+                help='Evaluate the filters which support it, such as '
+                     'RamFilter, CoreFilter, DiskFilter, NumInstancesFilter '
+                     'and IoOpsFilter, at once over arrays of the host '
+                     'resources instead of host by host. Requires NumPy.'),
+    cfg.BoolOpt('scheduler_use_batch_weighers',
+                default=False,
+                help='Weigh and sort all the hosts at once with arrays of '
+                     'weights, and only build the weighed host objects '
+                     'which are looked at by the scheduler. Requires NumPy.'),
 ]
 
 CONF = cfg.CONF
@@ -157,6 +171,9 @@ class HostState(object):
         # Instances on this host
         self.instances = {}
 
+        # Generation of the compute node record in the host state cache
+        self.generation = None
+
         self.updated = None
         if compute:
             self.update_from_compute_node(compute)
@@ -315,13 +332,28 @@ class HostManager(object):
 
     def __init__(self):
         self.host_state_map = {}
-        self.filter_handler = filters.HostFilterHandler()
+        # Inverted index of the aggregate metadata to the hosts, used by the
+        # aggregate filters
+        self.aggregate_index = aggregate_index.AggregateMetadataIndex()
+        use_batch_filters = CONF.scheduler_use_batch_filters
+        if use_batch_filters and filters.numpy is None:
+            LOG.warning(_LW("scheduler_use_batch_filters is set but NumPy "
+                            "is not available, filtering hosts one by one."))
+            use_batch_filters = False
+        self.filter_handler = filters.HostFilterHandler(
+            use_batch_filters=use_batch_filters)
         filter_classes = self.filter_handler.get_matching_classes(
                 CONF.scheduler_available_filters)
         self.filter_cls_map = {cls.__name__: cls for cls in filter_classes}
         self.filter_obj_map = {}
         self.default_filters = self._choose_host_filters(self._load_filters())
-        self.weight_handler = weights.HostWeightHandler()
+        use_batch_weighers = CONF.scheduler_use_batch_weighers
+        if use_batch_weighers and weights.numpy is None:
+            LOG.warning(_LW("scheduler_use_batch_weighers is set but NumPy "
+                            "is not available, weighing hosts one by one."))
+            use_batch_weighers = False
+        self.weight_handler = weights.HostWeightHandler(
+            use_batch_weighers=use_batch_weighers)
         weigher_classes = self.weight_handler.get_matching_classes(
                 CONF.scheduler_weight_classes)
         self.weighers = [cls() for cls in weigher_classes]
@@ -336,6 +368,8 @@ class HostManager(object):
         self._instance_info = {}
         if self.tracks_instance_changes:
             self._init_instance_info()
+        self.host_state_cache = host_state_cache.get_host_state_cache()
+        self._last_full_refresh = None
 
     def _load_filters(self):
         return CONF.scheduler_default_filters
@@ -347,6 +381,7 @@ class HostManager(object):
             self.aggs_by_id[agg.id] = agg
             for host in agg.hosts:
                 self.host_aggregates_map[host].add(agg.id)
+            self.aggregate_index.update(agg)
 
     def update_aggregates(self, aggregates):
         """Updates internal HostManager information about aggregates."""
@@ -360,6 +395,7 @@ class HostManager(object):
         self.aggs_by_id[aggregate.id] = aggregate
         for host in aggregate.hosts:
             self.host_aggregates_map[host].add(aggregate.id)
+        self.aggregate_index.update(aggregate)
         # Refreshing the mapping dict to remove all hosts that are no longer
         # part of the aggregate
         for host in self.host_aggregates_map:
@@ -375,6 +411,7 @@ class HostManager(object):
         for host in aggregate.hosts:
             if aggregate.id in self.host_aggregates_map[host]:
                 self.host_aggregates_map[host].remove(aggregate.id)
+        self.aggregate_index.delete(aggregate)
 
     def _init_instance_info(self):
         """Creates the initial view of instances for all hosts.
@@ -438,7 +475,12 @@ class HostManager(object):
                     bad_filters.append(filter_name)
                     continue
                 filter_cls = self.filter_cls_map[filter_name]
-                self.filter_obj_map[filter_name] = filter_cls()
+                filter_obj = filter_cls()
+                # The aggregate filters look up hosts by metadata in the
+                # index rather than merging the metadata of the aggregates
+                # of each host.
+                filter_obj.aggregate_index = self.aggregate_index
+                self.filter_obj_map[filter_name] = filter_obj
             good_filters.append(self.filter_obj_map[filter_name])
         if bad_filters:
             msg = ", ".join(bad_filters)
@@ -527,11 +569,29 @@ class HostManager(object):
         return self.weight_handler.get_weighed_objects(self.weighers,
                 hosts, weight_properties)
 
+    def get_stats(self):
+        """Returns the run statistics of the filters and weighers.
+
+        The 'histogram' of each filter and weigher counts the runs whose wall
+        time, in seconds, is up to the matching bound in 'time_buckets'; its
+        last value counts the slower runs.
+        """
+        return {'time_buckets': list(plugin_stats.TIME_BUCKETS),
+                'filters': self.filter_handler.stats.to_dict(),
+                'weighers': self.weight_handler.stats.to_dict()}
+
+    def get_weighed_host(self, host, weight_properties):
+        """Weigh a single host against the last weighed list of hosts."""
+        return self.weight_handler.get_weighed_object(self.weighers,
+                host, weight_properties)
+
     def get_all_host_states(self, context):
         """Returns a list of HostStates that represents all the hosts
         the HostManager knows about. Also, each of the consumable resources
         in HostState are pre-populated and adjusted based on data in the db.
         """
+        if self.host_state_cache and not self._full_refresh_needed():
+            return self._get_cached_host_states(context)
 
         service_refs = {service.host: service
                         for service in objects.ServiceList.get_by_binary(
@@ -556,14 +616,7 @@ class HostManager(object):
             else:
                 host_state = self.host_state_cls(host, node, compute=compute)
                 self.host_state_map[state_key] = host_state
-            # We force to update the aggregates info each time a new request
-            # comes in, because some changes on the aggregates could have been
-            # happening after setting this field for the first time
-            host_state.aggregates = [self.aggs_by_id[agg_id] for agg_id in
-                                     self.host_aggregates_map[
-                                         host_state.host]]
-            host_state.update_service(dict(service))
-            self._add_instance_info(context, compute, host_state)
+            self._refresh_host_state(context, host_state, service)
             seen_nodes.add(state_key)
 
         # remove compute nodes from host_state_map if they are not active
@@ -574,9 +627,85 @@ class HostManager(object):
                          "from scheduler"), {'host': host, 'node': node})
             del self.host_state_map[state_key]
 
+        if self.host_state_cache:
+            self._sync_host_state_cache(compute_nodes)
+            self._last_full_refresh = timeutils.utcnow()
+
         return six.itervalues(self.host_state_map)
 
-    def _add_instance_info(self, context, compute, host_state):
+    def _refresh_host_state(self, context, host_state, service):
+        # We force to update the aggregates info each time a new request
+        # comes in, because some changes on the aggregates could have been
+        # happening after setting this field for the first time
+        host_state.aggregates = [self.aggs_by_id[agg_id] for agg_id in
+                                 self.host_aggregates_map[
+                                     host_state.host]]
+        host_state.update_service(dict(service))
+        self._add_instance_info(context, host_state.host, host_state)
+
+    def _full_refresh_needed(self):
+        return (not self.host_state_map or self._last_full_refresh is None or
+                timeutils.is_older_than(
+                    self._last_full_refresh,
+                    CONF.scheduler_host_state_full_refresh_interval))
+
+    def _sync_host_state_cache(self, compute_nodes):
+        """Record the cached generation of the nodes just read from the DB.
+
+        Nodes which are not known by the cache, for example because their
+        compute service does not publish its updates, have no generation.
+        """
+        generations = self.host_state_cache.get_generations(
+            self.host_state_map.keys())
+        for compute in compute_nodes:
+            state_key = (compute.host, compute.hypervisor_hostname)
+            host_state = self.host_state_map.get(state_key)
+            if host_state is None:
+                continue
+            host_state.generation = generations.get(state_key)
+
+    def _get_cached_host_states(self, context):
+        """Returns the known HostStates, only refreshing the compute nodes
+        whose generation changed in the host state cache since the last time
+        they were read. The compute nodes which are not in the cache are
+        read again from the database.
+        """
+        service_refs = {service.host: service
+                        for service in objects.ServiceList.get_by_binary(
+                            context, 'nova-compute')}
+        generations = self.host_state_cache.get_generations(
+            self.host_state_map.keys())
+        changed_nodes = [state_key for state_key, generation
+                         in six.iteritems(generations)
+                         if generation != self.host_state_map[
+                             state_key].generation]
+        computes = self.host_state_cache.get_compute_nodes(changed_nodes)
+        LOG.debug("Refreshing %(changed)d of %(total)d host state(s) from "
+                  "the host state cache",
+                  {'changed': len(computes),
+                   'total': len(self.host_state_map)})
+        if len(generations) < len(self.host_state_map):
+            # Some compute nodes don't publish their updates.
+            for compute in objects.ComputeNodeList.get_all(context):
+                state_key = (compute.host, compute.hypervisor_hostname)
+                if (state_key in self.host_state_map and
+                        state_key not in generations):
+                    computes[state_key] = compute
+
+        host_states = []
+        for state_key, host_state in six.iteritems(self.host_state_map):
+            service = service_refs.get(host_state.host)
+            if not service:
+                continue
+            compute = computes.get(state_key)
+            if compute:
+                host_state.update_from_compute_node(compute)
+                host_state.generation = generations.get(state_key)
+            self._refresh_host_state(context, host_state, service)
+            host_states.append(host_state)
+        return iter(host_states)
+
+    def _add_instance_info(self, context, host_name, host_state):
         """Adds the host instance info to the host_state object.
 
         Some older compute nodes may not be sending instance change updates to
@@ -586,7 +715,6 @@ class HostManager(object):
         In those cases, we need to grab the current InstanceList instead of
         relying on the version in _instance_info.
         """
-        host_name = compute.host
         host_info = self._instance_info.get(host_name)
         if host_info and host_info.get("updated"):
             inst_dict = host_info["instances"]
@@ -0,0 +1,167 @@
+# Copyright (c) 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Cache of compute node records shared between scheduler workers.
+
+Compute nodes push their ComputeNode record into the cache each time they
+report their resources, and bump a per-node generation counter. Scheduler
+workers compare those generations against the ones of their local HostStates
+and only refresh the nodes which changed, instead of reloading every compute
+node from the database for each request.
+
+Compute nodes which don't publish their updates, for example because they
+run an older release, are not in the cache, so the scheduler keeps reading
+them from the database on each request.
+
+The cache has to be shared by the compute nodes and the schedulers, so it is
+only used when memcached_servers is set.
+"""
+
+from oslo_config import cfg
+from oslo_log import log as logging
+from oslo_serialization import jsonutils
+
+from nova.i18n import _LW
+from nova import objects
+from nova.openstack.common import memorycache
+
+host_state_cache_opts = [
+    cfg.BoolOpt('scheduler_use_host_state_cache',
+                default=False,
+                help='Whether compute nodes publish their resource updates '
+                     'to a shared cache which is used by the scheduler to '
+                     'incrementally refresh its host states, instead of '
+                     'reading every compute node from the database on each '
+                     'request. Requires memcached_servers to be set, the '
+                     'cache is disabled otherwise.'),
+    cfg.IntOpt('scheduler_host_state_cache_ttl',
+               default=600,
+               help='Number of seconds a compute node record is kept in the '
+                    'host state cache after its last update.'),
+    cfg.IntOpt('scheduler_host_state_full_refresh_interval',
+               default=300,
+               help='Number of seconds between two full reloads of the '
+                    'compute nodes from the database when the host state '
+                    'cache is used. New and deleted compute nodes are only '
+                    'seen by the scheduler on a full reload.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(host_state_cache_opts)
+CONF.import_opt('memcached_servers', 'nova.openstack.common.memorycache')
+
+LOG = logging.getLogger(__name__)
+
+NODE_KEY_PREFIX = 'scheduler-host-state'
+GENERATION_KEY_PREFIX = 'scheduler-host-state-generation'
+
+
+def _make_key(prefix, host, node):
+    return str('%s-%s-%s' % (prefix, host, node))
+
+
+def get_host_state_cache():
+    """Return the HostStateCache to use, or None if it is disabled."""
+    if not CONF.scheduler_use_host_state_cache:
+        return None
+    if not CONF.memcached_servers:
+        # An in-process cache would neither see the updates of the
+        # compute nodes nor be shared by the schedulers.
+        LOG.warning(_LW("The host state cache is disabled because "
+                        "memcached_servers is not set."))
+        return None
+    return HostStateCache()
+
+
+class HostStateCache(object):
+    """Stores ComputeNode records and their generation, keyed by node."""
+
+    def __init__(self, client=None):
+        self.mc = client or memorycache.get_client()
+
+    def _get_multi(self, keys):
+        # NOTE(iuliat): the in-process memorycache client does not provide
+        # get_multi(), unlike the real memcache client.
+        get_multi = getattr(self.mc, 'get_multi', None)
+        if get_multi is not None:
+            return get_multi(keys)
+        values = {}
+        for key in keys:
+            value = self.mc.get(key)
+            if value is not None:
+                values[key] = value
+        return values
+
+    def _bump_generation(self, host, node):
+        key = _make_key(GENERATION_KEY_PREFIX, host, node)
+        generation = self.mc.incr(key)
+        if generation is None:
+            # The generation counter never expires, so that a node which was
+            # evicted from the cache can't come back with an already seen
+            # generation.
+            self.mc.add(key, '0')
+            generation = self.mc.incr(key)
+        return int(generation)
+
+    def update_compute_node(self, compute):
+        """Store a ComputeNode record and bump the node generation.
+
+        :param compute: nova.objects.ComputeNode to publish
+        :returns: the new generation of the node
+        """
+        host = compute.host
+        node = compute.hypervisor_hostname
+        # NOTE(iuliat): The record is written before the generation is bumped
+        # so that a reader seeing the new generation always gets a record at
+        # least as recent as that generation.
+        self.mc.set(_make_key(NODE_KEY_PREFIX, host, node),
+                    jsonutils.dumps(compute.obj_to_primitive()),
+                    time=CONF.scheduler_host_state_cache_ttl)
+        return self._bump_generation(host, node)
+
+    def get_generations(self, state_keys):
+        """Return the generation of each of the (host, node) state keys.
+
+        Nodes which are unknown to the cache are not part of the result.
+        """
+        keys = {_make_key(GENERATION_KEY_PREFIX, host, node): (host, node)
+                for host, node in state_keys}
+        if not keys:
+            return {}
+        found = self._get_multi(list(keys))
+        return {keys[key]: int(value) for key, value in found.items()}
+
+    def get_compute_nodes(self, state_keys):
+        """Return the ComputeNode record of each of the (host, node) keys.
+
+        Nodes which are unknown to the cache are not part of the result.
+        """
+        keys = {_make_key(NODE_KEY_PREFIX, host, node): (host, node)
+                for host, node in state_keys}
+        if not keys:
+            return {}
+        found = self._get_multi(list(keys))
+        computes = {}
+        for key, value in found.items():
+            try:
+                compute = objects.ComputeNode.obj_from_primitive(
+                    jsonutils.loads(value))
+            except Exception:
+                LOG.debug("Ignoring invalid host state cache entry %s", key,
+                          exc_info=True)
+                continue
+            computes[keys[key]] = compute
+        return computes
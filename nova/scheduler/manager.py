@@ -27,6 +27,7 @@ from oslo_service import periodic_task
 from oslo_utils import importutils
 
 from nova import exception
+from nova.i18n import _LI
 from nova import manager
 from nova import objects
 from nova import quota
@@ -45,6 +46,11 @@ scheduler_driver_opts = [
                     'Please note this is likely to interact with the value '
                     'of service_down_time, but exactly how they interact '
                     'will depend on your choice of scheduler driver.'),
+    cfg.IntOpt('scheduler_stats_log_interval',
+               default=600,
+               help='How often (in seconds) to log a summary of the run '
+                    'statistics of the scheduler filters and weighers. '
+                    'Set to a negative value to disable the summary.'),
 ]
 CONF = cfg.CONF
 CONF.register_opts(scheduler_driver_opts)
@@ -55,7 +61,7 @@ QUOTAS = quota.QUOTAS
 class SchedulerManager(manager.Manager):
     """Chooses a host to run instances on."""
 
-    target = messaging.Target(version='4.2')
+    target = messaging.Target(version='4.3')
 
     def __init__(self, scheduler_driver=None, *args, **kwargs):
         if not scheduler_driver:
@@ -74,6 +80,23 @@ class SchedulerManager(manager.Manager):
     def _run_periodic_tasks(self, context):
         self.driver.run_periodic_tasks(context)
 
+    @periodic_task.periodic_task(spacing=CONF.scheduler_stats_log_interval)
+    def _log_scheduler_stats(self, context):
+        stats = self.driver.host_manager.get_stats()
+        for kind in ('filters', 'weighers'):
+            for name, plugin in sorted(stats[kind].items()):
+                avg_time = plugin['total_time'] / plugin['runs'] if (
+                    plugin['runs']) else 0.0
+                LOG.info(_LI("Scheduler %(kind)s stats for %(name)s: "
+                             "%(runs)d run(s), %(skipped)d skipped, average "
+                             "%(avg).6fs, max %(max).6fs, %(objs_in)d host(s) "
+                             "in, %(objs_out)d host(s) out"),
+                         {'kind': kind, 'name': name, 'runs': plugin['runs'],
+                          'skipped': plugin['skipped'], 'avg': avg_time,
+                          'max': plugin['max_time'],
+                          'objs_in': plugin['objs_in'],
+                          'objs_out': plugin['objs_out']})
+
     @messaging.expected_exceptions(exception.NoValidHost)
     def select_destinations(self, context, request_spec, filter_properties):
         """Returns destinations(s) best suited for this request_spec and
@@ -86,6 +109,10 @@ class SchedulerManager(manager.Manager):
             filter_properties)
         return jsonutils.to_primitive(dests)
 
+    def get_scheduler_stats(self, context):
+        """Returns the run statistics of the driver's filters and weighers."""
+        return self.driver.host_manager.get_stats()
+
     def update_aggregates(self, ctxt, aggregates):
         """Updates HostManager internal aggregates information.
 
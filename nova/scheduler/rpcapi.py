@@ -95,6 +95,8 @@ class SchedulerAPI(object):
         methods in 4.x after that point should be done such that they can
         handle the version_cap being set to 4.2.
 
+        * 4.3 - Added get_scheduler_stats()
+
     '''
 
     VERSION_ALIASES = {
@@ -143,3 +145,7 @@ class SchedulerAPI(object):
         cctxt = self.client.prepare(version='4.2', fanout=True)
         return cctxt.cast(ctxt, 'sync_instance_info', host_name=host_name,
                           instance_uuids=instance_uuids)
+
+    def get_scheduler_stats(self, ctxt):
+        cctxt = self.client.prepare(version='4.3')
+        return cctxt.call(ctxt, 'get_scheduler_stats')
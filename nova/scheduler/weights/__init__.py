@@ -17,6 +17,12 @@
 Scheduler host weights
 """
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from nova import plugin_stats
 from nova import weights
 
 
@@ -33,14 +39,25 @@ class WeighedHost(weights.WeighedObject):
 
 class BaseHostWeigher(weights.BaseWeigher):
     """Base class for host weights."""
-    pass
+
+    def _weigh_attribute(self, host_states, attr):
+        """Return an array of the values of a HostState attribute, used as
+        the weights of the hosts.
+        """
+        values = numpy.array([getattr(host_state, attr)
+                              for host_state in host_states],
+                             dtype=numpy.float64)
+        self._record_bounds(values)
+        return values
 
 
 class HostWeightHandler(weights.BaseWeightHandler):
     object_class = WeighedHost
 
-    def __init__(self):
+    def __init__(self, use_batch_weighers=False):
         super(HostWeightHandler, self).__init__(BaseHostWeigher)
+        self.use_batch_weighers = use_batch_weighers and numpy is not None
+        self.stats = plugin_stats.StatsCollector()
 
 
 def all_weighers():
@@ -49,3 +49,6 @@ class IoOpsWeigher(weights.BaseHostWeigher):
         to be the default.
         """
         return host_state.num_io_ops
+
+    def weigh_objects_array(self, obj_list, weight_properties):
+        return self._weigh_attribute(obj_list, 'num_io_ops')
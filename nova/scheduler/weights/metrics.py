@@ -26,6 +26,10 @@ in the configuration file as the followings:
     The final weight would be name1.value * 1.0 + name2.value * -1.0.
 """
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
 from oslo_config import cfg
 
 from nova import exception
@@ -102,3 +106,26 @@ class MetricsWeigher(weights.BaseHostWeigher):
                         return CONF.metrics.weight_of_unavailable
 
         return value
+
+    def weigh_objects_array(self, obj_list, weight_properties):
+        values = numpy.zeros((len(obj_list), len(self.setting)))
+        unavailable = numpy.zeros(len(obj_list), dtype=bool)
+        for i, host_state in enumerate(obj_list):
+            for j, (name, ratio) in enumerate(self.setting):
+                try:
+                    values[i, j] = host_state.metrics[name].value
+                except KeyError:
+                    if CONF.metrics.required:
+                        raise exception.ComputeHostMetricNotFound(
+                                host=host_state.host,
+                                node=host_state.nodename,
+                                name=name)
+                    if ratio * self.weight_multiplier() != 0:
+                        unavailable[i] = True
+
+        ratios = numpy.array([ratio for (name, ratio) in self.setting],
+                             dtype=numpy.float64)
+        weights = values.dot(ratios)
+        weights[unavailable] = CONF.metrics.weight_of_unavailable
+        self._record_bounds(weights)
+        return weights
@@ -45,3 +45,6 @@ class RAMWeigher(weights.BaseHostWeigher):
     def _weigh_object(self, host_state, weight_properties):
         """Higher weights win.  We want spreading to be the default."""
         return host_state.free_ram_mb
+
+    def weigh_objects_array(self, obj_list, weight_properties):
+        return self._weigh_attribute(obj_list, 'free_ram_mb')
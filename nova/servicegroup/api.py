@@ -16,6 +16,8 @@
 
 """Define APIs for the servicegroup access."""
 
+import time
+
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_utils import importutils
@@ -35,9 +37,16 @@ servicegroup_driver_opt = cfg.StrOpt('servicegroup_driver',
                                      help='The driver for servicegroup '
                                           'service (valid options are: '
                                           'db, zk, mc)')
+servicegroup_cache_time_opt = cfg.IntOpt('servicegroup_cache_time',
+                                         default=0,
+                                         help='Number of seconds to cache '
+                                              'whether a service is up in '
+                                              'each process. 0 disables the '
+                                              'cache.')
 
 CONF = cfg.CONF
 CONF.register_opt(servicegroup_driver_opt)
+CONF.register_opt(servicegroup_cache_time_opt)
 
 # NOTE(geekinutah): By default drivers wait 5 seconds before reporting
 INITIAL_REPORTING_DELAY = 5
@@ -74,6 +83,8 @@ class API(object):
                             % driver_name)
         self._driver = importutils.import_object(driver_class,
                                                  *args, **kwargs)
+        # Dict of (expiration time, is up) keyed by (topic, host)
+        self._cache = {}
 
     def join(self, member, group, service=None):
         """Add a new member to a service group.
@@ -91,7 +102,55 @@ class API(object):
         if member.get('forced_down'):
             return False
 
-        return self._driver.is_up(member)
+        is_up = self._get_cached(member)
+        if is_up is None:
+            is_up = self._driver.is_up(member)
+            self._set_cached(member, is_up)
+        return is_up
+
+    def is_up_many(self, members):
+        """Check which of the given members are up.
+
+        The driver checks all the members not cached at once, which costs
+        at most one round trip to its backend per group.
+
+        :returns: a list of booleans, in the order of the members
+        """
+        results = []
+        to_check = []
+        for i, member in enumerate(members):
+            is_up = False
+            if not member.get('forced_down'):
+                is_up = self._get_cached(member)
+                if is_up is None:
+                    to_check.append(i)
+            results.append(is_up)
+
+        if to_check:
+            checked = self._driver.is_up_many([members[i] for i in to_check])
+            for i, is_up in zip(to_check, checked):
+                results[i] = is_up
+                self._set_cached(members[i], is_up)
+        return results
+
+    def get_up_services(self, members):
+        """Return the list of the given members which are up."""
+        return [member for member, is_up
+                in zip(members, self.is_up_many(members)) if is_up]
+
+    def _get_cached(self, member):
+        if CONF.servicegroup_cache_time <= 0:
+            return None
+        cached = self._cache.get((member['topic'], member['host']))
+        if cached is None or cached[0] <= time.time():
+            return None
+        return cached[1]
+
+    def _set_cached(self, member, is_up):
+        if CONF.servicegroup_cache_time <= 0:
+            return
+        expiration = time.time() + CONF.servicegroup_cache_time
+        self._cache[(member['topic'], member['host'])] = (expiration, is_up)
 
     def get_all(self, group_id):
         """Returns ALL members of the given group."""
@@ -27,3 +27,13 @@ class Driver(object):
     def is_up(self, member):
         """Check whether the given member is up."""
         raise NotImplementedError()
+
+    def is_up_many(self, members):
+        """Check which of the given members are up.
+
+        Drivers whose backend can be queried for several members at once
+        should override this.
+
+        :returns: a list of booleans, in the order of the members
+        """
+        return [self.is_up(member) for member in members]
@@ -18,6 +18,7 @@ from oslo_log import log as logging
 from oslo_utils import timeutils
 import six
 
+from nova import context
 from nova.i18n import _, _LE
 from nova.servicegroup import api
 from nova.servicegroup.drivers import base
@@ -25,6 +26,8 @@ from nova.servicegroup.drivers import base
 
 CONF = cfg.CONF
 CONF.import_opt('service_down_time', 'nova.service')
+CONF.import_opt('heartbeat_flush_interval', 'nova.conductor.api',
+                group='conductor')
 
 LOG = logging.getLogger(__name__)
 
@@ -82,8 +85,12 @@ class DbDriver(base.Driver):
     def _report_state(self, service):
         """Update the state of this service in the datastore."""
         try:
-            service.service_ref.report_count += 1
-            service.service_ref.save()
+            if CONF.conductor.heartbeat_flush_interval > 0:
+                service.conductor_api.service_heartbeat(
+                    context.get_admin_context(), service.service_ref)
+            else:
+                service.service_ref.report_count += 1
+                service.service_ref.save()
 
             # TODO(termie): make this pattern be more elegant.
             if getattr(service, 'model_disconnected', False):
@@ -69,6 +69,27 @@ class MemcachedDriver(base.Driver):
 
         return is_up
 
+    def is_up_many(self, service_refs):
+        """Check which services are up, with a single memcached request."""
+        keys = [str("%(topic)s:%(host)s" % service_ref)
+                for service_ref in service_refs]
+        values = self._get_multi(keys) if keys else {}
+        results = []
+        for key in keys:
+            is_up = values.get(key) is not None
+            if not is_up:
+                LOG.debug('Seems service %s is down' % key)
+            results.append(is_up)
+        return results
+
+    def _get_multi(self, keys):
+        # NOTE: the in-process memorycache client does not provide
+        # get_multi(), unlike the real memcache client.
+        get_multi = getattr(self.mc, 'get_multi', None)
+        if get_multi is not None:
+            return get_multi(keys)
+        return dict((key, self.mc.get(key)) for key in keys)
+
     def _report_state(self, service):
         """Update the state of this service in the datastore."""
         try:
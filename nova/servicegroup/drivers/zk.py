@@ -140,6 +140,19 @@ class ZooKeeperDriver(base.Driver):
         all_members = self._get_all(group_id)
         return member_id in all_members
 
+    def is_up_many(self, service_refs):
+        """Check which services are up, getting the members of each of
+        their groups once.
+        """
+        members = {}
+        results = []
+        for service_ref in service_refs:
+            group_id = service_ref['topic']
+            if group_id not in members:
+                members[group_id] = set(self._get_all(group_id))
+            results.append(service_ref['host'] in members[group_id])
+        return results
+
     def _get_all(self, group_id):
         """Return all members in a list, or a ServiceGroupUnavailable
         exception.
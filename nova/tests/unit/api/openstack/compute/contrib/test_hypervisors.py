@@ -193,6 +193,8 @@ class HypervisorsTestV21(test.NoDBTestCase):
         self.controller = hypervisors_v21.HypervisorsController()
         self.controller.servicegroup_api.service_is_up = mock.MagicMock(
             return_value=True)
+        self.controller.servicegroup_api.is_up_many = mock.MagicMock(
+            side_effect=lambda services: [True] * len(services))
 
     def setUp(self):
         super(HypervisorsTestV21, self).setUp()
@@ -241,6 +243,26 @@ class HypervisorsTestV21(test.NoDBTestCase):
 
         self.assertEqual(result, dict(hypervisors=self.INDEX_HYPER_DICTS))
 
+    def test_index_checks_services_at_once(self):
+        servicegroup_api = self.controller.servicegroup_api
+        with mock.patch.object(servicegroup_api,
+                               'service_is_up') as mock_is_up:
+            with mock.patch.object(
+                    servicegroup_api, 'is_up_many',
+                    side_effect=lambda services: [True] * len(services)
+                    ) as mock_is_up_many:
+                self.controller.index(self._get_request(True))
+
+        self.assertFalse(mock_is_up.called)
+        if 'state' in self.INDEX_HYPER_DICTS[0]:
+            self.assertEqual(1, mock_is_up_many.call_count)
+            self.assertEqual(['compute1', 'compute2'],
+                             [service.host for service
+                              in mock_is_up_many.call_args[0][0]])
+        else:
+            # The state is only shown with os-hypervisor-status
+            self.assertFalse(mock_is_up_many.called)
+
     def test_index_non_admin(self):
         req = self._get_request(False)
         self.assertRaises(exception.PolicyNotAuthorized,
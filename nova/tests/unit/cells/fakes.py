@@ -80,6 +80,10 @@ class FakeCellState(cells_state.CellState):
         message.ctxt = orig_ctxt
         message.process()
 
+    def send_messages(self, messages):
+        for message in messages:
+            self.send_message(message)
+
 
 class FakeCellStateManager(cells_state.CellStateManagerDB):
     def __init__(self, *args, **kwargs):
@@ -18,6 +18,7 @@ Tests For Cells Messaging module
 """
 
 import contextlib
+import datetime
 import uuid
 
 import mock
@@ -2102,3 +2103,115 @@ class CellsPublicInterfacesTestCase(test.TestCase):
                                              method_kwargs, 'down',
                                              instance.cell_name,
                                              need_response=False)
+
+
+class CellsMessageBatchingTestCase(test.TestCase):
+    """Test case for the batching of the messages sent to neighbor
+    cells.
+    """
+    def setUp(self):
+        super(CellsMessageBatchingTestCase, self).setUp()
+        fakes.init(self)
+        self.flags(message_batch_window=1, group='cells')
+        self.ctxt = context.RequestContext('fake', 'fake')
+        self.msg_runner = fakes.get_message_runner('child-cell2')
+        self.cell_state = mock.Mock()
+        self.cell_state.name = 'api-cell'
+        patcher = mock.patch.object(messaging.greenthread, 'spawn_after')
+        self.spawn_after = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _instance_update(self, updated_at, instance_uuid='fake-uuid'):
+        instance = objects.Instance(uuid=instance_uuid,
+                                    updated_at=updated_at)
+        return messaging._BroadcastMessage(self.msg_runner, self.ctxt,
+                                           'instance_update_at_top',
+                                           dict(instance=instance), 'up',
+                                           run_locally=False)
+
+    def _send(self, *messages):
+        for message in messages:
+            self.msg_runner._send_message(self.cell_state, message)
+        self.msg_runner._flush_batch(self.cell_state)
+
+    def _sent(self):
+        self.assertEqual(1, self.cell_state.send_messages.call_count)
+        return self.cell_state.send_messages.call_args[0][0]
+
+    def test_batching_disabled(self):
+        self.flags(message_batch_window=0, group='cells')
+        message = self._instance_update(None)
+        self.msg_runner._send_message(self.cell_state, message)
+        self.cell_state.send_message.assert_called_once_with(message)
+        self.assertFalse(self.spawn_after.called)
+
+    def test_batch(self):
+        messages = [self._instance_update(None, instance_uuid=str(i))
+                    for i in range(3)]
+        self._send(*messages)
+        self.spawn_after.assert_called_once_with(
+            1, self.msg_runner._flush_batch, self.cell_state)
+        self.assertEqual(messages, self._sent())
+        self.assertFalse(self.cell_state.send_message.called)
+
+    def test_batch_last_instance_update_wins(self):
+        now = timeutils.utcnow()
+        old = self._instance_update(now)
+        other = self._instance_update(now, instance_uuid='other-uuid')
+        new = self._instance_update(now + datetime.timedelta(seconds=1))
+        self._send(old, other, new)
+        self.assertEqual([other, new], self._sent())
+
+    def test_batch_ignores_older_instance_update(self):
+        now = timeutils.utcnow()
+        new = self._instance_update(now)
+        old = self._instance_update(now - datetime.timedelta(seconds=1))
+        self._send(new, old)
+        self.assertEqual([new], self._sent())
+
+    def test_batch_last_capacities_win(self):
+        messages = [messaging._BroadcastMessage(
+                        self.msg_runner, self.ctxt, 'update_capacities',
+                        dict(cell_name='child-cell2', capacities={'n': i}),
+                        'up', run_locally=False)
+                    for i in range(3)]
+        self._send(*messages)
+        self.assertEqual(messages[-1:], self._sent())
+
+    def test_message_needing_response_flushes_batch(self):
+        batched = self._instance_update(None)
+        message = messaging._TargetedMessage(self.msg_runner, self.ctxt,
+                                             'fake', {}, 'up', 'api-cell',
+                                             need_response=True)
+        self.msg_runner._send_message(self.cell_state, batched)
+        self.msg_runner._send_message(self.cell_state, message)
+        self.assertEqual([mock.call.send_messages([batched]),
+                          mock.call.send_message(message)],
+                         self.cell_state.mock_calls)
+
+    def test_instance_update_at_top_batched(self):
+        self.cell_state = self.msg_runner.state_manager.get_parent_cell(
+            'api-cell')
+        api_runner = fakes.get_message_runner('api-cell')
+        methods = api_runner.methods_by_type['broadcast']
+        now = timeutils.utcnow()
+        instances = [objects.Instance(uuid='fake-uuid', updated_at=now,
+                                      vm_state=vm_states.ACTIVE),
+                     objects.Instance(uuid='fake-uuid', updated_at=now,
+                                      vm_state=vm_states.STOPPED)]
+        with mock.patch.object(methods,
+                               'instance_update_at_top') as update_at_top:
+            for instance in instances:
+                self.msg_runner.instance_update_at_top(self.ctxt, instance)
+            self.assertFalse(update_at_top.called)
+            self.msg_runner._flush_batch(self.cell_state)
+        self.assertEqual(1, update_at_top.call_count)
+        self.assertEqual(vm_states.STOPPED,
+                         update_at_top.call_args[1]['instance'].vm_state)
+
+    def test_process_messages(self):
+        messages = [mock.Mock(), mock.Mock(), mock.Mock()]
+        messages[1].process.side_effect = test.TestingException
+        self.msg_runner.process_messages(messages)
+        for message in messages:
+            message.process.assert_called_once_with()
@@ -17,10 +17,15 @@
 Tests For Cells RPC Communication Driver
 """
 
+import base64
+import zlib
+
 import mock
 from mox3 import mox
 from oslo_config import cfg
 import oslo_messaging
+from oslo_serialization import jsonutils
+from oslo_utils import encodeutils
 
 from nova.cells import messaging
 from nova.cells import rpc_driver
@@ -226,3 +231,80 @@ class CellsRPCDriverTestCase(test.NoDBTestCase):
         dispatcher.process_message(self.ctxt, message.to_json())
         self.assertEqual(message.to_json(), call_info['json_message'])
         self.assertTrue(call_info['process_called'])
+
+    def _get_batch(self, count=2):
+        msg_runner = fakes.get_message_runner('child-cell2')
+        return [messaging._BroadcastMessage(msg_runner, self.ctxt,
+                                            'fake%d' % i, {'arg': i}, 'up',
+                                            run_locally=False)
+                for i in range(count)]
+
+    def _test_send_messages_to_cell(self, messages, can_send_batch=True):
+        cell_state = fakes.get_cell_state('child-cell2', 'api-cell')
+        rpcapi = self.driver.intercell_rpcapi
+        rpcclient = mock.Mock()
+        rpcclient.can_send_version.return_value = can_send_batch
+        rpcclient.prepare.return_value = rpcclient
+        with mock.patch.object(rpcapi, '_get_client',
+                               return_value=rpcclient) as get_client:
+            self.driver.send_messages_to_cell(cell_state, messages)
+        get_client.assert_called_with(cell_state,
+                                      'cells.intercell.broadcast')
+        return rpcclient
+
+    def test_send_messages_to_cell_cast(self):
+        messages = self._get_batch()
+        expected = jsonutils.dumps([message.to_json()
+                                    for message in messages])
+        rpcclient = self._test_send_messages_to_cell(messages)
+        rpcclient.prepare.assert_called_once_with(fanout=False,
+                                                  version='1.1')
+        rpcclient.cast.assert_called_once_with(
+            self.ctxt, 'process_messages', messages=expected,
+            compressed=False)
+
+    def test_send_messages_to_cell_compressed(self):
+        self.flags(message_compression_threshold=1, group='cells')
+        messages = self._get_batch()
+        expected = jsonutils.dumps([message.to_json()
+                                    for message in messages])
+        rpcclient = self._test_send_messages_to_cell(messages)
+        rpcclient.cast.assert_called_once_with(
+            self.ctxt, 'process_messages', messages=mock.ANY,
+            compressed=True)
+        payload = rpcclient.cast.call_args[1]['messages']
+        self.assertEqual(expected, encodeutils.safe_decode(
+            zlib.decompress(base64.b64decode(payload))))
+
+    def test_send_messages_to_cell_version_cap(self):
+        messages = self._get_batch()
+        rpcclient = self._test_send_messages_to_cell(messages,
+                                                     can_send_batch=False)
+        self.assertEqual(
+            [mock.call(self.ctxt, 'process_message',
+                       message=message.to_json())
+             for message in messages],
+            rpcclient.cast.call_args_list)
+
+    def test_send_messages_to_cell_single_message(self):
+        messages = self._get_batch(count=1)
+        rpcclient = self._test_send_messages_to_cell(messages)
+        rpcclient.cast.assert_called_once_with(
+            self.ctxt, 'process_message', message=messages[0].to_json())
+
+    def test_process_messages(self):
+        self.flags(message_compression_threshold=1, group='cells')
+        messages = self._get_batch(count=3)
+        rpcclient = self._test_send_messages_to_cell(messages)
+        kwargs = rpcclient.cast.call_args[1]
+
+        msg_runner = fakes.get_message_runner('api-cell')
+        dispatcher = rpc_driver.InterCellRPCDispatcher(msg_runner)
+        with mock.patch.object(msg_runner,
+                               'process_messages') as process_messages:
+            dispatcher.process_messages(self.ctxt, **kwargs)
+        received = process_messages.call_args[0][0]
+        self.assertEqual(['fake0', 'fake1', 'fake2'],
+                         [message.method_name for message in received])
+        self.assertEqual([{'arg': 0}, {'arg': 1}, {'arg': 2}],
+                         [message.method_kwargs for message in received])
@@ -190,6 +190,47 @@ class TestCellsStateManager(test.NoDBTestCase):
         units = 2  # 2 on host 3
         self.assertEqual(units, cap['disk_free']['units_by_mb'][str(sz)])
 
+    def _stub_computes(self, computes):
+        @classmethod
+        def _compute_node_get_all(cls, context):
+            return [_create_fake_node(*fake) for fake in computes]
+
+        self.stubs.Set(objects.ComputeNodeList, 'get_all',
+                       _compute_node_get_all)
+
+    def test_capacity_incremental(self):
+        self._stub_computes(FAKE_COMPUTES)
+        state_manager = self._get_state_manager(50.0)
+        computes = list(FAKE_COMPUTES)
+        computes[3] = ('host4', 1024, 100, 1000, 90)
+        del computes[0]
+        self._stub_computes(computes)
+        with mock.patch.object(state, '_free_units',
+                               wraps=state._free_units) as free_units:
+            state_manager._update_our_capacity()
+        # host1 is removed and host4 is replaced, for 3 memory and 3 disk
+        # requirements each.
+        self.assertEqual(18, free_units.call_count)
+        self.assertEqual(self._capacity(50.0),
+                         state_manager.get_my_state().capacities)
+
+    def test_capacity_unchanged(self):
+        state_manager = self._get_state_manager(50.0)
+        capacities = state_manager.get_my_state().capacities
+        with mock.patch.object(state, '_free_units') as free_units:
+            state_manager._update_our_capacity()
+        self.assertFalse(free_units.called)
+        self.assertEqual(capacities, state_manager.get_my_state().capacities)
+
+    def test_capacity_instance_types_changed(self):
+        state_manager = self._get_state_manager(50.0)
+        self.stubs.Set(db, 'flavor_get_all', lambda context: [
+            {'memory_mb': 100, 'root_gb': 10, 'ephemeral_gb': 0}])
+        state_manager._update_our_capacity()
+        cap = state_manager.get_my_state().capacities
+        self.assertEqual(self._capacity(50.0), cap)
+        self.assertEqual(['100'], list(cap['ram_free']['units_by_mb']))
+
     def _get_state_manager(self, reserve_percent=0.0):
         self.flags(reserve_percent=reserve_percent, group='cells')
         return state.CellStateManager()
@@ -65,3 +65,22 @@ class BaseProxyTestCase(test.NoDBTestCase):
             web='/usr/share/spice-html5', file_only=True,
             RequestHandlerClass=websocketproxy.NovaProxyRequestHandler)
         mock_start.assert_called_once_with()
+
+    @mock.patch('os.path.exists', return_value=True)
+    @mock.patch.object(logging, 'setup')
+    @mock.patch.object(gmr.TextGuruMeditation, 'setup_autorun')
+    @mock.patch('nova.console.eventletproxy.WebSocketProxyServer')
+    @mock.patch('oslo_service.service.launch')
+    def test_proxy_eventlet(self, mock_launch, mock_server, mock_gmr,
+                            mock_log, mock_exists):
+        self.flags(proxy_mode='eventlet', proxy_workers=4,
+                   proxy_idle_timeout=600)
+        baseproxy.proxy('0.0.0.0', '6080')
+        mock_server.assert_called_once_with(
+            host='0.0.0.0', port='6080', web='/usr/share/spice-html5',
+            cert='self.pem', key=None, ssl_only=False, handshake_timeout=10,
+            idle_timeout=600)
+        mock_launch.assert_called_once_with(baseproxy.CONF,
+                                            mock_server.return_value,
+                                            workers=4)
+        mock_launch.return_value.wait.assert_called_once_with()
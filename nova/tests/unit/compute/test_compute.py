@@ -6251,9 +6251,14 @@ class ComputeTestCase(BaseTestCase):
         call_info = {'get_all_by_host': 0, 'get_by_uuid': 0,
                 'get_nw_info': 0, 'expected_instance': None}
 
-        def fake_instance_get_all_by_host(context, host,
-                                          columns_to_join, use_slave=False):
+        def fake_instance_get_all_by_filters_sort(context, filters,
+                                                  limit=None, marker=None,
+                                                  columns_to_join=None,
+                                                  use_slave=False,
+                                                  sort_keys=None,
+                                                  sort_dirs=None):
             call_info['get_all_by_host'] += 1
+            self.assertEqual({'host': CONF.host, 'deleted': False}, filters)
             self.assertEqual([], columns_to_join)
             return instances[:]
 
@@ -6279,8 +6284,8 @@ class ComputeTestCase(BaseTestCase):
             if _get_instance_nw_info_raise:
                 raise exception.InstanceNotFound(instance_id=instance['uuid'])
 
-        self.stubs.Set(db, 'instance_get_all_by_host',
-                fake_instance_get_all_by_host)
+        self.stubs.Set(db, 'instance_get_all_by_filters_sort',
+                fake_instance_get_all_by_filters_sort)
         self.stubs.Set(db, 'instance_get_by_uuid',
                 fake_instance_get_by_uuid)
         self.stubs.Set(self.compute.network_api, 'get_instance_nw_info',
@@ -6981,12 +6986,14 @@ class ComputeTestCase(BaseTestCase):
             hardware.InstanceInfo(state=power_state.RUNNING))
         self.compute._sync_instance_power_state(ctxt, mox.IgnoreArg(),
                                                 power_state.RUNNING,
-                                                use_slave=True)
+                                                use_slave=True,
+                                                listed=False)
         self.compute.driver.get_info(mox.IgnoreArg()).AndReturn(
             hardware.InstanceInfo(state=power_state.SHUTDOWN))
         self.compute._sync_instance_power_state(ctxt, mox.IgnoreArg(),
                                                 power_state.SHUTDOWN,
-                                                use_slave=True)
+                                                use_slave=True,
+                                                listed=False)
         self.mox.ReplayAll()
         self.compute._sync_power_states(ctxt)
 
@@ -1247,18 +1247,140 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase):
         self.mox.ReplayAll()
         self.compute._instance_usage_audit(self.context)
 
-    @mock.patch.object(objects.InstanceList, 'get_by_host')
+    @mock.patch.object(objects.InstanceList, 'iter_by_filters')
     def test_sync_power_states(self, mock_get):
         instance = mock.Mock()
-        mock_get.return_value = [instance]
+        mock_get.return_value = iter([instance])
         with mock.patch.object(self.compute._sync_power_pool,
                                'spawn_n') as mock_spawn:
             self.compute._sync_power_states(mock.sentinel.context)
-            mock_get.assert_called_with(mock.sentinel.context,
-                                        self.compute.host, expected_attrs=[],
-                                        use_slave=True)
+            mock_get.assert_called_with(
+                mock.sentinel.context,
+                {'host': self.compute.host, 'deleted': False},
+                sort_keys=['id'], sort_dirs=['asc'], expected_attrs=[],
+                use_slave=True)
             mock_spawn.assert_called_once_with(mock.ANY, instance)
 
+    @mock.patch.object(objects.InstanceList, 'iter_by_filters')
+    def test_sync_power_states_listed_by_driver(self, mock_get):
+        instances = [objects.Instance(uuid='fake-uuid1',
+                                      power_state=power_state.RUNNING),
+                     objects.Instance(uuid='fake-uuid2',
+                                      power_state=power_state.RUNNING)]
+        mock_get.return_value = iter(instances)
+        states = {'fake-uuid1': power_state.RUNNING,
+                  'fake-uuid2': power_state.SHUTDOWN}
+
+        def fake_spawn(func, db_instance):
+            func(db_instance)
+
+        with contextlib.nested(
+            mock.patch.object(self.compute.driver, 'get_power_states',
+                              return_value=states),
+            mock.patch.object(self.compute.driver, 'get_num_instances'),
+            mock.patch.object(self.compute._sync_power_pool, 'spawn_n',
+                              side_effect=fake_spawn),
+            mock.patch.object(self.compute,
+                              '_query_driver_power_state_and_sync')
+        ) as (mock_states, mock_num, mock_spawn, mock_query):
+            self.compute._sync_power_states(self.context)
+            self.assertFalse(mock_num.called)
+            # The power state disagreeing with the database is queried
+            # again
+            mock_query.assert_has_calls([
+                mock.call(self.context, instances[0],
+                          vm_power_state=power_state.RUNNING),
+                mock.call(self.context, instances[1], vm_power_state=None)])
+
+    @mock.patch('nova.compute.manager.ComputeManager.'
+                '_sync_instance_power_state')
+    def test_query_driver_power_state_and_sync_listed(
+            self, mock_sync_power_state):
+        db_instance = objects.Instance(uuid='fake-uuid', task_state=None,
+                                       power_state=power_state.RUNNING)
+        with contextlib.nested(
+            mock.patch.object(self.compute.driver, 'get_info'),
+            mock.patch.object(db_instance, 'refresh')
+        ) as (mock_get_info, mock_refresh):
+            self.compute._query_driver_power_state_and_sync(
+                self.context, db_instance, vm_power_state=power_state.RUNNING)
+            # The instance is only refreshed by _sync_instance_power_state
+            self.assertFalse(mock_refresh.called)
+            self.assertFalse(mock_get_info.called)
+            mock_sync_power_state.assert_called_once_with(
+                self.context, db_instance, power_state.RUNNING,
+                use_slave=True, listed=True)
+
+    @mock.patch.object(objects.InstanceList, 'get_by_host')
+    def test_heal_instance_info_cache_batch(self, mock_get_by_host):
+        self.flags(heal_instance_info_cache_batch=True)
+        instances = [
+            objects.Instance(uuid='fake-uuid%d' % i, vm_state=vm_state,
+                             task_state=task_state)
+            for i, (vm_state, task_state) in enumerate([
+                (vm_states.ACTIVE, None),
+                (vm_states.BUILDING, None),
+                (vm_states.ACTIVE, task_states.DELETING),
+                (vm_states.ACTIVE, None),
+                (vm_states.STOPPED, None)])]
+        mock_get_by_host.return_value = instances
+        stale_instances = [instances[0], instances[4]]
+
+        with contextlib.nested(
+            mock.patch.object(self.compute.network_api,
+                              'get_instances_with_stale_nw_info',
+                              return_value=stale_instances),
+            mock.patch.object(self.compute.network_api,
+                              'get_instance_nw_info',
+                              side_effect=[None, exception.InstanceNotFound(
+                                  instance_id='fake-uuid4')]),
+            mock.patch.object(manager.LOG, 'info')
+        ) as (mock_get_stale, mock_get_nw_info, mock_info):
+            self.compute._heal_instance_info_cache(self.context)
+
+        mock_get_by_host.assert_called_once_with(
+            self.context, self.compute.host, expected_attrs=['info_cache'],
+            use_slave=True)
+        # The building and deleting instances are skipped
+        mock_get_stale.assert_called_once_with(
+            self.context, [instances[0], instances[3], instances[4]],
+            self.compute.host)
+        self.assertEqual([mock.call(self.context, instances[0]),
+                          mock.call(self.context, instances[4])],
+                         mock_get_nw_info.call_args_list)
+        msg_args = mock_info.call_args[0][1]
+        self.assertEqual(1, msg_args['healed'])
+        self.assertEqual(3, msg_args['instances'])
+
+    @mock.patch.object(objects.InstanceList, 'iter_by_filters')
+    @mock.patch.object(objects.InstanceList, 'get_by_host')
+    def test_heal_instance_info_cache_batch_not_supported(
+            self, mock_get_by_host, mock_iter):
+        self.flags(heal_instance_info_cache_batch=True)
+        instance = objects.Instance(uuid='fake-uuid',
+                                    vm_state=vm_states.ACTIVE, task_state=None)
+        mock_get_by_host.return_value = [instance]
+        mock_iter.return_value = iter([instance])
+
+        with contextlib.nested(
+            mock.patch.object(self.compute.network_api,
+                              'get_instances_with_stale_nw_info',
+                              side_effect=NotImplementedError),
+            mock.patch.object(self.compute.network_api,
+                              'get_instance_nw_info')
+        ) as (mock_get_stale, mock_get_nw_info):
+            self.compute._heal_instance_info_cache(self.context)
+
+        # The info cache of one instance is healed instead
+        mock_get_by_host.assert_called_once_with(
+            self.context, self.compute.host, expected_attrs=['info_cache'],
+            use_slave=True)
+        mock_iter.assert_called_once_with(
+            self.context, {'host': self.compute.host, 'deleted': False},
+            sort_keys=['id'], sort_dirs=['asc'], expected_attrs=[],
+            use_slave=True)
+        mock_get_nw_info.assert_called_once_with(self.context, instance)
+
     def _get_sync_instance(self, power_state, vm_state, task_state=None,
                            shutdown_terminate=False):
         instance = objects.Instance()
@@ -1280,6 +1402,29 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase):
         self.compute._sync_instance_power_state(self.context, instance,
                                                 power_state.RUNNING)
 
+    def test_sync_instance_power_state_listed_match(self):
+        instance = self._get_sync_instance(power_state.RUNNING,
+                                           vm_states.ACTIVE)
+        instance.refresh(use_slave=True)
+        self.mox.StubOutWithMock(self.compute.driver, 'get_info')
+        self.mox.ReplayAll()
+        self.compute._sync_instance_power_state(self.context, instance,
+                                                power_state.RUNNING,
+                                                use_slave=True, listed=True)
+
+    def test_sync_instance_power_state_listed_changed(self):
+        # Stopped since the power states were listed
+        instance = self._get_sync_instance(power_state.SHUTDOWN,
+                                           vm_states.STOPPED)
+        instance.refresh(use_slave=True)
+        self.mox.StubOutWithMock(self.compute.driver, 'get_info')
+        self.compute.driver.get_info(instance).AndReturn(
+            hardware.InstanceInfo(state=power_state.SHUTDOWN))
+        self.mox.ReplayAll()
+        self.compute._sync_instance_power_state(self.context, instance,
+                                                power_state.RUNNING,
+                                                use_slave=True, listed=True)
+
     def test_sync_instance_power_state_running_stopped(self):
         instance = self._get_sync_instance(power_state.RUNNING,
                                            vm_states.ACTIVE)
@@ -1365,7 +1510,8 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase):
             mock_sync_power_state.assert_called_once_with(self.context,
                                                           db_instance,
                                                           power_state.NOSTATE,
-                                                          use_slave=True)
+                                                          use_slave=True,
+                                                          listed=False)
 
     def test_run_pending_deletes(self):
         self.flags(instance_delete_interval=10)
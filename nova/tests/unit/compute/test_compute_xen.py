@@ -49,14 +49,15 @@ class ComputeXenTestCase(stubs.XenAPITestBaseNoDB):
                 objects.InstanceList(), [db_instance], None)
         instance = instance_list[0]
 
-        self.mox.StubOutWithMock(objects.InstanceList, 'get_by_host')
+        self.mox.StubOutWithMock(objects.InstanceList, 'iter_by_filters')
         self.mox.StubOutWithMock(self.compute.driver, 'get_num_instances')
         self.mox.StubOutWithMock(vm_utils, 'lookup')
         self.mox.StubOutWithMock(self.compute, '_sync_instance_power_state')
 
-        objects.InstanceList.get_by_host(ctxt,
-                self.compute.host, expected_attrs=[],
-                use_slave=True).AndReturn(instance_list)
+        objects.InstanceList.iter_by_filters(ctxt,
+                {'host': self.compute.host, 'deleted': False},
+                sort_keys=['id'], sort_dirs=['asc'], expected_attrs=[],
+                use_slave=True).AndReturn(iter(instance_list))
         self.compute.driver.get_num_instances().AndReturn(1)
         vm_utils.lookup(self.compute.driver._session, instance['name'],
                 False).AndReturn(None)
@@ -800,6 +800,35 @@ class TestUpdateAvailableResources(BaseTestCase):
         self.assertTrue(obj_base.obj_equal_prims(expected_resources,
                                                  self.rt.compute_node))
 
+    @mock.patch('time.time')
+    def test_audit_interval(self, time_mock):
+        self.flags(resource_audit_interval=600)
+        self._setup_rt()
+        self.rt.compute_node = copy.deepcopy(_COMPUTE_NODE_FIXTURES[0])
+        self.rt._last_audit = 1000
+        vd = self.driver_mock
+
+        # Claims keep the usage up to date until the next audit
+        time_mock.return_value = 1500
+        update_mock = self._update_available_resources()
+        self.assertFalse(vd.get_available_resource.called)
+        self.assertFalse(update_mock.called)
+
+        time_mock.return_value = 1600
+        with mock.patch.object(self.rt, '_update_available_resource'):
+            self.rt.update_available_resource(mock.sentinel.ctx)
+        vd.get_available_resource.assert_called_once_with('fake-node')
+        self.assertEqual(1600, self.rt._last_audit)
+
+    def test_audit_interval_disabled_tracker(self):
+        self.flags(resource_audit_interval=600)
+        self._setup_rt()
+        self.rt._last_audit = float('inf')
+        with mock.patch.object(self.rt, '_update_available_resource'):
+            self.rt.update_available_resource(mock.sentinel.ctx)
+        self.driver_mock.get_available_resource.assert_called_once_with(
+            'fake-node')
+
 
 class TestInitComputeNode(BaseTestCase):
 
@@ -1014,6 +1043,25 @@ class TestUpdateComputeNode(BaseTestCase):
         urs_mock = self.sched_client_mock.update_resource_stats
         urs_mock.assert_called_once_with(self.rt.compute_node)
 
+    def test_existing_compute_node_updated_changed_fields(self):
+        self._setup_rt()
+        compute = copy.deepcopy(_COMPUTE_NODE_FIXTURES[0])
+        self.rt.compute_node = compute
+        self.rt._update(mock.sentinel.ctx)
+        urs_mock = self.sched_client_mock.update_resource_stats
+        urs_mock.assert_called_once_with(compute)
+
+        # Only the fields which changed since the last update are left
+        # to be saved to the compute node record
+        self.sched_client_mock.reset_mock()
+        compute.memory_mb_used = 128
+        compute.free_ram_mb = compute.memory_mb - 128
+        compute.cpu_info = '{}'
+        self.rt._update(mock.sentinel.ctx)
+        urs_mock.assert_called_once_with(compute)
+        self.assertEqual(set(['memory_mb_used', 'free_ram_mb']),
+                         compute.obj_what_changed())
+
 
 class TestInstanceClaim(BaseTestCase):
 
@@ -776,6 +776,39 @@ class ConductorTestCase(_BaseTestCase, test.TestCase):
             self.context, 'task', 'begin', 'end', 'host', 'errors', 'message')
         self.assertEqual(result, 'result')
 
+    @mock.patch('time.time')
+    @mock.patch.object(db, 'service_update_heartbeats')
+    @mock.patch('oslo_utils.timeutils.utcnow')
+    def test_service_heartbeat(self, mock_utcnow, mock_update, mock_time):
+        self.flags(heartbeat_flush_interval=10, group='conductor')
+        mock_time.return_value = 100
+        self.conductor._last_heartbeats_flush = 100
+        mock_utcnow.side_effect = ['t1', 't2', 't3', 't4']
+
+        self.conductor.service_heartbeat(self.context, 1)
+        self.conductor.service_heartbeat(self.context, 2)
+        mock_time.return_value = 105
+        self.conductor.service_heartbeat(self.context, 1)
+        self.assertFalse(mock_update.called)
+
+        mock_time.return_value = 110
+        self.conductor.service_heartbeat(self.context, 3)
+        mock_update.assert_called_once_with(
+            mock.ANY, {1: (2, 't3'), 2: (1, 't2'), 3: (1, 't4')})
+        self.assertEqual({}, self.conductor._heartbeats)
+        self.assertEqual(110, self.conductor._last_heartbeats_flush)
+
+    @mock.patch.object(db, 'service_update_heartbeats')
+    def test_flush_heartbeats(self, mock_update):
+        self.conductor._flush_heartbeats(self.context)
+        self.assertFalse(mock_update.called)
+
+        self.conductor._heartbeats = {1: (1, 't1')}
+        mock_update.side_effect = test.TestingException
+        self.conductor._flush_heartbeats(self.context)
+        mock_update.assert_called_once_with(mock.ANY, {1: (1, 't1')})
+        self.assertEqual({}, self.conductor._heartbeats)
+
 
 class ConductorRPCAPITestCase(_BaseTestCase, test.TestCase):
     """Conductor RPC API Tests."""
@@ -820,6 +853,22 @@ class ConductorAPITestCase(_BaseTestCase, test.TestCase):
         self.assertEqual(timeouts.count(10), 10)
         self.assertIn(None, timeouts)
 
+    def test_service_heartbeat(self):
+        service = objects.Service(id=1, report_count=3)
+        with mock.patch.object(self.conductor._manager,
+                               'service_heartbeat') as mock_heartbeat:
+            self.conductor.service_heartbeat(self.context, service)
+            mock_heartbeat.assert_called_once_with(self.context, 1)
+
+    def test_service_heartbeat_old_conductor(self):
+        self.flags(conductor='2.1', group='upgrade_levels')
+        self.conductor = conductor_api.API()
+        service = objects.Service(id=1, report_count=3)
+        with mock.patch.object(service, 'save') as mock_save:
+            self.conductor.service_heartbeat(self.context, service)
+            mock_save.assert_called_once_with()
+        self.assertEqual(4, service.report_count)
+
 
 class ConductorLocalAPITestCase(ConductorAPITestCase):
     """Conductor LocalAPI Tests."""
@@ -841,6 +890,17 @@ class ConductorLocalAPITestCase(ConductorAPITestCase):
         # Override test in ConductorAPITestCase
         pass
 
+    def test_service_heartbeat(self):
+        service = objects.Service(id=1, report_count=3)
+        with mock.patch.object(service, 'save') as mock_save:
+            self.conductor.service_heartbeat(self.context, service)
+            mock_save.assert_called_once_with()
+        self.assertEqual(4, service.report_count)
+
+    def test_service_heartbeat_old_conductor(self):
+        # Override test in ConductorAPITestCase
+        pass
+
 
 class ConductorImportTest(test.TestCase):
     def test_import_conductor_local(self):
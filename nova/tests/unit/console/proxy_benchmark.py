@@ -0,0 +1,265 @@
+# Copyright (c) 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Load generator for the websocket console proxy.
+
+Concurrent websocket sessions send binary messages through the proxy to a
+console echoing them, and wait for each echo before sending the next
+message, like the key presses and screen updates of interactive consoles.
+
+By default the event loop based proxy and an echoing console are run in
+this process.  Pass the URL, including the token, of a running proxy whose
+console echoes its input, such as a serial console running cat, to load
+it instead, for instance:
+
+    python -m nova.tests.unit.console.proxy_benchmark --sessions 1000 \\
+        --url 'ws://proxy:6083/?token=0123-4567'
+
+Each run reports the messages per second, the bandwidth, the percentiles
+of the handshake and round trip latencies, and the failed sessions.
+"""
+
+from __future__ import print_function
+
+import argparse
+import base64
+import collections
+import os
+import sys
+import time
+import unittest
+
+import eventlet
+import mock
+import six
+from six.moves import range
+import six.moves.urllib.parse as urlparse
+
+from nova.console import eventletproxy
+from nova.console import websocketproxy
+from nova import test
+from nova.tests.unit.scheduler.benchmark import percentile
+
+
+def _echo_console(sock):
+    """Echo everything received on the connections to a socket."""
+    def echo(conn):
+        try:
+            while True:
+                data = conn.recv(65536)
+                if not data:
+                    break
+                conn.sendall(data)
+        finally:
+            conn.close()
+
+    pool = eventlet.GreenPool()
+    while True:
+        conn, _address = sock.accept()
+        pool.spawn_n(echo, conn)
+
+
+def _connect(url):
+    """Open a websocket and return the socket and the decoder of the frames
+    received on it.
+    """
+    url = urlparse.urlparse(url)
+    sock = eventlet.connect((url.hostname, url.port or 80))
+    key = base64.b64encode(os.urandom(16)).decode('ascii')
+    request = ('GET %s?%s HTTP/1.1\r\n'
+               'Host: %s\r\n'
+               'Upgrade: websocket\r\n'
+               'Connection: Upgrade\r\n'
+               'Sec-WebSocket-Key: %s\r\n'
+               'Sec-WebSocket-Protocol: binary\r\n'
+               'Sec-WebSocket-Version: 13\r\n\r\n' %
+               (url.path or '/', url.query, url.netloc, key))
+    sock.sendall(request.encode('latin-1'))
+    response = b''
+    while b'\r\n\r\n' not in response:
+        data = sock.recv(4096)
+        if not data:
+            raise IOError('Connection closed during the handshake')
+        response += data
+    head, rest = response.split(b'\r\n\r\n', 1)
+    if b' 101 ' not in head.split(b'\r\n')[0]:
+        raise IOError(head.split(b'\r\n')[0].decode('latin-1'))
+    return sock, eventletproxy.FrameDecoder(rest, require_mask=False)
+
+
+def _run_session(url, messages, size, report):
+    start = time.time()
+    sock, decoder = _connect(url)
+    report['handshake_latencies'].append(time.time() - start)
+    try:
+        payload = os.urandom(size)
+        for i in range(messages):
+            mask = os.urandom(4)
+            start = time.time()
+            sock.sendall(eventletproxy.encode_frame_header(
+                eventletproxy.OPCODE_BINARY, size, mask) +
+                eventletproxy.unmask(memoryview(payload), mask))
+            received = 0
+            while received < size:
+                frames = decoder.feed(b'')
+                if not frames:
+                    data = sock.recv(65536)
+                    if not data:
+                        raise IOError('Connection closed by the proxy')
+                    frames = decoder.feed(data)
+                for opcode, data in frames:
+                    if opcode == eventletproxy.OPCODE_CLOSE:
+                        raise IOError('Session closed by the proxy')
+                    received += len(data)
+            report['latencies'].append(time.time() - start)
+            report['bytes'] += size
+    finally:
+        sock.close()
+
+
+def run_sessions(url, sessions=100, messages=100, size=1024):
+    """Run concurrent sessions through a proxy and return a report.
+
+    :param url: URL of the proxy, including the token of a console echoing
+                its input
+    :param sessions: number of concurrent sessions
+    :param messages: number of messages sent by each session
+    :param size: size in bytes of the messages
+    """
+    report = collections.OrderedDict()
+    report['sessions'] = sessions
+    report['messages'] = messages
+    report['size'] = size
+    report['handshake_latencies'] = []
+    report['latencies'] = []
+    report['bytes'] = 0
+    errors = collections.Counter()
+
+    def session():
+        try:
+            _run_session(url, messages, size, report)
+        except Exception as e:
+            errors[e.__class__.__name__] += 1
+
+    pool = eventlet.GreenPool(sessions)
+    start = time.time()
+    for i in range(sessions):
+        pool.spawn_n(session)
+    pool.waitall()
+    elapsed = time.time() - start
+
+    report['errors'] = dict(errors)
+    report['elapsed'] = elapsed
+    report['throughput'] = (len(report['latencies']) / elapsed
+                            if elapsed else None)
+    report['bandwidth'] = report['bytes'] / elapsed if elapsed else None
+    for name in ('handshake_latencies', 'latencies'):
+        values = sorted(report.pop(name))
+        report[name.replace('latencies', 'latency')] = (
+            collections.OrderedDict(
+                (pname, percentile(values, percent))
+                for pname, percent in (('p50', 50), ('p90', 90),
+                                       ('p99', 99), ('max', 100))))
+    return report
+
+
+def run_benchmark(sessions=100, messages=100, size=1024):
+    """Run concurrent sessions through an event loop based proxy started in
+    this process, in front of an echoing console, and return a report.
+    """
+    console = eventlet.listen(('127.0.0.1', 0))
+    console_thread = eventlet.spawn(_echo_console, console)
+    server = eventletproxy.WebSocketProxyServer(host='127.0.0.1', port=0,
+                                                pool_size=sessions + 10)
+    connect_info = {'host': '127.0.0.1',
+                    'port': console.getsockname()[1],
+                    'internal_access_path': None,
+                    'access_url': 'http://127.0.0.1:%d' % server.port}
+    consoleauth = mock.Mock()
+    consoleauth.return_value.check_token.return_value = connect_info
+    server.start()
+    try:
+        with mock.patch.object(websocketproxy.consoleauth_rpcapi,
+                               'ConsoleAuthAPI', consoleauth):
+            report = run_sessions('ws://127.0.0.1:%d/?token=fake' %
+                                  server.port, sessions, messages, size)
+    finally:
+        server.stop()
+        console_thread.kill()
+        console.close()
+    return report
+
+
+def format_report(report):
+    def _latency(latency):
+        return ', '.join('%s %.2fms' % (name, value * 1000)
+                         for name, value in six.iteritems(latency)
+                         if value is not None)
+
+    errors = ', '.join('%d %s' % (count, name) for name, count
+                       in sorted(six.iteritems(report['errors'])))
+    return ('%(sessions)d sessions of %(messages)d messages of %(size)d '
+            'bytes (%(errors)s): %(throughput).1f messages/s, '
+            '%(bandwidth).2f MB/s, handshake %(handshake)s, round trip '
+            '%(round_trip)s' %
+            dict(report, errors=errors or 'no errors',
+                 throughput=report['throughput'] or 0.0,
+                 bandwidth=(report['bandwidth'] or 0.0) / 1024.0 / 1024.0,
+                 handshake=_latency(report['handshake_latency']),
+                 round_trip=_latency(report['latency'])))
+
+
+class ProxyBenchmark(test.NoDBTestCase):
+    """Runs the benchmark within the usual unit test fixtures, which provide
+    the configuration.
+    """
+
+    def __init__(self, args):
+        super(ProxyBenchmark, self).__init__('run_benchmark')
+        self.args = args
+
+    def run_benchmark(self):
+        for sessions in self.args.sessions:
+            if self.args.url:
+                report = run_sessions(self.args.url, sessions,
+                                      self.args.messages, self.args.size)
+            else:
+                report = run_benchmark(sessions, self.args.messages,
+                                       self.args.size)
+            print(format_report(report))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--sessions', type=int, action='append',
+                        help='number of concurrent sessions, can be '
+                             'repeated (default: 10, 100 and 1000)')
+    parser.add_argument('--messages', type=int, default=100,
+                        help='number of messages sent by each session')
+    parser.add_argument('--size', type=int, default=1024,
+                        help='size in bytes of the messages')
+    parser.add_argument('--url',
+                        help='URL, including the token, of a running proxy '
+                             'to load instead of an in-process one')
+    args = parser.parse_args(argv)
+    args.sessions = args.sessions or [10, 100, 1000]
+
+    result = unittest.TextTestRunner().run(ProxyBenchmark(args))
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
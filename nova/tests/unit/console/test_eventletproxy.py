@@ -0,0 +1,237 @@
+# Copyright (c) 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Tests for the event loop based websocket proxy."""
+
+import os
+import struct
+
+import eventlet
+import fixtures
+import mock
+
+from nova.console import eventletproxy
+from nova.console import websocketproxy
+from nova import test
+from nova.tests.unit.console import proxy_benchmark
+
+
+def _masked_frame(opcode, payload, mask=b'\x01\x02\x03\x04'):
+    return (eventletproxy.encode_frame_header(opcode, len(payload), mask) +
+            eventletproxy.unmask(memoryview(payload), mask))
+
+
+class FrameDecoderTestCase(test.NoDBTestCase):
+
+    def test_unmask(self):
+        self.assertEqual(b'', eventletproxy.unmask(memoryview(b''), b'abcd'))
+        payload = b'\x00\x01\x02\x03\x04\xff'
+        masked = eventletproxy.unmask(memoryview(payload), b'\x0f\xf0\x00\xff')
+        self.assertEqual(b'\x0f\xf1\x02\xfc\x0b\x0f', masked)
+        self.assertEqual(payload, eventletproxy.unmask(memoryview(masked),
+                                                       b'\x0f\xf0\x00\xff'))
+
+    def test_feed(self):
+        payloads = [b'', b'x' * 125, b'y' * 126, b'z' * 70000]
+        data = b''.join(_masked_frame(eventletproxy.OPCODE_BINARY, payload)
+                        for payload in payloads)
+        decoder = eventletproxy.FrameDecoder()
+        frames = []
+        # Feed the frames in chunks which split their headers and payloads
+        for i in range(0, len(data), 1000):
+            frames.extend(decoder.feed(data[i:i + 1000]))
+        self.assertEqual([(eventletproxy.OPCODE_BINARY, payload)
+                          for payload in payloads], frames)
+        self.assertEqual(bytearray(), decoder.buf)
+
+    def test_feed_unmasked(self):
+        data = eventletproxy.encode_frame_header(
+            eventletproxy.OPCODE_TEXT, 3) + b'abc'
+        decoder = eventletproxy.FrameDecoder(data[:2], require_mask=False)
+        self.assertEqual([], decoder.feed(b''))
+        self.assertEqual([(eventletproxy.OPCODE_TEXT, b'abc')],
+                         decoder.feed(data[2:]))
+
+    def test_feed_fragmented(self):
+        mask = b'\x01\x02\x03\x04'
+        # The first fragment and the continuation frames aren't final.
+        data = (struct.pack('!BB', eventletproxy.OPCODE_TEXT, 0x84) + mask +
+                eventletproxy.unmask(memoryview(b'YWJj'), mask) +
+                _masked_frame(eventletproxy.OPCODE_PING, b'ping') +
+                struct.pack('!BB', eventletproxy.OPCODE_CONTINUATION, 0x82) +
+                mask + eventletproxy.unmask(memoryview(b'ZG'), mask) +
+                _masked_frame(eventletproxy.OPCODE_CONTINUATION, b'Vm'))
+        decoder = eventletproxy.FrameDecoder()
+        self.assertEqual([(eventletproxy.OPCODE_PING, b'ping')],
+                         decoder.feed(data[:-8]))
+        self.assertEqual([(eventletproxy.OPCODE_TEXT, b'YWJjZGVm')],
+                         decoder.feed(data[-8:]))
+        self.assertEqual([(eventletproxy.OPCODE_BINARY, b'x')],
+                         decoder.feed(_masked_frame(
+                             eventletproxy.OPCODE_BINARY, b'x')))
+
+    def test_feed_unexpected_continuation(self):
+        decoder = eventletproxy.FrameDecoder()
+        self.assertRaises(eventletproxy.WebSocketProtocolError,
+                          decoder.feed,
+                          _masked_frame(eventletproxy.OPCODE_CONTINUATION,
+                                        b'abc'))
+
+    def test_feed_unfinished_message(self):
+        mask = b'\x01\x02\x03\x04'
+        data = (struct.pack('!BB', eventletproxy.OPCODE_BINARY, 0x83) +
+                mask + eventletproxy.unmask(memoryview(b'abc'), mask) +
+                _masked_frame(eventletproxy.OPCODE_BINARY, b'def'))
+        decoder = eventletproxy.FrameDecoder()
+        self.assertRaises(eventletproxy.WebSocketProtocolError,
+                          decoder.feed, data)
+
+    def test_feed_unmasked_client_frame(self):
+        data = eventletproxy.encode_frame_header(
+            eventletproxy.OPCODE_BINARY, 3) + b'abc'
+        decoder = eventletproxy.FrameDecoder()
+        e = self.assertRaises(eventletproxy.WebSocketProtocolError,
+                              decoder.feed, data)
+        self.assertEqual(eventletproxy.CLOSE_PROTOCOL_ERROR, e.code)
+
+    def test_feed_too_big(self):
+        data = struct.pack('!BBQ', 0x82, 0x80 | 127, 1 << 40)
+        decoder = eventletproxy.FrameDecoder()
+        e = self.assertRaises(eventletproxy.WebSocketProtocolError,
+                              decoder.feed, data)
+        self.assertEqual(eventletproxy.CLOSE_TOO_BIG, e.code)
+
+
+class WebSocketProxyServerTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(WebSocketProxyServerTestCase, self).setUp()
+        self.web = self.useFixture(fixtures.TempDir()).path
+        self.server = eventletproxy.WebSocketProxyServer(
+            host='127.0.0.1', port=0, web=self.web)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        self.url = 'ws://127.0.0.1:%d/?token=fake' % self.server.port
+
+    def _request(self, path):
+        sock = eventlet.connect(('127.0.0.1', self.server.port))
+        sock.sendall(('GET %s HTTP/1.1\r\nHost: localhost\r\n\r\n' %
+                      path).encode('latin-1'))
+        response = b''
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                break
+            response += data
+        sock.close()
+        return response
+
+    def test_serve_file(self):
+        with open(os.path.join(self.web, 'vnc_auto.html'), 'wb') as f:
+            f.write(b'<html></html>')
+        response = self._request('/vnc_auto.html?token=fake')
+        self.assertTrue(response.startswith(b'HTTP/1.1 200 OK\r\n'))
+        self.assertIn(b'Content-Type: text/html\r\n', response)
+        self.assertTrue(response.endswith(b'\r\n\r\n<html></html>'))
+
+    def test_serve_file_outside_web(self):
+        response = self._request('/../../etc/passwd')
+        self.assertTrue(response.startswith(b'HTTP/1.1 404 Not Found\r\n'))
+
+    def _start_server(self, **kwargs):
+        server = eventletproxy.WebSocketProxyServer(host='127.0.0.1',
+                                                    port=0, **kwargs)
+        server.start()
+        self.addCleanup(server.stop)
+        return server
+
+    def test_handshake_timeout(self):
+        server = self._start_server(handshake_timeout=0.1)
+        sock = eventlet.connect(('127.0.0.1', server.port))
+        # Half a request is never completed
+        sock.sendall(b'GET / HTTP/1.1\r\n')
+        with eventlet.Timeout(5):
+            self.assertEqual(b'', sock.recv(65536))
+        sock.close()
+
+    def test_idle_timeout(self):
+        server = self._start_server(idle_timeout=0.1)
+        console = eventlet.listen(('127.0.0.1', 0))
+        self.addCleanup(console.close)
+        connect_info = {'host': '127.0.0.1',
+                        'port': console.getsockname()[1],
+                        'internal_access_path': None}
+        with mock.patch.object(websocketproxy.consoleauth_rpcapi,
+                               'ConsoleAuthAPI') as consoleauth:
+            consoleauth.return_value.check_token.return_value = connect_info
+            sock, decoder = proxy_benchmark._connect(
+                'ws://127.0.0.1:%d/?token=fake' % server.port)
+            conn, _address = console.accept()
+        frames = []
+        with eventlet.Timeout(5):
+            while not frames:
+                frames = decoder.feed(sock.recv(65536))
+            self.assertEqual(eventletproxy.OPCODE_CLOSE, frames[0][0])
+            # The connection to the console is closed too
+            self.assertEqual(b'', conn.recv(65536))
+        conn.close()
+        sock.close()
+
+    @mock.patch.object(websocketproxy.consoleauth_rpcapi, 'ConsoleAuthAPI')
+    def test_invalid_token(self, consoleauth):
+        consoleauth.return_value.check_token.return_value = None
+        sock, decoder = proxy_benchmark._connect(self.url)
+        frames = []
+        while not frames:
+            frames = decoder.feed(sock.recv(65536))
+        sock.close()
+        opcode, payload = frames[0]
+        self.assertEqual(eventletproxy.OPCODE_CLOSE, opcode)
+        self.assertEqual(eventletproxy.CLOSE_POLICY_VIOLATION,
+                         struct.unpack('!H', payload[:2])[0])
+
+    def test_session_counters(self):
+        console = eventlet.listen(('127.0.0.1', 0))
+        self.addCleanup(console.close)
+        connect_info = {'host': '127.0.0.1',
+                        'port': console.getsockname()[1],
+                        'internal_access_path': None}
+        with mock.patch.object(websocketproxy.consoleauth_rpcapi,
+                               'ConsoleAuthAPI') as consoleauth:
+            consoleauth.return_value.check_token.return_value = connect_info
+            sock, decoder = proxy_benchmark._connect(self.url)
+            conn, _address = console.accept()
+        sock.sendall(_masked_frame(eventletproxy.OPCODE_BINARY, b'ping'))
+        self.assertEqual(b'ping', conn.recv(4))
+        conn.sendall(b'pong')
+        frames = []
+        while not frames:
+            frames = decoder.feed(sock.recv(65536))
+        self.assertEqual([(eventletproxy.OPCODE_BINARY, b'pong')], frames)
+
+        stats = self.server.stats()
+        self.assertEqual(1, len(stats))
+        self.assertEqual(4, stats[0]['bytes_in'])
+        self.assertEqual(4, stats[0]['bytes_out'])
+        self.assertEqual(1, stats[0]['frames_in'])
+        self.assertEqual(1, stats[0]['frames_out'])
+
+        # Closing the console closes the session.
+        conn.close()
+        frames = []
+        while not frames:
+            frames = decoder.feed(sock.recv(65536))
+        self.assertEqual(eventletproxy.OPCODE_CLOSE, frames[0][0])
+        sock.close()
@@ -0,0 +1,39 @@
+# Copyright (c) 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For the websocket console proxy load generator
+"""
+
+from nova import test
+from nova.tests.unit.console import proxy_benchmark
+
+
+class ProxyBenchmarkTestCase(test.NoDBTestCase):
+
+    def _test_run_benchmark(self, size):
+        report = proxy_benchmark.run_benchmark(sessions=4, messages=5,
+                                               size=size)
+        self.assertEqual({}, report['errors'])
+        self.assertEqual(4 * 5 * size, report['bytes'])
+        latency = report['latency']
+        self.assertTrue(latency['p50'] <= latency['p90'] <= latency['max'])
+        self.assertIn('4 sessions of 5 messages of %d bytes' % size,
+                      proxy_benchmark.format_report(report))
+
+    def test_run_benchmark(self):
+        self._test_run_benchmark(100)
+
+    def test_run_benchmark_large_messages(self):
+        self._test_run_benchmark(100000)
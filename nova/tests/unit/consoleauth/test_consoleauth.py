@@ -18,10 +18,16 @@ Tests for Consoleauth Code.
 
 """
 
+import os
+import stat
+
+import fixtures
+import mock
 from mox3 import mox
 from oslo_utils import timeutils
 
 from nova.consoleauth import manager
+from nova.consoleauth import token_store
 from nova import context
 from nova import db
 from nova import test
@@ -80,7 +86,7 @@ class ConsoleauthTestCase(test.TestCase):
                                           self.instance['uuid'])
         self.manager_api.delete_tokens_for_instance(self.context,
                 self.instance['uuid'])
-        stored_tokens = self.manager._get_tokens_for_instance(
+        stored_tokens = self.manager.token_store.get_tokens_for_instance(
                 self.instance['uuid'])
 
         self.assertEqual(len(stored_tokens), 0)
@@ -115,28 +121,125 @@ class ConsoleauthTestCase(test.TestCase):
         self.manager_api.authorize_console(self.context, token1, 'novnc',
                                        '127.0.0.1', '8080', 'host',
                                        self.instance['uuid'])
-        stored_tokens = self.manager._get_tokens_for_instance(
+        stored_tokens = self.manager.token_store.get_tokens_for_instance(
                 self.instance['uuid'])
         # when trying to store token1, expired token is removed fist.
         self.assertEqual(len(stored_tokens), 1)
         self.assertEqual(stored_tokens[0], token1)
 
+    def test_validation_cache(self):
+        self.flags(console_token_validation_cache_time=10)
+        token = u'mytok'
+        calls = []
+
+        def fake_validate_token(context, token):
+            calls.append(token['token'])
+            return True
+
+        self.stubs.Set(self.manager, '_validate_token', fake_validate_token)
+        self.manager_api.authorize_console(self.context, token, 'novnc',
+                                           '127.0.0.1', '8080', 'host',
+                                           self.instance['uuid'])
+        self.assertTrue(self.manager_api.check_token(self.context, token))
+        self.assertTrue(self.manager_api.check_token(self.context, token))
+        self.assertEqual([token], calls)
+
+        self.manager_api.delete_tokens_for_instance(self.context,
+                                                    self.instance['uuid'])
+        self.assertFalse(self.manager_api.check_token(self.context, token))
+        self.assertEqual({}, self.manager._validated_tokens)
+
+    def test_validation_cache_expires(self):
+        self.useFixture(test.TimeOverride())
+        self.flags(console_token_validation_cache_time=10)
+        token = u'mytok'
+        calls = []
+
+        def fake_validate_token(context, token):
+            calls.append(token['token'])
+            return True
+
+        self.stubs.Set(self.manager, '_validate_token', fake_validate_token)
+        self.manager_api.authorize_console(self.context, token, 'novnc',
+                                           '127.0.0.1', '8080', 'host',
+                                           self.instance['uuid'])
+        self.assertTrue(self.manager_api.check_token(self.context, token))
+        self.stubs.Set(manager.time, 'time', lambda: 1e10)
+        self.assertTrue(self.manager_api.check_token(self.context, token))
+        self.assertEqual([token, token], calls)
+
+
+class SQLiteConsoleauthTestCase(ConsoleauthTestCase):
+    """Test Case for consoleauth with the SQLite token store."""
+
+    def setUp(self):
+        super(SQLiteConsoleauthTestCase, self).setUp()
+        self.flags(console_token_store='nova.consoleauth.token_store.'
+                                       'SQLiteTokenStore',
+                   console_token_store_path=':memory:')
+        self.manager_api = self.manager = manager.ConsoleAuthManager()
+
+    def test_sweep_expired_tokens(self):
+        self.useFixture(test.TimeOverride())
+        self.flags(console_token_ttl=1)
+        for token in (u'mytok', u'mytok2'):
+            timeutils.advance_time_seconds(1)
+            self.manager_api.authorize_console(self.context, token, 'novnc',
+                                               '127.0.0.1', '8080', 'host',
+                                               self.instance['uuid'])
+        self.assertEqual(1, self.manager.token_store.sweep())
+        timeutils.advance_time_seconds(1)
+        self.manager._sweep_expired_tokens(self.context)
+        self.assertEqual(0, self.manager.token_store.sweep())
+
+    def test_tokens_shared_by_stores(self):
+        path = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                            'tokens.sqlite')
+        store = token_store.SQLiteTokenStore(path)
+        other_store = token_store.SQLiteTokenStore(path)
+        token_dict = {'token': 'mytok', 'instance_uuid': 'fake-uuid'}
+        self.assertTrue(store.add('mytok', token_dict, 600))
+        self.assertEqual(token_dict, other_store.get('mytok'))
+        other_store.delete_tokens_for_instance('fake-uuid')
+        self.assertIsNone(store.get('mytok'))
+
+    def test_database_files_private(self):
+        path = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                            'tokens.sqlite')
+        store = token_store.SQLiteTokenStore(path)
+        token_dict = {'token': 'mytok', 'instance_uuid': 'fake-uuid'}
+        self.assertTrue(store.add('mytok', token_dict, 600))
+        for file_path in (path, path + '-wal', path + '-shm'):
+            if os.path.exists(file_path):
+                self.assertEqual(0o600,
+                                 stat.S_IMODE(os.stat(file_path).st_mode))
+
+    def test_statements_run_in_native_threads(self):
+        store = token_store.SQLiteTokenStore(':memory:')
+        with mock.patch.object(token_store.tpool, 'execute',
+                               side_effect=lambda func, *args: func(*args)
+                               ) as mock_execute:
+            self.assertIsNone(store.get('mytok'))
+        mock_execute.assert_called_once_with(store._execute_sync, mock.ANY,
+                                             ('mytok', mock.ANY))
+
 
 class ControlauthMemcacheEncodingTestCase(test.TestCase):
     def setUp(self):
         super(ControlauthMemcacheEncodingTestCase, self).setUp()
         self.manager = manager.ConsoleAuthManager()
+        self.mc = self.manager.token_store.mc
         self.context = context.get_admin_context()
         self.u_token = u"token"
         self.u_instance = u"instance"
 
     def test_authorize_console_encoding(self):
-        self.mox.StubOutWithMock(self.manager.mc, "set")
-        self.mox.StubOutWithMock(self.manager.mc, "get")
-        self.manager.mc.set(mox.IsA(str), mox.IgnoreArg(), mox.IgnoreArg()
-                           ).AndReturn(True)
-        self.manager.mc.get(mox.IsA(str)).AndReturn(None)
-        self.manager.mc.set(mox.IsA(str), mox.IgnoreArg()).AndReturn(True)
+        self.mox.StubOutWithMock(self.mc, "set")
+        self.mox.StubOutWithMock(self.mc, "get")
+        self.mc.set(mox.IsA(str), mox.IgnoreArg(), mox.IgnoreArg()
+                    ).AndReturn(True)
+        self.mc.get(mox.IsA(str)).AndReturn(None)
+        self.mc.set(mox.IsA(str), mox.IgnoreArg()).AndReturn(True)
 
         self.mox.ReplayAll()
 
@@ -145,19 +248,19 @@ class ControlauthMemcacheEncodingTestCase(test.TestCase):
                                        self.u_instance)
 
     def test_check_token_encoding(self):
-        self.mox.StubOutWithMock(self.manager.mc, "get")
-        self.manager.mc.get(mox.IsA(str)).AndReturn(None)
+        self.mox.StubOutWithMock(self.mc, "get")
+        self.mc.get(mox.IsA(str)).AndReturn(None)
 
         self.mox.ReplayAll()
 
         self.manager.check_token(self.context, self.u_token)
 
     def test_delete_tokens_for_instance_encoding(self):
-        self.mox.StubOutWithMock(self.manager.mc, "delete")
-        self.mox.StubOutWithMock(self.manager.mc, "get")
-        self.manager.mc.get(mox.IsA(str)).AndReturn('["token"]')
-        self.manager.mc.delete(mox.IsA(str)).AndReturn(True)
-        self.manager.mc.delete(mox.IsA(str)).AndReturn(True)
+        self.mox.StubOutWithMock(self.mc, "delete")
+        self.mox.StubOutWithMock(self.mc, "get")
+        self.mc.get(mox.IsA(str)).AndReturn('["token"]')
+        self.mc.delete(mox.IsA(str)).AndReturn(True)
+        self.mc.delete(mox.IsA(str)).AndReturn(True)
 
         self.mox.ReplayAll()
 
@@ -80,11 +80,12 @@ def _reservation_get(context, uuid):
     return result
 
 
-def _quota_reserve(context, project_id, user_id):
+def _quota_reserve(context, project_id, user_id, reserve=None):
     """Create sample Quota, QuotaUsage and Reservation objects.
 
     There is no method db.quota_usage_create(), so we have to use
-    db.quota_reserve() for creating QuotaUsage objects.
+    db.quota_reserve(), or the given reserve function, for creating
+    QuotaUsage objects.
 
     Returns reservations uuids.
 
@@ -120,9 +121,10 @@ def _quota_reserve(context, project_id, user_id):
         setattr(sqlalchemy_api, sync_name, get_sync(resource, i))
         sqlalchemy_api.QUOTA_SYNC_FUNCTIONS[sync_name] = getattr(
             sqlalchemy_api, sync_name)
-    return db.quota_reserve(context, resources, quotas, user_quotas, deltas,
-                    timeutils.utcnow(), CONF.until_refresh,
-                    datetime.timedelta(days=1), project_id, user_id)
+    reserve = reserve or db.quota_reserve
+    return reserve(context, resources, quotas, user_quotas, deltas,
+                   timeutils.utcnow(), CONF.until_refresh,
+                   datetime.timedelta(days=1), project_id, user_id)
 
 
 class DbTestCase(test.TestCase):
@@ -246,6 +248,33 @@ class UnsupportedDbRegexpTestCase(DbTestCase):
                           self.context, {'display_name': '%test%'},
                           marker=str(stdlib_uuid.uuid4()))
 
+    def test_instance_get_all_by_filters_paginate_marker_keys(self,
+                                                              mock_regexp):
+        test1 = self.create_instance_with_args(display_name='test1')
+        test2 = self.create_instance_with_args(display_name='test2')
+
+        # The marker is looked up by its sort keys, not as a whole instance
+        with mock.patch.object(sqlalchemy_api,
+                               '_instance_get_by_uuid') as mock_get:
+            result = db.instance_get_all_by_filters_sort(
+                self.context, {'display_name': '%test%'},
+                marker=test1['uuid'], sort_keys=['display_name', 'uuid'],
+                sort_dirs=['asc', 'asc'])
+            self.assertFalse(mock_get.called)
+        self.assertEqual([test2['uuid']], [inst['uuid'] for inst in result])
+
+        # A marker deleted since its page was listed is still sought past
+        db.instance_destroy(self.context, test1['uuid'])
+        result = db.instance_get_all_by_filters_sort(
+            self.context, {'display_name': '%test%'}, marker=test1['uuid'],
+            sort_keys=['display_name', 'uuid'], sort_dirs=['asc', 'asc'])
+        self.assertEqual([test2['uuid']], [inst['uuid'] for inst in result])
+
+        self.assertRaises(exception.InvalidSortKey,
+                          db.instance_get_all_by_filters_sort,
+                          self.context, {}, marker=test1['uuid'],
+                          sort_keys=['foo'])
+
     def _assert_equals_inst_order(self, correct_order, filters,
                                   sort_keys=None, sort_dirs=None,
                                   limit=None, marker=None,
@@ -1534,6 +1563,111 @@ class ReservationTestCase(test.TestCase, ModelsObjectComparatorMixin):
                                             self.ctxt, 'project1', 'user1'))
 
 
+class OptimisticReservationTestCase(test.TestCase):
+
+    """Tests for the db.api.*_optimistic reservation methods."""
+
+    def setUp(self):
+        super(OptimisticReservationTestCase, self).setUp()
+        self.ctxt = context.get_admin_context()
+        self.reservations = _quota_reserve(
+            self.ctxt, 'project1', 'user1',
+            reserve=db.quota_reserve_optimistic)
+
+    def _assertUsages(self, reserved, in_use):
+        expected = {'project_id': 'project1', 'user_id': 'user1',
+                    'resource0': {'reserved': 0, 'in_use': 0},
+                    'resource1': {'reserved': reserved, 'in_use': in_use},
+                    'fixed_ips': {'reserved': reserved * 2,
+                                  'in_use': in_use * 2}}
+        self.assertEqual(expected, db.quota_usage_get_all_by_project_and_user(
+                                            self.ctxt, 'project1', 'user1'))
+
+    def test_quota_reserve(self):
+        self._assertUsages(reserved=1, in_use=1)
+        for reservation in self.reservations:
+            _reservation_get(self.ctxt, reservation)
+
+    def test_reservation_commit(self):
+        db.reservation_commit_optimistic(self.ctxt, self.reservations,
+                                         'project1', 'user1')
+        self.assertRaises(exception.ReservationNotFound,
+            _reservation_get, self.ctxt, self.reservations[0])
+        self._assertUsages(reserved=0, in_use=2)
+        # Committing again is a no-op
+        db.reservation_commit_optimistic(self.ctxt, self.reservations,
+                                         'project1', 'user1')
+        self._assertUsages(reserved=0, in_use=2)
+
+    def test_reservation_rollback(self):
+        db.reservation_rollback_optimistic(self.ctxt, self.reservations,
+                                           'project1', 'user1')
+        self.assertRaises(exception.ReservationNotFound,
+            _reservation_get, self.ctxt, self.reservations[0])
+        self._assertUsages(reserved=0, in_use=1)
+
+    def test_reservation_expire(self):
+        db.reservation_expire_optimistic(self.ctxt)
+        self.assertRaises(exception.ReservationNotFound,
+            _reservation_get, self.ctxt, self.reservations[0])
+        self._assertUsages(reserved=0, in_use=1)
+        # The expired reservations are only rolled back once
+        db.reservation_rollback_optimistic(self.ctxt, self.reservations)
+        db.reservation_expire_optimistic(self.ctxt)
+        self._assertUsages(reserved=0, in_use=1)
+
+    @mock.patch('time.sleep')
+    def test_quota_reserve_retries_on_conflict(self, mock_sleep):
+        db.reservation_rollback_optimistic(self.ctxt, self.reservations)
+        resources = {'resource1': quota.ReservableResource(
+            'resource1', '_sync_resource1')}
+        quotas = {'resource1': 2}
+        expire = timeutils.utcnow() + datetime.timedelta(days=1)
+        update = sqlalchemy_api._quota_usage_update_if_unchanged
+        conflicts = []
+
+        def fake_update(*args):
+            if not conflicts:
+                conflicts.append(args)
+                return False
+            return update(*args)
+
+        with mock.patch.object(sqlalchemy_api,
+                               '_quota_usage_update_if_unchanged',
+                               side_effect=fake_update):
+            db.quota_reserve_optimistic(self.ctxt, resources, quotas, quotas,
+                                        {'resource1': 1}, expire, None, None,
+                                        'project1', 'user1')
+        self.assertEqual(1, len(conflicts))
+        # The usage was written once, by the retried reservation
+        usage = db.quota_usage_get(self.ctxt, 'project1', 'resource1',
+                                   'user1')
+        self.assertEqual((1, 1), (usage.in_use, usage.reserved))
+
+    def test_quota_reserve_concurrent_over_project_quota(self):
+        resources = {'resource1': quota.ReservableResource(
+            'resource1', '_sync_resource1')}
+        quotas = {'resource1': 4}
+        deltas = {'resource1': 2}
+        expire = timeutils.utcnow() + datetime.timedelta(days=1)
+        db.quota_reserve_optimistic(self.ctxt, resources, quotas, quotas,
+                                    deltas, expire, None, None, 'project2',
+                                    'user2')
+        # user1 read the usages of the project before the reservation of
+        # user2, and passes the initial quota check.
+        with mock.patch.object(sqlalchemy_api,
+                               '_get_project_user_quota_usages',
+                               return_value=({}, {})):
+            self.assertRaises(exception.OverQuota,
+                              db.quota_reserve_optimistic, self.ctxt,
+                              resources, quotas, quotas, deltas, expire,
+                              None, None, 'project2', 'user1')
+        self.assertEqual({'project_id': 'project2',
+                          'resource1': {'in_use': 2, 'reserved': 2}},
+                         db.quota_usage_get_all_by_project(self.ctxt,
+                                                           'project2'))
+
+
 class SecurityGroupRuleTestCase(test.TestCase, ModelsObjectComparatorMixin):
     def setUp(self):
         super(SecurityGroupRuleTestCase, self).setUp()
@@ -2907,6 +3041,30 @@ class ServiceTestCase(test.TestCase, ModelsObjectComparatorMixin):
         self.assertRaises(exception.ServiceNotFound,
                           db.service_update, self.ctxt, 100500, {})
 
+    def test_service_update_heartbeats(self):
+        service1 = self._create_service({})
+        service2 = self._create_service({'host': 'fake_host2'})
+        service3 = self._create_service({'host': 'fake_host3'})
+        last_seen_up1 = datetime.datetime(2015, 1, 1, 0, 0, 10)
+        last_seen_up2 = datetime.datetime(2015, 1, 1, 0, 0, 20)
+
+        db.service_update_heartbeats(self.ctxt, {
+            service1['id']: (1, last_seen_up1),
+            service2['id']: (2, last_seen_up2)})
+        updated_service1 = db.service_get(self.ctxt, service1['id'])
+        self.assertEqual(4, updated_service1['report_count'])
+        self.assertEqual(last_seen_up1, updated_service1['last_seen_up'])
+        self.assertIsNotNone(updated_service1['updated_at'])
+        updated_service2 = db.service_get(self.ctxt, service2['id'])
+        self.assertEqual(5, updated_service2['report_count'])
+        self.assertEqual(last_seen_up2, updated_service2['last_seen_up'])
+        self._assertEqualObjects(service3,
+                                 db.service_get(self.ctxt, service3['id']),
+                                 ignored_keys=['compute_node'])
+
+        # Nothing to update
+        db.service_update_heartbeats(self.ctxt, {})
+
     def test_service_update_with_set_forced_down(self):
         service = self._create_service({})
         db.service_update(self.ctxt, service['id'], {'forced_down': True})
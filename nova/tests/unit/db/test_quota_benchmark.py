@@ -0,0 +1,51 @@
+# Copyright (c) 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For the quota reservation benchmark
+"""
+
+from nova import test
+from nova.tests.unit.db import quota_benchmark
+
+
+class QuotaBenchmarkTestCase(test.TestCase):
+
+    def setUp(self):
+        super(QuotaBenchmarkTestCase, self).setUp()
+        self.flags(until_refresh=0, max_age=0)
+
+    def _test_run_benchmark(self, driver, users=1):
+        report = quota_benchmark.run_benchmark(driver, workers=4,
+                                               reservations=10, users=users)
+        self.assertEqual(driver, report['driver'])
+        self.assertEqual(10, report['committed'])
+        self.assertEqual({}, report['errors'])
+        self.assertTrue(report['consistent'])
+        latency = report['latency']
+        self.assertTrue(latency['p50'] <= latency['p90'] <= latency['max'])
+        self.assertIn('%s, 4 workers' % driver,
+                      quota_benchmark.format_report(report))
+
+    def test_run_benchmark_db(self):
+        self._test_run_benchmark('db')
+
+    def test_run_benchmark_optimistic(self):
+        self._test_run_benchmark('optimistic')
+
+    def test_run_benchmark_optimistic_users(self):
+        self._test_run_benchmark('optimistic', users=3)
+
+    def test_run_benchmark_unknown_driver(self):
+        self.assertRaises(ValueError, quota_benchmark.run_benchmark, 'foo')
@@ -0,0 +1,281 @@
+# Copyright (c) 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Benchmark of the image downloads against a local stand-in for Glance.
+
+An HTTP server started in this process serves a random image, throttling
+each connection to a bandwidth and delaying each response, like a Glance
+API or store whose bandwidth per stream is limited.  The image is
+downloaded through GlanceImageService.download, over a single stream as
+by the Glance API, and with the ranged transfer module from its http
+location, in a growing number of concurrent byte ranges, for instance:
+
+    python -m nova.tests.unit.image.download_benchmark --size 256 \\
+        --stream-rate 20 --ranges 1 --ranges 4 --ranges 8
+
+Each run reports the duration and the bandwidth of the download, and the
+number of requests made to the server.
+"""
+
+from __future__ import print_function
+
+import argparse
+import collections
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+import eventlet
+import mock
+from oslo_config import cfg
+import requests
+
+from nova import context
+from nova.image.download import ranged
+from nova.image import glance
+from nova import test
+from nova import wsgi
+
+CONF = cfg.CONF
+
+
+class ImageServer(object):
+    """Serves an image over HTTP, honouring single byte ranges.
+
+    :param data: the image
+    :param stream_rate: bandwidth of each connection in bytes per second,
+                        or None
+    :param latency: seconds to wait before each response
+    :param ignore_ranges: whether to send the whole image to the requests
+                          of byte ranges
+    :param failures: number of responses dropped after fail_after bytes
+    :param fail_after: bytes sent by the dropped responses
+    """
+
+    chunk_size = 64 * 1024
+
+    def __init__(self, data, stream_rate=None, latency=0,
+                 ignore_ranges=False, failures=0, fail_after=0):
+        self.data = data
+        self.stream_rate = stream_rate
+        self.latency = latency
+        self.ignore_ranges = ignore_ranges
+        self.failures = failures
+        self.fail_after = fail_after
+        self.requests = 0
+        self.bytes_sent = 0
+        self.server = wsgi.Server('Image stand-in', self, host='127.0.0.1',
+                                  port=0)
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%d/image' % self.server.port
+
+    def start(self):
+        self.server.start()
+
+    def stop(self):
+        self.server.stop()
+
+    def _range(self, environ):
+        size = len(self.data)
+        header = environ.get('HTTP_RANGE')
+        if self.ignore_ranges or not header or not header.startswith(
+                'bytes='):
+            return None
+        start, end = header[len('bytes='):].split('-')
+        if not start:
+            return max(size - int(end), 0), size
+        return int(start), min(int(end or size - 1) + 1, size)
+
+    def __call__(self, environ, start_response):
+        self.requests += 1
+        if self.latency:
+            eventlet.sleep(self.latency)
+        size = len(self.data)
+        byte_range = self._range(environ)
+        if byte_range is None:
+            start, end = 0, size
+            status = '200 OK'
+            headers = []
+        else:
+            start, end = byte_range
+            status = '206 Partial Content'
+            headers = [('Content-Range',
+                        'bytes %d-%d/%d' % (start, end - 1, size))]
+        headers.append(('Content-Length', str(end - start)))
+        headers.append(('Content-Type', 'application/octet-stream'))
+        start_response(status, headers)
+        if environ['REQUEST_METHOD'] == 'HEAD':
+            return []
+        fail = False
+        if self.failures and end - start > self.fail_after:
+            self.failures -= 1
+            fail = True
+        return self._body(start, end, fail)
+
+    def _body(self, start, end, fail):
+        sent = 0
+        while start < end:
+            if fail and sent >= self.fail_after:
+                # Drops the connection in the middle of the response
+                raise IOError('Dropped response')
+            chunk_end = min(start + self.chunk_size, end)
+            if fail:
+                chunk_end = min(chunk_end, start + self.fail_after - sent)
+            chunk = self.data[start:chunk_end]
+            if self.stream_rate:
+                eventlet.sleep(float(len(chunk)) / self.stream_rate)
+            self.bytes_sent += len(chunk)
+            sent += len(chunk)
+            start = chunk_end
+            yield chunk
+
+
+class _HttpGlanceClient(object):
+    """Glance client getting the image data from the stand-in server over
+    a single stream, as from the Glance API.
+    """
+
+    def __init__(self, url):
+        self.url = url
+
+    def call(self, ctxt, version, method, *args, **kwargs):
+        if method != 'data':
+            raise NotImplementedError(method)
+        response = requests.get(self.url, stream=True)
+        response.raise_for_status()
+        return response.iter_content(64 * 1024)
+
+
+def download(server, dst_path, ranges=None, checksum=None):
+    """Download the image of a server with GlanceImageService.download,
+    over a single stream or in ranges.
+
+    :param ranges: number of concurrent byte ranges, None to download the
+                   image from the Glance API
+    """
+    data = server.data
+    image = {'id': 'fake-image', 'status': 'active', 'size': len(data),
+             'checksum': checksum or hashlib.md5(data).hexdigest(),
+             'locations': [{'url': server.url, 'metadata': {}}]}
+    service = glance.GlanceImageService(_HttpGlanceClient(server.url))
+    service._download_handlers = {}
+    if ranges is not None:
+        CONF.set_override('ranges', ranges, group='image_http_url')
+        service._download_handlers['http'] = ranged.RangedTransfer()
+    ctxt = context.RequestContext('fake', 'fake')
+    with mock.patch.object(service, 'show', return_value=image):
+        service.download(ctxt, image['id'], dst_path=dst_path)
+
+
+def run_benchmark(size=64, ranges=(1, 4), stream_rate=None, latency=0):
+    """Download an image of size MB with the Glance API and in each number
+    of ranges, and return a report.
+
+    :param stream_rate: bandwidth of each connection in MB per second, or
+                        None
+    :param latency: seconds to wait before each response
+    """
+    data = os.urandom(size * 1024 * 1024)
+    checksum = hashlib.md5(data).hexdigest()
+    server = ImageServer(data, stream_rate=stream_rate and
+                         stream_rate * 1024 * 1024, latency=latency)
+    directory = tempfile.mkdtemp()
+    report = collections.OrderedDict()
+    report['size'] = size
+    report['stream_rate'] = stream_rate
+    report['runs'] = []
+    server.start()
+    try:
+        for count in (None,) + tuple(ranges):
+            dst_path = os.path.join(directory, 'image-%s' % count)
+            server.requests = 0
+            start = time.time()
+            download(server, dst_path, count, checksum)
+            elapsed = time.time() - start
+            with open(dst_path, 'rb') as image_file:
+                valid = (hashlib.md5(image_file.read()).hexdigest() ==
+                         checksum)
+            os.unlink(dst_path)
+            report['runs'].append(collections.OrderedDict([
+                ('ranges', count),
+                ('elapsed', elapsed),
+                ('bandwidth', len(data) / elapsed if elapsed else None),
+                ('requests', server.requests),
+                ('valid', valid),
+            ]))
+    finally:
+        server.stop()
+        shutil.rmtree(directory)
+    return report
+
+
+def format_report(report):
+    lines = ['%(size)dMB image, %(rate)s per stream:' %
+             dict(report, rate='%dMB/s' % report['stream_rate']
+                  if report['stream_rate'] else 'unlimited')]
+    for run in report['runs']:
+        lines.append('  %s: %.2fs, %.2f MB/s, %d requests%s' % (
+            'glance API' if run['ranges'] is None
+            else '%d ranges' % run['ranges'],
+            run['elapsed'], (run['bandwidth'] or 0.0) / 1024.0 / 1024.0,
+            run['requests'], '' if run['valid'] else ', INVALID'))
+    return '\n'.join(lines)
+
+
+class DownloadBenchmark(test.NoDBTestCase):
+    """Runs the benchmark within the usual unit test fixtures, which provide
+    the configuration.
+    """
+
+    def __init__(self, args):
+        super(DownloadBenchmark, self).__init__('run_benchmark')
+        self.args = args
+
+    def run_benchmark(self):
+        self.flags(allowed_direct_url_schemes=['http'], group='glance')
+        self.flags(min_range_size=0, group='image_http_url')
+        report = run_benchmark(self.args.size, self.args.ranges,
+                               self.args.stream_rate, self.args.latency)
+        print(format_report(report))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--size', type=int, default=64,
+                        help='size in MB of the image')
+    parser.add_argument('--ranges', type=int, action='append',
+                        help='number of concurrent byte ranges, can be '
+                             'repeated (default: 1, 4 and 8)')
+    parser.add_argument('--stream-rate', type=int,
+                        help='bandwidth in MB/s of each connection to the '
+                             'server (default: unlimited)')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='seconds to wait before each response')
+    args = parser.parse_args(argv)
+    args.ranges = args.ranges or [1, 4, 8]
+
+    result = unittest.TextTestRunner().run(DownloadBenchmark(args))
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
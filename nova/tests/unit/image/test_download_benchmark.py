@@ -0,0 +1,40 @@
+# Copyright (c) 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For the image download benchmark
+"""
+
+from nova import test
+from nova.tests.unit.image import download_benchmark
+
+
+class DownloadBenchmarkTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(DownloadBenchmarkTestCase, self).setUp()
+        self.flags(allowed_direct_url_schemes=['http'], group='glance')
+        self.flags(min_range_size=0, group='image_http_url')
+
+    def test_run_benchmark(self):
+        report = download_benchmark.run_benchmark(size=1, ranges=(1, 4))
+        self.assertEqual([None, 1, 4],
+                         [run['ranges'] for run in report['runs']])
+        self.assertEqual([1, 1, 4],
+                         [run['requests'] for run in report['runs']])
+        self.assertTrue(all(run['valid'] for run in report['runs']))
+        output = download_benchmark.format_report(report)
+        self.assertIn('1MB image, unlimited per stream', output)
+        self.assertIn('glance API', output)
+        self.assertIn('4 ranges', output)
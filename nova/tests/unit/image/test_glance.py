@@ -576,9 +576,9 @@ class TestDownloadNoDirectUri(test.NoDBTestCase):
                                           mock.sentinel.image_id,
                                           include_locations=True)
         get_tran_mock.assert_called_once_with('file')
-        tran_mod.download.assert_called_once_with(ctx, mock.ANY,
-                                                  mock.sentinel.dst_path,
-                                                  mock.sentinel.loc_meta)
+        tran_mod.download.assert_called_once_with(
+            ctx, mock.ANY, mock.sentinel.dst_path, mock.sentinel.loc_meta,
+            image_meta=show_mock.return_value)
 
     @mock.patch('__builtin__.open')
     @mock.patch('nova.image.glance.GlanceImageService._get_transfer_module')
@@ -615,9 +615,9 @@ class TestDownloadNoDirectUri(test.NoDBTestCase):
                                           mock.sentinel.image_id,
                                           include_locations=True)
         get_tran_mock.assert_called_once_with('file')
-        tran_mod.download.assert_called_once_with(ctx, mock.ANY,
-                                                  mock.sentinel.dst_path,
-                                                  mock.sentinel.loc_meta)
+        tran_mod.download.assert_called_once_with(
+            ctx, mock.ANY, mock.sentinel.dst_path, mock.sentinel.loc_meta,
+            image_meta=show_mock.return_value)
         client.call.assert_called_once_with(ctx, 1, 'data',
                                             mock.sentinel.image_id)
         # NOTE(jaypipes): log messages call open() in part of the
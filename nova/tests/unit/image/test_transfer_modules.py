@@ -12,13 +12,19 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import hashlib
+import os
+
+import fixtures
 import six.moves.urllib.parse as urlparse
 
 import mock
 
 from nova import exception
 from nova.image.download import file as tm_file
+from nova.image.download import ranged as tm_ranged
 from nova import test
+from nova.tests.unit.image import download_benchmark
 
 
 class TestFileTransferModule(test.NoDBTestCase):
@@ -99,3 +105,124 @@ class TestFileTransferModule(test.NoDBTestCase):
                           tm.download, mock.sentinel.ctx, url_parts,
                           dst_file, loc_meta)
         self.assertFalse(copy_mock.called)
+
+
+class TestRangedTransferModule(test.NoDBTestCase):
+
+    def setUp(self):
+        super(TestRangedTransferModule, self).setUp()
+        self.flags(ranges=4, min_range_size=1000, chunk_size=512,
+                   range_retries=1, group='image_http_url')
+        self.data = os.urandom(10000)
+        self.image_meta = {'size': len(self.data),
+                           'checksum': hashlib.md5(self.data).hexdigest()}
+        self.dst_path = os.path.join(self.useFixture(
+            fixtures.TempDir()).path, 'image')
+
+    def _start_server(self, **kwargs):
+        server = download_benchmark.ImageServer(self.data, **kwargs)
+        server.start()
+        self.addCleanup(server.stop)
+        return server
+
+    def _download(self, server, image_meta=None):
+        tm = tm_ranged.RangedTransfer()
+        tm.download(mock.sentinel.ctx, urlparse.urlparse(server.url),
+                    self.dst_path, {}, image_meta=image_meta or
+                    self.image_meta)
+
+    def _assert_downloaded(self):
+        with open(self.dst_path, 'rb') as image_file:
+            self.assertEqual(self.data, image_file.read())
+        self.assertFalse(os.path.exists(self.dst_path +
+                                        tm_ranged.STATE_SUFFIX))
+
+    def test_split_ranges(self):
+        ranges = tm_ranged.split_ranges(10, 4, 3)
+        self.assertEqual([[0, 4, 0], [4, 7, 0], [7, 10, 0]],
+                         [r.to_list() for r in ranges])
+        ranges = tm_ranged.split_ranges(0, 4, 3)
+        self.assertEqual([[0, 0, 0]], [r.to_list() for r in ranges])
+
+    def test_incremental_checksum(self):
+        with open(self.dst_path, 'wb') as image_file:
+            image_file.write(self.data)
+        ranges = [tm_ranged.ByteRange(0, 5000),
+                  tm_ranged.ByteRange(5000, 10000)]
+        checksum = tm_ranged.IncrementalChecksum(self.dst_path, ranges, 512)
+
+        # The second range is read back once the first one is complete
+        ranges[1].done = 5000
+        checksum.update(5000, self.data[5000:])
+        self.assertEqual(0, checksum.offset)
+        ranges[0].done = 5000
+        checksum.update(0, self.data[:5000])
+        self.assertEqual(10000, checksum.offset)
+        self.assertEqual(self.image_meta['checksum'], checksum.hexdigest())
+
+    def test_download(self):
+        server = self._start_server()
+        self._download(server)
+        self._assert_downloaded()
+        self.assertEqual(4, server.requests)
+        self.assertEqual(len(self.data), server.bytes_sent)
+
+    def test_download_without_size(self):
+        server = self._start_server()
+        self._download(server, {'checksum': self.image_meta['checksum']})
+        self._assert_downloaded()
+        # The size is requested first
+        self.assertEqual(5, server.requests)
+
+    def test_download_ranges_ignored(self):
+        self.flags(ranges=1, group='image_http_url')
+        server = self._start_server(ignore_ranges=True)
+        self._download(server)
+        self._assert_downloaded()
+
+    def test_download_ranges_ignored_fails(self):
+        server = self._start_server(ignore_ranges=True)
+        self.assertRaises(exception.ImageDownloadModuleError,
+                          self._download, server)
+
+    def test_download_bad_checksum(self):
+        server = self._start_server()
+        self.assertRaises(exception.ImageDownloadModuleError,
+                          self._download, server,
+                          dict(self.image_meta, checksum='0' * 32))
+        self.assertFalse(os.path.exists(self.dst_path +
+                                        tm_ranged.STATE_SUFFIX))
+
+    def test_download_retries_range(self):
+        server = self._start_server(failures=1, fail_after=1000)
+        self._download(server)
+        self._assert_downloaded()
+        # The failed range is requested again from where it stopped
+        self.assertEqual(5, server.requests)
+
+    def test_download_resumed(self):
+        self.flags(range_retries=0, group='image_http_url')
+        server = self._start_server(failures=2, fail_after=1000)
+        self.assertRaises(Exception, self._download, server)
+        self.assertTrue(os.path.exists(self.dst_path +
+                                       tm_ranged.STATE_SUFFIX))
+        sent = server.bytes_sent
+
+        self._download(server)
+        self._assert_downloaded()
+        # Only the missing bytes of the two failed ranges are downloaded
+        self.assertEqual(2, server.requests - 4)
+        self.assertTrue(server.bytes_sent - sent < 5000)
+
+    def test_download_not_resumed_other_image(self):
+        self.flags(range_retries=0, group='image_http_url')
+        server = self._start_server(failures=2, fail_after=1000)
+        self.assertRaises(Exception, self._download, server)
+
+        self.data = self.data[::-1]
+        self.image_meta['checksum'] = hashlib.md5(self.data).hexdigest()
+        server.data = self.data
+        server.bytes_sent = 0
+        self._download(server)
+        self._assert_downloaded()
+        self.assertEqual(len(self.data), server.bytes_sent)
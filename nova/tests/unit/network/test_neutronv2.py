@@ -598,23 +598,20 @@ class TestNeutronv2Base(test.TestCase):
         nets = number == 1 and self.nets1 or self.nets2
         self.moxed_client.list_networks(
             id=net_ids).AndReturn({'networks': nets})
-        for i in range(1, number + 1):
-            float_data = number == 1 and self.float_data1 or self.float_data2
-            for ip in port_data[i - 1]['fixed_ips']:
-                float_data = [x for x in float_data
-                              if x['fixed_ip_address'] == ip['ip_address']]
-                self.moxed_client.list_floatingips(
-                    fixed_ip_address=ip['ip_address'],
-                    port_id=port_data[i - 1]['id']).AndReturn(
-                        {'floatingips': float_data})
-            subnet_data = i == 1 and self.subnet_data1 or self.subnet_data2
-            self.moxed_client.list_subnets(
-                id=mox.SameElementsAs(['my_subid%s' % i])).AndReturn(
-                    {'subnets': subnet_data})
-            self.moxed_client.list_ports(
-                network_id=subnet_data[0]['network_id'],
-                device_owner='network:dhcp').AndReturn(
-                    {'ports': []})
+        float_data = number == 1 and self.float_data1 or self.float_data2
+        self.moxed_client.list_floatingips(
+            port_id=[port['id'] for port in port_data]).AndReturn(
+                {'floatingips': float_data})
+        subnet_data = self.subnet_data1
+        if number == 2:
+            subnet_data = subnet_data + self.subnet_data2
+        self.moxed_client.list_subnets(
+            id=['my_subid%s' % i for i in range(1, number + 1)]).AndReturn(
+                {'subnets': subnet_data})
+        self.moxed_client.list_ports(
+            network_id=[subnet['network_id'] for subnet in subnet_data],
+            device_owner='network:dhcp').AndReturn(
+                {'ports': []})
         self.instance['info_cache'] = self._fake_instance_info_cache(
             net_info_cache, self.instance['uuid'])
         self.mox.StubOutWithMock(api.db, 'instance_info_cache_get')
@@ -772,29 +769,28 @@ class TestNeutronv2(TestNeutronv2Base):
                 for iface in ifaces]
             port_ids = [iface['id'] for iface in ifaces] + port_ids
 
-        index = 0
-
         current_neutron_port_map = {}
         for current_neutron_port in current_neutron_ports:
             current_neutron_port_map[current_neutron_port['id']] = (
                 current_neutron_port)
-        for port_id in port_ids:
-            current_neutron_port = current_neutron_port_map.get(port_id)
-            if current_neutron_port:
-                for ip in current_neutron_port['fixed_ips']:
-                    self.moxed_client.list_floatingips(
-                        fixed_ip_address=ip['ip_address'],
-                        port_id=current_neutron_port['id']).AndReturn(
-                            {'floatingips': [self.float_data2[index]]})
-                    self.moxed_client.list_subnets(
-                        id=mox.SameElementsAs([ip['subnet_id']])
-                        ).AndReturn(
-                            {'subnets': [self.subnet_data_n[index]]})
-                    self.moxed_client.list_ports(
-                        network_id=current_neutron_port['network_id'],
-                        device_owner='network:dhcp').AndReturn(
-                        {'ports': self.dhcp_port_data1})
-                    index += 1
+        ports = [current_neutron_port_map[port_id] for port_id in port_ids
+                 if port_id in current_neutron_port_map]
+        fixed_ips = [ip for port in ports for ip in port['fixed_ips']]
+        index = len(fixed_ips)
+        if fixed_ips:
+            # The floating IPs, subnets and DHCP ports of all the ports are
+            # listed at once
+            self.moxed_client.list_floatingips(
+                port_id=[port['id'] for port in ports]).AndReturn(
+                    {'floatingips': self.float_data2[:index]})
+            self.moxed_client.list_subnets(
+                id=[ip['subnet_id'] for ip in fixed_ips]).AndReturn(
+                    {'subnets': self.subnet_data_n[:index]})
+            self.moxed_client.list_ports(
+                network_id=[subnet['network_id']
+                            for subnet in self.subnet_data_n[:index]],
+                device_owner='network:dhcp').AndReturn(
+                    {'ports': self.dhcp_port_data1})
         self.instance['info_cache'] = self._fake_instance_info_cache(
             network_cache['info_cache']['network_info'], self.instance['uuid'])
 
@@ -1413,13 +1409,10 @@ class TestNeutronv2(TestNeutronv2Base):
         self.moxed_client.list_networks(id=net_ids).AndReturn(
             {'networks': nets})
         float_data = number == 1 and self.float_data1 or self.float_data2
-        for data in port_data[1:]:
-            for ip in data['fixed_ips']:
-                self.moxed_client.list_floatingips(
-                    fixed_ip_address=ip['ip_address'],
-                    port_id=data['id']).AndReturn(
-                        {'floatingips': float_data[1:]})
-        for port in port_data[1:]:
+        if port_data[1:]:
+            self.moxed_client.list_floatingips(
+                port_id=[data['id'] for data in port_data[1:]]).AndReturn(
+                    {'floatingips': float_data[1:]})
             self.moxed_client.list_subnets(id=['my_subid2']).AndReturn({})
 
         self.mox.StubOutWithMock(api.db, 'instance_info_cache_get')
@@ -2333,29 +2326,36 @@ class TestNeutronv2(TestNeutronv2Base):
         NeutronNotFound = exceptions.NeutronClientException(
             status_code=404)
         self.moxed_client.list_floatingips(
-            fixed_ip_address='1.1.1.1', port_id=1).AndRaise(NeutronNotFound)
+            port_id=[1]).AndRaise(NeutronNotFound)
         self.mox.ReplayAll()
         neutronapi.get_client('fake')
-        floatingips = api._get_floating_ips_by_fixed_and_port(
-            self.moxed_client, '1.1.1.1', 1)
+        floatingips = api._get_floating_ips_by_ports(self.moxed_client, [1])
         self.assertEqual(floatingips, [])
 
+    def test_get_floating_ips_by_ports_without_ports(self):
+        api = neutronapi.API()
+        self.mox.ReplayAll()
+        self.assertEqual(
+            [], api._get_floating_ips_by_ports(self.moxed_client, []))
+
     def test_nw_info_get_ips(self):
         fake_port = {
             'fixed_ips': [
                 {'ip_address': '1.1.1.1'}],
             'id': 'port-id',
             }
-        api = neutronapi.API()
-        self.mox.StubOutWithMock(api, '_get_floating_ips_by_fixed_and_port')
-        api._get_floating_ips_by_fixed_and_port(
-            self.moxed_client, '1.1.1.1', 'port-id').AndReturn(
-                [{'floating_ip_address': '10.0.0.1'}])
-        self.mox.ReplayAll()
-        neutronapi.get_client('fake')
-        result = api._nw_info_get_ips(self.moxed_client, fake_port)
+        fake_floating_ips = [
+            {'port_id': 'port-id', 'fixed_ip_address': '1.1.1.1',
+             'floating_ip_address': '10.0.0.1'},
+            {'port_id': 'other-port-id', 'fixed_ip_address': '1.1.1.1',
+             'floating_ip_address': '10.0.0.2'},
+            {'port_id': 'port-id', 'fixed_ip_address': '1.1.1.2',
+             'floating_ip_address': '10.0.0.3'}]
+        api = neutronapi.API()
+        result = api._nw_info_get_ips(fake_port, fake_floating_ips)
         self.assertEqual(len(result), 1)
         self.assertEqual(result[0]['address'], '1.1.1.1')
+        self.assertEqual(len(result[0]['floating_ips']), 1)
         self.assertEqual(result[0]['floating_ips'][0]['address'], '10.0.0.1')
 
     def test_nw_info_get_subnets(self):
@@ -2369,7 +2369,7 @@ class TestNeutronv2(TestNeutronv2Base):
         fake_ips = [model.IP(x['ip_address']) for x in fake_port['fixed_ips']]
         api = neutronapi.API()
         self.mox.StubOutWithMock(api, '_get_subnets_from_port')
-        api._get_subnets_from_port(self.context, fake_port).AndReturn(
+        api._get_subnets_from_port(self.context, fake_port, None).AndReturn(
             [fake_subnet])
         self.mox.ReplayAll()
         neutronapi.get_client('fake')
@@ -2490,7 +2490,8 @@ class TestNeutronv2(TestNeutronv2Base):
              'network_id': 'net-id',
              'admin_state_up': True,
              'status': 'ACTIVE',
-             'fixed_ips': [{'ip_address': '1.1.1.1'}],
+             'fixed_ips': [{'ip_address': '1.1.1.1',
+                            'subnet_id': 'subnet-id'}],
              'mac_address': 'de:ad:be:ef:00:01',
              'binding:vif_type': model.VIF_TYPE_BRIDGE,
              'binding:vnic_type': model.VNIC_TYPE_NORMAL,
@@ -2501,7 +2502,8 @@ class TestNeutronv2(TestNeutronv2Base):
              'network_id': 'net-id',
              'admin_state_up': False,
              'status': 'DOWN',
-             'fixed_ips': [{'ip_address': '1.1.1.1'}],
+             'fixed_ips': [{'ip_address': '1.1.1.1',
+                            'subnet_id': 'subnet-id'}],
              'mac_address': 'de:ad:be:ef:00:02',
              'binding:vif_type': model.VIF_TYPE_BRIDGE,
              'binding:vnic_type': model.VNIC_TYPE_NORMAL,
@@ -2512,7 +2514,8 @@ class TestNeutronv2(TestNeutronv2Base):
              'network_id': 'net-id',
              'admin_state_up': True,
              'status': 'DOWN',
-             'fixed_ips': [{'ip_address': '1.1.1.1'}],
+             'fixed_ips': [{'ip_address': '1.1.1.1',
+                            'subnet_id': 'subnet-id'}],
              'mac_address': 'de:ad:be:ef:00:03',
              'binding:vif_type': model.VIF_TYPE_BRIDGE,
              'binding:vnic_type': model.VNIC_TYPE_NORMAL,
@@ -2523,7 +2526,8 @@ class TestNeutronv2(TestNeutronv2Base):
              'network_id': 'net-id',
              'admin_state_up': True,
              'status': 'ACTIVE',
-             'fixed_ips': [{'ip_address': '1.1.1.1'}],
+             'fixed_ips': [{'ip_address': '1.1.1.1',
+                            'subnet_id': 'subnet-id'}],
              'mac_address': 'de:ad:be:ef:00:04',
              'binding:vif_type': model.VIF_TYPE_HW_VEB,
              'binding:vnic_type': model.VNIC_TYPE_DIRECT,
@@ -2537,7 +2541,8 @@ class TestNeutronv2(TestNeutronv2Base):
              'network_id': 'net-id',
              'admin_state_up': True,
              'status': 'ACTIVE',
-             'fixed_ips': [{'ip_address': '1.1.1.1'}],
+             'fixed_ips': [{'ip_address': '1.1.1.1',
+                            'subnet_id': 'subnet-id'}],
              'mac_address': 'de:ad:be:ef:00:05',
              'binding:vif_type': model.VIF_TYPE_802_QBH,
              'binding:vnic_type': model.VNIC_TYPE_MACVTAP,
@@ -2552,7 +2557,8 @@ class TestNeutronv2(TestNeutronv2Base):
              'network_id': 'net-id',
              'admin_state_up': True,
              'status': 'ACTIVE',
-             'fixed_ips': [{'ip_address': '1.1.1.1'}],
+             'fixed_ips': [{'ip_address': '1.1.1.1',
+                            'subnet_id': 'subnet-id'}],
              'mac_address': 'de:ad:be:ef:00:06',
              'binding:vif_type': model.VIF_TYPE_BRIDGE,
              # No binding:vnic_type
@@ -2580,16 +2586,25 @@ class TestNeutronv2(TestNeutronv2Base):
             tenant_id='fake', device_id='uuid').AndReturn(
                 {'ports': fake_ports})
 
-        self.mox.StubOutWithMock(api, '_get_floating_ips_by_fixed_and_port')
+        self.mox.StubOutWithMock(api, '_get_floating_ips_by_ports')
+        self.mox.StubOutWithMock(api, '_get_subnets_and_dhcp_servers')
         self.mox.StubOutWithMock(api, '_get_subnets_from_port')
         requested_ports = [fake_ports[2], fake_ports[0], fake_ports[1],
                            fake_ports[3], fake_ports[4], fake_ports[5]]
+        api._get_floating_ips_by_ports(
+            self.moxed_client,
+            [requested_port['id'] for requested_port in requested_ports]
+        ).AndReturn([{'port_id': requested_port['id'],
+                      'fixed_ip_address': '1.1.1.1',
+                      'floating_ip_address': '10.0.0.1'}
+                     for requested_port in requested_ports])
+        fake_port_subnets = {'subnet-id': ({'id': 'subnet-id'}, None)}
+        api._get_subnets_and_dhcp_servers(
+            self.context, ['subnet-id'] * len(requested_ports)).AndReturn(
+                fake_port_subnets)
         for requested_port in requested_ports:
-            api._get_floating_ips_by_fixed_and_port(
-                self.moxed_client, '1.1.1.1', requested_port['id']).AndReturn(
-                    [{'floating_ip_address': '10.0.0.1'}])
-        for requested_port in requested_ports:
-            api._get_subnets_from_port(self.context, requested_port
+            api._get_subnets_from_port(self.context, requested_port,
+                                       fake_port_subnets
                 ).AndReturn(fake_subnets)
 
         self.mox.StubOutWithMock(api, '_get_preexisting_port_ids')
@@ -2628,6 +2643,9 @@ class TestNeutronv2(TestNeutronv2Base):
                              requested_ports[index].get('binding:vif_details'))
             self.assertEqual(nw_info.get('profile'),
                              requested_ports[index].get('binding:profile'))
+            self.assertEqual(['10.0.0.1'], [
+                ip['address'] for ip in
+                nw_info['network']['subnets'][0]['ips'][0]['floating_ips']])
             index += 1
 
         self.assertEqual(nw_infos[0]['active'], False)
@@ -2653,6 +2671,10 @@ class TestNeutronv2(TestNeutronv2Base):
 
     @mock.patch('nova.network.neutronv2.api.API._nw_info_get_subnets')
     @mock.patch('nova.network.neutronv2.api.API._nw_info_get_ips')
+    @mock.patch('nova.network.neutronv2.api.API.'
+                '_get_subnets_and_dhcp_servers', return_value={})
+    @mock.patch('nova.network.neutronv2.api.API._get_floating_ips_by_ports',
+                return_value=[])
     @mock.patch('nova.network.neutronv2.api.API._nw_info_build_network')
     @mock.patch('nova.network.neutronv2.api.API._get_preexisting_port_ids')
     @mock.patch('nova.network.neutronv2.api.API._gather_port_ids_and_networks')
@@ -2660,6 +2682,8 @@ class TestNeutronv2(TestNeutronv2Base):
             self, mock_gather_port_ids_and_networks,
             mock_get_preexisting_port_ids,
             mock_nw_info_build_network,
+            mock_get_floating_ips_by_ports,
+            mock_get_subnets_and_dhcp_servers,
             mock_nw_info_get_ips,
             mock_nw_info_get_subnets):
         api = neutronapi.API()
@@ -2675,7 +2699,8 @@ class TestNeutronv2(TestNeutronv2Base):
              'network_id': 'net-id',
              'admin_state_up': True,
              'status': 'ACTIVE',
-             'fixed_ips': [{'ip_address': '1.1.1.1'}],
+             'fixed_ips': [{'ip_address': '1.1.1.1',
+                            'subnet_id': 'subnet-id'}],
              'mac_address': 'de:ad:be:ef:00:01',
              'binding:vif_type': model.VIF_TYPE_BRIDGE,
              'binding:vnic_type': model.VNIC_TYPE_NORMAL,
@@ -2716,7 +2741,7 @@ class TestNeutronv2(TestNeutronv2Base):
             id=[port_data['fixed_ips'][0]['subnet_id']]
         ).AndReturn({'subnets': subnet_data1})
         self.moxed_client.list_ports(
-            network_id=subnet_data1[0]['network_id'],
+            network_id=[subnet_data1[0]['network_id']],
             device_owner='network:dhcp').AndReturn({'ports': []})
         self.mox.ReplayAll()
 
@@ -3462,6 +3487,194 @@ class TestNeutronv2WithMock(test.TestCase):
                                             mock_client)
 
 
+class CountingNeutronClient(object):
+    """Neutron client listing the given resources with the filters of
+    neutron, and counting its calls.
+    """
+
+    def __init__(self, **resources):
+        self.resources = resources
+        self.calls = collections.Counter()
+
+    def _list(self, collection, **filters):
+        self.calls['list_%s' % collection] += 1
+        found = []
+        for resource in self.resources.get(collection, []):
+            for key, value in six.iteritems(filters):
+                values = value if isinstance(value, list) else [value]
+                if resource.get(key) not in values:
+                    break
+            else:
+                found.append(resource)
+        return {collection: found}
+
+    def list_ports(self, **filters):
+        return self._list('ports', **filters)
+
+    def list_networks(self, **filters):
+        return self._list('networks', **filters)
+
+    def list_subnets(self, **filters):
+        return self._list('subnets', **filters)
+
+    def list_floatingips(self, **filters):
+        return self._list('floatingips', **filters)
+
+
+class TestNeutronv2BatchedLookups(test.NoDBTestCase):
+    """Counts the calls made to neutron to build the network info of
+    instances.
+    """
+
+    def setUp(self):
+        super(TestNeutronv2BatchedLookups, self).setUp()
+        self.api = neutronapi.API()
+        self.context = context.RequestContext('fake-user', 'fake-project')
+
+        def port(port_id, device_id, network_id, *fixed_ips):
+            return {'id': port_id, 'device_id': device_id,
+                    'tenant_id': 'fake-project', 'network_id': network_id,
+                    'device_owner': 'compute:nova', 'status': 'ACTIVE',
+                    'admin_state_up': True, 'mac_address': 'mac-' + port_id,
+                    'fixed_ips': [{'subnet_id': subnet_id, 'ip_address': ip}
+                                  for subnet_id, ip in fixed_ips]}
+
+        def subnet(subnet_id, network_id, cidr):
+            return {'id': subnet_id, 'network_id': network_id, 'cidr': cidr,
+                    'gateway_ip': cidr.replace('0/24', '1'),
+                    'dns_nameservers': []}
+
+        ports = [
+            port('port1', 'inst1', 'net1', ('sub1', '10.0.1.2'),
+                 ('sub3', '10.0.3.2')),
+            port('port2', 'inst1', 'net2', ('sub2', '10.0.2.2')),
+            port('port3', 'inst1', 'net1', ('sub1', '10.0.1.3')),
+            port('port4', 'inst2', 'net1', ('sub1', '10.0.1.4')),
+            dict(port('dhcp1', 'dhcp', 'net1', ('sub1', '10.0.1.9'),
+                      ('sub3', '10.0.3.9')), device_owner='network:dhcp'),
+            dict(port('dhcp2', 'dhcp', 'net2', ('sub2', '10.0.2.9')),
+                 device_owner='network:dhcp'),
+        ]
+        self.client = CountingNeutronClient(
+            ports=ports,
+            networks=[{'id': 'net1', 'name': 'net-1',
+                       'tenant_id': 'fake-project'},
+                      {'id': 'net2', 'name': 'net-2',
+                       'tenant_id': 'fake-project'}],
+            subnets=[subnet('sub1', 'net1', '10.0.1.0/24'),
+                     subnet('sub2', 'net2', '10.0.2.0/24'),
+                     subnet('sub3', 'net1', '10.0.3.0/24')],
+            floatingips=[{'port_id': 'port1', 'fixed_ip_address': '10.0.1.2',
+                          'floating_ip_address': '172.24.4.2'},
+                         {'port_id': 'port4', 'fixed_ip_address': '10.0.1.4',
+                          'floating_ip_address': '172.24.4.4'}])
+        patcher = mock.patch.object(neutronapi, 'get_client',
+                                    return_value=self.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.instance1 = self._instance('inst1', ports[:3])
+        self.instance2 = self._instance('inst2', ports[3:4])
+
+    def _instance(self, uuid, ports):
+        instance = objects.Instance(uuid=uuid, project_id='fake-project')
+        instance.info_cache = objects.InstanceInfoCache()
+        instance.info_cache.network_info = model.NetworkInfo(
+            [model.VIF(id=port['id'],
+                       network=model.Network(id=port['network_id']))
+             for port in ports])
+        return instance
+
+    def test_build_network_info_model(self):
+        nw_info = self.api._build_network_info_model(self.context,
+                                                     self.instance1)
+
+        # The instance ports, their networks, floating IPs, subnets and
+        # the DHCP ports of their networks are each listed once.
+        self.assertEqual({'list_ports': 2, 'list_networks': 1,
+                          'list_floatingips': 1, 'list_subnets': 1},
+                         dict(self.client.calls))
+        self.assertEqual(['port1', 'port2', 'port3'],
+                         [vif['id'] for vif in nw_info])
+        self.assertEqual(['net-1', 'net-2', 'net-1'],
+                         [vif['network']['label'] for vif in nw_info])
+        subnets = nw_info[0]['network']['subnets']
+        self.assertEqual(['10.0.1.0/24', '10.0.3.0/24'],
+                         [subnet['cidr'] for subnet in subnets])
+        self.assertEqual(['10.0.1.9', '10.0.3.9'],
+                         [subnet.get_meta('dhcp_server')
+                          for subnet in subnets])
+        self.assertEqual(['10.0.2.9'], [
+            subnet.get_meta('dhcp_server')
+            for subnet in nw_info[1]['network']['subnets']])
+        self.assertEqual(['172.24.4.2'],
+                         subnets[0]['ips'][0].floating_ip_addresses())
+        self.assertEqual([], subnets[1]['ips'][0].floating_ip_addresses())
+        self.assertEqual(['10.0.1.3'], [
+            ip['address'] for ip in nw_info[2].fixed_ips()])
+        self.assertEqual([], nw_info[2].floating_ips())
+
+    def test_shared_lookups(self):
+        with self.api.shared_lookups(self.context):
+            self.api._build_network_info_model(self.context, self.instance1)
+            with self.api.shared_lookups(self.context):
+                nw_info = self.api._build_network_info_model(
+                    self.context, self.instance2)
+            self.api._build_network_info_model(self.context, self.instance2)
+
+        # The networks, subnets and DHCP ports are only listed for the
+        # first instance.
+        self.assertEqual({'list_ports': 4, 'list_networks': 1,
+                          'list_floatingips': 3, 'list_subnets': 1},
+                         dict(self.client.calls))
+        self.assertEqual('net-1', nw_info[0]['network']['label'])
+        subnet = nw_info[0]['network']['subnets'][0]
+        self.assertEqual('10.0.1.9', subnet.get_meta('dhcp_server'))
+        self.assertEqual(['10.0.1.4'], [ip['address'] for ip in subnet['ips']])
+        self.assertEqual(['172.24.4.4'],
+                         [ip['address'] for ip in nw_info.floating_ips()])
+        self.assertNotIn(self.context, neutronapi._SHARED_LOOKUPS)
+
+        # They are looked up again outside of the block
+        self.api._build_network_info_model(self.context, self.instance2)
+        self.assertEqual({'list_ports': 6, 'list_networks': 2,
+                          'list_floatingips': 4, 'list_subnets': 2},
+                         dict(self.client.calls))
+
+    def test_get_instances_with_stale_nw_info(self):
+        for port in self.client.resources['ports']:
+            port['binding:host_id'] = 'fake-host'
+        for instance in (self.instance1, self.instance2):
+            instance.info_cache.network_info = (
+                self.api._build_network_info_model(self.context, instance))
+        # Changes the address of port4 and binds a port of a third instance
+        # to another host
+        self.client.resources['ports'][3]['fixed_ips'][0]['ip_address'] = (
+            '10.0.1.5')
+        self.client.resources['ports'].append(dict(
+            self.client.resources['ports'][0], id='port5', device_id='inst3',
+            **{'binding:host_id': 'other-host'}))
+        instance3 = self._instance('inst3', [])
+        self.client.calls.clear()
+
+        with mock.patch.object(self.api, '_has_port_binding_extension',
+                               return_value=True):
+            stale_instances = self.api.get_instances_with_stale_nw_info(
+                self.context, [self.instance1, self.instance2, instance3],
+                'fake-host')
+
+        self.assertEqual([self.instance2], stale_instances)
+        self.assertEqual({'list_ports': 1}, dict(self.client.calls))
+
+    def test_get_instances_with_stale_nw_info_without_port_binding(self):
+        with mock.patch.object(self.api, '_has_port_binding_extension',
+                               return_value=False):
+            self.assertRaises(NotImplementedError,
+                              self.api.get_instances_with_stale_nw_info,
+                              self.context, [self.instance1], 'fake-host')
+        self.assertEqual({}, dict(self.client.calls))
+
+
 class TestNeutronv2ModuleMethods(test.NoDBTestCase):
 
     def test_gather_port_ids_and_networks_wrong_params(self):
@@ -13,6 +13,7 @@
 #    under the License.
 
 import datetime
+import uuid
 
 import mock
 from mox3 import mox
@@ -1397,6 +1398,52 @@ class _TestInstanceListObject(object):
         self.assertIsInstance(inst_list.objects[0], instance.Instance)
         self.assertEqual(inst_list.objects[0].uuid, fakes[1]['uuid'])
 
+    @mock.patch.object(instance.InstanceList, 'get_by_filters')
+    def test_iter_by_filters(self, mock_get_by_filters):
+        batches = [[instance.Instance(uuid=str(uuid.uuid4()))
+                    for i in range(size)] for size in (2, 2, 1)]
+        mock_get_by_filters.side_effect = batches
+        inst_list = list(instance.InstanceList.iter_by_filters(
+            self.context, {'foo': 'bar'}, sort_keys=['uuid'],
+            sort_dirs=['asc'], expected_attrs=['metadata'], batch_size=2))
+        self.assertEqual(sum(batches, []), inst_list)
+        self.assertEqual(
+            [mock.call(self.context, {'foo': 'bar'}, limit=2, marker=marker,
+                       expected_attrs=['metadata'], use_slave=False,
+                       sort_keys=['uuid'], sort_dirs=['asc'])
+             for marker in (None, batches[0][-1].uuid, batches[1][-1].uuid)],
+            mock_get_by_filters.call_args_list)
+
+    @mock.patch.object(instance.InstanceList, 'get_by_filters')
+    def test_iter_by_filters_full_last_batch(self, mock_get_by_filters):
+        batch = [instance.Instance(uuid=str(uuid.uuid4()))]
+        mock_get_by_filters.side_effect = [batch, []]
+        inst_list = list(instance.InstanceList.iter_by_filters(
+            self.context, {}, batch_size=1))
+        self.assertEqual(batch, inst_list)
+        self.assertEqual(2, mock_get_by_filters.call_count)
+
+    @mock.patch.object(db, 'instance_get_all_by_filters_sort')
+    def test_iter_by_filters_pages_host(self, mock_get):
+        fakes = [self.fake_instance(i, updates={'uuid': 'fake-uuid-%d' % i,
+                                                'host': 'fake-host'})
+                 for i in range(3)]
+        mock_get.side_effect = [fakes[:2], fakes[2:]]
+        instances = instance.InstanceList.iter_by_filters(
+            self.context, {'host': 'fake-host'}, sort_keys=['id'],
+            sort_dirs=['asc'], batch_size=2)
+        self.assertEqual('fake-uuid-0', next(instances).uuid)
+        # The next page is only loaded once the first one is consumed
+        self.assertEqual(1, mock_get.call_count)
+        self.assertEqual(['fake-uuid-1', 'fake-uuid-2'],
+                         [inst.uuid for inst in instances])
+        self.assertEqual(
+            [mock.call(mock.ANY, {'host': 'fake-host'}, limit=2,
+                       marker=marker, columns_to_join=None, use_slave=False,
+                       sort_keys=['id'], sort_dirs=['asc'])
+             for marker in (None, 'fake-uuid-1')],
+            mock_get.call_args_list)
+
     def test_get_by_host(self):
         fakes = [self.fake_instance(1),
                  self.fake_instance(2)]
@@ -0,0 +1,419 @@
+# Copyright (c) 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Microbenchmark of the scheduler drivers against a synthetic cloud.
+
+The cloud (compute nodes, services, aggregates, instances, NUMA topologies
+and PCI device pools) is generated in memory and served to the HostManager
+by SyntheticCloudFixture, so neither a database nor a message bus is needed.
+
+Run it with, for instance:
+
+    python -m nova.tests.unit.scheduler.benchmark --hosts 1000 \
+        --hosts 10000 --hosts 50000 --iterations 200
+
+Each run reports the latency percentiles and the throughput of the
+scheduling requests, and the approximate memory used per HostState.
+"""
+
+from __future__ import print_function
+
+import argparse
+import collections
+import gc
+import math
+import random
+import sys
+import time
+import unittest
+import uuid
+
+import fixtures
+import mock
+from oslo_utils import timeutils
+import six
+from six.moves import range
+
+from nova.compute import vm_states
+from nova import context
+from nova import exception
+from nova import objects
+from nova.scheduler import caching_scheduler
+from nova.scheduler import filter_scheduler
+from nova.scheduler import host_manager
+from nova import test
+
+MODES = ('filter_scheduler', 'caching_scheduler', 'host_manager')
+
+# (vcpus, memory_mb, local_gb) of the generated compute nodes
+HOST_SHAPES = [(16, 65536, 500), (32, 131072, 1000), (48, 262144, 2000),
+               (64, 524288, 4000)]
+
+FLAVORS = [
+    {'flavorid': 'small', 'memory_mb': 2048, 'vcpus': 1, 'root_gb': 20,
+     'ephemeral_gb': 0, 'swap': 0},
+    {'flavorid': 'medium', 'memory_mb': 4096, 'vcpus': 2, 'root_gb': 40,
+     'ephemeral_gb': 0, 'swap': 0},
+    {'flavorid': 'large', 'memory_mb': 8192, 'vcpus': 4, 'root_gb': 80,
+     'ephemeral_gb': 20, 'swap': 0},
+    {'flavorid': 'xlarge', 'memory_mb': 16384, 'vcpus': 8, 'root_gb': 160,
+     'ephemeral_gb': 40, 'swap': 0},
+]
+
+
+class SyntheticCloud(object):
+    """In-memory compute nodes and related records of a fake cloud.
+
+    :param num_hosts: number of compute nodes, one per host
+    :param hosts_per_aggregate: size of the generated host aggregates
+    :param instances_per_host: average number of instances on each host
+    :param num_zones: number of availability zones the aggregates map to
+    :param numa_ratio: fraction of the hosts reporting a NUMA topology
+    :param pci_ratio: fraction of the hosts reporting a PCI device pool
+    :param seed: seed of the random generator, for reproducible clouds
+    """
+
+    def __init__(self, num_hosts, hosts_per_aggregate=100,
+                 instances_per_host=10, num_zones=3, numa_ratio=0.5,
+                 pci_ratio=0.1, seed=0):
+        self.random = random.Random(seed)
+        self.num_zones = num_zones
+        self.compute_nodes = []
+        self.services = []
+        self.aggregates = []
+        # Same layout as HostManager._instance_info
+        self.instance_info = {}
+
+        now = timeutils.utcnow()
+        for index in range(num_hosts):
+            host = 'host%d' % index
+            instances = self._make_instances(host, instances_per_host)
+            self.compute_nodes.append(self._make_compute_node(
+                index, host, now, len(instances), numa_ratio, pci_ratio))
+            self.services.append(objects.Service(
+                id=index, host=host, binary='nova-compute',
+                topic='compute', report_count=1, disabled=False,
+                disabled_reason=None, forced_down=False,
+                created_at=now, updated_at=now))
+            self.instance_info[host] = {
+                'instances': instances, 'updated': True}
+
+        for index, start in enumerate(range(0, num_hosts,
+                                            hosts_per_aggregate)):
+            metadata = {'availability_zone': self.zone(index)}
+            if self.random.random() < 0.3:
+                metadata['ssd'] = 'true'
+            self.aggregates.append(objects.Aggregate(
+                id=index, name='agg%d' % index,
+                hosts=['host%d' % i for i in
+                       range(start, min(start + hosts_per_aggregate,
+                                        num_hosts))],
+                metadata=metadata))
+
+    def zone(self, index):
+        return 'az%d' % (index % self.num_zones)
+
+    def _uuid(self):
+        return str(uuid.UUID(int=self.random.getrandbits(128)))
+
+    def _make_compute_node(self, index, host, now, num_instances,
+                           numa_ratio, pci_ratio):
+        vcpus, memory_mb, local_gb = self.random.choice(HOST_SHAPES)
+        usage = self.random.random() * 0.9
+        vcpus_used = int(vcpus * usage)
+        memory_mb_used = int(memory_mb * usage)
+        local_gb_used = int(local_gb * usage)
+
+        numa_topology = None
+        if self.random.random() < numa_ratio:
+            cpus = list(range(vcpus))
+            half = vcpus // 2
+            numa_topology = objects.NUMATopology(cells=[
+                objects.NUMACell(id=cell, cpuset=set(cpuset),
+                                 memory=memory_mb // 2, cpu_usage=0,
+                                 memory_usage=0, mempages=[], siblings=[],
+                                 pinned_cpus=set())
+                for cell, cpuset in enumerate((cpus[:half], cpus[half:]))])
+            numa_topology = numa_topology._to_json()
+
+        pools = []
+        if self.random.random() < pci_ratio:
+            pools.append(objects.PciDevicePool(
+                product_id='1520', vendor_id='8086', numa_node=0,
+                tags={'dev_type': 'type-VF', 'physical_network': 'physnet1'},
+                count=self.random.randint(1, 8)))
+
+        return objects.ComputeNode(
+            id=index, host=host, hypervisor_hostname='node%d' % index,
+            vcpus=vcpus, vcpus_used=vcpus_used,
+            memory_mb=memory_mb, free_ram_mb=memory_mb - memory_mb_used,
+            local_gb=local_gb, local_gb_used=local_gb_used,
+            free_disk_gb=local_gb - local_gb_used, disk_available_least=None,
+            host_ip='192.168.%d.%d' % (index // 250 % 250, index % 250 + 1),
+            hypervisor_type='QEMU', hypervisor_version=2001000,
+            cpu_info=None, numa_topology=numa_topology,
+            pci_device_pools=objects.PciDevicePoolList(objects=pools),
+            supported_hv_specs=[objects.HVSpec(arch='x86_64', hv_type='kvm',
+                                               vm_mode='hvm')],
+            stats={'num_instances': str(num_instances),
+                   'io_workload': str(self.random.randint(0, 4))},
+            metrics=None, updated_at=now)
+
+    def _make_instances(self, host, instances_per_host):
+        instances = {}
+        for i in range(self.random.randint(0, 2 * instances_per_host)):
+            instance = objects.Instance(
+                uuid=self._uuid(), host=host,
+                project_id='project%d' % self.random.randint(0, 99),
+                instance_type_id=self.random.randint(1, len(FLAVORS)),
+                vm_state=vm_states.ACTIVE, task_state=None)
+            instances[instance.uuid] = instance
+        return instances
+
+    def make_request(self, num_instances=1):
+        """Return a (request_spec, filter_properties) pair for a boot request
+        of a random flavor, half of them asking for a given zone.
+        """
+        flavor = dict(self.random.choice(FLAVORS), extra_specs={})
+        instance_properties = {
+            'uuid': self._uuid(),
+            'project_id': 'project%d' % self.random.randint(0, 99),
+            'os_type': 'linux',
+            'memory_mb': flavor['memory_mb'],
+            'vcpus': flavor['vcpus'],
+            'root_gb': flavor['root_gb'],
+            'ephemeral_gb': flavor['ephemeral_gb'],
+            'vm_state': vm_states.BUILDING,
+            'task_state': None,
+            'numa_topology': None,
+            'pci_requests': None,
+            'availability_zone': None,
+        }
+        if self.random.random() < 0.5:
+            instance_properties['availability_zone'] = self.zone(
+                self.random.randint(0, self.num_zones - 1))
+        request_spec = {'instance_type': flavor,
+                        'instance_properties': instance_properties,
+                        'image': {'properties': {}},
+                        'num_instances': num_instances}
+        filter_properties = {'scheduler_hints': {},
+                             'instance_type': flavor}
+        return request_spec, filter_properties
+
+
+class SyntheticCloudFixture(fixtures.Fixture):
+    """Serves the records of a SyntheticCloud instead of the database."""
+
+    def __init__(self, cloud):
+        super(SyntheticCloudFixture, self).__init__()
+        self.cloud = cloud
+
+    def _patch(self, target, name, new):
+        patcher = mock.patch.object(target, name, new)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def setUp(self):
+        super(SyntheticCloudFixture, self).setUp()
+        cloud = self.cloud
+
+        def get_instances_by_host(context, host, *args, **kwargs):
+            instances = cloud.instance_info.get(host, {}).get('instances', {})
+            return objects.InstanceList(objects=list(instances.values()))
+
+        def init_instance_info(host_manager):
+            host_manager._instance_info = cloud.instance_info
+
+        self._patch(objects.ServiceList, 'get_by_binary',
+                    staticmethod(lambda *args, **kwargs: cloud.services))
+        self._patch(objects.ComputeNodeList, 'get_all',
+                    staticmethod(lambda *args, **kwargs: cloud.compute_nodes))
+        self._patch(objects.AggregateList, 'get_all',
+                    staticmethod(lambda *args, **kwargs: cloud.aggregates))
+        self._patch(objects.InstanceList, 'get_by_host',
+                    staticmethod(get_instances_by_host))
+        self._patch(host_manager.HostManager, '_init_instance_info',
+                    init_instance_info)
+
+
+def percentile(values, percent):
+    """Return the nearest-rank percentile of a sorted list of values."""
+    if not values:
+        return None
+    rank = int(math.ceil(percent / 100.0 * len(values)))
+    return values[max(rank - 1, 0)]
+
+
+def deep_getsizeof(roots):
+    """Return the approximate number of bytes used by the given objects
+    and everything they reference, counting shared objects once.
+    """
+    seen = set()
+    size = 0
+    stack = list(roots)
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, (type, type(sys))):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(six.iterkeys(obj))
+            stack.extend(six.itervalues(obj))
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif hasattr(obj, '__dict__'):
+            stack.append(obj.__dict__)
+    return size
+
+
+def _make_scheduler(mode):
+    if mode == 'caching_scheduler':
+        return caching_scheduler.CachingScheduler()
+    return filter_scheduler.FilterScheduler()
+
+
+def run_benchmark(cloud, mode='filter_scheduler', iterations=100,
+                  num_instances=1):
+    """Schedule boot requests against the cloud and return a report.
+
+    The cloud must be served by an active SyntheticCloudFixture.
+
+    :param mode: 'filter_scheduler' or 'caching_scheduler' to time the
+                 select_destinations() calls of that driver, 'host_manager'
+                 to only time the get_filtered_hosts() and
+                 get_weighed_hosts() calls on the already loaded hosts
+    :param iterations: number of scheduling requests
+    :param num_instances: number of instances of each request
+    """
+    if mode not in MODES:
+        raise ValueError('Unknown benchmark mode %s' % mode)
+    ctxt = context.get_admin_context()
+    start = time.time()
+    scheduler = _make_scheduler(mode)
+    hm = scheduler.host_manager
+    if mode == 'caching_scheduler':
+        scheduler.run_periodic_tasks(ctxt)
+        host_states = scheduler.all_host_states
+    else:
+        host_states = list(hm.get_all_host_states(ctxt))
+    setup_time = time.time() - start
+
+    latencies = []
+    failures = 0
+    for i in range(iterations):
+        request_spec, filter_properties = cloud.make_request(num_instances)
+        if mode == 'host_manager':
+            filter_properties.update({'context': ctxt,
+                                      'request_spec': request_spec,
+                                      'config_options': {}})
+            start = time.time()
+            hosts = hm.get_filtered_hosts(host_states, filter_properties)
+            if hosts:
+                hm.get_weighed_hosts(hosts, filter_properties)
+            latencies.append(time.time() - start)
+            if not hosts:
+                failures += 1
+            continue
+        start = time.time()
+        try:
+            scheduler.select_destinations(ctxt, request_spec,
+                                          filter_properties)
+        except exception.NoValidHost:
+            failures += 1
+        latencies.append(time.time() - start)
+
+    gc.collect()
+    latencies.sort()
+    total_time = sum(latencies)
+    report = collections.OrderedDict()
+    report['mode'] = mode
+    report['hosts'] = len(cloud.compute_nodes)
+    report['iterations'] = iterations
+    report['failures'] = failures
+    report['setup_time'] = setup_time
+    report['latency'] = collections.OrderedDict(
+        (name, percentile(latencies, percent))
+        for name, percent in (('p50', 50), ('p90', 90), ('p99', 99),
+                              ('max', 100)))
+    report['throughput'] = iterations / total_time if total_time else None
+    report['bytes_per_host_state'] = (
+        deep_getsizeof(host_states) // len(host_states)
+        if host_states else None)
+    return report
+
+
+def format_report(report):
+    latency = ', '.join('%s %.2fms' % (name, value * 1000)
+                        for name, value in six.iteritems(report['latency'])
+                        if value is not None)
+    return ('%(mode)s, %(hosts)d hosts: %(iterations)d requests '
+            '(%(failures)d failed), setup %(setup_time).2fs, '
+            '%(throughput).1f req/s, %(latency)s, '
+            '%(bytes)s bytes/host state' %
+            dict(report, latency=latency,
+                 throughput=report['throughput'] or 0.0,
+                 bytes=report['bytes_per_host_state']))
+
+
+class SchedulerBenchmark(test.NoDBTestCase):
+    """Runs the benchmark within the usual unit test fixtures, which provide
+    the configuration and the fake notifier used by the scheduler.
+    """
+
+    def __init__(self, args):
+        super(SchedulerBenchmark, self).__init__('run_benchmark')
+        self.args = args
+
+    def run_benchmark(self):
+        # NOTE(iuliat): the generated services are never updated, so they
+        # must not be considered down during long runs.
+        self.flags(service_down_time=24 * 3600)
+        for num_hosts in self.args.hosts:
+            cloud = SyntheticCloud(num_hosts, seed=self.args.seed)
+            with SyntheticCloudFixture(cloud):
+                for mode in self.args.modes:
+                    report = run_benchmark(
+                        cloud, mode, self.args.iterations,
+                        self.args.num_instances)
+                    print(format_report(report))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--hosts', type=int, action='append',
+                        help='number of hosts of the synthetic cloud, can '
+                             'be repeated (default: 1000, 10000 and 50000)')
+    parser.add_argument('--mode', dest='modes', action='append',
+                        choices=MODES,
+                        help='what to benchmark, can be repeated '
+                             '(default: all)')
+    parser.add_argument('--iterations', type=int, default=100,
+                        help='number of requests per run')
+    parser.add_argument('--num-instances', type=int, default=1,
+                        help='number of instances per request')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the synthetic cloud generator')
+    args = parser.parse_args(argv)
+    args.hosts = args.hosts or [1000, 10000, 50000]
+    args.modes = args.modes or list(MODES)
+
+    result = unittest.TextTestRunner().run(SchedulerBenchmark(args))
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -48,3 +48,20 @@ class TestComputeFilter(test.NoDBTestCase):
         service_up_mock.return_value = False
         self.assertFalse(filt_cls.host_passes(host, filter_properties))
         service_up_mock.assert_called_once_with(service)
+
+    @mock.patch('nova.servicegroup.API.is_up_many')
+    def test_compute_filter_filter_all(self, is_up_many_mock,
+                                       service_up_mock):
+        filt_cls = compute_filter.ComputeFilter()
+        services = [{'disabled': False}, {'disabled': True},
+                    {'disabled': False}, {'disabled': False}]
+        hosts = [fakes.FakeHostState('host%d' % i, 'node%d' % i,
+                                     {'service': service})
+                 for i, service in enumerate(services)]
+        is_up_many_mock.return_value = [True, False, True]
+
+        self.assertEqual([hosts[0], hosts[3]],
+                         list(filt_cls.filter_all(hosts, {})))
+        is_up_many_mock.assert_called_once_with(
+            [services[0], services[2], services[3]])
+        self.assertFalse(service_up_mock.called)
@@ -0,0 +1,214 @@
+# Copyright (c) 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For the aggregate metadata index
+"""
+
+from nova import objects
+from nova.scheduler import aggregate_index
+from nova.scheduler.filters import aggregate_image_properties_isolation
+from nova.scheduler.filters import aggregate_instance_extra_specs
+from nova.scheduler.filters import aggregate_multitenancy_isolation
+from nova.scheduler.filters import availability_zone_filter
+from nova import test
+from nova.tests.unit.scheduler import fakes
+
+
+def _make_aggregates():
+    return [
+        objects.Aggregate(id=1, hosts=['host1', 'host2'],
+                          metadata={'availability_zone': 'az1',
+                                    'ssd': 'true',
+                                    'filter_tenant_id': 'tenant1, tenant2'}),
+        objects.Aggregate(id=2, hosts=['host2', 'host3'],
+                          metadata={'availability_zone': 'az2',
+                                    'cpu_model': 'haswell',
+                                    'hypervisor_type': 'kvm'}),
+        objects.Aggregate(id=3, hosts=['host3', 'host4'],
+                          metadata={'ssd': 'false', 'hypervisor_type': 'xen',
+                                    'filter_tenant_id': 'tenant3'}),
+        objects.Aggregate(id=4, hosts=['host5'], metadata={}),
+    ]
+
+
+class AggregateMetadataIndexTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(AggregateMetadataIndexTestCase, self).setUp()
+        self.index = aggregate_index.AggregateMetadataIndex()
+        for agg in _make_aggregates():
+            self.index.update(agg)
+
+    def test_lookups(self):
+        self.assertEqual(set(['host1', 'host2', 'host3']),
+                         set(self.index.hosts_with_key('availability_zone')))
+        self.assertEqual(set(['host2', 'host3']),
+                         set(self.index.hosts_with_value('availability_zone',
+                                                         'az2')))
+        self.assertEqual(set(['host1', 'host2']),
+                         set(self.index.hosts_with_value('filter_tenant_id',
+                                                         'tenant2')))
+        self.assertEqual(set(['true', 'false']),
+                         set(self.index.values('ssd')))
+        self.assertEqual(set(['host1', 'host2']),
+                         self.index.hosts_matching(
+                             'ssd', lambda value: value == 'true'))
+        self.assertEqual(set(['host2']),
+                         self.index.hosts_matching(
+                             'ssd', lambda value: value == 'true',
+                             hosts=set(['host2', 'host3'])))
+        self.assertEqual({}, self.index.hosts_with_key('foo'))
+        self.assertEqual({}, self.index.hosts_with_value('ssd', 'foo'))
+        self.assertEqual({}, self.index.hosts_with_value('ssd', ['true']))
+
+    def test_update_replaces_aggregate(self):
+        agg = objects.Aggregate(id=2, hosts=['host3'],
+                                metadata={'availability_zone': 'az3'})
+        self.index.update(agg)
+        self.assertEqual({}, self.index.hosts_with_value('availability_zone',
+                                                         'az2'))
+        self.assertEqual(set(['host3']),
+                         set(self.index.hosts_with_value('availability_zone',
+                                                         'az3')))
+        self.assertEqual([], self.index.values('cpu_model'))
+        # host3 still gets hypervisor_type from the third aggregate
+        self.assertEqual(set(['host3', 'host4']),
+                         set(self.index.hosts_with_key('hypervisor_type')))
+
+    def test_delete(self):
+        for agg in _make_aggregates():
+            self.index.delete(agg)
+        self.assertEqual({}, self.index.hosts_with_key('availability_zone'))
+        self.assertEqual([], self.index.values('ssd'))
+        # Unknown aggregates are ignored
+        self.index.delete(objects.Aggregate(id=42))
+
+    def test_update_without_metadata(self):
+        self.index.update(objects.Aggregate(id=5, hosts=['host6']))
+        self.index.update(objects.Aggregate(id=6))
+        self.assertEqual(set(['host1', 'host2', 'host3']),
+                         set(self.index.hosts_with_key('availability_zone')))
+
+
+class AggregateFiltersIndexTestCase(test.NoDBTestCase):
+    """Checks that the aggregate filters give the same results with the
+    index as with the metadata of the aggregates of each host.
+    """
+
+    def setUp(self):
+        super(AggregateFiltersIndexTestCase, self).setUp()
+        aggs = _make_aggregates()
+        self.index = aggregate_index.AggregateMetadataIndex()
+        for agg in aggs:
+            self.index.update(agg)
+        self.hosts = []
+        for i in range(1, 7):
+            host = fakes.FakeHostState('host%d' % i, 'node%d' % i, {})
+            host.aggregates = [agg for agg in aggs
+                               if host.host in agg.hosts]
+            self.hosts.append(host)
+
+    def _test_filter(self, filt_cls, filter_properties):
+        expected = list(filt_cls.filter_all(self.hosts, filter_properties))
+        filt_cls.aggregate_index = self.index
+        got = list(filt_cls.filter_all(self.hosts, filter_properties))
+        self.assertEqual(expected, got)
+        return [host.host for host in got]
+
+    def _make_request(self, **props):
+        return {'request_spec': {'instance_properties': props}}
+
+    def test_availability_zone_filter(self):
+        self.flags(default_availability_zone='nova')
+        filt_cls = availability_zone_filter.AvailabilityZoneFilter()
+        self.assertEqual(
+            ['host2', 'host3'],
+            self._test_filter(filt_cls, self._make_request(
+                availability_zone='az2')))
+        self.assertEqual(
+            ['host4', 'host5', 'host6'],
+            self._test_filter(filt_cls, self._make_request(
+                availability_zone='nova')))
+        self.assertEqual(
+            [], self._test_filter(filt_cls, self._make_request(
+                availability_zone='bad')))
+
+    def test_multitenancy_isolation_filter(self):
+        filt_cls = aggregate_multitenancy_isolation.\
+            AggregateMultiTenancyIsolation()
+        self.assertEqual(
+            ['host1', 'host2', 'host5', 'host6'],
+            self._test_filter(filt_cls, self._make_request(
+                project_id='tenant2')))
+        self.assertEqual(
+            ['host5', 'host6'],
+            self._test_filter(filt_cls, self._make_request(
+                project_id='tenant4')))
+
+    def test_image_properties_isolation_filter(self):
+        filt_cls = aggregate_image_properties_isolation.\
+            AggregateImagePropertiesIsolation()
+        filter_properties = {'request_spec': {'image': {'properties': {
+            'hypervisor_type': 'kvm', 'ssd': 'true', 'os_type': None}}}}
+        self.assertEqual(['host1', 'host2', 'host5', 'host6'],
+                         self._test_filter(filt_cls, filter_properties))
+
+    def test_image_properties_isolation_filter_namespace(self):
+        self.flags(aggregate_image_properties_isolation_namespace='hypervisor',
+                   aggregate_image_properties_isolation_separator='_')
+        filt_cls = aggregate_image_properties_isolation.\
+            AggregateImagePropertiesIsolation()
+        filter_properties = {'request_spec': {'image': {'properties': {
+            'hypervisor_type': 'kvm', 'ssd': 'true'}}}}
+        self.assertEqual(['host1', 'host2', 'host3', 'host5', 'host6'],
+                         self._test_filter(filt_cls, filter_properties))
+
+    def test_instance_extra_specs_filter(self):
+        filt_cls = aggregate_instance_extra_specs.\
+            AggregateInstanceExtraSpecsFilter()
+        filter_properties = {'instance_type': {'extra_specs': {
+            'ssd': 'true',
+            'aggregate_instance_extra_specs:hypervisor_type': 'kvm',
+            'capabilities:cpu_info': 'foo'}}}
+        self.assertEqual(['host2'],
+                         self._test_filter(filt_cls, filter_properties))
+
+    def test_instance_extra_specs_filter_bad_value(self):
+        filt_cls = aggregate_instance_extra_specs.\
+            AggregateInstanceExtraSpecsFilter()
+        good_agg = objects.Aggregate(id=5, hosts=['host5'],
+                                     metadata={'ram': '8'})
+        bad_agg = objects.Aggregate(id=6, hosts=['host6'],
+                                    metadata={'ram': 'lots'})
+        for agg, host in ((good_agg, self.hosts[4]),
+                          (bad_agg, self.hosts[5])):
+            self.index.update(agg)
+            host.aggregates.append(agg)
+        filter_properties = {'instance_type': {'extra_specs': {
+            'ram': '>= 4'}}}
+        filt_cls.aggregate_index = self.index
+        # The values of the aggregates of the other hosts are not matched
+        self.assertEqual([self.hosts[4]],
+                         list(filt_cls.filter_all(self.hosts[:5],
+                                                  filter_properties)))
+        self.assertRaises(ValueError, filt_cls.filter_all, self.hosts,
+                          filter_properties)
+
+    def test_instance_extra_specs_filter_no_extra_specs(self):
+        filt_cls = aggregate_instance_extra_specs.\
+            AggregateInstanceExtraSpecsFilter()
+        self.assertEqual(
+            ['host%d' % i for i in range(1, 7)],
+            self._test_filter(filt_cls, {'instance_type': {}}))
@@ -0,0 +1,100 @@
+# Copyright (c) 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For the scheduler benchmark harness
+"""
+
+from nova import context
+from nova import objects
+from nova.scheduler import host_manager
+from nova import test
+from nova.tests.unit.scheduler import benchmark
+
+
+class SyntheticCloudTestCase(test.NoDBTestCase):
+
+    def test_cloud_layout(self):
+        cloud = benchmark.SyntheticCloud(25, hosts_per_aggregate=10,
+                                         pci_ratio=1.0)
+        self.assertEqual(25, len(cloud.compute_nodes))
+        self.assertEqual(25, len(cloud.services))
+        self.assertEqual([10, 10, 5],
+                         [len(agg.hosts) for agg in cloud.aggregates])
+        self.assertEqual('az1', cloud.aggregates[1].availability_zone)
+        self.assertEqual(set('host%d' % i for i in range(25)),
+                         set(cloud.instance_info))
+        for compute in cloud.compute_nodes:
+            self.assertEqual(1, len(compute.pci_device_pools))
+
+    def test_same_seed_same_cloud(self):
+        clouds = [benchmark.SyntheticCloud(10, seed=42) for i in range(2)]
+        self.assertEqual(
+            *[[compute.free_ram_mb for compute in cloud.compute_nodes]
+              for cloud in clouds])
+
+    def test_fixture_serves_cloud(self):
+        cloud = benchmark.SyntheticCloud(5)
+        self.useFixture(benchmark.SyntheticCloudFixture(cloud))
+        ctxt = context.get_admin_context()
+        self.assertEqual(cloud.compute_nodes,
+                         objects.ComputeNodeList.get_all(ctxt))
+        hm = host_manager.HostManager()
+        host_states = list(hm.get_all_host_states(ctxt))
+        self.assertEqual(5, len(host_states))
+        for host_state in host_states:
+            self.assertEqual(
+                set(cloud.instance_info[host_state.host]['instances']),
+                set(host_state.instances))
+            self.assertEqual(1, len(host_state.aggregates))
+
+
+class SchedulerBenchmarkTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(SchedulerBenchmarkTestCase, self).setUp()
+        self.cloud = benchmark.SyntheticCloud(20, hosts_per_aggregate=5)
+        self.useFixture(benchmark.SyntheticCloudFixture(self.cloud))
+
+    def _test_run_benchmark(self, mode):
+        report = benchmark.run_benchmark(self.cloud, mode, iterations=5)
+        self.assertEqual(mode, report['mode'])
+        self.assertEqual(20, report['hosts'])
+        self.assertEqual(5, report['iterations'])
+        self.assertEqual(0, report['failures'])
+        latency = report['latency']
+        self.assertTrue(latency['p50'] <= latency['p90'] <= latency['max'])
+        self.assertTrue(report['bytes_per_host_state'] > 0)
+        self.assertIn('%s, 20 hosts' % mode, benchmark.format_report(report))
+
+    def test_run_benchmark_filter_scheduler(self):
+        self._test_run_benchmark('filter_scheduler')
+
+    def test_run_benchmark_caching_scheduler(self):
+        self._test_run_benchmark('caching_scheduler')
+
+    def test_run_benchmark_host_manager(self):
+        self._test_run_benchmark('host_manager')
+
+    def test_run_benchmark_unknown_mode(self):
+        self.assertRaises(ValueError, benchmark.run_benchmark, self.cloud,
+                          'foo')
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(50, benchmark.percentile(values, 50))
+        self.assertEqual(99, benchmark.percentile(values, 99))
+        self.assertEqual(100, benchmark.percentile(values, 100))
+        self.assertEqual(1, benchmark.percentile(values, 0))
+        self.assertIsNone(benchmark.percentile([], 50))
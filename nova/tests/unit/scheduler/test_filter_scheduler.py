@@ -20,6 +20,8 @@ import mock
 
 from nova import exception
 from nova.scheduler import filter_scheduler
+from nova.scheduler.filters import affinity_filter
+from nova.scheduler.filters import all_hosts_filter
 from nova.scheduler import host_manager
 from nova.scheduler import utils as scheduler_utils
 from nova.scheduler import weights
@@ -329,3 +331,127 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
                 # Make sure that the consumed hosts have chance to be reverted.
                 for host in consumed_hosts:
                     self.assertIsNone(host.obj.updated)
+
+    def _get_bulk_hosts(self):
+        host_states = [mock.Mock(host='host%d' % i) for i in range(3)]
+        weighed_hosts = [weights.WeighedHost(host_state, 3.0 - i)
+                         for i, host_state in enumerate(host_states)]
+        return host_states, weighed_hosts
+
+    def _schedule_bulk(self, host_states, weighed_hosts, num_instances,
+                       filter_properties=None):
+        self.flags(scheduler_bulk_placement=True)
+        request_spec = {'num_instances': num_instances,
+                        'instance_properties': {'uuid': 'fake-uuid'}}
+        with mock.patch.object(self.driver, '_get_all_host_states',
+                               return_value=host_states):
+            return self.driver._schedule(self.context, request_spec,
+                                         filter_properties or {})
+
+    @mock.patch.object(host_manager.HostManager, 'get_weighed_host')
+    @mock.patch.object(host_manager.HostManager, 'get_weighed_hosts')
+    @mock.patch.object(host_manager.HostManager, 'get_filtered_hosts')
+    def test_schedule_bulk_filters_once(self, mock_filter, mock_weigh,
+                                        mock_weigh_one):
+        host_states, weighed_hosts = self._get_bulk_hosts()
+        self.driver.host_manager.default_filters = []
+        mock_filter.side_effect = lambda hosts, props, **kw: list(hosts)
+        mock_weigh.return_value = weighed_hosts
+        mock_weigh_one.side_effect = lambda host, props: (
+            weights.WeighedHost(host, 0.0))
+
+        selected = self._schedule_bulk(host_states, weighed_hosts, 4)
+
+        self.assertEqual(['host0', 'host1', 'host2', 'host0'],
+                         [weighed.obj.host for weighed in selected])
+        self.assertEqual(1, mock_weigh.call_count)
+        self.assertEqual(3, mock_weigh_one.call_count)
+        for host_state in host_states:
+            host_state.consume_from_instance.assert_called_with(
+                {'uuid': 'fake-uuid'})
+        # The chosen host is the only one filtered again
+        mock_filter.assert_called_with([host_states[2]], mock.ANY, index=3)
+
+    @mock.patch.object(host_manager.HostManager, 'get_weighed_host')
+    @mock.patch.object(host_manager.HostManager, 'get_weighed_hosts')
+    @mock.patch.object(host_manager.HostManager, 'get_filtered_hosts')
+    def test_schedule_bulk_drops_full_hosts(self, mock_filter, mock_weigh,
+                                            mock_weigh_one):
+        host_states, weighed_hosts = self._get_bulk_hosts()
+        self.driver.host_manager.default_filters = []
+
+        def fake_filter(hosts, props, index=0):
+            hosts = list(hosts)
+            if index and hosts == [host_states[0]]:
+                return []
+            return hosts
+
+        mock_filter.side_effect = fake_filter
+        mock_weigh.return_value = weighed_hosts
+        mock_weigh_one.side_effect = lambda host, props: (
+            weights.WeighedHost(host, 5.0))
+
+        selected = self._schedule_bulk(host_states, weighed_hosts, 5)
+
+        self.assertEqual(['host0', 'host1', 'host1', 'host1', 'host1'],
+                         [weighed.obj.host for weighed in selected])
+
+    @mock.patch.object(host_manager.HostManager, 'get_weighed_host')
+    @mock.patch.object(host_manager.HostManager, 'get_weighed_hosts')
+    @mock.patch.object(host_manager.HostManager, 'get_filtered_hosts')
+    def test_schedule_bulk_refilters_placement_filters(self, mock_filter,
+                                                       mock_weigh,
+                                                       mock_weigh_one):
+        host_states, weighed_hosts = self._get_bulk_hosts()
+        self.driver.host_manager.default_filters = [
+            affinity_filter.ServerGroupAntiAffinityFilter(),
+            all_hosts_filter.AllHostsFilter()]
+
+        def fake_filter(hosts, props, filter_class_names=None, index=0):
+            group_hosts = props.get('group_hosts', set())
+            return [host for host in hosts if host.host not in group_hosts]
+
+        mock_filter.side_effect = fake_filter
+        mock_weigh.return_value = weighed_hosts
+        mock_weigh_one.side_effect = lambda host, props: (
+            weights.WeighedHost(host, 5.0))
+        filter_properties = {'group_updated': True, 'group_hosts': []}
+
+        selected = self._schedule_bulk(host_states, weighed_hosts, 3,
+                                       filter_properties)
+
+        self.assertEqual(['host0', 'host1', 'host2'],
+                         [weighed.obj.host for weighed in selected])
+        self.assertFalse(mock_weigh_one.called)
+        mock_filter.assert_any_call(
+            [host_states[1]], filter_properties,
+            filter_class_names=['ServerGroupAntiAffinityFilter'], index=1)
+
+    @mock.patch.object(host_manager.HostManager, 'get_weighed_host')
+    @mock.patch.object(host_manager.HostManager, 'get_weighed_hosts')
+    @mock.patch.object(host_manager.HostManager, 'get_filtered_hosts')
+    def test_schedule_bulk_only_looks_at_best_hosts(self, mock_filter,
+                                                    mock_weigh,
+                                                    mock_weigh_one):
+        host_states = [mock.Mock(host='host%d' % i) for i in range(10)]
+        looked_at = set()
+
+        class FakeWeighedHosts(list):
+            def __getitem__(self, index):
+                looked_at.add(index)
+                return super(FakeWeighedHosts, self).__getitem__(index)
+
+        weighed_hosts = FakeWeighedHosts(
+            weights.WeighedHost(host_state, 10.0 - i)
+            for i, host_state in enumerate(host_states))
+        self.driver.host_manager.default_filters = []
+        mock_filter.side_effect = lambda hosts, props, **kw: list(hosts)
+        mock_weigh.return_value = weighed_hosts
+        mock_weigh_one.side_effect = lambda host, props: (
+            weights.WeighedHost(host, 0.0))
+
+        selected = self._schedule_bulk(host_states, weighed_hosts, 2)
+
+        self.assertEqual(['host0', 'host1'],
+                         [weighed.obj.host for weighed in selected])
+        self.assertEqual(set([0, 1]), looked_at)
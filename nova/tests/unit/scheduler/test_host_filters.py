@@ -15,9 +15,16 @@
 Tests For Scheduler Host Filters.
 """
 
+import mock
+
 from nova.scheduler import filters
 from nova.scheduler.filters import all_hosts_filter
 from nova.scheduler.filters import compute_filter
+from nova.scheduler.filters import core_filter
+from nova.scheduler.filters import disk_filter
+from nova.scheduler.filters import io_ops_filter
+from nova.scheduler.filters import num_instances_filter
+from nova.scheduler.filters import ram_filter
 from nova import test
 from nova.tests.unit.scheduler import fakes
 
@@ -36,3 +43,116 @@ class HostFiltersTestCase(test.NoDBTestCase):
         filt_cls = all_hosts_filter.AllHostsFilter()
         host = fakes.FakeHostState('host1', 'node1', {})
         self.assertTrue(filt_cls.host_passes(host, {}))
+
+    @mock.patch.object(filters, 'numpy', None)
+    def test_filter_handler_without_numpy(self):
+        filter_handler = filters.HostFilterHandler(use_batch_filters=True)
+        self.assertFalse(filter_handler.use_batch_filters)
+        hosts = [fakes.FakeHostState('host1', 'node1', {})]
+        self.assertIsNone(filter_handler.get_columns(hosts))
+        filter_objs = [all_hosts_filter.AllHostsFilter()]
+        self.assertEqual(hosts, list(filter_handler.get_filtered_objects(
+            filter_objs, hosts, {})))
+
+
+class HostFilterBatchTestCase(test.NoDBTestCase):
+    """Test that the filter masks give the same results as host_passes."""
+
+    def setUp(self):
+        super(HostFilterBatchTestCase, self).setUp()
+        self.flags(ram_allocation_ratio=1.5, cpu_allocation_ratio=2.0,
+                   disk_allocation_ratio=1.0, max_instances_per_host=5,
+                   max_io_ops_per_host=3)
+        self.filter_properties = {
+            'instance_type': {'memory_mb': 1024, 'vcpus': 2, 'root_gb': 10,
+                              'ephemeral_gb': 5, 'swap': 512}}
+
+    def _get_hosts(self):
+        hosts = []
+        for i in range(60):
+            hosts.append(fakes.FakeHostState('host%d' % i, 'node%d' % i,
+                {'free_ram_mb': 2048 - 100 * i,
+                 'total_usable_ram_mb': 2048,
+                 'vcpus_total': i % 8,
+                 'vcpus_used': i % 11,
+                 'free_disk_mb': 40960 - 1024 * i,
+                 'total_usable_disk_gb': 40,
+                 'num_instances': i % 7,
+                 'num_io_ops': i % 4}))
+        return hosts
+
+    def _filter(self, filter_classes, use_batch_filters):
+        handler = filters.HostFilterHandler(
+            use_batch_filters=use_batch_filters)
+        hosts = self._get_hosts()
+        result = handler.get_filtered_objects(
+            [cls() for cls in filter_classes], hosts, self.filter_properties)
+        return [(host.host, host.limits) for host in result]
+
+    def _assert_same_result(self, filter_classes):
+        expected = self._filter(filter_classes, False)
+        self.assertNotEqual([], expected)
+        self.assertEqual(expected, self._filter(filter_classes, True))
+
+    def test_ram_filter(self):
+        self._assert_same_result([ram_filter.RamFilter])
+
+    def test_core_filter(self):
+        self._assert_same_result([core_filter.CoreFilter])
+
+    def test_core_filter_without_instance_type(self):
+        self.filter_properties = {}
+        self._assert_same_result([core_filter.CoreFilter])
+
+    def test_disk_filter(self):
+        self._assert_same_result([disk_filter.DiskFilter])
+
+    def test_num_instances_filter(self):
+        self._assert_same_result([num_instances_filter.NumInstancesFilter])
+
+    def test_io_ops_filter(self):
+        self._assert_same_result([io_ops_filter.IoOpsFilter])
+
+    def test_mixed_filters(self):
+        self._assert_same_result([num_instances_filter.NumInstancesFilter,
+                                  all_hosts_filter.AllHostsFilter,
+                                  ram_filter.RamFilter,
+                                  core_filter.CoreFilter,
+                                  disk_filter.AggregateDiskFilter,
+                                  io_ops_filter.IoOpsFilter])
+
+    def test_aggregate_filters_have_no_mask(self):
+        columns = filters.HostStateColumns(self._get_hosts())
+        for filt_cls in (disk_filter.AggregateDiskFilter,
+                         num_instances_filter.AggregateNumInstancesFilter,
+                         io_ops_filter.AggregateIoOpsFilter,
+                         compute_filter.ComputeFilter):
+            self.assertIsNone(filt_cls().filter_mask(columns,
+                                                     self.filter_properties))
+
+
+class HostFilterStatsTestCase(test.NoDBTestCase):
+
+    def test_stats(self):
+        class OnceFilter(all_hosts_filter.AllHostsFilter):
+            run_filter_once_per_request = True
+
+        class NoHostFilter(filters.BaseHostFilter):
+            def host_passes(self, host_state, filter_properties):
+                return False
+
+        handler = filters.HostFilterHandler()
+        hosts = [fakes.FakeHostState('host%d' % i, 'node', {})
+                 for i in range(3)]
+        filter_objs = [OnceFilter(), NoHostFilter()]
+        handler.get_filtered_objects(filter_objs, hosts, {}, index=0)
+        handler.get_filtered_objects(filter_objs, hosts, {}, index=1)
+
+        stats = handler.stats.to_dict()
+        self.assertEqual(1, stats['OnceFilter']['runs'])
+        self.assertEqual(1, stats['OnceFilter']['skipped'])
+        self.assertEqual(3, stats['OnceFilter']['objs_out'])
+        self.assertEqual(2, stats['NoHostFilter']['runs'])
+        self.assertEqual(6, stats['NoHostFilter']['objs_in'])
+        self.assertEqual(0, stats['NoHostFilter']['objs_out'])
+        self.assertEqual(2, stats['NoHostFilter']['emptied'])
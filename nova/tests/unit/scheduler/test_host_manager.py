@@ -17,6 +17,7 @@ Tests For HostManager
 """
 
 import collections
+import datetime
 
 import mock
 from oslo_config import cfg
@@ -29,9 +30,11 @@ from nova.compute import vm_states
 from nova import exception
 from nova import objects
 from nova.objects import base as obj_base
+from nova.openstack.common import memorycache
 from nova.pci import stats as pci_stats
 from nova.scheduler import filters
 from nova.scheduler import host_manager
+from nova.scheduler import host_state_cache
 from nova.scheduler import utils as sched_utils
 from nova import test
 from nova.tests.unit import fake_instance
@@ -176,6 +179,33 @@ class HostManagerTestCase(test.NoDBTestCase):
         self.assertEqual({'fake-host': set([])},
                          self.host_manager.host_aggregates_map)
 
+    def test_aggregate_index_maintained(self):
+        fake_agg = objects.Aggregate(id=1, hosts=['fake-host'],
+                                     metadata={'availability_zone': 'az1'})
+        index = self.host_manager.aggregate_index
+        self.host_manager.update_aggregates([fake_agg])
+        self.assertEqual(['fake-host'],
+                         list(index.hosts_with_value('availability_zone',
+                                                     'az1')))
+        fake_agg.metadata = {'availability_zone': 'az2'}
+        self.host_manager.update_aggregates(fake_agg)
+        self.assertEqual({}, index.hosts_with_value('availability_zone',
+                                                    'az1'))
+        self.assertEqual(['fake-host'],
+                         list(index.hosts_with_value('availability_zone',
+                                                     'az2')))
+        self.host_manager.delete_aggregate(fake_agg)
+        self.assertEqual({}, index.hosts_with_key('availability_zone'))
+
+    def test_choose_host_filters_sets_aggregate_index(self):
+        host_filters = self.host_manager._choose_host_filters(
+                ['FakeFilterClass2'])
+        self.assertIs(self.host_manager.aggregate_index,
+                      host_filters[0].aggregate_index)
+        fake_properties = {}
+        self.host_manager.get_filtered_hosts(self.fake_hosts, fake_properties)
+        self.assertNotIn('aggregate_index', fake_properties)
+
     def test_choose_host_filters_not_found(self):
         self.assertRaises(exception.SchedulerHostFilterNotFound,
                           self.host_manager._choose_host_filters,
@@ -500,7 +530,7 @@ class HostManagerTestCase(test.NoDBTestCase):
         host_state = host_manager.HostState('host1', cn1)
         self.assertFalse(host_state.instances)
         mock_get_by_host.return_value = None
-        hm._add_instance_info(context, cn1, host_state)
+        hm._add_instance_info(context, cn1.host, host_state)
         self.assertFalse(mock_get_by_host.called)
         self.assertTrue(host_state.instances)
         self.assertEqual(host_state.instances['uuid1'], inst1)
@@ -522,11 +552,91 @@ class HostManagerTestCase(test.NoDBTestCase):
         host_state = host_manager.HostState('host1', cn1)
         self.assertFalse(host_state.instances)
         mock_get_by_host.return_value = objects.InstanceList(objects=[inst1])
-        hm._add_instance_info(context, cn1, host_state)
+        hm._add_instance_info(context, cn1.host, host_state)
         mock_get_by_host.assert_called_once_with(context, cn1.host)
         self.assertTrue(host_state.instances)
         self.assertEqual(host_state.instances['uuid1'], inst1)
 
+    @mock.patch('nova.objects.InstanceList.get_by_host',
+                return_value=objects.InstanceList())
+    @mock.patch('nova.objects.ComputeNodeList.get_all',
+                return_value=fakes.COMPUTE_NODES)
+    @mock.patch('nova.objects.ServiceList.get_by_binary',
+                return_value=fakes.SERVICES)
+    def test_get_all_host_states_unpublished_nodes(self, mock_get_svc,
+                                                   mock_get_all_comp,
+                                                   mock_get_by_host):
+        hm = self.host_manager
+        hm.host_state_cache = host_state_cache.HostStateCache(
+            client=memorycache.Client())
+        hm.host_state_cache.update_compute_node(fakes.COMPUTE_NODES[0])
+        hm.get_all_host_states('fake_context')
+        self.assertIsNotNone(hm._last_full_refresh)
+        self.assertEqual(1, hm.host_state_map[('host1', 'node1')].generation)
+        self.assertIsNone(hm.host_state_map[('host2', 'node2')].generation)
+
+        # The nodes which aren't in the cache are read again from the
+        # database on each request.
+        with mock.patch.object(host_manager.HostState,
+                               'update_from_compute_node',
+                               autospec=True) as mock_update:
+            host_states = list(hm.get_all_host_states('fake_context'))
+        self.assertEqual(2, mock_get_all_comp.call_count)
+        self.assertEqual(4, len(host_states))
+        self.assertEqual(
+            set(['host2', 'host3', 'host4']),
+            set(call[0][1].host for call in mock_update.call_args_list))
+
+    @mock.patch('nova.objects.InstanceList.get_by_host',
+                return_value=objects.InstanceList())
+    @mock.patch('nova.objects.ComputeNodeList.get_all',
+                return_value=fakes.COMPUTE_NODES)
+    @mock.patch('nova.objects.ServiceList.get_by_binary',
+                return_value=fakes.SERVICES)
+    def test_get_all_host_states_from_host_state_cache(self, mock_get_svc,
+                                                       mock_get_all_comp,
+                                                       mock_get_by_host):
+        hm = self.host_manager
+        hm.host_state_cache = host_state_cache.HostStateCache(
+            client=memorycache.Client())
+        for compute in fakes.COMPUTE_NODES:
+            hm.host_state_cache.update_compute_node(compute)
+        hm.get_all_host_states('fake_context')
+        self.assertEqual(1, mock_get_all_comp.call_count)
+
+        compute = fakes.COMPUTE_NODES[0].obj_clone()
+        compute.free_ram_mb = 42
+        hm.host_state_cache.update_compute_node(compute)
+
+        with mock.patch.object(host_manager.HostState,
+                               'update_from_compute_node',
+                               autospec=True) as mock_update:
+            host_states = list(hm.get_all_host_states('fake_context'))
+            self.assertEqual(1, mock_update.call_count)
+        # The compute nodes are not read again from the database
+        self.assertEqual(1, mock_get_all_comp.call_count)
+        self.assertEqual(4, len(host_states))
+        self.assertEqual(2, hm.host_state_map[('host1', 'node1')].generation)
+        self.assertEqual(1, hm.host_state_map[('host2', 'node2')].generation)
+
+    @mock.patch('nova.objects.InstanceList.get_by_host',
+                return_value=objects.InstanceList())
+    @mock.patch('nova.objects.ComputeNodeList.get_all',
+                return_value=fakes.COMPUTE_NODES)
+    @mock.patch('nova.objects.ServiceList.get_by_binary',
+                return_value=fakes.SERVICES)
+    def test_get_all_host_states_cache_full_refresh_due(self, mock_get_svc,
+                                                        mock_get_all_comp,
+                                                        mock_get_by_host):
+        self.flags(scheduler_host_state_full_refresh_interval=60)
+        hm = self.host_manager
+        hm.host_state_cache = host_state_cache.HostStateCache(
+            client=memorycache.Client())
+        hm.get_all_host_states('fake_context')
+        hm._last_full_refresh -= datetime.timedelta(seconds=61)
+        hm.get_all_host_states('fake_context')
+        self.assertEqual(2, mock_get_all_comp.call_count)
+
     @mock.patch('nova.objects.InstanceList.get_by_host')
     def test_recreate_instance_info(self, mock_get_by_host):
         host_name = 'fake_host'
@@ -0,0 +1,92 @@
+# Copyright (c) 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For the scheduler host state cache
+"""
+
+import mock
+
+from nova import objects
+from nova.openstack.common import memorycache
+from nova.scheduler import host_state_cache
+from nova import test
+from nova.tests.unit.scheduler import fakes
+
+
+class GetHostStateCacheTestCase(test.NoDBTestCase):
+
+    def test_disabled(self):
+        self.assertIsNone(host_state_cache.get_host_state_cache())
+
+    @mock.patch.object(host_state_cache.LOG, 'warning')
+    def test_disabled_without_memcached_servers(self, mock_warning):
+        self.flags(scheduler_use_host_state_cache=True)
+        self.assertIsNone(host_state_cache.get_host_state_cache())
+        self.assertTrue(mock_warning.called)
+
+    @mock.patch.object(memorycache, 'get_client')
+    def test_enabled(self, mock_get_client):
+        self.flags(scheduler_use_host_state_cache=True,
+                   memcached_servers=['127.0.0.1:11211'])
+        cache = host_state_cache.get_host_state_cache()
+        self.assertIsInstance(cache, host_state_cache.HostStateCache)
+        self.assertEqual(mock_get_client.return_value, cache.mc)
+
+
+class HostStateCacheTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(HostStateCacheTestCase, self).setUp()
+        self.mc = memorycache.Client()
+        self.cache = host_state_cache.HostStateCache(client=self.mc)
+
+    def test_update_compute_node_bumps_generation(self):
+        compute = fakes.COMPUTE_NODES[0]
+        self.assertEqual(1, self.cache.update_compute_node(compute))
+        self.assertEqual(2, self.cache.update_compute_node(compute))
+        self.assertEqual({('host1', 'node1'): 2},
+                         self.cache.get_generations([('host1', 'node1'),
+                                                     ('host2', 'node2')]))
+
+    def test_get_compute_nodes(self):
+        for compute in fakes.COMPUTE_NODES[:2]:
+            self.cache.update_compute_node(compute)
+        computes = self.cache.get_compute_nodes([('host1', 'node1'),
+                                                 ('host3', 'node3')])
+        self.assertEqual([('host1', 'node1')], list(computes))
+        compute = computes[('host1', 'node1')]
+        self.assertIsInstance(compute, objects.ComputeNode)
+        self.assertEqual(512, compute.free_ram_mb)
+        self.assertEqual('node1', compute.hypervisor_hostname)
+
+    def test_get_with_no_keys(self):
+        self.assertEqual({}, self.cache.get_generations([]))
+        self.assertEqual({}, self.cache.get_compute_nodes([]))
+
+    def test_get_generations_uses_get_multi(self):
+        mc = mock.Mock()
+        mc.get_multi.return_value = {
+            'scheduler-host-state-generation-host1-node1': '3'}
+        cache = host_state_cache.HostStateCache(client=mc)
+        self.assertEqual({('host1', 'node1'): 3},
+                         cache.get_generations([('host1', 'node1')]))
+        mc.get_multi.assert_called_once_with(
+            ['scheduler-host-state-generation-host1-node1'])
+        self.assertFalse(mc.get.called)
+
+    def test_get_compute_nodes_skips_invalid_entries(self):
+        self.mc.set('scheduler-host-state-host1-node1', 'garbage')
+        self.assertEqual({},
+                         self.cache.get_compute_nodes([('host1', 'node1')]))
@@ -101,3 +101,7 @@ class SchedulerRpcAPITestCase(test.NoDBTestCase):
                 instance_uuids=['fake1', 'fake2'],
                 fanout=True,
                 version='4.2')
+
+    def test_get_scheduler_stats(self):
+        self._test_scheduler_api('get_scheduler_stats', rpc_method='call',
+                version='4.3')
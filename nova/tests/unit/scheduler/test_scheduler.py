@@ -104,6 +104,27 @@ class SchedulerManagerTestCase(test.NoDBTestCase):
                                               mock.sentinel.host_name,
                                               mock.sentinel.instance_uuids)
 
+    def test_get_scheduler_stats(self):
+        with mock.patch.object(self.manager.driver.host_manager,
+                               'get_stats') as mock_stats:
+            self.assertEqual(mock_stats.return_value,
+                             self.manager.get_scheduler_stats(
+                                 mock.sentinel.context))
+            mock_stats.assert_called_once_with()
+
+    def test_log_scheduler_stats(self):
+        self.manager.driver.host_manager.filter_handler.stats[
+            'RamFilter'].record_run(0.002, 10, 4)
+        self.manager.driver.host_manager.weight_handler.stats[
+            'RAMWeigher'].record_run(0.001, 4, 4)
+        with mock.patch.object(manager.LOG, 'info') as mock_log:
+            self.manager._log_scheduler_stats(mock.sentinel.context)
+            self.assertEqual(2, mock_log.call_count)
+            self.assertEqual('RamFilter', mock_log.call_args_list[0][0][1][
+                'name'])
+            self.assertEqual(4, mock_log.call_args_list[0][0][1][
+                'objs_out'])
+
 
 class SchedulerV3PassthroughTestCase(test.NoDBTestCase):
 
@@ -142,12 +163,11 @@ class SchedulerTestCase(test.NoDBTestCase):
         services = [service1, service2]
 
         self.mox.StubOutWithMock(db, 'service_get_all_by_topic')
-        self.mox.StubOutWithMock(servicegroup.API, 'service_is_up')
+        self.mox.StubOutWithMock(servicegroup.API, 'is_up_many')
 
         db.service_get_all_by_topic(self.context,
                 self.topic).AndReturn(services)
-        self.servicegroup_api.service_is_up(service1).AndReturn(False)
-        self.servicegroup_api.service_is_up(service2).AndReturn(True)
+        self.servicegroup_api.is_up_many(services).AndReturn([False, True])
 
         self.mox.ReplayAll()
         result = self.driver.hosts_up(self.context, self.topic)
@@ -22,9 +22,12 @@ from nova.tests.unit.scheduler import fakes
 
 
 class MetricsWeigherTestCase(test.NoDBTestCase):
+    use_batch_weighers = False
+
     def setUp(self):
         super(MetricsWeigherTestCase, self).setUp()
-        self.weight_handler = weights.HostWeightHandler()
+        self.weight_handler = weights.HostWeightHandler(
+            use_batch_weighers=self.use_batch_weighers)
         self.weighers = [metrics.MetricsWeigher()]
 
     def _get_weighed_host(self, hosts, setting, weight_properties=None):
@@ -154,3 +157,13 @@ class MetricsWeigherTestCase(test.NoDBTestCase):
         self.flags(required=False, group='metrics')
         setting = ['foo=0.0001', 'zot=-1']
         self._do_test(setting, 1.0, 'host5')
+
+
+class MetricsWeigherBatchTestCase(MetricsWeigherTestCase):
+    """Runs the same tests with the weights computed in NumPy arrays."""
+
+    use_batch_weighers = True
+
+    def setUp(self):
+        super(MetricsWeigherBatchTestCase, self).setUp()
+        self.assertTrue(self.weight_handler.use_batch_weighers)
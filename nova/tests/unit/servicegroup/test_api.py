@@ -69,3 +69,46 @@ class ServiceGroupApiTestCase(test.NoDBTestCase):
             driver = self.servicegroup_api._driver
             result = self.servicegroup_api.service_is_up(member)
             self.assertIs(result, False)
+
+    def test_is_up_many(self):
+        members = [{"host": "fake-host%d" % i,
+                    "topic": "compute",
+                    "forced_down": i == 1} for i in range(3)]
+        driver = self.servicegroup_api._driver
+        driver.is_up_many = mock.MagicMock(return_value=[True, False])
+
+        result = self.servicegroup_api.is_up_many(members)
+        self.assertEqual([True, False, False], result)
+        driver.is_up_many.assert_called_once_with([members[0], members[2]])
+
+        self.assertEqual([members[0]],
+                         self.servicegroup_api.get_up_services(members))
+
+    def test_is_up_many_no_members(self):
+        driver = self.servicegroup_api._driver
+        driver.is_up_many = mock.MagicMock()
+        self.assertEqual([], self.servicegroup_api.is_up_many([]))
+        self.assertFalse(driver.is_up_many.called)
+
+    @mock.patch('time.time')
+    def test_cache(self, mock_time):
+        self.flags(servicegroup_cache_time=10)
+        member = {"host": "fake-host", "topic": "compute"}
+        other = {"host": "other-host", "topic": "compute"}
+        driver = self.servicegroup_api._driver
+        driver.is_up = mock.MagicMock(return_value=True)
+        driver.is_up_many = mock.MagicMock(return_value=[False])
+
+        mock_time.return_value = 100
+        self.assertTrue(self.servicegroup_api.service_is_up(member))
+        mock_time.return_value = 105
+        self.assertEqual([True, False],
+                         self.servicegroup_api.is_up_many([member, other]))
+        driver.is_up_many.assert_called_once_with([other])
+        self.assertFalse(self.servicegroup_api.service_is_up(other))
+        self.assertEqual(1, driver.is_up.call_count)
+
+        # The cached state expires
+        mock_time.return_value = 110
+        self.assertTrue(self.servicegroup_api.service_is_up(member))
+        self.assertEqual(2, driver.is_up.call_count)
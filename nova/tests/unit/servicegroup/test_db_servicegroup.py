@@ -84,3 +84,17 @@ class DBServiceGroupTestCase(test.NoDBTestCase):
         fn(service)
         upd_mock.assert_called_once_with()
         self.assertEqual(11, service_ref.report_count)
+
+    @mock.patch.object(objects.Service, 'save')
+    def test_report_state_coalesced(self, upd_mock):
+        self.flags(heartbeat_flush_interval=10, group='conductor')
+        service_ref = objects.Service(host='fake-host', topic='compute',
+                                      report_count=10)
+        service = mock.MagicMock(model_disconnected=False,
+                                 service_ref=service_ref)
+        fn = self.servicegroup_api._driver._report_state
+        fn(service)
+        service.conductor_api.service_heartbeat.assert_called_once_with(
+            mock.ANY, service_ref)
+        self.assertFalse(upd_mock.called)
+        self.assertEqual(10, service_ref.report_count)
@@ -17,6 +17,7 @@
 
 import mock
 
+from nova.openstack.common import memorycache
 from nova import servicegroup
 from nova import test
 
@@ -64,3 +65,27 @@ class MemcachedServiceGroupTestCase(test.NoDBTestCase):
         fn(service)
         self.mc_client.set.assert_called_once_with('compute:fake-host',
                                                    mock.ANY, time=60)
+
+    def test_is_up_many(self):
+        service_refs = [{'host': 'fake-host%d' % i, 'topic': 'compute'}
+                        for i in range(3)]
+        self.mc_client.get_multi.return_value = {
+            'compute:fake-host0': True, 'compute:fake-host2': True}
+
+        self.assertEqual([True, False, True],
+                         self.servicegroup_api.is_up_many(service_refs))
+        self.mc_client.get_multi.assert_called_once_with(
+            ['compute:fake-host0', 'compute:fake-host1',
+             'compute:fake-host2'])
+        self.assertFalse(self.mc_client.get.called)
+
+    def test_is_up_many_in_process_client(self):
+        service_refs = [{'host': 'fake-host%d' % i, 'topic': 'compute'}
+                        for i in range(3)]
+        mc = memorycache.Client()
+        mc.set('compute:fake-host0', True)
+        mc.set('compute:fake-host2', True)
+        self.servicegroup_api._driver.mc = mc
+
+        self.assertEqual([True, False, True],
+                         self.servicegroup_api.is_up_many(service_refs))
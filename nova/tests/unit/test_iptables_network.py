@@ -15,6 +15,9 @@
 #    under the License.
 """Unit Tests for network code."""
 
+import collections
+
+from oslo_concurrency import processutils
 import six
 
 from nova.network import linux_net
@@ -275,3 +278,211 @@ class IptablesManagerTestCase(test.NoDBTestCase):
                                                self.manager.ipv4['filter'],
                                                'filter')
         self.assertEqual(current_lines, new_lines)
+
+
+class FakeIptables(object):
+    """iptables-save and iptables-restore, with and without --noflush, of
+    the tables of iptables and ip6tables.
+    """
+
+    def __init__(self, ipv4_lines, ipv6_lines):
+        self.tables = {'iptables': collections.OrderedDict(),
+                       'ip6tables': collections.OrderedDict()}
+        self._restore('iptables', ipv4_lines, False)
+        self._restore('ip6tables', ipv6_lines, False)
+        self.commands = []
+        self.restored = []
+        self.fail_noflush = False
+
+    def __call__(self, cmd, *args, **kwargs):
+        self.commands.append(' '.join((cmd,) + args))
+        family, action = cmd.split('-')
+        if action == 'save':
+            return '\n'.join(self._save(family)), ''
+        noflush = '--noflush' in args
+        if noflush and self.fail_noflush:
+            raise processutils.ProcessExecutionError()
+        lines = kwargs['process_input'].strip().split('\n')
+        self.restored.append(lines)
+        self._restore(family, lines, noflush)
+        return '', ''
+
+    @staticmethod
+    def _chain(rule):
+        return rule.split(' -A ', 1)[1].split()[0]
+
+    def _save(self, family):
+        lines = []
+        for table_name, (chains, rules) in six.iteritems(
+                self.tables[family]):
+            lines.append('# Generated by iptables-save')
+            lines.append('*%s' % table_name)
+            lines.extend(':%s %s' % (chain, policy)
+                         for chain, policy in six.iteritems(chains))
+            lines.extend(rules)
+            lines.append('COMMIT')
+            lines.append('# Completed')
+        return lines
+
+    def _restore(self, family, lines, noflush):
+        tables = self.tables[family]
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith('#') or line == 'COMMIT':
+                continue
+            if line.startswith('*'):
+                if not noflush or line[1:] not in tables:
+                    tables[line[1:]] = (collections.OrderedDict(), [])
+                chains, rules = tables[line[1:]]
+            elif line.startswith(':'):
+                chain, policy = line[1:].split(' ', 1)
+                if policy.startswith('-'):
+                    # Declaring a user defined chain flushes it
+                    rules[:] = [rule for rule in rules
+                                if self._chain(rule) != chain]
+                chains[chain] = policy
+            elif line.startswith('-X '):
+                chain = line.split()[1]
+                if any(self._chain(rule) == chain or
+                       ' -j %s ' % chain in rule + ' ' for rule in rules):
+                    raise processutils.ProcessExecutionError(
+                        'Chain %s is not empty or referenced' % chain)
+                del chains[chain]
+            else:
+                rules.append(line)
+
+    def chain_rules(self):
+        """Return the rules without their counters by chain, by command and
+        table name.
+        """
+        result = {}
+        for family, tables in six.iteritems(self.tables):
+            for table_name, (chains, rules) in six.iteritems(tables):
+                result[(family, table_name)] = dict(
+                    (chain, [rule.split('] ', 1)[-1] for rule in rules
+                             if self._chain(rule) == chain])
+                    for chain in chains)
+        return result
+
+
+class IptablesIncrementalApplyTestCase(test.NoDBTestCase):
+    """Compares the rules applied incrementally with the rules of another
+    manager rewriting the tables after the same changes.
+    """
+
+    binary_name = linux_net.get_binary_name()
+
+    def setUp(self):
+        super(IptablesIncrementalApplyTestCase, self).setUp()
+        self.flags(use_ipv6=True)
+        ipv4_lines = (IptablesManagerTestCase.sample_filter +
+                      IptablesManagerTestCase.sample_nat)
+        ipv6_lines = IptablesManagerTestCase.sample_filter
+        self.full_iptables = FakeIptables(ipv4_lines, ipv6_lines)
+        self.iptables = FakeIptables(ipv4_lines, ipv6_lines)
+        self.full_manager = linux_net.IptablesManager(
+            execute=self.full_iptables)
+        self.manager = linux_net.IptablesManager(execute=self.iptables)
+        self._apply()
+        self.iptables.commands = []
+        self.iptables.restored = []
+
+    def _apply(self, change=None):
+        for manager in (self.full_manager, self.manager):
+            if change is not None:
+                change(manager)
+            self.flags(iptables_incremental_apply=manager is self.manager)
+            manager.apply()
+        self.assertEqual(self.full_iptables.chain_rules(),
+                         self.iptables.chain_rules())
+
+    def _add_instance(self, manager, name, address):
+        for tables in (manager.ipv4, manager.ipv6):
+            table = tables['filter']
+            table.add_chain(name)
+            table.add_rule(name, '-s %s -j ACCEPT' % address)
+            table.add_rule(name, '-m state --state INVALID -j DROP',
+                           top=True)
+            table.add_rule(name, '-j $sg-fallback')
+            table.add_rule('local', '-d %s -j $%s' % (address, name))
+            if not table.has_chain('sg-fallback'):
+                table.add_chain('sg-fallback')
+                table.add_rule('sg-fallback', '-j DROP')
+        manager.ipv4['nat'].add_rule(
+            'float-snat', '-s %s -j SNAT --to-source 1.2.3.4' % address)
+
+    def test_apply_changed_chains(self):
+        self._apply(lambda manager: self._add_instance(manager, 'inst-1',
+                                                       '10.0.0.1'))
+        self.assertEqual(['iptables-restore -c --noflush',
+                          'ip6tables-restore -c --noflush'],
+                         self.iptables.commands)
+        self.assertEqual(
+            ['*filter',
+             ':%s-inst-1 - [0:0]' % self.binary_name,
+             ':%s-local - [0:0]' % self.binary_name,
+             ':%s-sg-fallback - [0:0]' % self.binary_name,
+             '[0:0] -A %s-inst-1 -m state --state INVALID -j DROP' %
+             self.binary_name,
+             '[0:0] -A %s-inst-1 -s 10.0.0.1 -j ACCEPT' % self.binary_name,
+             '[0:0] -A %(bn)s-inst-1 -j %(bn)s-sg-fallback' %
+             {'bn': self.binary_name},
+             '[0:0] -A %(bn)s-local -d 10.0.0.1 -j %(bn)s-inst-1' %
+             {'bn': self.binary_name},
+             '[0:0] -A %s-sg-fallback -j DROP' % self.binary_name,
+             'COMMIT'],
+            self.iptables.restored[1])
+
+        def change_instances(manager):
+            self._add_instance(manager, 'inst-2', '10.0.0.2')
+            manager.ipv4['filter'].empty_chain('inst-1')
+            manager.ipv4['filter'].add_rule('inst-1',
+                                            '-s 10.0.0.3 -j ACCEPT')
+
+        self._apply(change_instances)
+
+        def remove_instance(manager):
+            for tables in (manager.ipv4, manager.ipv6):
+                tables['filter'].remove_chain('inst-1')
+            manager.ipv4['nat'].remove_rule(
+                'float-snat', '-s 10.0.0.1 -j SNAT --to-source 1.2.3.4')
+
+        self._apply(remove_instance)
+        self.assertIn('-X %s-inst-1' % self.binary_name,
+                      self.iptables.restored[-1])
+        self.assertNotIn('%s-inst-1' % self.binary_name,
+                         self.iptables.chain_rules()[('iptables', 'filter')])
+        self.assertEqual(3 * ['iptables-restore -c --noflush',
+                              'ip6tables-restore -c --noflush'],
+                         self.iptables.commands)
+
+    def test_apply_unwrapped_rules_rewrites_tables(self):
+        def add_unwrapped_rule(manager):
+            manager.ipv4['filter'].add_rule('FORWARD', '-i eth1 -j DROP',
+                                            wrap=False)
+            self._add_instance(manager, 'inst-1', '10.0.0.1')
+
+        self._apply(add_unwrapped_rule)
+        self.assertEqual(['iptables-save -c', 'iptables-restore -c',
+                          'ip6tables-restore -c --noflush'],
+                         self.iptables.commands)
+
+    def test_apply_failed_restore_rewrites_tables(self):
+        self.iptables.fail_noflush = True
+        self._apply(lambda manager: self._add_instance(manager, 'inst-1',
+                                                       '10.0.0.1'))
+        self.assertEqual(['iptables-restore -c --noflush',
+                          'iptables-save -c', 'iptables-restore -c',
+                          'ip6tables-restore -c --noflush',
+                          'ip6tables-save -c', 'ip6tables-restore -c'],
+                         self.iptables.commands)
+
+    def test_apply_unchanged_chains_not_restored(self):
+        def add_remove_rule(manager):
+            table = manager.ipv4['filter']
+            table.add_rule('local', '-d 10.0.0.1 -j DROP')
+            table.remove_rule('local', '-d 10.0.0.1 -j DROP')
+
+        self._apply(add_remove_rule)
+        self.assertFalse(self.manager.ipv4['filter'].dirty)
+        self.assertEqual([], self.iptables.commands)
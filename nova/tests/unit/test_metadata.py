@@ -634,6 +634,90 @@ class OpenStackMetadataTestCase(test.TestCase):
             self.assertEqual(nw[k], v)
 
 
+class PrerenderedMetadataTestCase(test.TestCase):
+    def setUp(self):
+        super(PrerenderedMetadataTestCase, self).setUp()
+        fakes.stub_out_key_pair_funcs(self.stubs)
+        self.context = context.RequestContext('fake', 'fake')
+        self.instance = fake_inst_obj(self.context)
+        self.flags(use_local=True, group='conductor')
+        fake_network.stub_out_nw_api_get_instance_nw_info(self.stubs)
+        self.mdinst = fake_InstanceMetadata(
+            self.stubs, self.instance, content=[('/etc/motd', 'hello')])
+        self.rendered = base.PrerenderedMetadata.render(self.mdinst)
+
+    def test_can_pickle_rendered(self):
+        rendered = pickle.loads(pickle.dumps(self.rendered))
+        mdinst = base.PrerenderedMetadata.from_rendered(rendered)
+        self.assertEqual(self.mdinst.lookup('/2009-04-04/meta-data/hostname'),
+                         mdinst.lookup('/2009-04-04/meta-data/hostname'))
+
+    def test_lookup(self):
+        mdinst = base.PrerenderedMetadata.from_rendered(self.rendered)
+        for path in ('/', '/latest', '/2009-04-04/meta-data',
+                     '/1.0/meta-data/instance-id',
+                     '/2009-04-04/meta-data/block-device-mapping',
+                     '/2009-04-04/meta-data/public-keys',
+                     '/2009-04-04/user-data', '/openstack',
+                     '/openstack/2012-08-10', '/openstack/latest',
+                     '/openstack/2012-08-10/meta_data.json',
+                     '/openstack/latest/user_data',
+                     '/openstack/latest/vendor_data.json',
+                     '/openstack/latest/network_data.json',
+                     '/openstack/content/0000'):
+            self.assertEqual(self.mdinst.lookup(path), mdinst.lookup(path),
+                             path)
+            self.assertEqual(self.mdinst.get_mimetype(),
+                             mdinst.get_mimetype(), path)
+
+        mddict = jsonutils.loads(
+            mdinst.lookup('/openstack/latest/meta_data.json'))
+        self.assertEqual(self.instance.uuid, mddict['uuid'])
+        self.assertIn('random_seed', mddict)
+        self.assertEqual(base.MIME_TYPE_APPLICATION_JSON,
+                         mdinst.get_mimetype())
+
+    def test_random_seed_per_request(self):
+        mdinst = base.PrerenderedMetadata.from_rendered(self.rendered)
+        seeds = set(jsonutils.loads(
+            mdinst.lookup('/openstack/latest/meta_data.json'))['random_seed']
+            for i in range(2))
+        self.assertEqual(2, len(seeds))
+        self.assertNotIn(
+            'random_seed',
+            self.rendered['openstack'][base.OPENSTACK_VERSIONS[-1]][
+                base.MD_JSON_NAME][1])
+
+    def test_user_data_rendered_once(self):
+        self.assertEqual(self.mdinst.userdata_raw, self.rendered['user_data'])
+        for version in base.VERSIONS:
+            self.assertNotIn('user-data', self.rendered['ec2'][version])
+        for items in self.rendered['openstack'].values():
+            self.assertIsNone(items.get(base.UD_NAME, (None, None))[1])
+
+    def test_lookup_password(self):
+        mdinst = base.PrerenderedMetadata.from_rendered(self.rendered)
+        self.assertEqual(password.handle_password,
+                         mdinst.lookup('/openstack/latest/password'))
+        self.assertEqual(self.instance.uuid, mdinst.uuid)
+        self.assertEqual(self.mdinst.password, mdinst.password)
+        self.assertRaises(base.InvalidMetadataPath,
+                          mdinst.lookup, '/openstack/2012-08-10/password')
+
+    def test_lookup_invalid_path(self):
+        mdinst = base.PrerenderedMetadata.from_rendered(self.rendered)
+        for path in ('/2009-04-04/meta-data/foo', '/9999-99-99/meta-data',
+                     '/openstack/9999-99-99', '/openstack/latest/foo',
+                     '/openstack/content/9999'):
+            self.assertRaises(base.InvalidMetadataPath, mdinst.lookup, path)
+
+    def test_from_rendered_other_version(self):
+        self.rendered['render_version'] += 1
+        self.assertIsNone(
+            base.PrerenderedMetadata.from_rendered(self.rendered))
+        self.assertIsNone(base.PrerenderedMetadata.from_rendered(self.mdinst))
+
+
 class MetadataHandlerTestCase(test.TestCase):
     """Test that metadata is returning proper values."""
 
@@ -975,6 +1059,19 @@ class MetadataHandlerTestCase(test.TestCase):
         self._metadata_handler_with_remote_address(hnd)
         self.assertEqual(2, get_by_uuid.call_count)
 
+    @mock.patch.object(base, 'get_metadata_by_address')
+    def test_metadata_handler_prerendered(self, get_by_uuid):
+        fakes.stub_out_key_pair_funcs(self.stubs)
+        get_by_uuid.return_value = self.mdinst
+        self.flags(metadata_cache_expiration=15, metadata_prerender=True)
+        hnd = handler.MetadataRequestHandler()
+        self._metadata_handler_with_remote_address(hnd)
+        self._metadata_handler_with_remote_address(hnd)
+        self.assertEqual(1, get_by_uuid.call_count)
+        self.assertIsInstance(
+            hnd.get_metadata_by_remote_address('192.192.192.2'),
+            base.PrerenderedMetadata)
+
     @mock.patch.object(neutronapi, 'get_client', return_value=mock.Mock())
     def test_metadata_lb_proxy(self, mock_get_client):
 
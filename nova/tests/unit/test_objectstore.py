@@ -25,10 +25,12 @@ import tempfile
 import boto
 from boto import exception as boto_exception
 from boto.s3 import connection as s3
+import mock
 from oslo_config import cfg
 
 from nova.objectstore import s3server
 from nova import test
+from nova import utils
 from nova import wsgi
 
 CONF = cfg.CONF
@@ -149,6 +151,75 @@ class S3APITestCase(test.NoDBTestCase):
                           bucket.get_all_keys,
                           maxkeys=0)
 
+    def test_get_key_in_chunks(self):
+        self.flags(s3_chunk_size=3)
+        bucket = self.conn.create_bucket('testbucket')
+        key = bucket.new_key('somekey')
+        key.set_contents_from_string('0123456789')
+        self.assertEqual('"%s"' % utils.get_hash_str('0123456789'),
+                         key.etag)
+
+        key = bucket.get_key('somekey')
+        self.assertEqual('0123456789', key.get_contents_as_string())
+
+    def test_get_key_range(self):
+        bucket = self.conn.create_bucket('testbucket')
+        key = bucket.new_key('somekey')
+        key.set_contents_from_string('0123456789')
+
+        for byte_range, contents in (('bytes=2-5', '2345'),
+                                     ('bytes=7-', '789'),
+                                     ('bytes=-2', '89'),
+                                     ('bytes=8-20', '89')):
+            self.assertEqual(contents, key.get_contents_as_string(
+                headers={'Range': byte_range}))
+
+    def test_get_key_range_not_satisfiable(self):
+        bucket = self.conn.create_bucket('testbucket')
+        key = bucket.new_key('somekey')
+        key.set_contents_from_string('0123456789')
+
+        e = self.assertRaises(boto_exception.S3ResponseError,
+                              key.get_contents_as_string,
+                              headers={'Range': 'bytes=20-30'})
+        self.assertEqual(416, e.status)
+
+    def test_list_keys_paging(self):
+        bucket = self.conn.create_bucket('testbucket')
+        for key_name in ('a1', 'a2', 'a3', 'b1', 'b2'):
+            bucket.new_key(key_name).set_contents_from_string(key_name)
+
+        keys = bucket.get_all_keys(prefix='a', maxkeys=2)
+        self.assertEqual(['a1', 'a2'], [key.name for key in keys])
+        self.assertTrue(keys.is_truncated)
+        keys = bucket.get_all_keys(prefix='a', marker='a2')
+        self.assertEqual(['a3'], [key.name for key in keys])
+        self.assertFalse(keys.is_truncated)
+        keys = bucket.get_all_keys(marker='a3')
+        self.assertEqual(['b1', 'b2'], [key.name for key in keys])
+
+    def test_list_keys_cached_index(self):
+        bucket = self.conn.create_bucket('testbucket')
+        bucket.new_key('a').set_contents_from_string('a')
+
+        with mock.patch.object(os, 'walk', wraps=os.walk) as mock_walk:
+            self.assertEqual(['a'], [key.name for key in bucket.list()])
+            bucket.new_key('b').set_contents_from_string('b')
+            self.assertEqual(['a', 'b'],
+                             [key.name for key in bucket.list()])
+            bucket.delete_key('a')
+            self.assertEqual(['b'], [key.name for key in bucket.list()])
+        self.assertEqual(1, mock_walk.call_count)
+
+    def test_list_keys_cache_disabled(self):
+        self.flags(s3_bucket_index_cache_time=0)
+        bucket = self.conn.create_bucket('testbucket')
+
+        with mock.patch.object(os, 'walk', wraps=os.walk) as mock_walk:
+            bucket.get_all_keys()
+            bucket.get_all_keys()
+        self.assertEqual(2, mock_walk.call_count)
+
     def tearDown(self):
         """Tear down test server."""
         self.server.stop()
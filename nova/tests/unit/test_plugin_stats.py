@@ -0,0 +1,54 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For plugin run statistics.
+"""
+
+from nova import plugin_stats
+from nova import test
+
+
+class PluginStatsTestCase(test.NoDBTestCase):
+
+    def test_record_run(self):
+        stats = plugin_stats.PluginStats()
+        stats.record_run(0.002, 10, 4)
+        stats.record_run(2.0, 4, 0)
+        stats.record_skip()
+        self.assertEqual({'runs': 2,
+                          'skipped': 1,
+                          'total_time': 2.002,
+                          'max_time': 2.0,
+                          'objs_in': 14,
+                          'objs_out': 4,
+                          'emptied': 1,
+                          'histogram': [0, 0, 0, 1, 0, 0, 0, 0, 0, 1]},
+                         stats.to_dict())
+
+    def test_record_run_without_output(self):
+        stats = plugin_stats.PluginStats()
+        stats.record_run(0.00001, 3)
+        self.assertEqual(3, stats.objs_in)
+        self.assertEqual(0, stats.objs_out)
+        self.assertEqual(0, stats.emptied)
+        self.assertEqual(1, stats.histogram[0])
+
+    def test_collector(self):
+        collector = plugin_stats.StatsCollector()
+        collector['Filter1'].record_run(0.01, 2, 1)
+        collector['Filter1'].record_skip()
+        collector['Filter2'].record_skip()
+        stats = collector.reset()
+        self.assertEqual(['Filter1', 'Filter2'], sorted(stats))
+        self.assertEqual(1, stats['Filter1']['runs'])
+        self.assertEqual(1, stats['Filter2']['skipped'])
+        self.assertEqual({}, collector.to_dict())
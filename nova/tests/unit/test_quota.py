@@ -16,6 +16,7 @@
 
 import datetime
 
+import mock
 from oslo_config import cfg
 from oslo_utils import timeutils
 from six.moves import range
@@ -792,6 +793,19 @@ class QuotaEngineTestCase(test.TestCase):
                 ('expire', context),
                 ])
 
+    def test_flush_limits(self):
+        driver = mock.Mock(spec=['flush_limits'])
+        quota_obj = self._make_quota_obj(driver)
+        quota_obj.flush_limits(project_id='p1')
+
+        driver.flush_limits.assert_called_once_with(project_id='p1',
+                                                    quota_class=None)
+
+    def test_flush_limits_not_supported_by_driver(self):
+        # FakeDriver, like the out of tree drivers, has no flush_limits()
+        quota_obj = self._make_quota_obj(FakeDriver())
+        quota_obj.flush_limits(quota_class='default')
+
     def test_resources(self):
         quota_obj = self._make_quota_obj(None)
 
@@ -2782,6 +2796,185 @@ class QuotaReserveSqlAlchemyTestCase(test.TestCase):
         self.compare_reservation(result, reservations_list)
 
 
+class QuotaLimitsCacheTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(QuotaLimitsCacheTestCase, self).setUp()
+        self.flags(quota_limits_cache_time=60)
+        self.cache = quota.QuotaLimitsCache()
+        self.context = FakeContext('p1', None)
+        self.calls = []
+
+        def fake_quota_class_get_default(context):
+            self.calls.append('quota_class_get_default')
+            return {'class_name': 'default', 'instances': 10}
+
+        def fake_quota_class_get_all_by_name(context, quota_class):
+            self.calls.append(('quota_class_get_all_by_name', quota_class))
+            return {'class_name': quota_class, 'instances': 20}
+
+        def fake_quota_get_all_by_project(context, project_id):
+            self.calls.append(('quota_get_all_by_project', project_id))
+            return {'project_id': project_id, 'instances': 30}
+
+        def fake_quota_get_all_by_project_and_user(context, project_id,
+                                                   user_id):
+            self.calls.append(('quota_get_all_by_project_and_user',
+                               project_id, user_id))
+            return {'project_id': project_id, 'user_id': user_id,
+                    'instances': 40}
+
+        self.stubs.Set(db, 'quota_class_get_default',
+                       fake_quota_class_get_default)
+        self.stubs.Set(db, 'quota_class_get_all_by_name',
+                       fake_quota_class_get_all_by_name)
+        self.stubs.Set(db, 'quota_get_all_by_project',
+                       fake_quota_get_all_by_project)
+        self.stubs.Set(db, 'quota_get_all_by_project_and_user',
+                       fake_quota_get_all_by_project_and_user)
+
+    def _get_all(self):
+        for project_id in ('p1', 'p2'):
+            self.cache.get_project_quotas(self.context, project_id)
+            self.cache.get_user_quotas(self.context, project_id, 'u1')
+        self.cache.get_class_quotas(self.context, 'c1')
+        self.cache.get_defaults(self.context)
+
+    def test_get(self):
+        self.assertEqual({'project_id': 'p1', 'instances': 30},
+                         self.cache.get_project_quotas(self.context, 'p1'))
+        quotas = self.cache.get_project_quotas(self.context, 'p1')
+        self.assertEqual({'project_id': 'p1', 'instances': 30}, quotas)
+        quotas['instances'] = 0
+        self.assertEqual(30, self.cache.get_project_quotas(
+            self.context, 'p1')['instances'])
+        self.assertEqual([('quota_get_all_by_project', 'p1')], self.calls)
+        self.assertEqual((2, 1), (self.cache.hits, self.cache.misses))
+
+    def test_get_disabled(self):
+        self.flags(quota_limits_cache_time=0)
+        self.cache.get_defaults(self.context)
+        self.cache.get_defaults(self.context)
+        self.assertEqual(['quota_class_get_default'] * 2, self.calls)
+        self.assertEqual((0, 0), (self.cache.hits, self.cache.misses))
+
+    @mock.patch('time.time')
+    def test_get_expired(self, mock_time):
+        mock_time.return_value = 1000
+        self.cache.get_class_quotas(self.context, 'c1')
+        mock_time.return_value = 1059
+        self.cache.get_class_quotas(self.context, 'c1')
+        mock_time.return_value = 1060
+        self.cache.get_class_quotas(self.context, 'c1')
+        self.assertEqual([('quota_class_get_all_by_name', 'c1')] * 2,
+                         self.calls)
+        self.assertEqual((1, 2), (self.cache.hits, self.cache.misses))
+
+    def test_flush_project(self):
+        self._get_all()
+        self.cache.flush(project_id='p1')
+        self.calls = []
+        self._get_all()
+        self.assertEqual([('quota_get_all_by_project', 'p1'),
+                          ('quota_get_all_by_project_and_user', 'p1', 'u1')],
+                         self.calls)
+
+    def test_flush_quota_class(self):
+        self._get_all()
+        self.cache.flush(quota_class='c1')
+        self.calls = []
+        self._get_all()
+        self.assertEqual([('quota_class_get_all_by_name', 'c1'),
+                          'quota_class_get_default'], self.calls)
+
+    def test_flush_all(self):
+        self._get_all()
+        self.cache.flush()
+        self.calls = []
+        self._get_all()
+        self.assertEqual(6, len(self.calls))
+
+    def test_driver_limits(self):
+        driver = quota.DbQuotaDriver()
+        resources = {'instances': quota.BaseResource('instances')}
+        for i in range(2):
+            self.assertEqual(
+                {'instances': {'limit': 40}},
+                driver.get_user_quotas(self.context, resources, 'p1', 'u1',
+                                       usages=False))
+        self.assertEqual(3, len(self.calls))
+        self.assertEqual(3, driver.limits_cache.hits)
+        driver.flush_limits(project_id='p1')
+        driver.get_user_quotas(self.context, resources, 'p1', 'u1',
+                               usages=False)
+        self.assertEqual(5, len(self.calls))
+
+
+class OptimisticQuotaDriverTestCase(test.TestCase):
+    def setUp(self):
+        super(OptimisticQuotaDriverTestCase, self).setUp()
+        self.flags(reservation_expire=86400,
+                   until_refresh=0,
+                   max_age=0)
+        self.driver = quota.OptimisticQuotaDriver()
+        self.calls = []
+        self.useFixture(test.TimeOverride())
+
+        def fake_get_project_quotas(context, resources, project_id,
+                                    quota_class=None, defaults=True,
+                                    usages=True, remains=False,
+                                    project_quotas=None):
+            return {k: dict(limit=v.default) for k, v in resources.items()}
+
+        def fake_quota_reserve(context, resources, quotas, user_quotas,
+                               deltas, expire, until_refresh, max_age,
+                               project_id=None, user_id=None):
+            self.calls.append(('quota_reserve_optimistic', expire,
+                               until_refresh, max_age, project_id, user_id))
+            return ['resv-1']
+
+        def fake_reservation_commit(context, reservations, project_id=None,
+                                    user_id=None):
+            self.calls.append(('reservation_commit_optimistic', reservations))
+
+        def fake_reservation_rollback(context, reservations, project_id=None,
+                                      user_id=None):
+            self.calls.append(('reservation_rollback_optimistic',
+                               reservations))
+
+        self.stubs.Set(self.driver, 'get_project_quotas',
+                       fake_get_project_quotas)
+        self.stubs.Set(db, 'quota_reserve_optimistic', fake_quota_reserve)
+        self.stubs.Set(db, 'reservation_commit_optimistic',
+                       fake_reservation_commit)
+        self.stubs.Set(db, 'reservation_rollback_optimistic',
+                       fake_reservation_rollback)
+
+    def test_reserve(self):
+        result = self.driver.reserve(FakeContext('test_project', 'test_class'),
+                                     quota.QUOTAS._resources,
+                                     dict(instances=2))
+        expire = timeutils.utcnow() + datetime.timedelta(seconds=86400)
+        self.assertEqual([('quota_reserve_optimistic', expire, 0, 0,
+                           'test_project', 'fake_user')], self.calls)
+        self.assertEqual(['resv-1'], result)
+
+    def test_commit_and_rollback(self):
+        context = FakeContext('test_project', 'test_class')
+        self.driver.commit(context, ['resv-1'])
+        self.driver.rollback(context, ['resv-2'])
+        self.assertEqual([('reservation_commit_optimistic', ['resv-1']),
+                          ('reservation_rollback_optimistic', ['resv-2'])],
+                         self.calls)
+
+    @mock.patch.object(db, 'reservation_expire')
+    @mock.patch.object(db, 'reservation_expire_optimistic')
+    def test_expire(self, mock_expire_optimistic, mock_expire):
+        context = FakeContext('test_project', 'test_class')
+        self.driver.expire(context)
+        mock_expire_optimistic.assert_called_once_with(context)
+        self.assertFalse(mock_expire.called)
+
+
 class NoopQuotaDriverTestCase(test.TestCase):
     def setUp(self):
         super(NoopQuotaDriverTestCase, self).setUp()
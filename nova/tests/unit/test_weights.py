@@ -55,6 +55,9 @@ class TestWeigher(test.NoDBTestCase):
         for seq, result, minval, maxval in map_:
             ret = weights.normalize(seq, minval=minval, maxval=maxval)
             self.assertEqual(tuple(ret), result)
+            ret = weights.normalize_array(weights.numpy.array(seq),
+                                          minval=minval, maxval=maxval)
+            self.assertEqual(tuple(ret), result)
 
     @mock.patch('nova.weights.BaseWeigher.weigh_objects')
     def test_only_one_host(self, mock_weigh):
@@ -71,3 +74,71 @@ class TestWeigher(test.NoDBTestCase):
         self.assertEqual(1, len(weighed_host))
         self.assertEqual('host1', weighed_host[0].obj.host)
         self.assertFalse(mock_weigh.called)
+
+    def test_get_weighed_object_keeps_bounds(self):
+        host_values = [
+            ('host1', 'node1', {'free_ram_mb': 512}),
+            ('host2', 'node2', {'free_ram_mb': 1024}),
+        ]
+        hostinfo = [fakes.FakeHostState(host, node, values)
+                    for host, node, values in host_values]
+        weight_handler = scheduler_weights.HostWeightHandler()
+        weighers = [scheduler_weights.ram.RAMWeigher()]
+        weight_handler.get_weighed_objects(weighers, hostinfo, {})
+
+        hostinfo[0].free_ram_mb = 2048
+        weighed_host = weight_handler.get_weighed_object(weighers,
+                                                         hostinfo[0], {})
+        self.assertEqual(3.0, weighed_host.weight)
+        self.assertEqual(512, weighers[0].minval)
+        self.assertEqual(1024, weighers[0].maxval)
+
+
+class TestBatchWeighing(test.NoDBTestCase):
+    def _get_all_hosts(self):
+        host_values = [
+            ('host%d' % i, 'node%d' % i,
+             {'free_ram_mb': (i * 37) % 512, 'num_io_ops': i % 5})
+            for i in range(50)
+        ]
+        return [fakes.FakeHostState(host, node, values)
+                for host, node, values in host_values]
+
+    def _get_weighed_hosts(self, use_batch_weighers):
+        weight_handler = scheduler_weights.HostWeightHandler(
+            use_batch_weighers=use_batch_weighers)
+        weighers = [scheduler_weights.ram.RAMWeigher(),
+                    scheduler_weights.io_ops.IoOpsWeigher()]
+        return weight_handler.get_weighed_objects(weighers,
+                                                  self._get_all_hosts(), {})
+
+    def test_same_result_as_per_object_weighing(self):
+        expected = [(weighed.obj.host, weighed.weight)
+                    for weighed in self._get_weighed_hosts(False)]
+        weighed_hosts = self._get_weighed_hosts(True)
+        self.assertEqual(50, len(weighed_hosts))
+        self.assertEqual(expected, [(weighed.obj.host, weighed.weight)
+                                    for weighed in weighed_hosts])
+        self.assertEqual(expected[:3],
+                         [(weighed.obj.host, weighed.weight)
+                          for weighed in weighed_hosts[0:3]])
+        self.assertEqual(expected[-1], (weighed_hosts[-1].obj.host,
+                                        weighed_hosts[-1].weight))
+
+    def test_only_looked_at_hosts_are_built(self):
+        weighed_hosts = self._get_weighed_hosts(True)
+        best_hosts = weighed_hosts[0:2]
+        self.assertEqual(2, len(weighed_hosts._weighed_objs))
+        self.assertIs(best_hosts[0], weighed_hosts[0])
+
+    def test_default_weigh_objects_array(self):
+        class FakeWeigher(scheduler_weights.BaseHostWeigher):
+            def _weigh_object(self, host_state, weight_properties):
+                return host_state.num_io_ops * 2
+
+        weigher = FakeWeigher()
+        weights_array = weigher.weigh_objects_array(self._get_all_hosts(), {})
+        self.assertEqual([(i % 5) * 2 for i in range(50)],
+                         list(weights_array))
+        self.assertEqual(0, weigher.minval)
+        self.assertEqual(8, weigher.maxval)
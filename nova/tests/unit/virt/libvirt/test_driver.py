@@ -80,6 +80,7 @@ from nova.virt import block_device as driver_block_device
 from nova.virt import configdrive
 from nova.virt.disk import api as disk
 from nova.virt import driver
+from nova.virt import event as virtevent
 from nova.virt import fake
 from nova.virt import firewall as base_firewall
 from nova.virt import hardware
@@ -8713,8 +8714,9 @@ class LibvirtConnTestCase(test.NoDBTestCase):
     def test_disk_over_committed_size_total(self, mock_list):
         # Ensure destroy calls managedSaveRemove for saved instance.
         class DiagFakeDomain(object):
-            def __init__(self, name):
+            def __init__(self, name, uuid):
                 self._name = name
+                self._uuid = uuid
 
             def ID(self):
                 return 1
@@ -8723,14 +8725,19 @@ class LibvirtConnTestCase(test.NoDBTestCase):
                 return self._name
 
             def UUIDString(self):
-                return "19479fee-07a5-49bb-9138-d3738280d63c"
+                return self._uuid
+
+            def vcpus(self):
+                return None
 
             def XMLDesc(self, flags):
                 return "<domain/>"
 
         mock_list.return_value = [
-            DiagFakeDomain("instance0000001"),
-            DiagFakeDomain("instance0000002")]
+            DiagFakeDomain("instance0000001",
+                           "19479fee-07a5-49bb-9138-d3738280d63c"),
+            DiagFakeDomain("instance0000002",
+                           "a2e5f3b5-8c6c-4a4b-9b9e-1a0e8b0f6f4e")]
 
         drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
 
@@ -8763,8 +8770,9 @@ class LibvirtConnTestCase(test.NoDBTestCase):
     def test_disk_over_committed_size_total_eperm(self, mock_list):
         # Ensure destroy calls managedSaveRemove for saved instance.
         class DiagFakeDomain(object):
-            def __init__(self, name):
+            def __init__(self, name, uuid):
                 self._name = name
+                self._uuid = uuid
 
             def ID(self):
                 return 1
@@ -8773,14 +8781,19 @@ class LibvirtConnTestCase(test.NoDBTestCase):
                 return self._name
 
             def UUIDString(self):
-                return "19479fee-07a5-49bb-9138-d3738280d63c"
+                return self._uuid
+
+            def vcpus(self):
+                return None
 
             def XMLDesc(self, flags):
                 return "<domain/>"
 
         mock_list.return_value = [
-            DiagFakeDomain("instance0000001"),
-            DiagFakeDomain("instance0000002")]
+            DiagFakeDomain("instance0000001",
+                           "19479fee-07a5-49bb-9138-d3738280d63c"),
+            DiagFakeDomain("instance0000002",
+                           "a2e5f3b5-8c6c-4a4b-9b9e-1a0e8b0f6f4e")]
 
         drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
 
@@ -9714,6 +9727,113 @@ class LibvirtConnTestCase(test.NoDBTestCase):
                     'version': '1.0'}
         self.assertEqual(expected, actual.serialize())
 
+    @mock.patch.object(timeutils, 'utcnow')
+    @mock.patch.object(host.Host, 'get_domain_stats')
+    @mock.patch.object(host.Host, 'get_domain')
+    def test_diagnostic_bulk_stats(self, mock_get_domain, mock_stats,
+                                   mock_utcnow):
+        xml = """
+                <domain type='kvm'>
+                    <devices>
+                        <disk type='file'>
+                            <source file='filename'/>
+                            <target dev='vda' bus='virtio'/>
+                        </disk>
+                        <interface type='network'>
+                            <mac address='52:54:00:a4:38:38'/>
+                            <source network='default'/>
+                            <target dev='vnet0'/>
+                        </interface>
+                    </devices>
+                </domain>
+            """
+
+        class DiagFakeDomain(FakeVirtDomain):
+
+            def __init__(self):
+                super(DiagFakeDomain, self).__init__(fake_xml=xml)
+
+            def memoryStats(self):
+                return {'actual': 220160}
+
+            def maxMemory(self):
+                return 280160
+
+        domain = DiagFakeDomain()
+        mock_get_domain.return_value = domain
+        mock_stats.return_value = {domain.UUIDString(): host.DomainStats(
+            domain.UUIDString(), 'instance-00000001',
+            state=libvirt_driver.VIR_DOMAIN_RUNNING,
+            max_mem=2048 * units.Mi, mem=1234 * units.Mi,
+            vcpus=[(0, 15340000000)],
+            block={'vda': (169, 688640, 0, 0, -1)},
+            net={'vnet0': (4408, 82, 0, 0, 0, 0, 0, 0)})}
+
+        drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        instance = objects.Instance(**self.test_instance)
+        actual = drvr.get_diagnostics(instance)
+        expect = {'cpu0_time': 15340000000,
+                  'vda_read': 688640,
+                  'vda_read_req': 169,
+                  'vda_write': 0,
+                  'vda_write_req': 0,
+                  'vda_errors': -1,
+                  'memory': 280160,
+                  'memory-actual': 220160,
+                  'vnet0_rx': 4408,
+                  'vnet0_rx_drop': 0,
+                  'vnet0_rx_errors': 0,
+                  'vnet0_rx_packets': 82,
+                  'vnet0_tx': 0,
+                  'vnet0_tx_drop': 0,
+                  'vnet0_tx_errors': 0,
+                  'vnet0_tx_packets': 0,
+                  }
+        self.assertEqual(expect, actual)
+        mock_stats.assert_called_once_with(
+            host.VIR_DOMAIN_STATS_VCPU | host.VIR_DOMAIN_STATS_BLOCK |
+            host.VIR_DOMAIN_STATS_INTERFACE, domains=[domain])
+
+        lt = datetime.datetime(2012, 11, 22, 12, 00, 00)
+        diags_time = datetime.datetime(2012, 11, 22, 12, 00, 10)
+        mock_utcnow.return_value = diags_time
+
+        instance.launched_at = lt
+        actual = drvr.get_instance_diagnostics(instance)
+        expected = {'config_drive': False,
+                    'cpu_details': [{'time': 15340000000}],
+                    'disk_details': [{'errors_count': 0,
+                                      'id': '',
+                                      'read_bytes': 688640,
+                                      'read_requests': 169,
+                                      'write_bytes': 0,
+                                      'write_requests': 0}],
+                    'driver': 'libvirt',
+                    'hypervisor_os': 'linux',
+                    'memory_details': {'maximum': 2048, 'used': 1234},
+                    'nic_details': [{'mac_address': '52:54:00:a4:38:38',
+                                     'rx_drop': 0,
+                                     'rx_errors': 0,
+                                     'rx_octets': 4408,
+                                     'rx_packets': 82,
+                                     'tx_drop': 0,
+                                     'tx_errors': 0,
+                                     'tx_octets': 0,
+                                     'tx_packets': 0}],
+                    'state': 'running',
+                    'uptime': 10,
+                    'version': '1.0'}
+        self.assertEqual(expected, actual.serialize())
+
+    @mock.patch.object(host.Host, 'get_domain_stats', return_value={})
+    @mock.patch.object(host.Host, 'get_domain')
+    def test_diagnostic_domain_gone(self, mock_get_domain, mock_stats):
+        mock_get_domain.return_value = FakeVirtDomain()
+        drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        instance = objects.Instance(**self.test_instance)
+        self.assertRaises(exception.InstanceNotFound,
+                          drvr.get_diagnostics, instance)
+
     @mock.patch.object(timeutils, 'utcnow')
     @mock.patch.object(host.Host, 'get_domain')
     def test_diagnostic_full_with_multiple_interfaces(self, mock_get_domain,
@@ -9889,6 +10009,9 @@ class LibvirtConnTestCase(test.NoDBTestCase):
             def UUIDString(self):
                 return "19479fee-07a5-49bb-9138-d3738280d63c"
 
+            def XMLDesc(self, flags):
+                return "<domain/>"
+
         mock_list.return_value = [
             DiagFakeDomain(None), DiagFakeDomain(5)]
 
@@ -9917,12 +10040,252 @@ class LibvirtConnTestCase(test.NoDBTestCase):
             def name(self):
                 return "instance000001"
 
+            def UUIDString(self):
+                return "19479fee-07a5-49bb-9138-d3738280d63c"
+
+            def XMLDesc(self, flags):
+                return "<domain/>"
+
         mock_list.return_value = [DiagFakeDomain()]
 
         drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
         self.assertEqual(0, drvr._get_vcpu_used())
         mock_list.assert_called_with()
 
+    def _fake_domains(self, count):
+        doms = []
+        for i in range(count):
+            dom = mock.Mock()
+            dom.UUIDString.return_value = 'uuid-%d' % i
+            dom.name.return_value = 'instance-%d' % i
+            dom.vcpus.return_value = ([[0, 1, 2, 3]] * (i + 1), [True])
+            dom.XMLDesc.return_value = '<domain><name>%d</name></domain>' % i
+            doms.append(dom)
+        return doms
+
+    @mock.patch.object(host.Host, "list_instance_domains")
+    def test_get_domain_inventory(self, mock_list):
+        doms = self._fake_domains(2)
+        mock_list.return_value = doms
+        drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+
+        inventory = drvr._get_domain_inventory()
+        self.assertEqual([('uuid-0', 'instance-0', 1),
+                          ('uuid-1', 'instance-1', 2)],
+                         [(e['uuid'], e['name'], e['vcpus'])
+                          for e in inventory])
+        self.assertEqual('<domain><name>1</name></domain>',
+                         inventory[1]['xml'])
+        self.assertEqual(3, drvr._get_vcpu_used(inventory))
+
+        # The vcpus aren't fetched again, the XML is
+        self.assertEqual(inventory, drvr._get_domain_inventory())
+        for dom in doms:
+            self.assertEqual(1, dom.vcpus.call_count)
+            self.assertEqual(2, dom.XMLDesc.call_count)
+        self.assertEqual(2, mock_list.call_count)
+
+    @mock.patch.object(host.Host, "list_instance_domains")
+    def test_get_domain_inventory_xml_changed(self, mock_list):
+        doms = self._fake_domains(1)
+        mock_list.return_value = doms
+        drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        drvr._get_domain_inventory()
+
+        # Attaching a volume changes the XML without a lifecycle event
+        xml = '<domain><devices><disk/></devices></domain>'
+        doms[0].XMLDesc.return_value = xml
+        self.assertEqual(xml, drvr._get_domain_inventory()[0]['xml'])
+
+    @mock.patch.object(host.Host, "list_instance_domains")
+    def test_get_domain_inventory_domain_changed(self, mock_list):
+        doms = self._fake_domains(2)
+        mock_list.return_value = doms
+        drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        drvr._get_domain_inventory()
+
+        drvr._domain_changed(virtevent.LifecycleEvent(
+            'uuid-1', virtevent.EVENT_LIFECYCLE_STOPPED))
+        doms[1].vcpus.return_value = ([[0, 1, 2, 3]] * 4, [True])
+        self.assertEqual(5, drvr._get_vcpu_used())
+        self.assertEqual(1, doms[0].vcpus.call_count)
+        self.assertEqual(2, doms[1].vcpus.call_count)
+
+    @mock.patch.object(host.Host, "list_instance_domains")
+    def test_get_domain_inventory_changed_while_listed(self, mock_list):
+        doms = self._fake_domains(2)
+        mock_list.return_value = doms
+        drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+
+        def vcpus():
+            drvr._domain_changed(virtevent.LifecycleEvent(
+                'uuid-0', virtevent.EVENT_LIFECYCLE_STARTED))
+            return ([[0, 1, 2, 3]], [True])
+
+        doms[0].vcpus.side_effect = vcpus
+        drvr._get_domain_inventory()
+        drvr._get_domain_inventory()
+        self.assertEqual(2, doms[0].vcpus.call_count)
+        self.assertEqual(1, doms[1].vcpus.call_count)
+
+    @mock.patch.object(host.Host, "list_instance_domains")
+    def test_get_domain_inventory_error_not_cached(self, mock_list):
+        doms = self._fake_domains(1)
+        doms[0].XMLDesc.side_effect = fakelibvirt.make_libvirtError(
+            fakelibvirt.libvirtError, 'fake-error',
+            error_code=fakelibvirt.VIR_ERR_INTERNAL_ERROR)
+        mock_list.return_value = doms
+        drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+
+        inventory = drvr._get_domain_inventory()
+        self.assertIsNone(inventory[0]['xml'])
+        self.assertEqual(0, drvr._get_disk_over_committed_size_total(
+            inventory))
+
+    @mock.patch.object(host.Host, "list_instance_domains")
+    def test_get_domain_inventory_vcpus_error_not_cached(self, mock_list):
+        doms = self._fake_domains(1)
+        doms[0].vcpus.side_effect = fakelibvirt.make_libvirtError(
+            fakelibvirt.libvirtError, 'fake-error',
+            error_code=fakelibvirt.VIR_ERR_INTERNAL_ERROR)
+        mock_list.return_value = doms
+        drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+
+        self.assertEqual(0, drvr._get_domain_inventory()[0]['vcpus'])
+        drvr._get_domain_inventory()
+        self.assertEqual(2, doms[0].vcpus.call_count)
+
+    @mock.patch.object(host.Host, "get_domain_stats")
+    def test_get_power_states(self, mock_stats):
+        mock_stats.return_value = {
+            'uuid-0': host.DomainStats(
+                'uuid-0', 'instance-0',
+                state=libvirt_driver.VIR_DOMAIN_RUNNING),
+            'uuid-1': host.DomainStats(
+                'uuid-1', 'instance-1',
+                state=libvirt_driver.VIR_DOMAIN_SHUTOFF)}
+        drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+
+        self.assertEqual({'uuid-0': power_state.RUNNING,
+                          'uuid-1': power_state.SHUTDOWN},
+                         drvr.get_power_states())
+        mock_stats.assert_called_once_with(host.VIR_DOMAIN_STATS_STATE,
+                                           only_running=False)
+
+    @mock.patch.object(host.Host, "get_domain_stats")
+    @mock.patch.object(host.Host, "list_instance_domains")
+    def test_get_all_bw_counters(self, mock_list, mock_stats):
+        doms = self._fake_domains(3)
+        doms[0].XMLDesc.return_value = """
+            <domain type='kvm'>
+              <devices>
+                <interface type='bridge'>
+                  <mac address='52:54:00:a4:38:38'/>
+                  <target dev='tap0'/>
+                </interface>
+                <interface type='bridge'>
+                  <mac address='52:54:00:a4:38:39'/>
+                  <target dev='tap1'/>
+                </interface>
+                <interface type='bridge'>
+                  <mac address='52:54:00:a4:38:40'/>
+                </interface>
+              </devices>
+            </domain>
+            """
+        mock_list.return_value = doms
+        mock_stats.return_value = {
+            'uuid-0': host.DomainStats(
+                'uuid-0', 'instance-0',
+                net={'tap0': (10, 1, 0, 0, 20, 2, 0, 0),
+                     'tap1': (30, 3, 0, 0, 40, 4, 0, 0)}),
+            'uuid-2': host.DomainStats(
+                'uuid-2', 'instance-2',
+                net={'tap2': (50, 5, 0, 0, 60, 6, 0, 0)})}
+        instances = [objects.Instance(uuid='uuid-0'),
+                     objects.Instance(uuid='uuid-1')]
+        drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+
+        self.assertEqual([{'uuid': 'uuid-0',
+                           'mac_address': '52:54:00:a4:38:38',
+                           'bw_in': 10, 'bw_out': 20},
+                          {'uuid': 'uuid-0',
+                           'mac_address': '52:54:00:a4:38:39',
+                           'bw_in': 30, 'bw_out': 40}],
+                         drvr.get_all_bw_counters(instances))
+        mock_stats.assert_called_once_with(host.VIR_DOMAIN_STATS_INTERFACE)
+
+    @mock.patch.object(host.Host, "list_instance_domains")
+    def test_forget_domain(self, mock_list):
+        doms = self._fake_domains(2)
+        mock_list.return_value = doms
+        drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        drvr._get_domain_inventory()
+
+        drvr._forget_domain('uuid-0')
+        drvr._get_domain_inventory()
+        self.assertEqual(2, doms[0].vcpus.call_count)
+        self.assertEqual(1, doms[1].vcpus.call_count)
+
+    def test_handle_conn_event_clears_domain_inventory(self):
+        drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        drvr._domain_inventory = {'uuid-0': {}}
+        with mock.patch.object(drvr, '_set_host_enabled'):
+            drvr._handle_conn_event(True, 'fake-reason')
+        self.assertEqual({}, drvr._domain_inventory)
+
+    @mock.patch.object(disk, 'get_disk_size', return_value=10 * units.Gi)
+    @mock.patch.object(fake_libvirt_utils, 'get_disk_backing_file',
+                       return_value='base')
+    @mock.patch.object(os.path, 'getmtime', return_value=1000.0)
+    def test_get_qcow2_disk_info_cached(self, mock_mtime, mock_backing,
+                                        mock_size):
+        drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+
+        self.assertEqual(('base', 10 * units.Gi),
+                         drvr._get_qcow2_disk_info('/disk', units.Gi))
+        self.assertEqual(('base', 10 * units.Gi),
+                         drvr._get_qcow2_disk_info('/disk', units.Gi))
+        self.assertEqual(1, mock_size.call_count)
+
+        # The disk grew
+        drvr._get_qcow2_disk_info('/disk', 2 * units.Gi)
+        self.assertEqual(2, mock_size.call_count)
+        # The disk was modified
+        mock_mtime.return_value = 1001.0
+        drvr._get_qcow2_disk_info('/disk', 2 * units.Gi)
+        self.assertEqual(3, mock_size.call_count)
+        self.assertEqual(3, mock_backing.call_count)
+
+    @mock.patch.object(disk, 'get_disk_size', return_value=10 * units.Gi)
+    @mock.patch.object(fake_libvirt_utils, 'get_disk_backing_file',
+                       return_value='base')
+    @mock.patch.object(os.path, 'getmtime', side_effect=OSError)
+    def test_get_qcow2_disk_info_not_cached(self, mock_mtime, mock_backing,
+                                            mock_size):
+        drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+
+        drvr._get_qcow2_disk_info('/disk', units.Gi)
+        drvr._get_qcow2_disk_info('/disk', units.Gi)
+        self.assertEqual(2, mock_size.call_count)
+        self.assertEqual({}, drvr._qcow2_disk_info)
+
+    def test_disk_over_committed_size_total_prunes_disk_info(self):
+        drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        drvr._qcow2_disk_info = {'/disk1': mock.sentinel.info1,
+                                 '/disk2': mock.sentinel.info2}
+        inventory = [{'uuid': 'uuid-0', 'name': 'instance-0', 'vcpus': 1,
+                      'xml': '<domain/>'}]
+        disk_info = [{'path': '/disk1', 'over_committed_disk_size': 10}]
+
+        with mock.patch.object(drvr, '_get_instance_disk_info',
+                               return_value=disk_info) as mock_info:
+            self.assertEqual(10, drvr._get_disk_over_committed_size_total(
+                inventory))
+            mock_info.assert_called_once_with('instance-0', '<domain/>')
+        self.assertEqual({'/disk1': mock.sentinel.info1},
+                         drvr._qcow2_disk_info)
+
     def test_get_instance_capabilities(self):
         drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), True)
 
@@ -11465,13 +11828,16 @@ class HostStateTestCase(test.NoDBTestCase):
         def _get_vcpu_total(self):
             return 1
 
-        def _get_vcpu_used(self):
+        def _get_domain_inventory(self):
+            return []
+
+        def _get_vcpu_used(self, inventory=None):
             return 0
 
         def _get_cpu_info(self):
             return HostStateTestCase.cpu_info
 
-        def _get_disk_over_committed_size_total(self):
+        def _get_disk_over_committed_size_total(self, inventory=None):
             return 0
 
         def _get_local_gb_info(self):
@@ -13131,13 +13497,17 @@ class LibvirtVolumeUsageTestCase(test.NoDBTestCase):
                      {'volume_id': 2,
                       'device_name': 'vda'}]
 
-    def test_get_all_volume_usage(self):
-        def fake_block_stats(instance_name, disk):
-            return (169, 688640, 0, 0, -1)
+    @mock.patch.object(host.Host, 'get_domain_stats')
+    def test_get_all_volume_usage(self, mock_stats):
+        mock_stats.return_value = {
+            self.ins_ref.uuid: host.DomainStats(
+                self.ins_ref.uuid, 'instance-000006c1',
+                block={'vda': (169, 688640, 0, 0, -1),
+                       'vde': (169, 688640, 0, 0, -1)})}
 
-        self.stubs.Set(self.drvr, 'block_stats', fake_block_stats)
         vol_usage = self.drvr.get_all_volume_usage(self.c,
               [dict(instance=self.ins_ref, instance_bdms=self.bdms)])
+        mock_stats.assert_called_once_with(host.VIR_DOMAIN_STATS_BLOCK)
 
         expected_usage = [{'volume': 1,
                            'instance': self.ins_ref,
@@ -13149,15 +13519,31 @@ class LibvirtVolumeUsageTestCase(test.NoDBTestCase):
                             'rd_req': 169, 'wr_bytes': 0}]
         self.assertEqual(vol_usage, expected_usage)
 
-    def test_get_all_volume_usage_device_not_found(self):
-        def fake_get_domain(self, instance):
-            raise exception.InstanceNotFound(instance_id="fakedom")
-
-        self.stubs.Set(host.Host, 'get_domain', fake_get_domain)
+    @mock.patch.object(host.Host, 'get_domain_stats', return_value={})
+    def test_get_all_volume_usage_device_not_found(self, mock_stats):
         vol_usage = self.drvr.get_all_volume_usage(self.c,
               [dict(instance=self.ins_ref, instance_bdms=self.bdms)])
         self.assertEqual(vol_usage, [])
 
+    @mock.patch.object(host.Host, 'get_domain_stats')
+    def test_get_all_volume_usage_detached(self, mock_stats):
+        mock_stats.return_value = {
+            self.ins_ref.uuid: host.DomainStats(
+                self.ins_ref.uuid, 'instance-000006c1',
+                block={'vda': (169, 688640, 0, 0, -1)})}
+
+        vol_usage = self.drvr.get_all_volume_usage(self.c,
+              [dict(instance=self.ins_ref, instance_bdms=self.bdms)])
+
+        self.assertEqual([{'volume': 2, 'instance': self.ins_ref,
+                           'rd_bytes': 688640, 'wr_req': 0,
+                           'rd_req': 169, 'wr_bytes': 0}], vol_usage)
+
+    @mock.patch.object(host.Host, 'get_domain_stats')
+    def test_get_all_volume_usage_no_bdms(self, mock_stats):
+        self.assertEqual([], self.drvr.get_all_volume_usage(self.c, []))
+        self.assertFalse(mock_stats.called)
+
 
 class LibvirtNonblockingTestCase(test.NoDBTestCase):
     """Test libvirtd calls are nonblocking."""
@@ -164,6 +164,28 @@ class HostTestCase(test.NoDBTestCase):
         mock_spawn_after.assert_called_once_with(
             hostimpl._lifecycle_delay, hostimpl._event_emit, event4)
 
+    @mock.patch.object(greenthread, 'spawn_after')
+    def test_event_dispatch_domain_event_handler(self, mock_spawn_after):
+        domain_events = []
+        hostimpl = host.Host("qemu:///system",
+                             lifecycle_event_handler=lambda e: None,
+                             domain_event_handler=domain_events.append)
+        hostimpl._init_events_pipe()
+
+        event1 = event.LifecycleEvent(
+            "cef19ce0-0ca2-11df-855d-b19fbce37686",
+            event.EVENT_LIFECYCLE_STARTED)
+        event2 = event.LifecycleEvent(
+            "cef19ce0-0ca2-11df-855d-b19fbce37686",
+            event.EVENT_LIFECYCLE_STOPPED)
+        hostimpl._queue_event(event1)
+        hostimpl._queue_event(event2)
+        hostimpl._dispatch_events()
+
+        # STOPPED is not delayed
+        self.assertEqual([event1, event2], domain_events)
+        self.assertTrue(mock_spawn_after.called)
+
     def test_event_lifecycle(self):
         got_events = []
 
@@ -606,6 +628,103 @@ class HostTestCase(test.NoDBTestCase):
         self.assertEqual(doms[2].name(), vm2.name())
         mock_list.assert_called_with(True)
 
+    @mock.patch.object(fakelibvirt.Connection, "getAllDomainStats",
+                       create=True)
+    def test_get_domain_stats(self, mock_stats):
+        vm0 = FakeVirtDomain(id=0, name="Domain-0")  # Xen dom-0
+        vm1 = FakeVirtDomain(id=3, name="instance00000001")
+        vm2 = FakeVirtDomain(name="instance00000002")
+        mock_stats.return_value = [
+            (vm0, {'state.state': fakelibvirt.VIR_DOMAIN_RUNNING}),
+            (vm1, {'state.state': fakelibvirt.VIR_DOMAIN_RUNNING}),
+            (vm2, {'state.state': fakelibvirt.VIR_DOMAIN_SHUTOFF})]
+
+        stats = self.host.get_domain_stats(host.VIR_DOMAIN_STATS_STATE,
+                                           only_running=False)
+
+        mock_stats.assert_called_once_with(host.VIR_DOMAIN_STATS_STATE, 0)
+        self.assertEqual({vm1.UUIDString(): fakelibvirt.VIR_DOMAIN_RUNNING,
+                          vm2.UUIDString(): fakelibvirt.VIR_DOMAIN_SHUTOFF},
+                         {uuid: dom_stats.state
+                          for uuid, dom_stats in stats.items()})
+        self.assertEqual(vm1.name(), stats[vm1.UUIDString()].name)
+
+        mock_stats.reset_mock()
+        self.host.get_domain_stats()
+        mock_stats.assert_called_once_with(
+            host.VIR_DOMAIN_STATS_ALL,
+            host.VIR_CONNECT_GET_ALL_DOMAINS_STATS_ACTIVE)
+
+    @mock.patch.object(fakelibvirt.Connection, "domainListGetStats",
+                       create=True)
+    def test_get_domain_stats_domains(self, mock_stats):
+        vm1 = FakeVirtDomain(id=3, name="instance00000001")
+        mock_stats.return_value = [(vm1, {'balloon.current': 1024})]
+
+        stats = self.host.get_domain_stats(host.VIR_DOMAIN_STATS_BALLOON,
+                                           domains=[vm1])
+
+        mock_stats.assert_called_once_with(
+            [vm1], host.VIR_DOMAIN_STATS_BALLOON, 0)
+        self.assertEqual(1024, stats[vm1.UUIDString()].mem)
+        self.assertEqual({}, self.host.get_domain_stats(domains=[]))
+        self.assertEqual(1, mock_stats.call_count)
+
+    @mock.patch.object(host.DomainStats, "for_domain_compat")
+    @mock.patch.object(host.Host, "list_instance_domains")
+    def test_get_domain_stats_fallback(self, mock_list, mock_compat):
+        vm1 = FakeVirtDomain(id=3, name="instance00000001")
+        vm2 = FakeVirtDomain(id=17, name="instance00000002")
+        mock_list.return_value = [vm1, vm2]
+
+        def fake_compat(host_, dom, stats):
+            if dom is vm2:
+                raise fakelibvirt.make_libvirtError(
+                    fakelibvirt.libvirtError, "Domain not found",
+                    error_code=fakelibvirt.VIR_ERR_NO_DOMAIN)
+            return host.DomainStats(dom.UUIDString(), dom.name(), state=1)
+
+        mock_compat.side_effect = fake_compat
+
+        # The fake connection doesn't implement the bulk APIs, like the
+        # python bindings of libvirt < 1.2.8
+        stats = self.host.get_domain_stats(host.VIR_DOMAIN_STATS_STATE)
+        self.assertEqual([vm1.UUIDString()], list(stats))
+        mock_list.assert_called_once_with(True)
+        self.assertTrue(self.host._skip_domain_stats)
+
+        stats = self.host.get_domain_stats(host.VIR_DOMAIN_STATS_STATE,
+                                           domains=[vm2])
+        self.assertEqual({}, stats)
+        self.assertEqual(1, mock_list.call_count)
+
+    @mock.patch.object(host.Host, "_get_domain_stats_slow", return_value={})
+    @mock.patch.object(fakelibvirt.Connection, "getAllDomainStats",
+                       create=True)
+    def test_get_domain_stats_not_supported(self, mock_stats, mock_slow):
+        mock_stats.side_effect = fakelibvirt.make_libvirtError(
+            fakelibvirt.libvirtError, "API is not supported",
+            error_code=fakelibvirt.VIR_ERR_NO_SUPPORT)
+
+        self.host.get_domain_stats()
+        self.host.get_domain_stats()
+
+        mock_stats.assert_called_once_with(
+            host.VIR_DOMAIN_STATS_ALL,
+            host.VIR_CONNECT_GET_ALL_DOMAINS_STATS_ACTIVE)
+        self.assertEqual(2, mock_slow.call_count)
+
+    @mock.patch.object(fakelibvirt.Connection, "getAllDomainStats",
+                       create=True)
+    def test_get_domain_stats_error(self, mock_stats):
+        mock_stats.side_effect = fakelibvirt.make_libvirtError(
+            fakelibvirt.libvirtError, "Internal error",
+            error_code=fakelibvirt.VIR_ERR_INTERNAL_ERROR)
+
+        self.assertRaises(fakelibvirt.libvirtError,
+                          self.host.get_domain_stats)
+        self.assertFalse(self.host._skip_domain_stats)
+
     def test_cpu_features_bug_1217630(self):
         self.host.get_connection()
 
@@ -863,6 +982,142 @@ Active:          8381604 kB
         mock_compareCPU.assert_called_once_with("cpuxml", 0)
 
 
+class DomainStatsTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(DomainStatsTestCase, self).setUp()
+
+        self.useFixture(fakelibvirt.FakeLibvirtFixture())
+        self.host = host.Host("qemu:///system")
+        self.dom = FakeVirtDomain(id=3, name="instance00000001")
+
+    def test_from_record(self):
+        record = {
+            'state.state': fakelibvirt.VIR_DOMAIN_RUNNING,
+            'state.reason': 1,
+            'cpu.time': 123456789,
+            'balloon.current': 1024,
+            'balloon.maximum': 2048,
+            'vcpu.current': 2,
+            'vcpu.maximum': 2,
+            'vcpu.0.state': 1,
+            'vcpu.0.time': 1000,
+            'vcpu.1.state': 1,
+            'vcpu.1.time': 2000,
+            'net.count': 1,
+            'net.0.name': 'vnet0',
+            'net.0.rx.bytes': 4408,
+            'net.0.rx.pkts': 82,
+            'net.0.rx.errs': 0,
+            'net.0.rx.drop': 1,
+            'net.0.tx.bytes': 1024,
+            'net.0.tx.pkts': 10,
+            'net.0.tx.errs': 2,
+            'net.0.tx.drop': 3,
+            'block.count': 2,
+            'block.0.name': 'vda',
+            'block.0.rd.reqs': 169,
+            'block.0.rd.bytes': 688640,
+            'block.0.wr.reqs': 5,
+            'block.0.wr.bytes': 4096,
+            'block.1.name': 'vdb',
+        }
+
+        stats = host.DomainStats.from_record(self.dom, record)
+
+        self.assertEqual(self.dom.UUIDString(), stats.uuid)
+        self.assertEqual(self.dom.name(), stats.name)
+        self.assertEqual(fakelibvirt.VIR_DOMAIN_RUNNING, stats.state)
+        self.assertEqual(2048, stats.max_mem)
+        self.assertEqual(1024, stats.mem)
+        self.assertEqual(2, stats.num_cpu)
+        self.assertEqual(123456789, stats.cpu_time)
+        self.assertEqual([(0, 1000), (1, 2000)], stats.vcpus)
+        self.assertEqual({'vda': (169, 688640, 5, 4096, -1),
+                          'vdb': (0, 0, 0, 0, -1)}, stats.block)
+        self.assertEqual({'vnet0': (4408, 82, 0, 1, 1024, 10, 2, 3)},
+                         stats.net)
+
+    def test_from_record_empty(self):
+        stats = host.DomainStats.from_record(self.dom, {})
+
+        self.assertIsNone(stats.state)
+        self.assertIsNone(stats.max_mem)
+        self.assertEqual([], stats.vcpus)
+        self.assertEqual({}, stats.block)
+        self.assertEqual({}, stats.net)
+
+    def test_for_domain_compat(self):
+        dom = mock.Mock()
+        dom.UUIDString.return_value = 'fake-uuid'
+        dom.name.return_value = 'instance00000001'
+        dom.info.return_value = [fakelibvirt.VIR_DOMAIN_RUNNING, 2048, 1024,
+                                 2, 123456789]
+        dom.vcpus.return_value = ([(0, 1, 1000, 2), (1, 1, 2000, 3)],
+                                  [(True, True), (True, True)])
+        dom.XMLDesc.return_value = """
+            <domain type='kvm'>
+              <devices>
+                <disk type='file'>
+                  <target dev='vda' bus='virtio'/>
+                </disk>
+                <disk type='block'>
+                  <target dev='vdb' bus='virtio'/>
+                </disk>
+                <interface type='network'>
+                  <mac address='52:54:00:a4:38:38'/>
+                  <target dev='vnet0'/>
+                </interface>
+              </devices>
+            </domain>
+            """
+
+        def fake_block_stats(dev):
+            if dev == 'vdb':
+                raise fakelibvirt.libvirtError('blockStats missing')
+            return (169, 688640, 5, 4096, -1)
+
+        dom.blockStats.side_effect = fake_block_stats
+        dom.interfaceStats.return_value = (4408, 82, 0, 1, 1024, 10, 2, 3)
+
+        stats = host.DomainStats.for_domain_compat(
+            self.host, dom, host.VIR_DOMAIN_STATS_ALL)
+
+        self.assertEqual('fake-uuid', stats.uuid)
+        self.assertEqual(fakelibvirt.VIR_DOMAIN_RUNNING, stats.state)
+        self.assertEqual(2048, stats.max_mem)
+        self.assertEqual(1024, stats.mem)
+        self.assertEqual(2, stats.num_cpu)
+        self.assertEqual(123456789, stats.cpu_time)
+        self.assertEqual([(0, 1000), (1, 2000)], stats.vcpus)
+        self.assertEqual({'vda': (169, 688640, 5, 4096, -1)}, stats.block)
+        self.assertEqual({'vnet0': (4408, 82, 0, 1, 1024, 10, 2, 3)},
+                         stats.net)
+
+    def test_for_domain_compat_state_only(self):
+        dom = mock.Mock()
+        dom.info.return_value = [fakelibvirt.VIR_DOMAIN_SHUTOFF, 2048, 0,
+                                 2, 0]
+
+        stats = host.DomainStats.for_domain_compat(
+            self.host, dom, host.VIR_DOMAIN_STATS_STATE)
+
+        self.assertEqual(fakelibvirt.VIR_DOMAIN_SHUTOFF, stats.state)
+        self.assertFalse(dom.vcpus.called)
+        self.assertFalse(dom.XMLDesc.called)
+        self.assertFalse(dom.blockStats.called)
+
+    def test_for_domain_compat_vcpus_error(self):
+        dom = mock.Mock()
+        dom.vcpus.side_effect = fakelibvirt.libvirtError('vcpus missing')
+
+        stats = host.DomainStats.for_domain_compat(
+            self.host, dom, host.VIR_DOMAIN_STATS_VCPU)
+
+        self.assertEqual([], stats.vcpus)
+        self.assertFalse(dom.info.called)
+
+
 class DomainJobInfoTestCase(test.NoDBTestCase):
 
     def setUp(self):
@@ -211,6 +211,18 @@ class ComputeDriver(object):
         """
         return len(self.list_instances())
 
+    def get_power_states(self):
+        """Return the power states of all the virtual machines at once.
+
+        Drivers able to query the hypervisor in bulk implement this so
+        that the power states are synchronized without querying each
+        instance separately.
+
+        :returns: dict of nova.compute.power_state by instance uuid, for
+                  every virtual machine the hypervisor knows about
+        """
+        raise NotImplementedError()
+
     def instance_exists(self, instance):
         """Checks existence of an instance on the host.
 
@@ -419,7 +419,15 @@ class LibvirtDriver(driver.ComputeDriver):
 
         self._host = host.Host(self._uri(), read_only,
                                lifecycle_event_handler=self.emit_event,
-                               conn_event_handler=self._handle_conn_event)
+                               conn_event_handler=self._handle_conn_event,
+                               domain_event_handler=self._domain_changed)
+        # Name and vcpu count of the running domains by uuid, collected by
+        # _get_domain_inventory until the domains change state
+        self._domain_inventory = {}
+        self._changed_domains = set()
+        # Backing file and virtual size of the qcow2 disks by path, with the
+        # modification time and size of the disks they were read for
+        self._qcow2_disk_info = {}
         self._initiator = None
         self._fc_wwnns = None
         self._fc_wwpns = None
@@ -536,8 +544,18 @@ class LibvirtDriver(driver.ComputeDriver):
     def _handle_conn_event(self, enabled, reason):
         LOG.info(_LI("Connection event '%(enabled)d' reason '%(reason)s'"),
                  {'enabled': enabled, 'reason': reason})
+        # The events of the domains may have been missed
+        self._domain_inventory = {}
         self._set_host_enabled(enabled, reason)
 
+    def _domain_changed(self, event):
+        self._forget_domain(event.uuid)
+
+    def _forget_domain(self, uuid):
+        """Collect a domain again on the next sweep of the inventory."""
+        self._domain_inventory.pop(uuid, None)
+        self._changed_domains.add(uuid)
+
     def _version_to_string(self, version):
         return '.'.join([str(x) for x in version])
 
@@ -4288,6 +4306,15 @@ class LibvirtDriver(driver.ComputeDriver):
                                      cpu_time_ns=dom_info[4],
                                      id=virt_dom.ID())
 
+    def get_power_states(self):
+        """Return the power states of all the domains, in a single call
+        with libvirt >= 1.2.8.
+        """
+        domain_stats = self._host.get_domain_stats(
+            host.VIR_DOMAIN_STATS_STATE, only_running=False)
+        return {uuid: LIBVIRT_POWER_STATE[stats.state]
+                for uuid, stats in six.iteritems(domain_stats)}
+
     def _create_domain_setup_lxc(self, instance, image_meta,
                                  block_device_info, disk_info):
         inst_path = libvirt_utils.get_instance_path(instance)
@@ -4593,9 +4620,68 @@ class LibvirtDriver(driver.ComputeDriver):
 
         return info
 
-    def _get_vcpu_used(self):
+    def _get_domain_inventory(self):
+        """Get the name, vcpu count and XML of the running domains.
+
+        The domains are listed once, and the vcpu counts of the domains
+        which didn't change state since they were collected are reused.
+        The XML is fetched on every pass, as attaching, detaching or
+        rebasing a disk changes it without a lifecycle event.
+
+        :returns: a list of dicts with the uuid, name, vcpus and xml of the
+                  domains
+        """
+        self._changed_domains = set()
+        cached = self._domain_inventory
+        domain_inventory = {}
+        inventory = []
+        for dom in self._host.list_instance_domains():
+            # TODO(sahid): list_instance_domains should
+            # return Guest objects.
+            guest = libvirt_guest.Guest(dom)
+            uuid = guest.uuid
+            vcpus_entry = cached.get(uuid)
+            if vcpus_entry is None:
+                vcpus_entry = {'name': guest.name, 'vcpus': 0}
+                try:
+                    vcpus = guest.get_vcpus_info()
+                    if vcpus is not None:
+                        vcpus_entry['vcpus'] = len(list(vcpus))
+                    domain_inventory[uuid] = vcpus_entry
+                except libvirt.libvirtError as e:
+                    LOG.warn(_LW("couldn't obtain the vpu count from domain "
+                                 "id: %(uuid)s, exception: %(ex)s"),
+                             {"uuid": uuid, "ex": e})
+            else:
+                domain_inventory[uuid] = vcpus_entry
+            entry = {'uuid': uuid, 'name': vcpus_entry['name'],
+                     'vcpus': vcpus_entry['vcpus'], 'xml': None}
+            try:
+                entry['xml'] = guest.get_xml_desc()
+            except libvirt.libvirtError as ex:
+                LOG.warn(_LW(
+                    'Error from libvirt while getting description of '
+                    '%(instance_name)s: [Error Code %(error_code)s] '
+                    '%(ex)s'
+                ), {'instance_name': entry['name'],
+                    'error_code': ex.get_error_code(),
+                    'ex': ex})
+            inventory.append(entry)
+            # NOTE(gtt116): give other tasks a chance.
+            greenthread.sleep(0)
+
+        # The domains which changed state while they were listed are
+        # collected again next time.
+        for uuid in self._changed_domains:
+            domain_inventory.pop(uuid, None)
+        self._domain_inventory = domain_inventory
+        return inventory
+
+    def _get_vcpu_used(self, inventory=None):
         """Get vcpu usage number of physical computer.
 
+        :param inventory: the result of _get_domain_inventory, collected
+                          when not given
         :returns: The total number of vcpu(s) that are currently being used.
 
         """
@@ -4604,19 +4690,10 @@ class LibvirtDriver(driver.ComputeDriver):
         if CONF.libvirt.virt_type == 'lxc':
             return total + 1
 
-        for dom in self._host.list_instance_domains():
-            try:
-                # TODO(sahid): list_instance_domains should
-                # return Guest objects.
-                vcpus = libvirt_guest.Guest(dom).get_vcpus_info()
-                if vcpus is not None:
-                    total += len(list(vcpus))
-            except libvirt.libvirtError as e:
-                LOG.warn(_LW("couldn't obtain the vpu count from domain id:"
-                             " %(uuid)s, exception: %(ex)s"),
-                         {"uuid": dom.UUIDString(), "ex": e})
-            # NOTE(gtt116): give other tasks a chance.
-            greenthread.sleep(0)
+        if inventory is None:
+            inventory = self._get_domain_inventory()
+        for entry in inventory:
+            total += entry['vcpus']
         return total
 
     def _get_instance_capabilities(self):
@@ -4835,14 +4912,57 @@ class LibvirtDriver(driver.ComputeDriver):
 
         return objects.NUMATopology(cells=cells)
 
+    def get_all_bw_counters(self, instances):
+        """Return bandwidth usage counters for each interface on each
+           running VM.
+        """
+        instance_uuids = set(instance.uuid for instance in instances)
+        # The counters of all the domains are collected in a single call
+        # with libvirt >= 1.2.8, the MAC addresses of their interfaces are
+        # read from the XML of the domain inventory.
+        domain_stats = self._host.get_domain_stats(
+            host.VIR_DOMAIN_STATS_INTERFACE)
+        bw_counters = []
+        for entry in self._get_domain_inventory():
+            stats = domain_stats.get(entry['uuid'])
+            if (entry['uuid'] not in instance_uuids or stats is None or
+                    entry['xml'] is None):
+                continue
+            doc = etree.fromstring(entry['xml'])
+            for node in doc.findall('./devices/interface'):
+                target = node.find('target')
+                mac = node.find('mac')
+                if target is None or mac is None:
+                    continue
+                nic_stats = stats.net.get(target.get('dev'))
+                if nic_stats is not None:
+                    bw_counters.append(dict(uuid=entry['uuid'],
+                                            mac_address=mac.get('address'),
+                                            bw_in=nic_stats[0],
+                                            bw_out=nic_stats[4]))
+        return bw_counters
+
     def get_all_volume_usage(self, context, compute_host_bdms):
         """Return usage info for volumes attached to vms on
            a given host.
         """
         vol_usage = []
+        if not compute_host_bdms:
+            return vol_usage
+
+        # The block stats of all the domains, in a single call with
+        # libvirt >= 1.2.8
+        domain_stats = self._host.get_domain_stats(
+            host.VIR_DOMAIN_STATS_BLOCK)
 
         for instance_bdms in compute_host_bdms:
             instance = instance_bdms['instance']
+            instance_stats = domain_stats.get(instance.uuid)
+            if instance_stats is None:
+                LOG.info(_LI('Could not find domain in libvirt for instance '
+                             '%s. Cannot get block stats for device'),
+                         instance.name, instance=instance)
+                continue
 
             for bdm in instance_bdms['instance_bdms']:
                 mountpoint = bdm['device_name']
@@ -4852,7 +4972,7 @@ class LibvirtDriver(driver.ComputeDriver):
 
                 LOG.debug("Trying to get stats for the volume %s",
                           volume_id, instance=instance)
-                vol_stats = self.block_stats(instance, mountpoint)
+                vol_stats = instance_stats.block.get(mountpoint)
 
                 if vol_stats:
                     stats = dict(volume=volume_id,
@@ -4924,6 +5044,7 @@ class LibvirtDriver(driver.ComputeDriver):
         """
 
         disk_info_dict = self._get_local_gb_info()
+        inventory = self._get_domain_inventory()
         data = {}
 
         # NOTE(dprince): calling capabilities before getVersion works around
@@ -4939,7 +5060,7 @@ class LibvirtDriver(driver.ComputeDriver):
         data["vcpus"] = self._get_vcpu_total()
         data["memory_mb"] = self._host.get_memory_mb_total()
         data["local_gb"] = disk_info_dict['total']
-        data["vcpus_used"] = self._get_vcpu_used()
+        data["vcpus_used"] = self._get_vcpu_used(inventory)
         data["memory_mb_used"] = self._host.get_memory_mb_used()
         data["local_gb_used"] = disk_info_dict['used']
         data["hypervisor_type"] = self._host.get_driver_type()
@@ -4957,7 +5078,8 @@ class LibvirtDriver(driver.ComputeDriver):
         data["cpu_info"] = jsonutils.dumps(self._get_cpu_info())
 
         disk_free_gb = disk_info_dict['free']
-        disk_over_committed = self._get_disk_over_committed_size_total()
+        disk_over_committed = self._get_disk_over_committed_size_total(
+            inventory)
         available_least = disk_free_gb * units.Gi - disk_over_committed
         data['disk_available_least'] = available_least / units.Gi
 
@@ -6155,8 +6277,8 @@ class LibvirtDriver(driver.ComputeDriver):
 
             disk_type = driver_nodes[cnt].get('type')
             if disk_type == "qcow2":
-                backing_file = libvirt_utils.get_disk_backing_file(path)
-                virt_size = disk.get_disk_size(path)
+                backing_file, virt_size = self._get_qcow2_disk_info(path,
+                                                                    dk_size)
                 over_commit_size = int(virt_size) - dk_size
             else:
                 backing_file = ""
@@ -6171,6 +6293,26 @@ class LibvirtDriver(driver.ComputeDriver):
                               'over_committed_disk_size': over_commit_size})
         return disk_info
 
+    def _get_qcow2_disk_info(self, path, dk_size):
+        """Return the backing file and the virtual size of a qcow2 disk.
+
+        qemu-img info is only run again once the modification time or the
+        size of the disk changed.
+        """
+        try:
+            key = (os.path.getmtime(path), dk_size)
+        except OSError:
+            key = None
+        cached = self._qcow2_disk_info.get(path)
+        if key is not None and cached is not None and cached[0] == key:
+            return cached[1]
+
+        info = (libvirt_utils.get_disk_backing_file(path),
+                disk.get_disk_size(path))
+        if key is not None:
+            self._qcow2_disk_info[path] = (key, info)
+        return info
+
     def get_instance_disk_info(self, instance,
                                block_device_info=None):
         try:
@@ -6191,44 +6333,41 @@ class LibvirtDriver(driver.ComputeDriver):
                 self._get_instance_disk_info(instance.name, xml,
                                              block_device_info))
 
-    def _get_disk_over_committed_size_total(self):
-        """Return total over committed disk size for all instances."""
+    def _get_disk_over_committed_size_total(self, inventory=None):
+        """Return total over committed disk size for all instances.
+
+        :param inventory: the result of _get_domain_inventory, collected
+                          when not given
+        """
         # Disk size that all instance uses : virtual_size - disk_size
         disk_over_committed_size = 0
-        for dom in self._host.list_instance_domains():
+        if inventory is None:
+            inventory = self._get_domain_inventory()
+        disk_paths = set()
+        for entry in inventory:
+            if entry['xml'] is None:
+                continue
             try:
-                # TODO(sahid): list_instance_domain should
-                # be renamed as list_guest and so returning
-                # Guest objects.
-                guest = libvirt_guest.Guest(dom)
-                xml = guest.get_xml_desc()
-
-                disk_infos = self._get_instance_disk_info(guest.name, xml)
+                disk_infos = self._get_instance_disk_info(entry['name'],
+                                                          entry['xml'])
                 for info in disk_infos:
                     disk_over_committed_size += int(
                         info['over_committed_disk_size'])
-            except libvirt.libvirtError as ex:
-                error_code = ex.get_error_code()
-                LOG.warn(_LW(
-                    'Error from libvirt while getting description of '
-                    '%(instance_name)s: [Error Code %(error_code)s] %(ex)s'
-                ), {'instance_name': guest.name,
-                    'error_code': error_code,
-                    'ex': ex})
+                    disk_paths.add(info['path'])
             except OSError as e:
                 if e.errno == errno.ENOENT:
                     LOG.warn(_LW('Periodic task is updating the host stat, '
                                  'it is trying to get disk %(i_name)s, '
                                  'but disk file was removed by concurrent '
                                  'operations such as resize.'),
-                                {'i_name': guest.name})
+                                {'i_name': entry['name']})
                 elif e.errno == errno.EACCES:
                     LOG.warn(_LW('Periodic task is updating the host stat, '
                                  'it is trying to get disk %(i_name)s, '
                                  'but access is denied. It is most likely '
                                  'due to a VM that exists on the compute '
                                  'node but is not managed by Nova.'),
-                             {'i_name': guest.name})
+                             {'i_name': entry['name']})
                 else:
                     raise
             except exception.VolumeBDMPathNotFound as e:
@@ -6237,10 +6376,15 @@ class LibvirtDriver(driver.ComputeDriver):
                              'but the backing volume block device was removed '
                              'by concurrent operations such as resize. '
                              'Error: %(error)s'),
-                         {'i_name': guest.name,
+                         {'i_name': entry['name'],
                           'error': e})
             # NOTE(gtt116): give other tasks a chance.
             greenthread.sleep(0)
+
+        # Only the disks of the running domains stay cached
+        self._qcow2_disk_info = dict(
+            (path, info) for path, info in
+            six.iteritems(self._qcow2_disk_info) if path in disk_paths)
         return disk_over_committed_size
 
     def unfilter_instance(self, instance, network_info):
@@ -6615,6 +6759,16 @@ class LibvirtDriver(driver.ComputeDriver):
                         result[key].append(child.get('dev'))
         return result
 
+    def _get_instance_stats(self, instance, domain, stats):
+        """Get the statistics of the domain of an instance in a single call
+        with libvirt >= 1.2.8.
+        """
+        instance_stats = self._host.get_domain_stats(
+            stats, domains=[domain]).get(domain.UUIDString())
+        if instance_stats is None:
+            raise exception.InstanceNotFound(instance_id=instance.uuid)
+        return instance_stats
+
     def get_diagnostics(self, instance):
         guest = self._host.get_guest(instance)
 
@@ -6623,46 +6777,30 @@ class LibvirtDriver(driver.ComputeDriver):
         # We should be able to remove domain at the end.
         domain = guest._domain
         output = {}
-        # get cpu time, might launch an exception if the method
-        # is not supported by the underlying hypervisor being
-        # used by libvirt
-        try:
-            for vcpu in guest.get_vcpus_info():
-                output["cpu" + str(vcpu.id) + "_time"] = vcpu.time
-        except libvirt.libvirtError:
-            pass
-        # get io status
-        xml = guest.get_xml_desc()
-        dom_io = LibvirtDriver._get_io_devices(xml)
-        for guest_disk in dom_io["volumes"]:
-            try:
-                # blockStats might launch an exception if the method
-                # is not supported by the underlying hypervisor being
-                # used by libvirt
-                stats = domain.blockStats(guest_disk)
-                output[guest_disk + "_read_req"] = stats[0]
-                output[guest_disk + "_read"] = stats[1]
-                output[guest_disk + "_write_req"] = stats[2]
-                output[guest_disk + "_write"] = stats[3]
-                output[guest_disk + "_errors"] = stats[4]
-            except libvirt.libvirtError:
-                pass
-        for interface in dom_io["ifaces"]:
-            try:
-                # interfaceStats might launch an exception if the method
-                # is not supported by the underlying hypervisor being
-                # used by libvirt
-                stats = domain.interfaceStats(interface)
-                output[interface + "_rx"] = stats[0]
-                output[interface + "_rx_packets"] = stats[1]
-                output[interface + "_rx_errors"] = stats[2]
-                output[interface + "_rx_drop"] = stats[3]
-                output[interface + "_tx"] = stats[4]
-                output[interface + "_tx_packets"] = stats[5]
-                output[interface + "_tx_errors"] = stats[6]
-                output[interface + "_tx_drop"] = stats[7]
-            except libvirt.libvirtError:
-                pass
+        # get cpu time and io status, the statistics which are not
+        # supported by the underlying hypervisor being used by libvirt
+        # are missing
+        stats = self._get_instance_stats(
+            instance, domain,
+            host.VIR_DOMAIN_STATS_VCPU | host.VIR_DOMAIN_STATS_BLOCK |
+            host.VIR_DOMAIN_STATS_INTERFACE)
+        for vcpu_id, vcpu_time in stats.vcpus:
+            output["cpu" + str(vcpu_id) + "_time"] = vcpu_time
+        for guest_disk, disk_stats in six.iteritems(stats.block):
+            output[guest_disk + "_read_req"] = disk_stats[0]
+            output[guest_disk + "_read"] = disk_stats[1]
+            output[guest_disk + "_write_req"] = disk_stats[2]
+            output[guest_disk + "_write"] = disk_stats[3]
+            output[guest_disk + "_errors"] = disk_stats[4]
+        for interface, nic_stats in six.iteritems(stats.net):
+            output[interface + "_rx"] = nic_stats[0]
+            output[interface + "_rx_packets"] = nic_stats[1]
+            output[interface + "_rx_errors"] = nic_stats[2]
+            output[interface + "_rx_drop"] = nic_stats[3]
+            output[interface + "_tx"] = nic_stats[4]
+            output[interface + "_tx_packets"] = nic_stats[5]
+            output[interface + "_tx_errors"] = nic_stats[6]
+            output[interface + "_tx_drop"] = nic_stats[7]
         output["memory"] = domain.maxMemory()
         # memoryStats might launch an exception if the method
         # is not supported by the underlying hypervisor being
@@ -6686,58 +6824,48 @@ class LibvirtDriver(driver.ComputeDriver):
         xml = guest.get_xml_desc()
         xml_doc = etree.fromstring(xml)
 
-        (state, max_mem, mem, num_cpu, cpu_time) = \
-            self._host.get_domain_info(domain)
+        stats = self._get_instance_stats(
+            instance, domain,
+            host.VIR_DOMAIN_STATS_STATE | host.VIR_DOMAIN_STATS_BALLOON |
+            host.VIR_DOMAIN_STATS_VCPU | host.VIR_DOMAIN_STATS_BLOCK |
+            host.VIR_DOMAIN_STATS_INTERFACE)
         config_drive = configdrive.required_by(instance)
         launched_at = timeutils.normalize_time(instance.launched_at)
         uptime = timeutils.delta_seconds(launched_at,
                                          timeutils.utcnow())
-        diags = diagnostics.Diagnostics(state=power_state.STATE_MAP[state],
-                                        driver='libvirt',
-                                        config_drive=config_drive,
-                                        hypervisor_os='linux',
-                                        uptime=uptime)
-        diags.memory_details.maximum = max_mem / units.Mi
-        diags.memory_details.used = mem / units.Mi
-
-        # get cpu time, might launch an exception if the method
-        # is not supported by the underlying hypervisor being
-        # used by libvirt
-        try:
-            for vcpu in guest.get_vcpus_info():
-                diags.add_cpu(time=vcpu.time)
-        except libvirt.libvirtError:
-            pass
-        # get io status
+        diags = diagnostics.Diagnostics(
+            state=power_state.STATE_MAP[stats.state],
+            driver='libvirt',
+            config_drive=config_drive,
+            hypervisor_os='linux',
+            uptime=uptime)
+        diags.memory_details.maximum = stats.max_mem / units.Mi
+        diags.memory_details.used = stats.mem / units.Mi
+
+        # the cpu time and io status which are not supported by the
+        # underlying hypervisor being used by libvirt are missing
+        for vcpu_id, vcpu_time in stats.vcpus:
+            diags.add_cpu(time=vcpu_time)
+        # get io status in the order of the devices of the domain
         dom_io = LibvirtDriver._get_io_devices(xml)
         for guest_disk in dom_io["volumes"]:
-            try:
-                # blockStats might launch an exception if the method
-                # is not supported by the underlying hypervisor being
-                # used by libvirt
-                stats = domain.blockStats(guest_disk)
-                diags.add_disk(read_bytes=stats[1],
-                               read_requests=stats[0],
-                               write_bytes=stats[3],
-                               write_requests=stats[2])
-            except libvirt.libvirtError:
-                pass
+            disk_stats = stats.block.get(guest_disk)
+            if disk_stats is not None:
+                diags.add_disk(read_bytes=disk_stats[1],
+                               read_requests=disk_stats[0],
+                               write_bytes=disk_stats[3],
+                               write_requests=disk_stats[2])
         for interface in dom_io["ifaces"]:
-            try:
-                # interfaceStats might launch an exception if the method
-                # is not supported by the underlying hypervisor being
-                # used by libvirt
-                stats = domain.interfaceStats(interface)
-                diags.add_nic(rx_octets=stats[0],
-                              rx_errors=stats[2],
-                              rx_drop=stats[3],
-                              rx_packets=stats[1],
-                              tx_octets=stats[4],
-                              tx_errors=stats[6],
-                              tx_drop=stats[7],
-                              tx_packets=stats[5])
-            except libvirt.libvirtError:
-                pass
+            nic_stats = stats.net.get(interface)
+            if nic_stats is not None:
+                diags.add_nic(rx_octets=nic_stats[0],
+                              rx_errors=nic_stats[2],
+                              rx_drop=nic_stats[3],
+                              rx_packets=nic_stats[1],
+                              tx_octets=nic_stats[4],
+                              tx_errors=nic_stats[6],
+                              tx_drop=nic_stats[7],
+                              tx_packets=nic_stats[5])
 
         # Update mac addresses of interface if stats have been reported
         if diags.nic_details:
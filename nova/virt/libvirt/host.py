@@ -38,6 +38,7 @@ from eventlet import greenio
 from eventlet import greenthread
 from eventlet import patcher
 from eventlet import tpool
+from lxml import etree
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_utils import excutils
@@ -76,6 +77,19 @@ CONF.import_opt('my_ip', 'nova.netconf')
 HV_DRIVER_QEMU = "QEMU"
 HV_DRIVER_XEN = "Xen"
 
+# Groups of statistics of virConnectGetAllDomainStats (libvirt >= 1.2.8),
+# also understood by the per domain fallback of older libvirt versions.
+VIR_DOMAIN_STATS_STATE = 1
+VIR_DOMAIN_STATS_CPU_TOTAL = 2
+VIR_DOMAIN_STATS_BALLOON = 4
+VIR_DOMAIN_STATS_VCPU = 8
+VIR_DOMAIN_STATS_INTERFACE = 16
+VIR_DOMAIN_STATS_BLOCK = 32
+VIR_DOMAIN_STATS_ALL = (VIR_DOMAIN_STATS_STATE | VIR_DOMAIN_STATS_CPU_TOTAL |
+                        VIR_DOMAIN_STATS_BALLOON | VIR_DOMAIN_STATS_VCPU |
+                        VIR_DOMAIN_STATS_INTERFACE | VIR_DOMAIN_STATS_BLOCK)
+VIR_CONNECT_GET_ALL_DOMAINS_STATS_ACTIVE = 1
+
 
 class DomainJobInfo(object):
     """Information about libvirt background jobs
@@ -192,11 +206,137 @@ class DomainJobInfo(object):
             return cls._get_job_stats_compat(dom)
 
 
+class DomainStats(object):
+    """Statistics of a domain
+
+    This class maps both the records of the bulk
+    virConnectGetAllDomainStats API and the results of the
+    per domain calls it replaces on older libvirt versions
+    to the same fields. The fields of the groups of
+    statistics which weren't requested are left empty.
+
+    state: the libvirt state of the domain
+    max_mem, mem: the maximum and current memory in KiB
+    num_cpu: the number of virtual cpus
+    cpu_time: the cpu time used in nanoseconds
+    vcpus: list of (vcpu number, cpu time in nanoseconds)
+    block: dict of (rd_req, rd_bytes, wr_req, wr_bytes, errs)
+           by disk target, as returned by virDomainBlockStats
+    net: dict of (rx_bytes, rx_packets, rx_errs, rx_drop,
+         tx_bytes, tx_packets, tx_errs, tx_drop) by interface
+         target, as returned by virDomainInterfaceStats
+    """
+
+    _block_fields = ('rd.reqs', 'rd.bytes', 'wr.reqs', 'wr.bytes')
+    _net_fields = ('rx.bytes', 'rx.pkts', 'rx.errs', 'rx.drop',
+                   'tx.bytes', 'tx.pkts', 'tx.errs', 'tx.drop')
+
+    def __init__(self, uuid, name, state=None, max_mem=None, mem=None,
+                 num_cpu=None, cpu_time=None, vcpus=None, block=None,
+                 net=None):
+        self.uuid = uuid
+        self.name = name
+        self.state = state
+        self.max_mem = max_mem
+        self.mem = mem
+        self.num_cpu = num_cpu
+        self.cpu_time = cpu_time
+        self.vcpus = vcpus or []
+        self.block = block or {}
+        self.net = net or {}
+
+    @classmethod
+    def from_record(cls, dom, record):
+        """Get the statistics of a domain from its record returned by
+        virConnectGetAllDomainStats or virDomainListGetStats.
+        """
+        vcpus = []
+        for i in six.moves.range(record.get('vcpu.maximum',
+                                            record.get('vcpu.current', 0))):
+            if 'vcpu.%d.time' % i in record:
+                vcpus.append((i, record['vcpu.%d.time' % i]))
+
+        block = {}
+        for i in six.moves.range(record.get('block.count', 0)):
+            name = record.get('block.%d.name' % i)
+            if name is not None:
+                # The bulk API doesn't report the errors, neither do most
+                # hypervisors through virDomainBlockStats
+                block[name] = tuple(
+                    record.get('block.%d.%s' % (i, field), 0)
+                    for field in cls._block_fields) + (
+                    record.get('block.%d.errs' % i, -1),)
+
+        net = {}
+        for i in six.moves.range(record.get('net.count', 0)):
+            name = record.get('net.%d.name' % i)
+            if name is not None:
+                net[name] = tuple(record.get('net.%d.%s' % (i, field), 0)
+                                  for field in cls._net_fields)
+
+        return cls(dom.UUIDString(), dom.name(),
+                   state=record.get('state.state'),
+                   max_mem=record.get('balloon.maximum'),
+                   mem=record.get('balloon.current'),
+                   num_cpu=record.get('vcpu.current'),
+                   cpu_time=record.get('cpu.time'),
+                   vcpus=vcpus, block=block, net=net)
+
+    @classmethod
+    def for_domain_compat(cls, host, dom, stats):
+        """Get the statistics of a domain with the per domain calls of
+        libvirt versions older than 1.2.8.
+        """
+        result = cls(dom.UUIDString(), dom.name())
+        if stats & (VIR_DOMAIN_STATS_STATE | VIR_DOMAIN_STATS_CPU_TOTAL |
+                    VIR_DOMAIN_STATS_BALLOON):
+            (result.state, result.max_mem, result.mem, result.num_cpu,
+             result.cpu_time) = host.get_domain_info(dom)
+
+        if stats & VIR_DOMAIN_STATS_VCPU:
+            # vcpus might launch an exception if the method is not
+            # supported by the underlying hypervisor being used by libvirt
+            try:
+                vcpus = dom.vcpus()
+            except libvirt.libvirtError:
+                vcpus = None
+            if vcpus is not None:
+                result.vcpus = [(vcpu[0], vcpu[2]) for vcpu in vcpus[0]]
+
+        if stats & (VIR_DOMAIN_STATS_BLOCK | VIR_DOMAIN_STATS_INTERFACE):
+            xml = dom.XMLDesc(0)
+            try:
+                doc = etree.fromstring(xml)
+            except Exception:
+                return result
+            devices = []
+            if stats & VIR_DOMAIN_STATS_BLOCK:
+                devices.append(('./devices/disk/target', dom.blockStats,
+                                result.block))
+            if stats & VIR_DOMAIN_STATS_INTERFACE:
+                devices.append(('./devices/interface/target',
+                                dom.interfaceStats, result.net))
+            for path, get_stats, table in devices:
+                for target in doc.findall(path):
+                    dev = target.get('dev')
+                    if not dev:
+                        continue
+                    # blockStats and interfaceStats might launch an
+                    # exception if the method is not supported by the
+                    # underlying hypervisor being used by libvirt
+                    try:
+                        table[dev] = tuple(get_stats(dev))
+                    except libvirt.libvirtError:
+                        pass
+        return result
+
+
 class Host(object):
 
     def __init__(self, uri, read_only=False,
                  conn_event_handler=None,
-                 lifecycle_event_handler=None):
+                 lifecycle_event_handler=None,
+                 domain_event_handler=None):
 
         global libvirt
         if libvirt is None:
@@ -206,7 +346,11 @@ class Host(object):
         self._read_only = read_only
         self._conn_event_handler = conn_event_handler
         self._lifecycle_event_handler = lifecycle_event_handler
+        # Unlike the lifecycle event handler, called as soon as the
+        # events are dispatched, including the delayed STOPPED events.
+        self._domain_event_handler = domain_event_handler
         self._skip_list_all_domains = False
+        self._skip_domain_stats = False
         self._caps = None
         self._hostname = None
 
@@ -362,6 +506,8 @@ class Host(object):
             try:
                 event = self._event_queue.get(block=False)
                 if isinstance(event, virtevent.LifecycleEvent):
+                    if self._domain_event_handler is not None:
+                        self._domain_event_handler(event)
                     # call possibly with delay
                     self._event_emit_delayed(event)
 
@@ -731,6 +877,82 @@ class Host(object):
 
         return doms
 
+    def _get_domain_stats_fast(self, stats, domains=None, only_running=True):
+        # The modern (>= 1.2.8) fast way - 1 single API call for all domains
+        if domains is not None:
+            return self.get_connection().domainListGetStats(domains, stats, 0)
+        flags = 0
+        if only_running:
+            flags = VIR_CONNECT_GET_ALL_DOMAINS_STATS_ACTIVE
+        return self.get_connection().getAllDomainStats(stats, flags)
+
+    def _get_domain_stats_slow(self, stats, domains=None, only_running=True):
+        # The legacy (< 1.2.8) slow way - O(n) API calls for n domains
+        if domains is None:
+            domains = self.list_instance_domains(only_running)
+        result = {}
+        for dom in domains:
+            try:
+                dom_stats = DomainStats.for_domain_compat(self, dom, stats)
+            except libvirt.libvirtError as ex:
+                if ex.get_error_code() == libvirt.VIR_ERR_NO_DOMAIN:
+                    # The domain went away since it was listed
+                    continue
+                raise
+            result[dom_stats.uuid] = dom_stats
+        return result
+
+    def get_domain_stats(self, stats=VIR_DOMAIN_STATS_ALL, domains=None,
+                         only_running=True):
+        """Get the statistics of several domains at once
+
+        :param stats: the VIR_DOMAIN_STATS_* groups of statistics to get
+        :param domains: the libvirt.Domain objects to get the statistics
+                        of, None for all the nova instances
+        :param only_running: True to only include the active instances
+                             when no domains are given
+
+        With libvirt >= 1.2.8 the statistics of all the domains are
+        returned by a single call to virConnectGetAllDomainStats or
+        virDomainListGetStats, instead of several calls per domain.
+
+        :returns: dict of DomainStats by domain uuid
+        """
+
+        if domains is not None and not domains:
+            return {}
+
+        if not self._skip_domain_stats:
+            try:
+                records = self._get_domain_stats_fast(stats, domains,
+                                                      only_running)
+            except AttributeError as ex:
+                LOG.info(_LI("Unable to use bulk domain stats APIs, "
+                             "falling back to slow code path: %(ex)s"),
+                         {'ex': ex})
+                self._skip_domain_stats = True
+            except libvirt.libvirtError as ex:
+                if ex.get_error_code() != libvirt.VIR_ERR_NO_SUPPORT:
+                    raise
+                LOG.info(_LI("Unable to use bulk domain stats APIs, "
+                             "falling back to slow code path: %(ex)s"),
+                         {'ex': ex})
+                self._skip_domain_stats = True
+
+        if self._skip_domain_stats:
+            # Old libvirt, or a libvirt driver which doesn't
+            # implement the new API
+            return self._get_domain_stats_slow(stats, domains, only_running)
+
+        result = {}
+        for dom, record in records:
+            if domains is None and dom.ID() == 0:
+                # Skip any host domain (eg Dom-0)
+                continue
+            dom_stats = DomainStats.from_record(dom, record)
+            result[dom_stats.uuid] = dom_stats
+        return result
+
     def get_online_cpus(self):
         """Get the set of CPUs that are online on the host
 
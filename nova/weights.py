@@ -18,7 +18,12 @@ Pluggable Weighing support
 """
 
 import abc
+import time
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
 import six
 
 from nova import loadables
@@ -53,6 +58,30 @@ def normalize(weight_list, minval=None, maxval=None):
     return ((i - minval) / range_ for i in weight_list)
 
 
+def normalize_array(weights, minval=None, maxval=None):
+    """Normalize the values of a NumPy array between 0 and 1.0.
+
+    This is the same as normalize(), computed at once over the array.
+    """
+    if not len(weights):
+        return weights
+
+    if maxval is None:
+        maxval = weights.max()
+
+    if minval is None:
+        minval = weights.min()
+
+    maxval = float(maxval)
+    minval = float(minval)
+
+    if minval == maxval:
+        return numpy.zeros(len(weights))
+
+    range_ = maxval - minval
+    return (weights - minval) / range_
+
+
 class WeighedObject(object):
     """Object with weight information."""
     def __init__(self, obj, weight):
@@ -63,6 +92,52 @@ class WeighedObject(object):
         return "<WeighedObject '%s': %s>" % (self.obj, self.weight)
 
 
+class WeighedObjectList(object):
+    """Sorted (descending) sequence of WeighedObjects built on access.
+
+    Only the WeighedObjects which are actually looked at, usually the few
+    best ones, are created out of the array of weights.
+    """
+
+    def __init__(self, object_class, obj_list, weights):
+        self._object_class = object_class
+        self._obj_list = obj_list
+        self._weights = weights
+        # NOTE(iuliat): mergesort is stable, so objects with the same weight
+        # keep their original order like with sorted().
+        self._order = numpy.argsort(-weights, kind='mergesort')
+        self._weighed_objs = {}
+
+    def __len__(self):
+        return len(self._obj_list)
+
+    def _get(self, position):
+        weighed_obj = self._weighed_objs.get(position)
+        if weighed_obj is None:
+            index = self._order[position]
+            weighed_obj = self._object_class(self._obj_list[index],
+                                             float(self._weights[index]))
+            self._weighed_objs[position] = weighed_obj
+        return weighed_obj
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self._get(i)
+                    for i in range(*position.indices(len(self)))]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        return self._get(position)
+
+    def __iter__(self):
+        for position in range(len(self)):
+            yield self._get(position)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
 @six.add_metaclass(abc.ABCMeta)
 class BaseWeigher(object):
     """Base class for pluggable weighers.
@@ -117,18 +192,62 @@ class BaseWeigher(object):
 
         return weights
 
+    def weigh_objects_array(self, obj_list, weight_properties):
+        """Weigh multiple objects, returning a NumPy array of weights.
+
+        Override in a subclass which can compute all its weights at once.
+        The default implementation goes through weigh_objects(). An override
+        has to record the min and max values with _record_bounds().
+        """
+        weighed_obj_list = [WeighedObject(obj, 0.0) for obj in obj_list]
+        return numpy.array(self.weigh_objects(weighed_obj_list,
+                                              weight_properties),
+                           dtype=numpy.float64)
+
+    def _record_bounds(self, weights):
+        """Record the min and max values of an array of weights.
+
+        This mirrors what weigh_objects() does one weight at a time.
+        """
+        if not len(weights):
+            return
+        lowest = float(weights.min())
+        highest = float(weights.max())
+        if self.minval is None or lowest < self.minval:
+            self.minval = lowest
+        if self.maxval is None or highest > self.maxval:
+            self.maxval = highest
+
 
 class BaseWeightHandler(loadables.BaseLoader):
     object_class = WeighedObject
 
+    # Set to true in a subclass to weigh all the objects at once with
+    # NumPy arrays
+    use_batch_weighers = False
+
+    # Set to a nova.plugin_stats.StatsCollector in a subclass to collect
+    # run statistics of the weighers
+    stats = None
+
+    def _record_run(self, weigher, start, num_objs):
+        if self.stats is not None:
+            self.stats[weigher.__class__.__name__].record_run(
+                time.time() - start, num_objs, num_objs)
+
     def get_weighed_objects(self, weighers, obj_list, weighing_properties):
         """Return a sorted (descending), normalized list of WeighedObjects."""
+        if self.use_batch_weighers:
+            return self._get_weighed_objects_batch(weighers, obj_list,
+                                                   weighing_properties)
+
         weighed_objs = [self.object_class(obj, 0.0) for obj in obj_list]
 
         if len(weighed_objs) <= 1:
             return weighed_objs
 
         for weigher in weighers:
+            start = time.time()
             weights = weigher.weigh_objects(weighed_objs, weighing_properties)
 
             # Normalize the weights
@@ -139,5 +258,48 @@ class BaseWeightHandler(loadables.BaseLoader):
             for i, weight in enumerate(weights):
                 obj = weighed_objs[i]
                 obj.weight += weigher.weight_multiplier() * weight
+            self._record_run(weigher, start, len(weighed_objs))
 
         return sorted(weighed_objs, key=lambda x: x.weight, reverse=True)
+
+    def get_weighed_object(self, weighers, obj, weighing_properties):
+        """Return a WeighedObject for a single object.
+
+        The weights are normalized with the min and max values recorded by
+        the weighers while weighing the whole list of objects, so that the
+        result can be compared with the weights of that list.
+        """
+        weighed_obj = self.object_class(obj, 0.0)
+        for weigher in weighers:
+            # weigh_objects() widens the bounds to the weight of the object,
+            # which would normalize it differently from the list.
+            minval, maxval = weigher.minval, weigher.maxval
+            weights = weigher.weigh_objects([weighed_obj],
+                                            weighing_properties)
+            weigher.minval, weigher.maxval = minval, maxval
+            weight = list(normalize(weights, minval=minval,
+                                    maxval=maxval))[0]
+            weighed_obj.weight += weigher.weight_multiplier() * weight
+        return weighed_obj
+
+    def _get_weighed_objects_batch(self, weighers, obj_list,
+                                   weighing_properties):
+        """Return a sorted (descending), normalized sequence of
+        WeighedObjects, computing the weights with NumPy arrays.
+        """
+        obj_list = list(obj_list)
+        if len(obj_list) <= 1:
+            return [self.object_class(obj, 0.0) for obj in obj_list]
+
+        total_weights = numpy.zeros(len(obj_list))
+        for weigher in weighers:
+            start = time.time()
+            weights = weigher.weigh_objects_array(obj_list,
+                                                  weighing_properties)
+            weights = normalize_array(weights,
+                                      minval=weigher.minval,
+                                      maxval=weigher.maxval)
+            total_weights += weigher.weight_multiplier() * weights
+            self._record_run(weigher, start, len(obj_list))
+
+        return WeighedObjectList(self.object_class, obj_list, total_weights)